@@ -22,7 +22,10 @@ class Dataset(DatasetBase):
 
     def __init__(self, data_type, train_data_size, label_type_main,
                  label_type_sub, batch_size, num_stack=None, num_skip=None,
-                 is_sorted=True, is_progressbar=False, num_gpu=1, is_gpu=True):
+                 is_sorted=True, is_progressbar=False, num_gpu=1, is_gpu=True,
+                 num_prefetch=0, num_prefetch_thread=1,
+                 packed_path=None, bucket_size=None,
+                 max_frame_num=None):
         """A class for loading dataset.
         Args:
             data_type: string, train or dev or eval1 or eval2 or eval3
@@ -36,6 +39,19 @@ class Dataset(DatasetBase):
             is_progressbar: if True, visualize progressbar
             num_gpu: int, if more than 1, divide batch_size by num_gpu
             is_gpu: bool
+            num_prefetch: int, the number of mini-batches to build in advance
+                in background threads. If 0, build each mini-batch on demand
+            num_prefetch_thread: int, the number of threads to build
+                mini-batches
+            packed_path: path to the packed corpus. If None, load one .npy
+                file per utterance. This is not supported for the eval sets
+                unless label_type_sub is phone, because their labels are raw
+                strings.
+            bucket_size: int, if set with is_sorted, shuffle utterances
+                within buckets of this number of utterances sorted by frame
+                num
+            max_frame_num: int, if set, make mini-batches up to this number
+                of frames including padding instead of using batch_size
         """
         if data_type not in ['train', 'dev', 'eval1', 'eval2', 'eval3']:
             raise ValueError(
@@ -51,55 +67,64 @@ class Dataset(DatasetBase):
         self.is_sorted = is_sorted
         self.is_progressbar = is_progressbar
         self.num_gpu = num_gpu
+        self.num_prefetch = num_prefetch
+        self.num_prefetch_thread = num_prefetch_thread
+        self.prefetch_stats = None
         self.input_size = 123
 
-        if is_gpu:
-            # GPU
-            input_path = join('/data/inaguma/csj/inputs',
-                              train_data_size, data_type)
-            label_main_path = join('/data/inaguma/csj/labels/ctc/',
-                                   train_data_size, label_type_main, data_type)
-            label_sub_path = join('/data/inaguma/csj/labels/ctc/',
-                                  train_data_size, label_type_sub, data_type)
+        self.packed = None
+        if packed_path is not None:
+            self._open_packed(packed_path)
         else:
-            # CPU
-            input_path = join('/n/sd8/inaguma/corpus/csj/dataset/inputs',
-                              train_data_size, data_type)
-            label_main_path = join(
-                '/n/sd8/inaguma/corpus/csj/dataset/labels/ctc/',
-                train_data_size, label_type_main, data_type)
-            label_sub_path = join(
-                '/n/sd8/inaguma/corpus/csj/dataset/labels/ctc/',
-                train_data_size, label_type_sub, data_type)
+            if is_gpu:
+                # GPU
+                input_path = join('/data/inaguma/csj/inputs',
+                                  train_data_size, data_type)
+                label_main_path = join('/data/inaguma/csj/labels/ctc/',
+                                       train_data_size, label_type_main,
+                                       data_type)
+                label_sub_path = join('/data/inaguma/csj/labels/ctc/',
+                                      train_data_size, label_type_sub,
+                                      data_type)
+            else:
+                # CPU
+                input_path = join('/n/sd8/inaguma/corpus/csj/dataset/inputs',
+                                  train_data_size, data_type)
+                label_main_path = join(
+                    '/n/sd8/inaguma/corpus/csj/dataset/labels/ctc/',
+                    train_data_size, label_type_main, data_type)
+                label_sub_path = join(
+                    '/n/sd8/inaguma/corpus/csj/dataset/labels/ctc/',
+                    train_data_size, label_type_sub, data_type)
 
-        # Load the frame number dictionary
-        with open(join(input_path, 'frame_num.pickle'), 'rb') as f:
-            self.frame_num_dict = pickle.load(f)
+            # Load the frame number dictionary
+            with open(join(input_path, 'frame_num.pickle'), 'rb') as f:
+                self.frame_num_dict = pickle.load(f)
 
-        # Sort paths to input & label by frame num
-        print('=> loading paths to dataset...')
-        frame_num_tuple_sorted = sorted(self.frame_num_dict.items(),
-                                        key=lambda x: x[1])
-        input_paths, label_main_paths, label_sub_paths = [], [], []
-        for input_name, frame_num in wrap_iterator(frame_num_tuple_sorted,
-                                                   self.is_progressbar):
-            speaker_name = input_name.split('_')[0]
-            input_paths.append(
-                join(input_path, speaker_name, input_name + '.npy'))
-            label_main_paths.append(
-                join(label_main_path, speaker_name, input_name + '.npy'))
-            label_sub_paths.append(
-                join(label_sub_path, speaker_name, input_name + '.npy'))
-        self.input_paths = np.array(input_paths)
-        self.label_main_paths = np.array(label_main_paths)
-        self.label_sub_paths = np.array(label_sub_paths)
-        self.data_num = len(self.input_paths)
+            # Sort paths to input & label by frame num
+            print('=> loading paths to dataset...')
+            frame_num_tuple_sorted = sorted(self.frame_num_dict.items(),
+                                            key=lambda x: x[1])
+            input_paths, label_main_paths, label_sub_paths = [], [], []
+            for input_name, frame_num in wrap_iterator(frame_num_tuple_sorted,
+                                                       self.is_progressbar):
+                speaker_name = input_name.split('_')[0]
+                input_paths.append(
+                    join(input_path, speaker_name, input_name + '.npy'))
+                label_main_paths.append(
+                    join(label_main_path, speaker_name, input_name + '.npy'))
+                label_sub_paths.append(
+                    join(label_sub_path, speaker_name, input_name + '.npy'))
+            self.input_paths = np.array(input_paths)
+            self.label_main_paths = np.array(label_main_paths)
+            self.label_sub_paths = np.array(label_sub_paths)
+            self.data_num = len(self.input_paths)
 
         if (self.num_stack is not None) and (self.num_skip is not None):
             self.input_size = self.input_size * num_stack
         # NOTE: Not load dataset yet
 
-        self.rest = set(range(0, self.data_num, 1))
+        self._init_sampler(bucket_size, max_frame_num)
 
         if data_type in ['eval1', 'eval2', 'eval3'] and label_type_sub != 'phone':
             self.is_test = True
@@ -36,17 +36,24 @@ class TestLoadDatasetCTC(unittest.TestCase):
         # For many GPUs
         self.check_loading(label_type='kanji', num_gpu=7, is_sorted=True)
 
+        # Prefetching
+        self.check_loading(label_type='kanji', num_gpu=1, is_sorted=True,
+                           num_prefetch=4)
+        self.check_loading(label_type='kanji', num_gpu=2, is_sorted=False,
+                           num_prefetch=4)
+
     @measure_time
-    def check_loading(self, label_type, num_gpu, is_sorted):
+    def check_loading(self, label_type, num_gpu, is_sorted, num_prefetch=0):
         print('----- label_type: ' + label_type + ', num_gpu: ' +
-              str(num_gpu) + ', is_sorted: ' + str(is_sorted) + ' -----')
+              str(num_gpu) + ', is_sorted: ' + str(is_sorted) +
+              ', num_prefetch: ' + str(num_prefetch) + ' -----')
 
         batch_size = 32
         dataset = Dataset(data_type='train', train_data_size='default',
                           label_type=label_type, batch_size=batch_size,
                           num_stack=3, num_skip=3,
                           is_sorted=is_sorted, is_progressbar=True,
-                          num_gpu=num_gpu)
+                          num_gpu=num_gpu, num_prefetch=num_prefetch)
 
         tf.reset_default_graph()
         with tf.Session().as_default() as sess:
@@ -61,7 +68,7 @@ class TestLoadDatasetCTC(unittest.TestCase):
                 map_file_path = '../metrics/mapping_files/ctc/phone2num.txt'
                 map_fn = num2phone
 
-            mini_batch = dataset.next_batch(session=sess)
+            mini_batch = dataset.next_batch()
 
             iter_per_epoch = int(dataset.data_num /
                                  (batch_size * num_gpu)) + 1
@@ -85,6 +92,9 @@ class TestLoadDatasetCTC(unittest.TestCase):
                 str_true = re.sub(r'_', ' ', str_true)
                 print(str_true)
 
+            if num_prefetch > 0:
+                print(dataset.prefetch_stats)
+
 
 if __name__ == '__main__':
     unittest.main()
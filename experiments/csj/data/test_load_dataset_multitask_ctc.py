@@ -96,7 +96,7 @@ class TestReadDatasetCTC(unittest.TestCase):
                 map_file_path_sub = '../metrics/mapping_files/ctc/phone2num.txt'
                 map_fn_sub = num2phone
 
-            mini_batch = dataset.next_batch(session=sess)
+            mini_batch = dataset.next_batch()
 
             iter_per_epoch = int(dataset.data_num /
                                  (batch_size * num_gpu)) + 1
@@ -1,7 +1,11 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
-"""Evaluate the trained CTC model (CSJ corpus)."""
+"""Evaluate the trained CTC model (CSJ corpus). With --dump, the log
+   posteriors of the evaluation sets are written to the posterior cache
+   instead (see experiments/utils/data/posterior_cache.py), which is
+   evaluated by eval_ctc_cached.py without TensorFlow.
+"""
 
 from __future__ import absolute_import
 from __future__ import division
@@ -15,6 +19,8 @@ import yaml
 sys.path.append('../../../')
 from experiments.csj.data.load_dataset_ctc import Dataset
 from experiments.csj.metrics.ctc import do_eval_per, do_eval_cer
+from experiments.utils.data.posterior_cache import cache_path, dump_posteriors
+from models.checkpoint import restore_checkpoint
 from models.ctc.load_model import load
 
 
@@ -50,10 +56,9 @@ def do_eval(network, param, epoch=None):
         tf.float32,
         shape=[None, None, network.input_size],
         name='input')
-    indices_pl = tf.placeholder(tf.int64, name='indices')
-    values_pl = tf.placeholder(tf.int32, name='values')
-    shape_pl = tf.placeholder(tf.int64, name='shape')
-    network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+    network.labels = tf.placeholder(tf.int32,
+                                    shape=[None, None],
+                                    name='labels')
     network.inputs_seq_len = tf.placeholder(tf.int64,
                                             shape=[None],
                                             name='inputs_seq_len')
@@ -72,10 +77,6 @@ def do_eval(network, param, epoch=None):
                                 network.inputs_seq_len,
                                 decode_type='beam_search',
                                 beam_width=20)
-    per_op = network.compute_ler(decode_op, network.labels)
-
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
 
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
@@ -87,7 +88,7 @@ def do_eval(network, param, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
-            saver.restore(sess, model_path)
+            restore_checkpoint(sess, model_path)
             print("Model restored: " + model_path)
         else:
             raise ValueError('There are not any checkpoints.')
@@ -101,7 +102,7 @@ def do_eval(network, param, epoch=None):
                 dataset=eval1_data,
                 label_type=param['label_type'],
                 is_test=True,
-                eval_batch_size=1,
+                max_frame_num=param.get('eval_max_frame_num'),
                 is_progressbar=True)
             print('  CER: %f %%' % (cer_eval1 * 100))
 
@@ -113,7 +114,7 @@ def do_eval(network, param, epoch=None):
                 dataset=eval2_data,
                 label_type=param['label_type'],
                 is_test=True,
-                eval_batch_size=1,
+                max_frame_num=param.get('eval_max_frame_num'),
                 is_progressbar=True)
             print('  CER: %f %%' % (cer_eval2 * 100))
 
@@ -125,7 +126,7 @@ def do_eval(network, param, epoch=None):
                 dataset=eval3_data,
                 label_type=param['label_type'],
                 is_test=True,
-                eval_batch_size=1,
+                max_frame_num=param.get('eval_max_frame_num'),
                 is_progressbar=True)
             print('  CER: %f %%' % (cer_eval3 * 100))
 
@@ -137,30 +138,27 @@ def do_eval(network, param, epoch=None):
             print('=== eval1 Evaluation ===')
             per_eval1 = do_eval_per(
                 session=sess,
-                per_op=per_op,
                 network=network,
                 dataset=eval1_data,
-                eval_batch_size=1,
+                max_frame_num=param.get('eval_max_frame_num'),
                 is_progressbar=True)
             print('  PER: %f %%' % (per_eval1 * 100))
 
             print('=== eval2 Evaluation ===')
             per_eval2 = do_eval_per(
                 session=sess,
-                per_op=per_op,
                 network=network,
                 dataset=eval2_data,
-                eval_batch_size=1,
+                max_frame_num=param.get('eval_max_frame_num'),
                 is_progressbar=True)
             print('  PER: %f %%' % (per_eval2 * 100))
 
             print('=== eval3 Evaluation ===')
             per_eval3 = do_eval_per(
                 session=sess,
-                per_op=per_op,
                 network=network,
                 dataset=eval3_data,
-                eval_batch_size=1,
+                max_frame_num=param.get('eval_max_frame_num'),
                 is_progressbar=True)
             print('  PER: %f %%' % (per_eval3 * 100))
 
@@ -169,7 +167,77 @@ def do_eval(network, param, epoch=None):
             print('  PER: %f %%' % 1 (per_mean * 100))
 
 
-def main(model_path, epoch):
+def do_dump(network, param, epoch=None):
+    """Dump the log posteriors of the evaluation sets to the posterior
+       cache.
+    Args:
+        network: model to restore
+        param: A dictionary of parameters
+        epoch: int, the epoch to restore
+    """
+    # Define placeholders
+    network.inputs = tf.placeholder(
+        tf.float32,
+        shape=[None, None, network.input_size],
+        name='input')
+    network.labels = tf.placeholder(tf.int32,
+                                    shape=[None, None],
+                                    name='labels')
+    network.inputs_seq_len = tf.placeholder(tf.int64,
+                                            shape=[None],
+                                            name='inputs_seq_len')
+    network.keep_prob_input = tf.placeholder(tf.float32,
+                                             name='keep_prob_input')
+    network.keep_prob_hidden = tf.placeholder(tf.float32,
+                                              name='keep_prob_hidden')
+
+    # Add to the graph each operation (including model definition)
+    _, logits = network.compute_loss(network.inputs,
+                                     network.labels,
+                                     network.inputs_seq_len,
+                                     network.keep_prob_input,
+                                     network.keep_prob_hidden)
+    log_posteriors_op, outputs_seq_len_op = network.log_posteriors(
+        logits, network.inputs_seq_len)
+
+    with tf.Session() as sess:
+        ckpt = tf.train.get_checkpoint_state(network.model_dir)
+
+        # If check point exists
+        if ckpt:
+            # Use last saved model
+            model_path = ckpt.model_checkpoint_path
+            if epoch is not None:
+                model_path = model_path.split('/')[:-1]
+                model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+            restore_checkpoint(sess, model_path)
+            print("Model restored: " + model_path)
+        else:
+            raise ValueError('There are not any checkpoints.')
+
+        for data_type in ['eval1', 'eval2', 'eval3']:
+            print('=== ' + data_type + ' ===')
+            eval_data = Dataset(data_type=data_type,
+                                label_type=param['label_type'],
+                                batch_size=1,
+                                train_data_size=param['train_data_size'],
+                                num_stack=param['num_stack'],
+                                num_skip=param['num_skip'],
+                                is_sorted=False, is_progressbar=True)
+            save_path = cache_path(network.model_dir, model_path, data_type)
+            dump_posteriors(session=sess,
+                            log_posteriors_ops=[log_posteriors_op],
+                            outputs_seq_len_op=outputs_seq_len_op,
+                            network=network,
+                            dataset=eval_data,
+                            save_paths=[save_path],
+                            label_types=[param['label_type']],
+                            max_frame_num=param.get('eval_max_frame_num'),
+                            is_progressbar=True)
+            print("Posteriors dumped: " + save_path)
+
+
+def main(model_path, epoch, is_dump=False):
 
     # Load config file (.yml)
     with open(os.path.join(model_path, 'config.yml'), "r") as f:
@@ -203,12 +271,17 @@ def main(model_path, epoch):
 
     network.model_dir = model_path
     print(network.model_dir)
-    do_eval(network=network, param=param, epoch=epoch)
+    if is_dump:
+        do_dump(network=network, param=param, epoch=epoch)
+    else:
+        do_eval(network=network, param=param, epoch=epoch)
 
 
 if __name__ == '__main__':
 
     args = sys.argv
+    is_dump = '--dump' in args
+    args = [arg for arg in args if arg != '--dump']
     if len(args) == 2:
         model_path = args[1]
         epoch = None
@@ -218,5 +291,6 @@ if __name__ == '__main__':
     else:
         raise ValueError(
             ("Set a path to saved model.\n"
-             "Usase: python eval_ctc.py path_to_saved_model"))
-    main(model_path=model_path, epoch=epoch)
+             "Usase: python eval_ctc.py path_to_saved_model (epoch)\n"
+             "       python eval_ctc.py path_to_saved_model (epoch) --dump"))
+    main(model_path=model_path, epoch=epoch, is_dump=is_dump)
@@ -8,10 +8,11 @@ from __future__ import division
 from __future__ import print_function
 
 import re
-import Levenshtein
 
-from experiments.utils.labels.character import num2char
-from experiments.utils.sparsetensor import sparsetensor2list
+from experiments.utils.data.eval_batch import eval_batches, restore_order
+from experiments.utils.edit_distance import compute_error_rate
+from experiments.utils.labels.vocabulary import load_vocabulary
+from experiments.utils.sparsetensor import sparsetensor2ragged
 from experiments.utils.exception_func import exception
 from experiments.utils.progressbar import wrap_iterator
 
@@ -19,7 +20,8 @@ from experiments.utils.progressbar import wrap_iterator
 @exception
 def do_eval_cer(session, decode_op, network, dataset, label_type, is_test=None,
                 eval_batch_size=None, is_progressbar=False,
-                is_multitask=False, is_main=False):
+                is_multitask=False, is_main=False, num_worker=1,
+                max_frame_num=None, is_per_utterance=False):
     """Evaluate trained model by Character Error Rate.
     Args:
         session: session of training model
@@ -28,26 +30,21 @@ def do_eval_cer(session, decode_op, network, dataset, label_type, is_test=None,
         dataset: An instance of `Dataset` class
         label_type: string, kanji or kana or phone
         is_test: bool, set to True when evaluating by the test set
-        eval_batch_size: int, the batch size when evaluating the model
+        eval_batch_size: int, the batch size when evaluating the model. This
+            is used only when max_frame_num is None.
         is_progressbar: if True, visualize progressbar
         is_multitask: if True, evaluate the multitask model
         is_main: if True, evaluate the main task
+        num_worker: int, the number of processes to compute edit distance
+        max_frame_num: int, the number of frames in each mini-batch of
+            utterances sorted by length (see eval_batch.py)
+        is_per_utterance: if True, also return CER of each utterance
     Return:
         cer_mean: An average of CER
+        cer_list: np.ndarray of CER of each utterance in the original order
+            of the dataset (only if is_per_utterance is True)
     """
-    if eval_batch_size is None:
-        batch_size = dataset.batch_size
-    else:
-        batch_size = eval_batch_size
-
-    num_examples = dataset.data_num
-    iteration = int(num_examples / batch_size)
-    if (num_examples / batch_size) != int(num_examples / batch_size):
-        iteration += 1
-    cer_sum = 0
-
-    # Make data generator
-    mini_batch = dataset.next_batch(batch_size=batch_size)
+    str_true_list, str_pred_list, positions = [], [], []
 
     if label_type == 'kanji':
         map_file_path = '../metrics/mapping_files/ctc/kanji2num.txt'
@@ -55,16 +52,21 @@ def do_eval_cer(session, decode_op, network, dataset, label_type, is_test=None,
         map_file_path = '../metrics/mapping_files/ctc/kana2num.txt'
     elif label_type == 'phone':
         map_file_path == '../metrics/mapping_files/ctc/phone2num.txt'
+    vocab = load_vocabulary(map_file_path)
 
-    for step in wrap_iterator(range(iteration), is_progressbar):
+    # Utterances sorted by length
+    mini_batches = eval_batches(dataset, max_frame_num=max_frame_num,
+                                batch_size=eval_batch_size)
+    for batch, positions_batch in wrap_iterator(mini_batches,
+                                                is_progressbar):
         # Create feed dictionary for next mini batch
         if not is_multitask:
-            inputs, labels_true, inputs_seq_len, _ = mini_batch.__next__()
+            inputs, labels_true, inputs_seq_len, _ = batch
         else:
             if is_main:
-                inputs, labels_true, _, inputs_seq_len, _ = mini_batch.__next__()
+                inputs, labels_true, _, inputs_seq_len, _ = batch
             else:
-                inputs, _, labels_true, inputs_seq_len, _ = mini_batch.__next__()
+                inputs, _, labels_true, inputs_seq_len, _ = batch
 
         feed_dict = {
             network.inputs: inputs,
@@ -76,7 +78,9 @@ def do_eval_cer(session, decode_op, network, dataset, label_type, is_test=None,
         batch_size_each = len(inputs_seq_len)
 
         labels_pred_st = session.run(decode_op, feed_dict=feed_dict)
-        labels_pred = sparsetensor2list(labels_pred_st, batch_size_each)
+        offsets, labels_pred = sparsetensor2ragged(labels_pred_st,
+                                                   batch_size_each)
+        str_pred_batch = vocab.decode_batch(offsets, labels_pred)
 
         for i_batch in range(batch_size_each):
             # Convert from list to string
@@ -84,19 +88,72 @@ def do_eval_cer(session, decode_op, network, dataset, label_type, is_test=None,
                 str_true = ''.join(labels_true[i_batch])
                 # NOTE: 漢字とかなの場合はテストデータのラベルはそのまま保存してある
             else:
-                str_true = num2char(labels_true[i_batch], map_file_path)
-            str_pred = num2char(labels_pred[i_batch], map_file_path)
+                str_true = vocab.decode(labels_true[i_batch])
+            str_pred = str_pred_batch[i_batch]
 
             # Remove silence(_) & noise(NZ) labels
-            str_true = re.sub(r'[_NZー]+', "", str_true)
-            str_pred = re.sub(r'[_NZー]+', "", str_pred)
+            str_true_list.append(re.sub(r'[_NZー]+', "", str_true))
+            str_pred_list.append(re.sub(r'[_NZー]+', "", str_pred))
+        positions.extend(positions_batch)
+
+    # Compute edit distance in the original order
+    cer_list = compute_error_rate(restore_order(str_true_list, positions),
+                                  restore_order(str_pred_list, positions),
+                                  num_worker=num_worker)
+    cer_mean = cer_list.sum() / dataset.data_num
+
+    if is_per_utterance:
+        return cer_mean, cer_list
+    return cer_mean
+
+
+def do_eval_cer_cached(cache, label_type, beam_width=None,
+                       is_progressbar=False, num_worker=1,
+                       is_per_utterance=False):
+    """Evaluate log posteriors in a cache by Character Error Rate without
+       TensorFlow (see experiments/utils/data/posterior_cache.py).
+    Args:
+        cache: An instance of `PosteriorCache`
+        label_type: string, kanji or kana or phone
+        beam_width: int, beam width for beam search. If None, use greedy
+            decoding.
+        is_progressbar: if True, visualize progressbar
+        num_worker: int, the number of processes to decode and compute edit
+            distance
+        is_per_utterance: if True, also return CER of each utterance
+    Return:
+        cer_mean: An average of CER
+        cer_list: np.ndarray of CER of each utterance (only if
+            is_per_utterance is True)
+    """
+    if label_type == 'kanji':
+        map_file_path = '../metrics/mapping_files/ctc/kanji2num.txt'
+    elif label_type == 'kana':
+        map_file_path = '../metrics/mapping_files/ctc/kana2num.txt'
+    elif label_type == 'phone':
+        map_file_path = '../metrics/mapping_files/ctc/phone2num.txt'
+    vocab = load_vocabulary(map_file_path)
 
-            # Compute edit distance
-            cer_each = Levenshtein.distance(
-                str_pred, str_true) / len(list(str_true))
+    labels_pred = cache.decode(beam_width=beam_width, num_worker=num_worker,
+                               is_progressbar=is_progressbar)
+
+    str_true_list, str_pred_list = [], []
+    for i, l_pred in enumerate(labels_pred):
+        # NOTE: Labels of the test set are the strings themselves
+        if cache.is_raw_label:
+            str_true = ''.join(cache.label(i))
+        else:
+            str_true = vocab.decode(cache.label(i))
+        str_pred = vocab.decode(l_pred)
 
-            cer_sum += cer_each
+        # Remove silence(_) & noise(NZ) labels
+        str_true_list.append(re.sub(r'[_NZー]+', "", str_true))
+        str_pred_list.append(re.sub(r'[_NZー]+', "", str_pred))
 
-    cer_mean = cer_sum / dataset.data_num
+    cer_list = compute_error_rate(str_true_list, str_pred_list,
+                                  num_worker=num_worker)
+    cer_mean = cer_list.sum() / cache.data_num
 
+    if is_per_utterance:
+        return cer_mean, cer_list
     return cer_mean
@@ -8,6 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 from os.path import join, isfile
+from collections import OrderedDict
 import sys
 import time
 import tensorflow as tf
@@ -20,17 +21,28 @@ from experiments.csj.data.load_dataset_ctc import Dataset
 from experiments.csj.metrics.ctc import do_eval_cer
 from experiments.utils.directory import mkdir, mkdir_join
 from experiments.utils.parameter import count_total_parameters
-from experiments.utils.csv import save_loss, save_ler
-from experiments.utils.sparsetensor import list2sparsetensor
+from experiments.utils.distributed import Replica
+from experiments.utils.trainer import Trainer
 from models.ctc.load_model import load
 
 
-def do_train(network, param):
+def do_train(network, param, replica=None):
     """Run training.
     Args:
         network: network to train
         param: A dictionary of parameters
+        replica: An instance of `Replica` in distributed training. If None,
+            train in this process only
     """
+    # Make mini-batches up to max_frame_num frames instead of batch_size
+    max_frame_num = None
+    if param['max_frame_num'] != 0:
+        max_frame_num = param['max_frame_num']
+
+    # Evaluate in mini-batches of utterances sorted by length up to this
+    # number of frames (see experiments/utils/data/eval_batch.py)
+    eval_max_frame_num = param.get('eval_max_frame_num')
+
     # Load dataset
     train_data = Dataset(data_type='train',
                          label_type=param['label_type'],
@@ -38,7 +50,9 @@ def do_train(network, param):
                          batch_size=param['batch_size'],
                          num_stack=param['num_stack'],
                          num_skip=param['num_skip'],
-                         is_sorted=True)
+                         is_sorted=True,
+                         num_prefetch=param['num_prefetch'],
+                         max_frame_num=max_frame_num)
     dev_data_step = Dataset(data_type='dev',
                             label_type=param['label_type'],
                             train_data_size=param['train_data_size'],
@@ -54,18 +68,24 @@ def do_train(network, param):
                              num_skip=param['num_skip'],
                              is_sorted=False)
 
+    # Each worker trains on its own shard of the training data
+    if replica is None:
+        replica = Replica(param)
+    iter_per_epoch = replica.shard(train_data, by_speaker=True)
+
     # Tell TensorFlow that the model will be built into the default graph
-    with tf.Graph().as_default():
+    # (variables are placed on parameter servers in distributed training)
+    with tf.Graph().as_default(), tf.device(replica.device()):
 
         # Define placeholders
         network.inputs = tf.placeholder(
             tf.float32,
             shape=[None, None, network.input_size],
             name='input')
-        indices_pl = tf.placeholder(tf.int64, name='indices')
-        values_pl = tf.placeholder(tf.int32, name='values')
-        shape_pl = tf.placeholder(tf.int64, name='shape')
-        network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+        # NOTE: padded labels are converted into SparseTensor in the graph
+        network.labels = tf.placeholder(tf.int32,
+                                        shape=[None, None],
+                                        name='labels')
         network.inputs_seq_len = tf.placeholder(tf.int64,
                                                 shape=[None],
                                                 name='inputs_seq_len')
@@ -84,18 +104,25 @@ def do_train(network, param):
             loss_op,
             optimizer=param['optimizer'],
             learning_rate_init=float(param['learning_rate']),
-            is_scheduled=False)
-        decode_op = network.decoder(logits,
-                                    network.inputs_seq_len,
-                                    decode_type='beam_search',
-                                    beam_width=20)
-        ler_op = network.compute_ler(decode_op, network.labels)
+            is_scheduled=False,
+            num_replicas=replica.num_replicas,
+            accumulate_steps=param.get('accumulate_steps', 1))
+        # LER by greedy decoding is monitored during training
+        decode_op_greedy = network.decoder(logits,
+                                           network.inputs_seq_len,
+                                           decode_type='greedy')
+        ler_op_greedy = network.compute_ler(decode_op_greedy, network.labels)
 
         # Build the summary tensor based on the TensorFlow collection of
         # summaries
         summary_train = tf.summary.merge(network.summaries_train)
         summary_dev = tf.summary.merge(network.summaries_dev)
 
+        decode_op = network.decoder(logits,
+                                    network.inputs_seq_len,
+                                    decode_type='beam_search',
+                                    beam_width=20)
+
         # Add the variable initializer operation
         init_op = tf.global_variables_initializer()
 
@@ -111,154 +138,125 @@ def do_train(network, param):
               (len(parameters_dict.keys()),
                "{:,}".format(total_parameters / 1000000)))
 
-        csv_steps, csv_train_loss, csv_dev_loss = [], [], []
-        csv_ler_train, csv_ler_dev = [], []
+        # Make mini-batch generator
+        mini_batch_train = train_data.next_batch()
+        mini_batch_dev = dev_data_step.next_batch()
+
+        def next_feed_dict_train():
+            with tf.device('/cpu:0'):
+                inputs, labels, inputs_seq_len, _ = mini_batch_train.__next__()
+            return {
+                network.inputs: inputs,
+                network.labels: labels,
+                network.inputs_seq_len: inputs_seq_len,
+                network.keep_prob_input: network.dropout_ratio_input,
+                network.keep_prob_hidden: network.dropout_ratio_hidden,
+                network.lr: float(param['learning_rate'])
+            }, train_data.next_epoch_flag
+
+        def next_feed_dict_dev():
+            with tf.device('/cpu:0'):
+                inputs, labels, inputs_seq_len, _ = mini_batch_dev.__next__()
+            # Evaluation mode
+            return {
+                network.inputs: inputs,
+                network.labels: labels,
+                network.inputs_seq_len: inputs_seq_len,
+                network.keep_prob_input: 1.0,
+                network.keep_prob_hidden: 1.0
+            }
+
+        def print_fn(step):
+            if train_data.prefetch_stats is not None:
+                # Check whether training is I/O bound
+                print('  ' + str(train_data.prefetch_stats))
+                train_data.prefetch_stats.reset()
+            # Frames computed on padding
+            print('  ' + str(train_data.sampler))
+            train_data.sampler.reset_stats()
+
         # Create a session for running operation on the graph
-        with tf.Session() as sess:
+        with replica.session(init_op,
+                             network.sync_optimizer) as sess:
 
             # Instantiate a SummaryWriter to output summaries and the graph
             summary_writer = tf.summary.FileWriter(
                 network.model_dir, sess.graph)
 
-            # Initialize parameters
-            sess.run(init_op)
-
-            # Make mini-batch generator
-            mini_batch_train = train_data.next_batch()
-            mini_batch_dev = dev_data_step.next_batch()
+            # Updated in epoch_end_fn
+            best = {'error': 1}
+
+            def epoch_end_fn(epoch):
+                # Save model (check point)
+                checkpoint_file = join(network.model_dir, 'model.ckpt')
+                save_path = saver.save(
+                    sess, checkpoint_file, global_step=epoch)
+                print("Model saved in file: %s" % save_path)
+
+                # Only the chief evaluates the model
+                if epoch >= 5 and replica.is_chief:
+                    start_time_eval = time.time()
+                    print('=== Dev Evaluation ===')
+                    cer_dev_epoch = do_eval_cer(
+                        session=sess,
+                        decode_op=decode_op,
+                        network=network,
+                        dataset=dev_data_epoch,
+                        label_type=param['label_type'],
+                        max_frame_num=eval_max_frame_num)
+                    if param['label_type'] in ['kana', 'kanji']:
+                        print('  CER: %f %%' % (cer_dev_epoch * 100))
+                    else:
+                        print('  PER: %f %%' % (cer_dev_epoch * 100))
+
+                        if cer_dev_epoch < best['error']:
+                            best['error'] = cer_dev_epoch
+                            print('■■■ ↑Best Score↑ ■■■')
+
+                    duration_eval = time.time() - start_time_eval
+                    print('Evaluation time: %.3f min' %
+                          (duration_eval / 60))
 
             # Train model
-            iter_per_epoch = int(train_data.data_num / param['batch_size'])
-            train_step = train_data.data_num / param['batch_size']
-            if (train_step) != int(train_step):
-                iter_per_epoch += 1
-            max_steps = iter_per_epoch * param['num_epoch']
-            start_time_train = time.time()
-            start_time_epoch = time.time()
-            start_time_step = time.time()
-            error_best = 1
-            for step in range(max_steps):
-
-                # Create feed dictionary for next mini batch (train)
-                with tf.device('/cpu:0'):
-                    inputs, labels, inputs_seq_len, _ = mini_batch_train.__next__()
-                feed_dict_train = {
-                    network.inputs: inputs,
-                    network.labels: list2sparsetensor(labels, padded_value=-1),
-                    network.inputs_seq_len: inputs_seq_len,
-                    network.keep_prob_input: network.dropout_ratio_input,
-                    network.keep_prob_hidden: network.dropout_ratio_hidden,
-                    network.lr: float(param['learning_rate'])
-                }
-
-                # Update parameters
-                sess.run(train_op, feed_dict=feed_dict_train)
-
-                if (step + 1) % 200 == 0:
-
-                    # Create feed dictionary for next mini batch (dev)
-                    with tf.device('/cpu:0'):
-                        inputs, labels, inputs_seq_len, _ = mini_batch_dev.__next__()
-                    feed_dict_dev = {
-                        network.inputs: inputs,
-                        network.labels: list2sparsetensor(labels,
-                                                          padded_value=-1),
-                        network.inputs_seq_len: inputs_seq_len,
-                        network.keep_prob_input: network.dropout_ratio_input,
-                        network.keep_prob_hidden: network.dropout_ratio_hidden
-                    }
-
-                    # Compute loss_
-                    loss_train = sess.run(loss_op, feed_dict=feed_dict_train)
-                    loss_dev = sess.run(loss_op, feed_dict=feed_dict_dev)
-                    csv_steps.append(step)
-                    csv_train_loss.append(loss_train)
-                    csv_dev_loss.append(loss_dev)
-
-                    # Change to evaluation mode
-                    feed_dict_train[network.keep_prob_input] = 1.0
-                    feed_dict_train[network.keep_prob_hidden] = 1.0
-                    feed_dict_dev[network.keep_prob_input] = 1.0
-                    feed_dict_dev[network.keep_prob_hidden] = 1.0
-
-                    # Compute accuracy & update event file
-                    ler_train, summary_str_train = sess.run(
-                        [ler_op, summary_train], feed_dict=feed_dict_train)
-                    ler_dev, summary_str_dev = sess.run(
-                        [ler_op, summary_dev], feed_dict=feed_dict_dev)
-                    csv_ler_train.append(ler_train)
-                    csv_ler_dev.append(ler_dev)
-                    summary_writer.add_summary(summary_str_train, step + 1)
-                    summary_writer.add_summary(summary_str_dev, step + 1)
-                    summary_writer.flush()
-
-                    duration_step = time.time() - start_time_step
-                    print('Step %d: loss = %.3f (%.3f) / ler = %.4f (%.4f) (%.3f min)' %
-                          (step + 1, loss_train, loss_dev, ler_train,
-                           ler_dev, duration_step / 60))
-                    sys.stdout.flush()
-                    start_time_step = time.time()
-
-                # Save checkpoint and evaluate model per epoch
-                if (step + 1) % iter_per_epoch == 0 or (step + 1) == max_steps:
-                    duration_epoch = time.time() - start_time_epoch
-                    epoch = (step + 1) // iter_per_epoch
-                    print('-----EPOCH:%d (%.3f min)-----' %
-                          (epoch, duration_epoch / 60))
-
-                    # Save model (check point)
-                    checkpoint_file = join(network.model_dir, 'model.ckpt')
-                    save_path = saver.save(
-                        sess, checkpoint_file, global_step=epoch)
-                    print("Model saved in file: %s" % save_path)
-
-                    if epoch >= 5:
-                        start_time_eval = time.time()
-                        print('=== Dev Evaluation ===')
-                        cer_dev_epoch = do_eval_cer(
-                            session=sess,
-                            decode_op=decode_op,
-                            network=network,
-                            dataset=dev_data_epoch,
-                            label_type=param['label_type'],
-                            eval_batch_size=param['batch_size'])
-                        if param['label_type'] in ['kana', 'kanji']:
-                            print('  CER: %f %%' % (cer_dev_epoch * 100))
-                        else:
-                            print('  PER: %f %%' % (cer_dev_epoch * 100))
-
-                            if cer_dev_epoch < error_best:
-                                error_best = cer_dev_epoch
-                                print('■■■ ↑Best Score↑ ■■■')
-
-                        duration_eval = time.time() - start_time_eval
-                        print('Evaluation time: %.3f min' %
-                              (duration_eval / 60))
-
-                        start_time_epoch = time.time()
-                        start_time_step = time.time()
-
-            duration_train = time.time() - start_time_train
-            print('Total time: %.3f hour' % (duration_train / 3600))
+            trainer = Trainer(session=sess,
+                              train_op=train_op,
+                              loss_op=loss_op,
+                              metric_ops=OrderedDict([('ler', ler_op_greedy)]),
+                              summary_writer=summary_writer,
+                              summary_train=summary_train,
+                              summary_dev=summary_dev,
+                              apply_op=network.apply_op,
+                              accumulate_steps=param.get(
+                                  'accumulate_steps', 1),
+                              print_step=200)
+            trainer.run(num_epoch=param['num_epoch'],
+                        iter_per_epoch=iter_per_epoch,
+                        next_feed_dict_train=next_feed_dict_train,
+                        next_feed_dict_dev=next_feed_dict_dev,
+                        epoch_end_fn=epoch_end_fn,
+                        print_fn=print_fn)
 
             # Save train & dev loss, ler
-            save_loss(csv_steps, csv_train_loss, csv_dev_loss,
-                      save_path=network.model_dir)
-            save_ler(csv_steps, csv_ler_train, csv_ler_dev,
-                     save_path=network.model_dir)
+            trainer.save(save_path=network.model_dir)
 
             # Training was finished correctly
             with open(join(network.model_dir, 'complete.txt'), 'w') as f:
                 f.write('')
 
 
-def main(config_path):
+def main(config_path, job_name=None, task_index=0):
 
     # Load a config file (.yml)
     with open(config_path, "r") as f:
         config = yaml.load(f)
         param = config['param']
 
+    # Parameter servers only serve variables
+    replica = Replica(param, job_name, task_index)
+    if replica.job_name == 'ps':
+        replica.join()
+        return
+
     # Except for a blank label
     if param['label_type'] == 'kanji':
         param['num_classes'] = 3386
@@ -267,6 +265,12 @@ def main(config_path):
     elif param['label_type'] == 'phone':
         param['num_classes'] = 38
 
+    # Latency-controlled BLSTM (blstm_ctc only)
+    lc_param = {}
+    if param.get('lc_chunk_size', 0) != 0:
+        lc_param['lc_chunk_size'] = param['lc_chunk_size']
+        lc_param['lc_right_context'] = param.get('lc_right_context', 0)
+
     # Model setting
     CTCModel = load(model_type=param['model'])
     network = CTCModel(batch_size=param['batch_size'],
@@ -281,7 +285,8 @@ def main(config_path):
                        dropout_ratio_input=param['dropout_input'],
                        dropout_ratio_hidden=param['dropout_hidden'],
                        num_proj=param['num_proj'],
-                       weight_decay=param['weight_decay'])
+                       weight_decay=param['weight_decay'],
+                       **lc_param)
 
     network.model_name = param['model']
     network.model_name += '_' + str(param['num_unit'])
@@ -296,9 +301,19 @@ def main(config_path):
         network.model_name += '_stack' + str(param['num_stack'])
     if param['weight_decay'] != 0:
         network.model_name += '_weightdecay' + str(param['weight_decay'])
+    if len(lc_param) != 0:
+        network.model_name += '_lc' + str(lc_param['lc_chunk_size'])
+        network.model_name += '_' + str(lc_param['lc_right_context'])
     if param['train_data_size'] == 'large':
         network.model_name += '_large'
 
+    if param.get('accumulate_steps', 1) > 1:
+        network.model_name += '_accum' + str(param['accumulate_steps'])
+    network.model_name += replica.name
+    if not replica.is_chief:
+        # Workers except the chief save logs in their own directories
+        network.model_name += '_worker' + str(replica.task_index)
+
     # Set save path
     network.model_dir = mkdir('/n/sd8/inaguma/result/csj/')
     network.model_dir = mkdir_join(network.model_dir, 'ctc')
@@ -321,13 +336,22 @@ def main(config_path):
 
     sys.stdout = open(join(network.model_dir, 'train.log'), 'w')
     print(network.model_name)
-    do_train(network=network, param=param)
+    do_train(network=network, param=param, replica=replica)
     sys.stdout = sys.__stdout__
 
 
 if __name__ == '__main__':
 
     args = sys.argv
-    if len(args) != 2:
-        raise ValueError
-    main(config_path=args[1])
+    if len(args) != 2 and len(args) != 4:
+        raise ValueError(
+            ("Set a config file (and the job name and task index in "
+             "distributed training).\n"
+             "Usase: python " + args[0] + " config_path "
+             "(job_name task_index)"))
+    if len(args) == 4:
+        # See experiments/utils/launch_cluster.py
+        main(config_path=args[1], job_name=args[2],
+             task_index=int(args[3]))
+    else:
+        main(config_path=args[1])
@@ -15,6 +15,7 @@ import yaml
 sys.path.append('../../../')
 from experiments.csj.data.load_dataset_ctc import Dataset
 from experiments.csj.visualization.util_plot_ctc import posterior_test
+from models.checkpoint import restore_checkpoint
 from models.ctc.load_model import load
 
 
@@ -50,10 +51,9 @@ def do_plot(network, param, epoch=None):
         tf.float32,
         shape=[None, None, network.input_size],
         name='input')
-    indices_pl = tf.placeholder(tf.int64, name='indices')
-    values_pl = tf.placeholder(tf.int32, name='values')
-    shape_pl = tf.placeholder(tf.int64, name='shape')
-    network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+    network.labels = tf.placeholder(tf.int32,
+                                    shape=[None, None],
+                                    name='labels')
     network.inputs_seq_len = tf.placeholder(tf.int64,
                                             shape=[None],
                                             name='inputs_seq_len')
@@ -70,9 +70,6 @@ def do_plot(network, param, epoch=None):
                                      network.keep_prob_hidden)
     posteriors_op = network.posteriors(logits)
 
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
-
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
 
@@ -83,7 +80,7 @@ def do_plot(network, param, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
-            saver.restore(sess, model_path)
+            restore_checkpoint(sess, model_path)
             print("Model restored: " + model_path)
         else:
             raise ValueError('There are not any checkpoints.')
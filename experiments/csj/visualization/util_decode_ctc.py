@@ -10,8 +10,7 @@ from __future__ import print_function
 from os.path import join
 import sys
 
-from experiments.utils.labels.character import num2char
-from experiments.utils.labels.phone import num2phone
+from experiments.utils.labels.vocabulary import load_vocabulary
 from experiments.utils.sparsetensor import sparsetensor2list
 
 
@@ -38,6 +37,7 @@ def decode_test(session, decode_op, network, dataset, label_type,
         map_file_path = '../metrics/mapping_files/ctc/kana2num.txt'
     elif label_type == 'phone':
         map_file_path = '../metrics/mapping_files/ctc/phone2num.txt'
+    vocab = load_vocabulary(map_file_path)
 
     if save_path is not None:
         sys.stdout = open(join(network.model_dir, 'decode.txt'), 'w')
@@ -62,9 +62,39 @@ def decode_test(session, decode_op, network, dataset, label_type,
         if label_type in ['kanji', 'kana']:
             print('----- wav: %s -----' % input_names[0])
             print('True: %s' % labels_true[0])
-            print('Pred: %s' % num2char(labels_pred[0], map_file_path))
+            print('Pred: %s' % vocab.decode(labels_pred[0]))
 
         elif label_type == 'phone':
             print('----- wav: %s -----' % input_names[0])
-            print('True: %s' % num2phone(labels_true[0], map_file_path))
-            print('Pred: %s' % num2phone(labels_pred[0], map_file_path))
+            print('True: %s' % vocab.decode(labels_true[0], delimiter=' '))
+            print('Pred: %s' % vocab.decode(labels_pred[0], delimiter=' '))
+
+
+def decode_cached(cache, label_type, beam_width=None):
+    """Visualize label outputs of CTC model from the posterior cache without
+       TensorFlow (see experiments/utils/data/posterior_cache.py).
+    Args:
+        cache: An instance of `PosteriorCache`
+        label_type: string, kanji or kana or phone
+        beam_width: int, beam width for beam search. If None, use greedy
+            decoding.
+    """
+    if label_type == 'kanji':
+        map_file_path = '../metrics/mapping_files/ctc/kanji2num.txt'
+    elif label_type == 'kana':
+        map_file_path = '../metrics/mapping_files/ctc/kana2num.txt'
+    elif label_type == 'phone':
+        map_file_path = '../metrics/mapping_files/ctc/phone2num.txt'
+    vocab = load_vocabulary(map_file_path)
+    delimiter = ' ' if label_type == 'phone' else ''
+
+    labels_pred = cache.decode(beam_width=beam_width)
+    for i in range(cache.data_num):
+        # NOTE: Labels of the test set are the strings themselves
+        if cache.is_raw_label:
+            str_true = ''.join(cache.label(i))
+        else:
+            str_true = vocab.decode(cache.label(i), delimiter=delimiter)
+        print('----- wav: %s -----' % cache.names[i])
+        print('True: %s' % str_true)
+        print('Pred: %s' % vocab.decode(labels_pred[i], delimiter=delimiter))
@@ -69,6 +69,25 @@ def posterior_test(session, posteriors_op, network, dataset, label_type,
             show=show)
 
 
+def posterior_cached(cache, label_type, save_path=None, show=False):
+    """Visualize label posteriors of CTC model from the posterior cache
+       without TensorFlow (see experiments/utils/data/posterior_cache.py).
+    Args:
+        cache: An instance of `PosteriorCache`
+        label_type: string, kanji or kana or phone
+        save_path: path to save ctc outputs
+        show: if True, show each figure
+    """
+    save_path = mkdir_join(save_path, 'ctc_output')
+
+    for i in range(cache.data_num):
+        plot_probs_ctc(probs=np.exp(cache.log_posteriors(i)),
+                       wav_index=str(cache.names[i]),
+                       label_type=label_type,
+                       save_path=save_path,
+                       show=show)
+
+
 def plot_probs_ctc(probs, wav_index, label_type, save_path, show):
     """Plot posteriors of phones.
     Args:
@@ -20,7 +20,9 @@ from experiments.utils.data.joint_ctc_attention_all_load import DatasetBase
 class Dataset(DatasetBase):
 
     def __init__(self, data_type, label_type, batch_size, eos_index,
-                 is_sorted=True, is_progressbar=False, num_gpu=1):
+                 is_sorted=True, is_progressbar=False, num_gpu=1,
+                 packed_path=None, bucket_size=None,
+                 max_frame_num=None, max_label_num=None):
         """A class for loading dataset.
         Args:
             data_type: string, train or dev or test
@@ -29,6 +31,15 @@ class Dataset(DatasetBase):
             is_sorted: if True, sort dataset by frame num
             is_progressbar: if True, visualize progressbar
             num_gpu: int, if more than 1, divide batch_size by num_gpu
+            packed_path: path to the packed corpus. If None, load one .npy
+                file per utterance
+            bucket_size: int, if set with is_sorted, shuffle utterances
+                within buckets of this number of utterances sorted by frame
+                num
+            max_frame_num: int, if set, make mini-batches up to this number
+                of frames including padding instead of using batch_size
+            max_label_num: int, if set with max_frame_num, also limit the
+                total number of labels in each mini-batch
         """
         if data_type not in ['train', 'dev', 'test']:
             raise ValueError('data_type is "train" or "dev" or "test".')
@@ -42,41 +53,48 @@ class Dataset(DatasetBase):
         self.num_gpu = num_gpu
 
         self.input_size = 123
-        input_path = join(
-            '/n/sd8/inaguma/corpus/timit/dataset/inputs/', data_type)
-        ctc_label_path = join(
-            '/n/sd8/inaguma/corpus/timit/dataset/labels/ctc/',
-            label_type, data_type)
-        att_label_path = join(
-            '/n/sd8/inaguma/corpus/timit/dataset/labels/attention/',
-            label_type, data_type)
+        self.packed = None
+        if packed_path is not None:
+            self._open_packed(packed_path)
+        else:
+            input_path = join(
+                '/n/sd8/inaguma/corpus/timit/dataset/inputs/', data_type)
+            ctc_label_path = join(
+                '/n/sd8/inaguma/corpus/timit/dataset/labels/ctc/',
+                label_type, data_type)
+            att_label_path = join(
+                '/n/sd8/inaguma/corpus/timit/dataset/labels/attention/',
+                label_type, data_type)
 
-        # Load the frame number dictionary
-        with open(join(input_path, 'frame_num.pickle'), 'rb') as f:
-            self.frame_num_dict = pickle.load(f)
+            # Load the frame number dictionary
+            with open(join(input_path, 'frame_num.pickle'), 'rb') as f:
+                self.frame_num_dict = pickle.load(f)
 
-        # Sort paths to input & label by frame num
-        frame_num_tuple_sorted = sorted(self.frame_num_dict.items(),
-                                        key=lambda x: x[1])
-        input_paths, att_label_paths, ctc_label_paths = [], [], []
-        for input_name, frame_num in frame_num_tuple_sorted:
-            input_paths.append(join(input_path, input_name + '.npy'))
-            att_label_paths.append(join(att_label_path, input_name + '.npy'))
-            ctc_label_paths.append(join(ctc_label_path, input_name + '.npy'))
-        self.input_paths = np.array(input_paths)
-        self.att_label_paths = np.array(att_label_paths)
-        self.ctc_label_paths = np.array(ctc_label_paths)
-        self.data_num = len(self.input_paths)
+            # Sort paths to input & label by frame num
+            frame_num_tuple_sorted = sorted(self.frame_num_dict.items(),
+                                            key=lambda x: x[1])
+            input_paths, att_label_paths, ctc_label_paths = [], [], []
+            for input_name, frame_num in frame_num_tuple_sorted:
+                input_paths.append(join(input_path, input_name + '.npy'))
+                att_label_paths.append(
+                    join(att_label_path, input_name + '.npy'))
+                ctc_label_paths.append(
+                    join(ctc_label_path, input_name + '.npy'))
+            self.input_paths = np.array(input_paths)
+            self.att_label_paths = np.array(att_label_paths)
+            self.ctc_label_paths = np.array(ctc_label_paths)
+            self.data_num = len(self.input_paths)
 
-        # Load all dataset in advance
-        print('=> Loading ' + data_type + ' dataset (' + label_type + ')...')
-        input_list, att_label_list, ctc_label_list = [], [], []
-        for i in wrap_iterator(range(self.data_num), self.is_progressbar):
-            input_list.append(np.load(self.input_paths[i]))
-            att_label_list.append(np.load(self.att_label_paths[i]))
-            ctc_label_list.append(np.load(self.ctc_label_paths[i]))
-        self.input_list = np.array(input_list)
-        self.att_label_list = np.array(att_label_list)
-        self.ctc_label_list = np.array(ctc_label_list)
+            # Load all dataset in advance
+            print('=> Loading ' + data_type +
+                  ' dataset (' + label_type + ')...')
+            input_list, att_label_list, ctc_label_list = [], [], []
+            for i in wrap_iterator(range(self.data_num), self.is_progressbar):
+                input_list.append(np.load(self.input_paths[i]))
+                att_label_list.append(np.load(self.att_label_paths[i]))
+                ctc_label_list.append(np.load(self.ctc_label_paths[i]))
+            self.input_list = np.array(input_list)
+            self.att_label_list = np.array(att_label_list)
+            self.ctc_label_list = np.array(ctc_label_list)
 
-        self.rest = set(range(0, self.data_num, 1))
+        self._init_sampler(bucket_size, max_frame_num, max_label_num)
@@ -23,7 +23,9 @@ class Dataset(DatasetBase):
 
     def __init__(self, data_type, label_type_main, label_type_sub, batch_size,
                  num_stack=None, num_skip=None,
-                 is_sorted=True, is_progressbar=False, num_gpu=1):
+                 is_sorted=True, is_progressbar=False, num_gpu=1,
+                 packed_path=None, bucket_size=None,
+                 max_frame_num=None):
         """A class for loading dataset.
         Args:
             data_type: string, train or dev or test
@@ -34,6 +36,13 @@ class Dataset(DatasetBase):
             is_sorted: if True, sort dataset by frame num
             is_progressbar: if True, visualize progressbar
             num_gpu: int, if more than 1, divide batch_size by num_gpu
+            packed_path: path to the packed corpus. If None, load one .npy
+                file per utterance
+            bucket_size: int, if set with is_sorted, shuffle utterances
+                within buckets of this number of utterances sorted by frame
+                num
+            max_frame_num: int, if set, make mini-batches up to this number
+                of frames including padding instead of using batch_size
         """
         if data_type not in ['train', 'dev', 'test']:
             raise ValueError('data_type is "train" or "dev" or "test".')
@@ -49,48 +58,53 @@ class Dataset(DatasetBase):
         self.num_gpu = num_gpu
 
         self.input_size = 123
-        input_path = join(
-            '/n/sd8/inaguma/corpus/timit/dataset/inputs/', data_type)
-        label_main_path = join(
-            '/n/sd8/inaguma/corpus/timit/dataset/labels/ctc/character/',
-            data_type)
-        label_sub_path = join(
-            '/n/sd8/inaguma/corpus/timit/dataset/labels/ctc/',
-            label_type_sub, data_type)
+        self.packed = None
+        if packed_path is not None:
+            self._open_packed(packed_path)
+        else:
+            input_path = join(
+                '/n/sd8/inaguma/corpus/timit/dataset/inputs/', data_type)
+            label_main_path = join(
+                '/n/sd8/inaguma/corpus/timit/dataset/labels/ctc/character/',
+                data_type)
+            label_sub_path = join(
+                '/n/sd8/inaguma/corpus/timit/dataset/labels/ctc/',
+                label_type_sub, data_type)
 
-        # Load the frame number dictionary
-        with open(join(input_path, 'frame_num.pickle'), 'rb') as f:
-            self.frame_num_dict = pickle.load(f)
+            # Load the frame number dictionary
+            with open(join(input_path, 'frame_num.pickle'), 'rb') as f:
+                self.frame_num_dict = pickle.load(f)
 
-        # Sort paths to input & label by frame num
-        frame_num_tuple_sorted = sorted(self.frame_num_dict.items(),
-                                        key=lambda x: x[1])
-        input_paths, label_main_paths, label_sub_paths = [], [], []
-        for input_name, frame_num in frame_num_tuple_sorted:
-            input_paths.append(join(input_path, input_name + '.npy'))
-            label_main_paths.append(join(label_main_path, input_name + '.npy'))
-            label_sub_paths.append(
-                join(label_sub_path,  input_name + '.npy'))
-        if len(label_main_paths) != len(label_sub_paths):
-            raise ValueError(
-                'The numbers of labels between ' +
-                'character and phone are not same.')
-        self.input_paths = np.array(input_paths)
-        self.label_main_paths = np.array(label_main_paths)
-        self.label_sub_paths = np.array(label_sub_paths)
-        self.data_num = len(self.input_paths)
+            # Sort paths to input & label by frame num
+            frame_num_tuple_sorted = sorted(self.frame_num_dict.items(),
+                                            key=lambda x: x[1])
+            input_paths, label_main_paths, label_sub_paths = [], [], []
+            for input_name, frame_num in frame_num_tuple_sorted:
+                input_paths.append(join(input_path, input_name + '.npy'))
+                label_main_paths.append(
+                    join(label_main_path, input_name + '.npy'))
+                label_sub_paths.append(
+                    join(label_sub_path,  input_name + '.npy'))
+            if len(label_main_paths) != len(label_sub_paths):
+                raise ValueError(
+                    'The numbers of labels between ' +
+                    'character and phone are not same.')
+            self.input_paths = np.array(input_paths)
+            self.label_main_paths = np.array(label_main_paths)
+            self.label_sub_paths = np.array(label_sub_paths)
+            self.data_num = len(self.input_paths)
 
-        # Load all dataset in advance
-        print('=> Loading ' + data_type +
-              ' dataset (' + label_type_sub + ')...')
-        input_list, label_main_list, label_sub_list = [], [], []
-        for i in wrap_iterator(range(self.data_num), self.is_progressbar):
-            input_list.append(np.load(self.input_paths[i]))
-            label_main_list.append(np.load(self.label_main_paths[i]))
-            label_sub_list.append(np.load(self.label_sub_paths[i]))
-        self.input_list = np.array(input_list)
-        self.label_main_list = np.array(label_main_list)
-        self.label_sub_list = np.array(label_sub_list)
+            # Load all dataset in advance
+            print('=> Loading ' + data_type +
+                  ' dataset (' + label_type_sub + ')...')
+            input_list, label_main_list, label_sub_list = [], [], []
+            for i in wrap_iterator(range(self.data_num), self.is_progressbar):
+                input_list.append(np.load(self.input_paths[i]))
+                label_main_list.append(np.load(self.label_main_paths[i]))
+                label_sub_list.append(np.load(self.label_sub_paths[i]))
+            self.input_list = np.array(input_list)
+            self.label_main_list = np.array(label_main_list)
+            self.label_sub_list = np.array(label_sub_list)
 
         # Frame stacking
         if (num_stack is not None) and (num_skip is not None):
@@ -103,4 +117,4 @@ class Dataset(DatasetBase):
                                           is_progressbar)
             self.input_size = self.input_size * num_stack
 
-        self.rest = set(range(0, self.data_num, 1))
+        self._init_sampler(bucket_size, max_frame_num)
@@ -14,7 +14,6 @@ sys.path.append('../../../')
 from experiments.timit.data.load_dataset_ctc import Dataset
 from experiments.utils.labels.character import num2char
 from experiments.utils.labels.phone import num2phone
-from experiments.utils.sparsetensor import sparsetensor2list
 from experiments.utils.measure_time_func import measure_time
 
 
@@ -57,22 +56,22 @@ class TestLoadDatasetCTC(unittest.TestCase):
                     label_type[5:7] + '.txt'
                 map_fn = num2phone
 
-            mini_batch = dataset.next_batch(session=sess)
+            mini_batch = dataset.next_batch()
 
             iter_per_epoch = int(dataset.data_num /
                                  (batch_size * num_gpu)) + 1
             for i in range(iter_per_epoch + 1):
                 return_tuple = mini_batch.__next__()
                 inputs = return_tuple[0]
-                labels_st = return_tuple[1]
+                labels = return_tuple[1]
 
                 if num_gpu > 1:
                     for inputs_gpu in inputs:
                         print(inputs_gpu.shape)
-                    labels_st = labels_st[0]
+                    labels = labels[0]
 
-                labels = sparsetensor2list(
-                    labels_st, batch_size=len(inputs))
+                # Remove padding
+                labels = [label[label != -1] for label in labels]
 
                 if num_gpu == 1:
                     for inputs_i, labels_i in zip(inputs, labels):
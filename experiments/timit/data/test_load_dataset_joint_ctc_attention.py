@@ -14,7 +14,6 @@ sys.path.append('../../../')
 from experiments.timit.data.load_dataset_joint_ctc_attention import Dataset
 from experiments.utils.labels.character import num2char
 from experiments.utils.labels.phone import num2phone
-from experiments.utils.sparsetensor import sparsetensor2list
 from experiments.utils.measure_time_func import measure_time
 
 
@@ -59,7 +58,7 @@ class TestLoadDatasetJointCTCAttention(unittest.TestCase):
                     label_type[5:7] + '.txt'
                 map_fn = num2phone
 
-            mini_batch = dataset.next_batch(session=sess)
+            mini_batch = dataset.next_batch()
 
             iter_per_epoch = int(dataset.data_num /
                                  (batch_size * num_gpu)) + 1
@@ -67,7 +66,7 @@ class TestLoadDatasetJointCTCAttention(unittest.TestCase):
                 return_tuple = mini_batch.__next__()
                 inputs = return_tuple[0]
                 att_labels = return_tuple[1]
-                ctc_labels_st = return_tuple[2]
+                ctc_labels = return_tuple[2]
                 att_labels_seq_len = return_tuple[4]
 
                 if num_gpu > 1:
@@ -75,11 +74,10 @@ class TestLoadDatasetJointCTCAttention(unittest.TestCase):
                         print(inputs_gpu.shape)
                     inputs = inputs[0]
                     att_labels = att_labels[0]
-                    ctc_labels_st = ctc_labels_st[0]
+                    ctc_labels = ctc_labels[0]
                     att_labels_seq_len = att_labels_seq_len[0]
 
-                ctc_labels = sparsetensor2list(
-                    ctc_labels_st, batch_size=len(inputs))
+                ctc_labels = [label[label != -1] for label in ctc_labels]
 
                 if num_gpu == 1:
                     for inputs_i, labels_i in zip(inputs, ctc_labels):
@@ -14,7 +14,6 @@ sys.path.append('../../../')
 from experiments.timit.data.load_dataset_multitask_ctc import Dataset
 from experiments.utils.labels.character import num2char
 from experiments.utils.labels.phone import num2phone
-from experiments.utils.sparsetensor import sparsetensor2list
 from experiments.utils.measure_time_func import measure_time
 
 
@@ -50,26 +49,25 @@ class TestLoadDatasetMultitaskCTC(unittest.TestCase):
             map_file_path_char = '../metrics/mapping_files/ctc/char2num.txt'
             map_file_path_phone = '../metrics/mapping_files/ctc/phone2num_61.txt'
 
-            mini_batch = dataset.next_batch(session=sess)
+            mini_batch = dataset.next_batch()
 
             iter_per_epoch = int(dataset.data_num /
                                  (batch_size * num_gpu)) + 1
             for i in range(iter_per_epoch + 1):
                 return_tuple = mini_batch.__next__()
                 inputs = return_tuple[0]
-                labels_char_st = return_tuple[1]
-                labels_phone_st = return_tuple[2]
+                labels_char = return_tuple[1]
+                labels_phone = return_tuple[2]
 
                 if num_gpu > 1:
                     for inputs_gpu in inputs:
                         print(inputs_gpu.shape)
-                    labels_char_st = labels_char_st[0]
-                    labels_phone_st = labels_phone_st[0]
+                    labels_char = labels_char[0]
+                    labels_phone = labels_phone[0]
 
-                labels_char = sparsetensor2list(
-                    labels_char_st, batch_size=len(inputs))
-                labels_phone = sparsetensor2list(
-                    labels_phone_st, batch_size=len(inputs))
+                # Remove padding
+                labels_char = [label[label != -1] for label in labels_char]
+                labels_phone = [label[label != -1] for label in labels_phone]
 
                 if num_gpu == 1:
                     for inputs_i, labels_i in zip(inputs, labels_char):
@@ -16,6 +16,8 @@ sys.path.append('../../../')
 from experiments.timit.data.load_dataset_attention import Dataset
 from experiments.timit.metrics.attention import do_eval_per, do_eval_cer
 from models.attention import blstm_attention_seq2seq
+from models.checkpoint import restore_checkpoint
+from models.frozen_graph import FrozenGraph
 
 
 def do_eval(network, param, epoch=None):
@@ -44,19 +46,6 @@ def do_eval(network, param, epoch=None):
     network.labels = tf.placeholder(tf.int32,
                                     shape=[None, None],
                                     name='label')
-    # These are prepared for computing LER
-    indices_true_pl = tf.placeholder(tf.int64, name='indices_pred')
-    values_true_pl = tf.placeholder(tf.int32, name='values_pred')
-    shape_true_pl = tf.placeholder(tf.int64, name='shape_pred')
-    network.labels_st_true = tf.SparseTensor(indices_true_pl,
-                                             values_true_pl,
-                                             shape_true_pl)
-    indices_pred_pl = tf.placeholder(tf.int64, name='indices_pred')
-    values_pred_pl = tf.placeholder(tf.int32, name='values_pred')
-    shape_pred_pl = tf.placeholder(tf.int64, name='shape_pred')
-    network.labels_st_pred = tf.SparseTensor(indices_pred_pl,
-                                             values_pred_pl,
-                                             shape_pred_pl)
     network.inputs_seq_len = tf.placeholder(tf.int32,
                                             shape=[None],
                                             name='inputs_seq_len')
@@ -81,11 +70,6 @@ def do_eval(network, param, epoch=None):
         decoder_outputs_infer,
         decode_type='greedy',
         beam_width=20)
-    per_op = network.compute_ler(network.labels_st_true,
-                                 network.labels_st_pred)
-
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
 
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
@@ -97,35 +81,76 @@ def do_eval(network, param, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
-            saver.restore(sess, model_path)
+            restore_checkpoint(sess, model_path)
             print("Model restored: " + model_path)
         else:
             raise ValueError('There are not any checkpoints.')
 
-        print('Test Data Evaluation:')
-        if param['label_type'] == 'character':
-            cer_test = do_eval_cer(
-                session=sess,
-                decode_op=decode_op_infer,
-                network=network,
-                dataset=test_data,
-                is_progressbar=True)
-            print('  CER: %f %%' % (cer_test * 100))
-        else:
-            per_test = do_eval_per(
-                session=sess,
-                decode_op=decode_op_infer,
-                per_op=per_op,
-                network=network,
-                dataset=test_data,
-                label_type=param['label_type'],
-                eos_index=param['eos_index'],
-                is_progressbar=True)
-            print('  PER: %f %%' % (per_test * 100))
+        evaluate(sess, decode_op_infer, network, test_data, param)
+
+
+def do_eval_frozen(network, param):
+    """Evaluate the model exported by export_attention.py.
+    Args:
+        network: An instance of `FrozenGraph`
+        param: A dictionary of parameters
+    """
+    # Load dataset
+    if param['label_type'] == 'character':
+        test_data = Dataset(data_type='test', label_type='character',
+                            batch_size=1,
+                            eos_index=param['eos_index'],
+                            is_sorted=False, is_progressbar=True)
+    else:
+        test_data = Dataset(data_type='test', label_type='phone39',
+                            batch_size=1,
+                            eos_index=param['eos_index'],
+                            is_sorted=False, is_progressbar=True)
+
+    evaluate(network.session, network.decode_op, None, network, test_data,
+             param)
+
+
+def evaluate(session, decode_op, network, dataset, param):
+    """Evaluate the model by CER or PER.
+    Args:
+        session: session of tensorflow
+        decode_op: operation for decoding
+        network: network to evaluate
+        dataset: An instance of a `Dataset` class
+        param: A dictionary of parameters
+    """
+    print('Test Data Evaluation:')
+    if param['label_type'] == 'character':
+        cer_test = do_eval_cer(
+            session=session,
+            decode_op=decode_op,
+            network=network,
+            dataset=dataset,
+            max_frame_num=param.get('eval_max_frame_num'),
+            is_progressbar=True)
+        print('  CER: %f %%' % (cer_test * 100))
+    else:
+        per_test = do_eval_per(
+            session=session,
+            decode_op=decode_op,
+            network=network,
+            dataset=dataset,
+            label_type=param['label_type'],
+            eos_index=param['eos_index'],
+            max_frame_num=param.get('eval_max_frame_num'),
+            is_progressbar=True)
+        print('  PER: %f %%' % (per_test * 100))
 
 
 def main(model_path, epoch):
 
+    # A frozen graph exported by export_attention.py
+    graph_path = None
+    if model_path.endswith('.pb'):
+        graph_path = model_path
+        model_path = os.path.dirname(graph_path)
+
     # Load config file
     with open(os.path.join(model_path, 'config.yml'), "r") as f:
         config = yaml.load(f)
@@ -148,6 +173,12 @@ def main(model_path, epoch):
         param['sos_index'] = 1
         param['eos_index'] = 2
 
+    if graph_path is not None:
+        network = FrozenGraph(graph_path, model_dir=model_path)
+        print(graph_path)
+        do_eval_frozen(network=network, param=param)
+        return
+
     # Model setting
     # AttentionModel = load(model_type=param['model'])
     network = blstm_attention_seq2seq.BLSTMAttetion(
@@ -173,7 +204,8 @@ def main(model_path, epoch):
         clip_activation_decoder=param['clip_activation_decoder'],
         dropout_ratio_input=param['dropout_input'],
         dropout_ratio_hidden=param['dropout_hidden'],
-        weight_decay=param['weight_decay'])
+        weight_decay=param['weight_decay'],
+        cell_impl=param.get('cell_impl', 'standard'))
 
     network.model_dir = model_path
     print(network.model_dir)
@@ -192,5 +224,6 @@ if __name__ == '__main__':
     else:
         raise ValueError(
             ("Set a path to saved model.\n"
-             "Usase: python eval_attention.py path_to_saved_model (epoch)"))
+             "Usase: python eval_attention.py path_to_saved_model (epoch)\n"
+             "       python eval_attention.py path_to_frozen_graph.pb"))
     main(model_path=model_path, epoch=epoch)
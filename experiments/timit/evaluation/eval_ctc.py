@@ -1,7 +1,11 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
-"""Evaluate the trained CTC model (TIMIT corpus)."""
+"""Evaluate the trained CTC model (TIMIT corpus). With --dump, the log
+   posteriors of the test set are written to the posterior cache instead
+   (see experiments/utils/data/posterior_cache.py), which is evaluated by
+   eval_ctc_cached.py without TensorFlow.
+"""
 
 from __future__ import absolute_import
 from __future__ import division
@@ -15,7 +19,10 @@ import yaml
 sys.path.append('../../../')
 from experiments.timit.data.load_dataset_ctc import Dataset
 from experiments.timit.metrics.ctc import do_eval_per, do_eval_cer
+from experiments.utils.data.posterior_cache import cache_path, dump_posteriors
+from models.checkpoint import restore_checkpoint
 from models.ctc.load_model import load
+from models.frozen_graph import FrozenGraph
 
 
 def do_eval(network, param, epoch=None):
@@ -37,10 +44,9 @@ def do_eval(network, param, epoch=None):
         tf.float32,
         shape=[None, None, network.input_size],
         name='input')
-    indices_pl = tf.placeholder(tf.int64, name='indices')
-    values_pl = tf.placeholder(tf.int32, name='values')
-    shape_pl = tf.placeholder(tf.int64, name='shape')
-    network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+    network.labels = tf.placeholder(tf.int32,
+                                    shape=[None, None],
+                                    name='labels')
     network.inputs_seq_len = tf.placeholder(tf.int64,
                                             shape=[None],
                                             name='inputs_seq_len')
@@ -59,10 +65,6 @@ def do_eval(network, param, epoch=None):
                                 network.inputs_seq_len,
                                 decode_type='beam_search',
                                 beam_width=20)
-    per_op = network.compute_ler(decode_op, network.labels)
-
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
 
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
@@ -74,33 +76,138 @@ def do_eval(network, param, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
-            saver.restore(sess, model_path)
+            restore_checkpoint(sess, model_path)
             print("Model restored: " + model_path)
         else:
             raise ValueError('There are not any checkpoints.')
 
-        print('Test Data Evaluation:')
-        if param['label_type'] == 'character':
-            cer_test = do_eval_cer(
-                session=sess,
-                decode_op=decode_op,
-                network=network,
-                dataset=test_data,
-                is_progressbar=True)
-            print('  CER: %f %%' % (cer_test * 100))
+        evaluate(sess, decode_op, network, test_data, param)
+
+
+def do_dump(network, param, epoch=None):
+    """Dump the log posteriors of the test set to the posterior cache.
+    Args:
+        network: model to restore
+        param: A dictionary of parameters
+        epoch: int, the epoch to restore
+    """
+    # Load dataset
+    label_type = 'character' if param['label_type'] == 'character' else \
+        'phone39'
+    test_data = Dataset(data_type='test', label_type=label_type,
+                        batch_size=1,
+                        num_stack=param['num_stack'],
+                        num_skip=param['num_skip'],
+                        is_sorted=False, is_progressbar=True)
+
+    # Define placeholders
+    network.inputs = tf.placeholder(
+        tf.float32,
+        shape=[None, None, network.input_size],
+        name='input')
+    network.labels = tf.placeholder(tf.int32,
+                                    shape=[None, None],
+                                    name='labels')
+    network.inputs_seq_len = tf.placeholder(tf.int64,
+                                            shape=[None],
+                                            name='inputs_seq_len')
+    network.keep_prob_input = tf.placeholder(tf.float32,
+                                             name='keep_prob_input')
+    network.keep_prob_hidden = tf.placeholder(tf.float32,
+                                              name='keep_prob_hidden')
+
+    # Add to the graph each operation (including model definition)
+    _, logits = network.compute_loss(network.inputs,
+                                     network.labels,
+                                     network.inputs_seq_len,
+                                     network.keep_prob_input,
+                                     network.keep_prob_hidden)
+    log_posteriors_op, outputs_seq_len_op = network.log_posteriors(
+        logits, network.inputs_seq_len)
+
+    with tf.Session() as sess:
+        ckpt = tf.train.get_checkpoint_state(network.model_dir)
+
+        # If check point exists
+        if ckpt:
+            # Use last saved model
+            model_path = ckpt.model_checkpoint_path
+            if epoch is not None:
+                model_path = model_path.split('/')[:-1]
+                model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+            restore_checkpoint(sess, model_path)
+            print("Model restored: " + model_path)
         else:
-            per_test = do_eval_per(
-                session=sess,
-                decode_op=decode_op,
-                per_op=per_op,
-                network=network,
-                dataset=test_data,
-                label_type=param['label_type'],
-                is_progressbar=True)
-            print('  PER: %f %%' % (per_test * 100))
+            raise ValueError('There are not any checkpoints.')
+
+        save_path = cache_path(network.model_dir, model_path, 'test')
+        dump_posteriors(session=sess,
+                        log_posteriors_ops=[log_posteriors_op],
+                        outputs_seq_len_op=outputs_seq_len_op,
+                        network=network,
+                        dataset=test_data,
+                        save_paths=[save_path],
+                        label_types=[label_type],
+                        max_frame_num=param.get('eval_max_frame_num'),
+                        is_progressbar=True)
+        print("Posteriors dumped: " + save_path)
+
+
+def do_eval_frozen(network, param):
+    """Evaluate the model exported by export_ctc.py.
+    Args:
+        network: An instance of `FrozenGraph`
+        param: A dictionary of parameters
+    """
+    # Load dataset
+    test_data = Dataset(data_type='test', label_type='phone39',
+                        batch_size=1,
+                        num_stack=param['num_stack'],
+                        num_skip=param['num_skip'],
+                        is_sorted=False, is_progressbar=True)
 
+    evaluate(network.session, network.decode_op, None, network, test_data,
+             param)
 
-def main(model_path, epoch):
+
+def evaluate(session, decode_op, network, dataset, param):
+    """Evaluate the model by CER or PER.
+    Args:
+        session: session of tensorflow
+        decode_op: operation for decoding
+        network: network to evaluate
+        dataset: An instance of a `Dataset` class
+        param: A dictionary of parameters
+    """
+    print('Test Data Evaluation:')
+    if param['label_type'] == 'character':
+        cer_test = do_eval_cer(
+            session=session,
+            decode_op=decode_op,
+            network=network,
+            dataset=dataset,
+            max_frame_num=param.get('eval_max_frame_num'),
+            is_progressbar=True)
+        print('  CER: %f %%' % (cer_test * 100))
+    else:
+        per_test = do_eval_per(
+            session=session,
+            decode_op=decode_op,
+            network=network,
+            dataset=dataset,
+            label_type=param['label_type'],
+            max_frame_num=param.get('eval_max_frame_num'),
+            is_progressbar=True)
+        print('  PER: %f %%' % (per_test * 100))
+
+
+def main(model_path, epoch, is_dump=False):
+
+    # A frozen graph exported by export_ctc.py
+    graph_path = None
+    if model_path.endswith('.pb'):
+        graph_path = model_path
+        model_path = os.path.dirname(graph_path)
 
     # Load config file
     with open(os.path.join(model_path, 'config.yml'), "r") as f:
@@ -117,6 +224,14 @@ def main(model_path, epoch):
     elif param['label_type'] == 'character':
         param['num_classes'] = 33
 
+    if graph_path is not None:
+        if is_dump:
+            raise ValueError('Dump posteriors from a checkpoint.')
+        network = FrozenGraph(graph_path, model_dir=model_path)
+        print(graph_path)
+        do_eval_frozen(network=network, param=param)
+        return
+
     # Model setting
     CTCModel = load(model_type=param['model'])
     network = CTCModel(
@@ -131,16 +246,22 @@ def main(model_path, epoch):
         dropout_ratio_input=param['dropout_input'],
         dropout_ratio_hidden=param['dropout_hidden'],
         num_proj=param['num_proj'],
-        weight_decay=param['weight_decay'])
+        weight_decay=param['weight_decay'],
+        cell_impl=param.get('cell_impl', 'standard'))
 
     network.model_dir = model_path
     print(network.model_dir)
-    do_eval(network=network, param=param, epoch=epoch)
+    if is_dump:
+        do_dump(network=network, param=param, epoch=epoch)
+    else:
+        do_eval(network=network, param=param, epoch=epoch)
 
 
 if __name__ == '__main__':
 
     args = sys.argv
+    is_dump = '--dump' in args
+    args = [arg for arg in args if arg != '--dump']
     if len(args) == 2:
         model_path = args[1]
         epoch = None
@@ -150,5 +271,7 @@ if __name__ == '__main__':
     else:
         raise ValueError(
             ("Set a path to saved model.\n"
-             "Usase: python eval_ctc.py path_to_saved_model (epoch)"))
-    main(model_path=model_path, epoch=epoch)
+             "Usase: python eval_ctc.py path_to_saved_model (epoch)\n"
+             "       python eval_ctc.py path_to_saved_model (epoch) --dump\n"
+             "       python eval_ctc.py path_to_frozen_graph.pb"))
+    main(model_path=model_path, epoch=epoch, is_dump=is_dump)
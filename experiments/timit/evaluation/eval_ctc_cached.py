@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Evaluate the log posteriors of the CTC model in the posterior cache
+   (TIMIT corpus) without TensorFlow. Dump them by eval_ctc.py --dump (or
+   eval_multitask_ctc.py --dump) first. Several beam widths can be compared
+   with one dump.
+
+   Usage:
+       python eval_ctc_cached.py path_to_saved_model \
+           [epoch=N] [beam_width=0,5,20] [num_worker=N]
+   beam_width of 0 means greedy decoding.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import yaml
+
+sys.path.append('../../../')
+from experiments.timit.metrics.ctc import do_eval_per_cached
+from experiments.timit.metrics.ctc import do_eval_cer_cached
+from experiments.utils.data.posterior_cache import PosteriorCache
+from experiments.utils.data.posterior_cache import cache_path
+from experiments.utils.data.posterior_cache import checkpoint_name
+
+
+def do_eval(model_path, param, epoch=None, beam_widths=None, num_worker=1):
+    """Evaluate the cached log posteriors.
+    Args:
+        model_path: path to the saved model
+        param: A dictionary of parameters
+        epoch: int, the epoch of the checkpoint
+        beam_widths: list of beam widths. 0 means greedy decoding. If None,
+            use 20.
+        num_worker: int, the number of processes
+    """
+    if beam_widths is None:
+        beam_widths = [20]
+    checkpoint = checkpoint_name(model_path, epoch)
+    print(checkpoint)
+
+    is_multitask = 'label_type_sub' in param
+    if is_multitask:
+        cache_main = PosteriorCache(
+            cache_path(model_path, checkpoint, 'test', task='main'))
+        cache_sub = PosteriorCache(
+            cache_path(model_path, checkpoint, 'test', task='sub'))
+    else:
+        cache = PosteriorCache(cache_path(model_path, checkpoint, 'test'))
+
+    for beam_width in beam_widths:
+        print('=== Test Data Evaluation (beam width: %d) ===' % beam_width)
+        if beam_width == 0:
+            beam_width = None
+
+        if is_multitask:
+            cer_test = do_eval_cer_cached(cache_main,
+                                          beam_width=beam_width,
+                                          is_progressbar=True,
+                                          num_worker=num_worker)
+            print('  CER: %f %%' % (cer_test * 100))
+            per_test = do_eval_per_cached(cache_sub,
+                                          label_type=param['label_type_sub'],
+                                          beam_width=beam_width,
+                                          is_progressbar=True,
+                                          num_worker=num_worker)
+            print('  PER: %f %%' % (per_test * 100))
+
+        elif param['label_type'] == 'character':
+            cer_test = do_eval_cer_cached(cache,
+                                          beam_width=beam_width,
+                                          is_progressbar=True,
+                                          num_worker=num_worker)
+            print('  CER: %f %%' % (cer_test * 100))
+
+        else:
+            per_test = do_eval_per_cached(cache,
+                                          label_type=param['label_type'],
+                                          beam_width=beam_width,
+                                          is_progressbar=True,
+                                          num_worker=num_worker)
+            print('  PER: %f %%' % (per_test * 100))
+
+
+def main(model_path, epoch=None, beam_widths=None, num_worker=1):
+
+    # Load config file
+    with open(os.path.join(model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        param = config['param']
+
+    do_eval(model_path=model_path, param=param, epoch=epoch,
+            beam_widths=beam_widths, num_worker=num_worker)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) < 2:
+        raise ValueError(
+            ("Set a path to saved model.\n"
+             "Usase: python eval_ctc_cached.py path_to_saved_model "
+             "[epoch=N] [beam_width=0,5,20] [num_worker=N]"))
+    options = dict(arg.split('=', 1) for arg in args[2:])
+    main(model_path=args[1],
+         epoch=options.get('epoch'),
+         beam_widths=[int(beam_width) for beam_width in
+                      options.get('beam_width', '20').split(',')],
+         num_worker=int(options.get('num_worker', 1)))
@@ -1,7 +1,10 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
-"""Evaluate the trained multi-task CTC model (TIMIT corpus)."""
+"""Evaluate the trained multi-task CTC model (TIMIT corpus). With --dump,
+   the log posteriors of both tasks on the test set are written to the
+   posterior cache instead (see experiments/utils/data/posterior_cache.py).
+"""
 
 from __future__ import absolute_import
 from __future__ import division
@@ -15,6 +18,8 @@ import yaml
 sys.path.append('../../../')
 from experiments.timit.data.load_dataset_multitask_ctc import Dataset
 from experiments.timit.metrics.ctc import do_eval_per, do_eval_cer
+from experiments.utils.data.posterior_cache import cache_path, dump_posteriors
+from models.checkpoint import restore_checkpoint
 from models.ctc.load_model_multitask import load
 
 
@@ -39,16 +44,12 @@ def do_eval(network, param, epoch=None):
         tf.float32,
         shape=[None, None, network.input_size],
         name='input')
-    indices_pl = tf.placeholder(tf.int64, name='indices')
-    values_pl = tf.placeholder(tf.int32, name='values')
-    shape_pl = tf.placeholder(tf.int64, name='shape')
-    network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
-    indices_sub_pl = tf.placeholder(tf.int64, name='indices_sub')
-    values_sub_pl = tf.placeholder(tf.int32, name='values_sub')
-    shape_sub_pl = tf.placeholder(tf.int64, name='shape_sub')
-    network.labels_sub = tf.SparseTensor(indices_sub_pl,
-                                         values_sub_pl,
-                                         shape_sub_pl)
+    network.labels = tf.placeholder(tf.int32,
+                                    shape=[None, None],
+                                    name='labels')
+    network.labels_sub = tf.placeholder(tf.int32,
+                                        shape=[None, None],
+                                        name='labels_sub')
     network.inputs_seq_len = tf.placeholder(tf.int64,
                                             shape=[None],
                                             name='inputs_seq_len')
@@ -65,12 +66,6 @@ def do_eval(network, param, epoch=None):
         network.inputs_seq_len,
         decode_type='beam_search',
         beam_width=20)
-    per_op_main, per_op_sub = network.compute_ler(
-        decode_op_main, decode_op_sub,
-        network.labels, network.labels_sub)
-
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
 
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
@@ -82,7 +77,7 @@ def do_eval(network, param, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
-            saver.restore(sess, model_path)
+            restore_checkpoint(sess, model_path)
             print("Model restored: " + model_path)
         else:
             raise ValueError('There are not any checkpoints.')
@@ -93,6 +88,7 @@ def do_eval(network, param, epoch=None):
             decode_op=decode_op_main,
             network=network,
             dataset=test_data,
+            max_frame_num=param.get('eval_max_frame_num'),
             is_progressbar=True,
             is_multitask=True)
         print('  CER: %f %%' % (cer_test * 100))
@@ -100,16 +96,93 @@ def do_eval(network, param, epoch=None):
         per_test = do_eval_per(
             session=sess,
             decode_op=decode_op_sub,
-            per_op=per_op_sub,
             network=network,
             dataset=test_data,
             train_label_type=param['label_type_sub'],
+            max_frame_num=param.get('eval_max_frame_num'),
             is_progressbar=True,
             is_multitask=True)
         print('  PER: %f %%' % (per_test * 100))
 
 
-def main(model_path, epoch):
+def do_dump(network, param, epoch=None):
+    """Dump the log posteriors of the test set to the posterior cache.
+    Args:
+        network: model to restore
+        param: A dictionary of parameters
+        epoch: int, the epoch to restore
+    """
+    # Load dataset
+    test_data = Dataset(data_type='test',
+                        label_type_main='character',
+                        label_type_sub='phone39',
+                        batch_size=1,
+                        num_stack=param['num_stack'],
+                        num_skip=param['num_skip'],
+                        is_sorted=False, is_progressbar=True)
+
+    # Define placeholders
+    network.inputs = tf.placeholder(
+        tf.float32,
+        shape=[None, None, network.input_size],
+        name='input')
+    network.labels = tf.placeholder(tf.int32,
+                                    shape=[None, None],
+                                    name='labels')
+    network.labels_sub = tf.placeholder(tf.int32,
+                                        shape=[None, None],
+                                        name='labels_sub')
+    network.inputs_seq_len = tf.placeholder(tf.int64,
+                                            shape=[None],
+                                            name='inputs_seq_len')
+    network.keep_prob_input = tf.placeholder(tf.float32,
+                                             name='keep_prob_input')
+    network.keep_prob_hidden = tf.placeholder(tf.float32,
+                                              name='keep_prob_hidden')
+
+    # Add to the graph each operation
+    _, logits_main, logits_sub = network.compute_loss(
+        network.inputs,
+        network.labels,
+        network.labels_sub,
+        network.inputs_seq_len,
+        network.keep_prob_input,
+        network.keep_prob_hidden)
+    log_posteriors_op_main, log_posteriors_op_sub, outputs_seq_len_op = \
+        network.log_posteriors(logits_main, logits_sub,
+                               network.inputs_seq_len)
+
+    with tf.Session() as sess:
+        ckpt = tf.train.get_checkpoint_state(network.model_dir)
+
+        # If check point exists
+        if ckpt:
+            # Use last saved model
+            model_path = ckpt.model_checkpoint_path
+            if epoch is not None:
+                model_path = model_path.split('/')[:-1]
+                model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+            restore_checkpoint(sess, model_path)
+            print("Model restored: " + model_path)
+        else:
+            raise ValueError('There are not any checkpoints.')
+
+        save_paths = [cache_path(network.model_dir, model_path, 'test',
+                                 task=task) for task in ['main', 'sub']]
+        dump_posteriors(session=sess,
+                        log_posteriors_ops=[log_posteriors_op_main,
+                                            log_posteriors_op_sub],
+                        outputs_seq_len_op=outputs_seq_len_op,
+                        network=network,
+                        dataset=test_data,
+                        save_paths=save_paths,
+                        label_types=['character', 'phone39'],
+                        max_frame_num=param.get('eval_max_frame_num'),
+                        is_progressbar=True)
+        print("Posteriors dumped: " + ', '.join(save_paths))
+
+
+def main(model_path, epoch=None, is_dump=False):
 
     # Load config file
     with open(os.path.join(model_path, 'config.yml'), "r") as f:
@@ -141,18 +214,31 @@ def main(model_path, epoch):
         dropout_ratio_input=param['dropout_input'],
         dropout_ratio_hidden=param['dropout_hidden'],
         num_proj=param['num_proj'],
-        weight_decay=param['weight_decay'])
+        weight_decay=param['weight_decay'],
+        cell_impl=param.get('cell_impl', 'standard'))
 
     network.model_dir = model_path
     print(network.model_dir)
-    do_eval(network=network, param=param, epoch=epoch)
+    if is_dump:
+        do_dump(network=network, param=param, epoch=epoch)
+    else:
+        do_eval(network=network, param=param, epoch=epoch)
 
 
 if __name__ == '__main__':
 
     args = sys.argv
-    if len(args) != 2:
+    is_dump = '--dump' in args
+    args = [arg for arg in args if arg != '--dump']
+    if len(args) == 2:
+        model_path = args[1]
+        epoch = None
+    elif len(args) == 3:
+        model_path = args[1]
+        epoch = args[2]
+    else:
         raise ValueError(
             ("Set a path to saved model.\n"
-             "Usase: python eval_multitask_ctc.py path_to_saved_model"))
-    main(model_path=args[1])
+             "Usase: python eval_multitask_ctc.py path_to_saved_model "
+             "(epoch) (--dump)"))
+    main(model_path=model_path, epoch=epoch, is_dump=is_dump)
@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Export the trained Attention model as a frozen graph (TIMIT corpus)."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import tensorflow as tf
+import yaml
+
+sys.path.append('../../../')
+from models.attention import blstm_attention_seq2seq
+from models.frozen_graph import export_frozen_graph
+
+
+def do_export(network, param, epoch=None):
+    """Export the model.
+    Args:
+        network: model to restore
+        param: A dictionary of parameters
+        epoch: int, the epoch to restore
+    """
+    ckpt = tf.train.get_checkpoint_state(network.model_dir)
+
+    # If check point exists
+    if ckpt:
+        # Use last saved model
+        model_path = ckpt.model_checkpoint_path
+        if epoch is not None:
+            model_path = model_path.split('/')[:-1]
+            model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+    else:
+        raise ValueError('There are not any checkpoints.')
+
+    if epoch is None:
+        save_path = os.path.join(network.model_dir, 'frozen_graph.pb')
+    else:
+        save_path = os.path.join(network.model_dir,
+                                 'frozen_graph-' + str(epoch) + '.pb')
+
+    graph_def = export_frozen_graph(network=network,
+                                    model_path=model_path,
+                                    save_path=save_path,
+                                    decode_type='greedy',
+                                    beam_width=20)
+    print("Model restored: " + model_path)
+    print("Frozen graph (%d nodes) saved: %s" %
+          (len(graph_def.node), save_path))
+
+
+def main(model_path, epoch):
+
+    # Load config file
+    with open(os.path.join(model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        param = config['param']
+
+    if param['label_type'] == 'phone61':
+        param['num_classes'] = 63
+        param['sos_index'] = 0
+        param['eos_index'] = 1
+    elif param['label_type'] == 'phone48':
+        param['num_classes'] = 50
+        param['sos_index'] = 0
+        param['eos_index'] = 1
+    elif param['label_type'] == 'phone39':
+        param['num_classes'] = 41
+        param['sos_index'] = 0
+        param['eos_index'] = 1
+    elif param['label_type'] == 'character':
+        param['num_classes'] = 35
+        param['sos_index'] = 1
+        param['eos_index'] = 2
+
+    # Model setting
+    # AttentionModel = load(model_type=param['model'])
+    network = blstm_attention_seq2seq.BLSTMAttetion(
+        batch_size=1,
+        input_size=param['input_size'],
+        encoder_num_unit=param['encoder_num_unit'],
+        encoder_num_layer=param['encoder_num_layer'],
+        attention_dim=param['attention_dim'],
+        attention_type=param['attention_type'],
+        decoder_num_unit=param['decoder_num_unit'],
+        decoder_num_layer=param['decoder_num_layer'],
+        embedding_dim=param['embedding_dim'],
+        num_classes=param['num_classes'],
+        sos_index=param['sos_index'],
+        eos_index=param['eos_index'],
+        max_decode_length=param['max_decode_length'],
+        attention_smoothing=param['attention_smoothing'],
+        attention_weights_tempareture=param['attention_weights_tempareture'],
+        logits_tempareture=param['logits_tempareture'],
+        parameter_init=param['weight_init'],
+        clip_grad=param['clip_grad'],
+        clip_activation_encoder=param['clip_activation_encoder'],
+        clip_activation_decoder=param['clip_activation_decoder'],
+        dropout_ratio_input=param['dropout_input'],
+        dropout_ratio_hidden=param['dropout_hidden'],
+        weight_decay=param['weight_decay'],
+        cell_impl=param.get('cell_impl', 'standard'),
+        lc_chunk_size=param.get('lc_chunk_size', 0),
+        lc_right_context=param.get('lc_right_context', 0))
+
+    network.model_dir = model_path
+    print(network.model_dir)
+    do_export(network=network, param=param, epoch=epoch)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) == 2:
+        model_path = args[1]
+        epoch = None
+    elif len(args) == 3:
+        model_path = args[1]
+        epoch = args[2]
+    else:
+        raise ValueError(
+            ("Set a path to saved model.\n"
+             "Usase: python export_attention.py path_to_saved_model (epoch)"))
+    main(model_path=model_path, epoch=epoch)
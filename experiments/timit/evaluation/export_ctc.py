@@ -0,0 +1,114 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Export the trained CTC model as a frozen graph (TIMIT corpus)."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import tensorflow as tf
+import yaml
+
+sys.path.append('../../../')
+from models.ctc.load_model import load
+from models.frozen_graph import export_frozen_graph
+
+
+def do_export(network, param, epoch=None):
+    """Export the model.
+    Args:
+        network: model to restore
+        param: A dictionary of parameters
+        epoch: int, the epoch to restore
+    """
+    ckpt = tf.train.get_checkpoint_state(network.model_dir)
+
+    # If check point exists
+    if ckpt:
+        # Use last saved model
+        model_path = ckpt.model_checkpoint_path
+        if epoch is not None:
+            model_path = model_path.split('/')[:-1]
+            model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+    else:
+        raise ValueError('There are not any checkpoints.')
+
+    if epoch is None:
+        save_path = os.path.join(network.model_dir, 'frozen_graph.pb')
+    else:
+        save_path = os.path.join(network.model_dir,
+                                 'frozen_graph-' + str(epoch) + '.pb')
+
+    graph_def = export_frozen_graph(network=network,
+                                    model_path=model_path,
+                                    save_path=save_path,
+                                    decode_type='beam_search',
+                                    beam_width=20)
+    print("Model restored: " + model_path)
+    print("Frozen graph (%d nodes) saved: %s" %
+          (len(graph_def.node), save_path))
+
+
+def main(model_path, epoch):
+
+    # Load config file
+    with open(os.path.join(model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        param = config['param']
+
+    # Except for a blank label
+    if param['label_type'] == 'phone61':
+        param['num_classes'] = 61
+    elif param['label_type'] == 'phone48':
+        param['num_classes'] = 48
+    elif param['label_type'] == 'phone39':
+        param['num_classes'] = 39
+    elif param['label_type'] == 'character':
+        param['num_classes'] = 33
+
+    # Latency-controlled BLSTM (blstm_ctc only)
+    lc_param = {}
+    if param.get('lc_chunk_size', 0) != 0:
+        lc_param['lc_chunk_size'] = param['lc_chunk_size']
+        lc_param['lc_right_context'] = param.get('lc_right_context', 0)
+
+    # Model setting
+    CTCModel = load(model_type=param['model'])
+    network = CTCModel(
+        batch_size=1,
+        input_size=param['input_size'] * param['num_stack'],
+        num_unit=param['num_unit'],
+        num_layer=param['num_layer'],
+        num_classes=param['num_classes'],
+        parameter_init=param['weight_init'],
+        clip_grad=param['clip_grad'],
+        clip_activation=param['clip_activation'],
+        dropout_ratio_input=param['dropout_input'],
+        dropout_ratio_hidden=param['dropout_hidden'],
+        num_proj=param['num_proj'],
+        weight_decay=param['weight_decay'],
+        cell_impl=param.get('cell_impl', 'standard'),
+        **lc_param)
+
+    network.model_dir = model_path
+    print(network.model_dir)
+    do_export(network=network, param=param, epoch=epoch)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) == 2:
+        model_path = args[1]
+        epoch = None
+    elif len(args) == 3:
+        model_path = args[1]
+        epoch = args[2]
+    else:
+        raise ValueError(
+            ("Set a path to saved model.\n"
+             "Usase: python export_ctc.py path_to_saved_model (epoch)"))
+    main(model_path=model_path, epoch=epoch)
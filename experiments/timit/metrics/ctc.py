@@ -8,65 +8,91 @@ from __future__ import division
 from __future__ import print_function
 
 import re
-import Levenshtein
 
-from experiments.timit.metrics.mapping import map_to_39phone
-from experiments.timit.metrics.edit_distance import compute_edit_distance
-from experiments.utils.labels.character import num2char
-from experiments.utils.labels.phone import num2phone, phone2num
-from experiments.utils.sparsetensor import list2sparsetensor, sparsetensor2list
+from experiments.timit.metrics.mapping import make_39phone_table
+from experiments.utils.data.eval_batch import eval_batches, restore_order
+from experiments.utils.edit_distance import compute_error_rate
+from experiments.utils.labels.vocabulary import load_vocabulary
+from experiments.utils.labels.ragged import dense2ragged, remap_ragged, ragged2list
+from experiments.utils.sparsetensor import sparsetensor2ragged
 from experiments.utils.progressbar import wrap_iterator
 
 
-def do_eval_per(session, decode_op, per_op, network, dataset, label_type,
+def _make_39phone_tables(train_label_type, eval_label_type):
+    """Make lookup tables from indices of each phone set to those of 39
+       phones.
+    Args:
+        train_label_type: string, phone39 or phone48 or phone61
+        eval_label_type: string, phone39 or phone48 or phone61
+    Returns:
+        train_table: np.ndarray, the table of train_label_type
+        eval_table: np.ndarray, the table of eval_label_type
+    """
+    train_phone2num_map_file_path = '../metrics/mapping_files/ctc/' + \
+        train_label_type + '_to_num.txt'
+    eval_phone2num_map_file_path = '../metrics/mapping_files/ctc/' + \
+        eval_label_type + '_to_num.txt'
+    phone2num_39_map_file_path = '../metrics/mapping_files/ctc/phone39_to_num.txt'
+    phone2phone_map_file_path = '../metrics/mapping_files/phone2phone.txt'
+
+    vocab_39 = load_vocabulary(phone2num_39_map_file_path)
+    train_table = make_39phone_table(
+        load_vocabulary(train_phone2num_map_file_path), vocab_39,
+        train_label_type, phone2phone_map_file_path)
+    eval_table = make_39phone_table(
+        load_vocabulary(eval_phone2num_map_file_path), vocab_39,
+        eval_label_type, phone2phone_map_file_path)
+    return train_table, eval_table
+
+
+def do_eval_per(session, decode_op, network, dataset, label_type,
                 eval_batch_size=None, is_progressbar=False,
-                is_multitask=False):
-    """Evaluate trained model by Phone Error Rate.
+                is_multitask=False, num_worker=1, max_frame_num=None,
+                is_per_utterance=False):
+    """Evaluate trained model by Phone Error Rate. PER of each utterance
+       is the edit distance divided by the number of phones in the ground
+       truth (the former TensorFlow evaluation divided it by the number of
+       phones in the hypothesis).
     Args:
         session: session of training model
         decode_op: operation for decoding
-        per_op: operation for computing phone error rate
         network: network to evaluate
         dataset: An instance of a `Dataset' class
         label_type: string, phone39 or phone48 or phone61
-        eval_batch_size: int, the batch size when evaluating the model
+        eval_batch_size: int, the batch size when evaluating the model. This
+            is used only when max_frame_num is None.
         is_progressbar: if True, visualize the progressbar
         is_multitask: if True, evaluate the multitask model
+        num_worker: int, the number of processes to compute edit distance
+        max_frame_num: int, the number of frames in each mini-batch of
+            utterances sorted by length (see eval_batch.py)
+        is_per_utterance: if True, also return PER of each utterance
     Returns:
         per_mean: An average of PER
+        per_list: np.ndarray of PER of each utterance in the original order
+            of the dataset (only if is_per_utterance is True)
     """
-    if eval_batch_size is not None:
-        batch_size = eval_batch_size
-    else:
-        batch_size = dataset.batch_size
-
     train_label_type = label_type
     if is_multitask:
         eval_label_type = dataset.label_type_sub
     else:
         eval_label_type = dataset.label_type
 
-    num_examples = dataset.data_num
-    iteration = int(num_examples / batch_size)
-    if (num_examples / batch_size) != int(num_examples / batch_size):
-        iteration += 1
-    per_mean = 0
+    labels_true_mapped, labels_pred_mapped, positions = [], [], []
 
-    # Make data generator
-    mini_batch = dataset.next_batch(batch_size=batch_size)
+    train_table, eval_table = _make_39phone_tables(train_label_type,
+                                                   eval_label_type)
 
-    train_phone2num_map_file_path = '../metrics/mapping_files/ctc/' + \
-        train_label_type + '_to_num.txt'
-    eval_phone2num_map_file_path = '../metrics/mapping_files/ctc/' + \
-        eval_label_type + '_to_num.txt'
-    phone2num_39_map_file_path = '../metrics/mapping_files/ctc/phone39_to_num.txt'
-    phone2phone_map_file_path = '../metrics/mapping_files/phone2phone.txt'
-    for step in wrap_iterator(range(iteration), is_progressbar):
+    # Utterances sorted by length
+    mini_batches = eval_batches(dataset, max_frame_num=max_frame_num,
+                                batch_size=eval_batch_size)
+    for batch, positions_batch in wrap_iterator(mini_batches,
+                                                is_progressbar):
         # Create feed dictionary for next mini batch
         if not is_multitask:
-            inputs, labels_true, inputs_seq_len, _ = mini_batch.__next__()
+            inputs, labels_true, inputs_seq_len, _ = batch
         else:
-            inputs, _, labels_true, inputs_seq_len, _ = mini_batch.__next__()
+            inputs, _, labels_true, inputs_seq_len, _ = batch
 
         feed_dict = {
             network.inputs: inputs,
@@ -79,94 +105,69 @@ def do_eval_per(session, decode_op, per_op, network, dataset, label_type,
 
         # Evaluate by 39 phones
         labels_pred_st = session.run(decode_op, feed_dict=feed_dict)
-        labels_pred = sparsetensor2list(labels_pred_st, batch_size_each)
-
-        labels_pred_mapped, labels_true_mapped = [], []
-        for i_batch in range(batch_size_each):
-            ###############
-            # Hypothesis
-            ###############
-            # Convert from num to phone (-> list of phone strings)
-            phone_pred_list = num2phone(
-                labels_pred[i_batch],
-                train_phone2num_map_file_path).split(' ')
-
-            # Mapping to 39 phones (-> list of phone strings)
-            phone_pred_list = map_to_39phone(phone_pred_list,
-                                             train_label_type,
-                                             phone2phone_map_file_path)
-
-            # Convert from phone to num (-> list of phone indices)
-            phone_pred_list = phone2num(phone_pred_list,
-                                        phone2num_39_map_file_path)
-            labels_pred_mapped.append(phone_pred_list)
-
-            ###############
-            # Reference
-            ###############
-            # Convert from num to phone (-> list of phone strings)
-            phone_true_list = num2phone(
-                labels_true[i_batch],
-                eval_phone2num_map_file_path).split(' ')
-
-            # Mapping to 39 phones (-> list of phone strings)
-            phone_true_list = map_to_39phone(phone_true_list,
-                                             eval_label_type,
-                                             phone2phone_map_file_path)
-
-            # Convert from phone to num (-> list of phone indices)
-            phone_true_list = phone2num(phone_true_list,
-                                        phone2num_39_map_file_path)
-            labels_true_mapped.append(phone_true_list)
-
-        # Compute edit distance
-        labels_true_st = list2sparsetensor(labels_true_mapped, padded_value=-1)
-        labels_pred_st = list2sparsetensor(labels_pred_mapped, padded_value=-1)
-        per_each = compute_edit_distance(session,
-                                         labels_true_st,
-                                         labels_pred_st)
-        per_mean += per_each * batch_size_each
-
-    per_mean /= dataset.data_num
 
+        # Hypothesis
+        offsets, labels_pred = sparsetensor2ragged(labels_pred_st,
+                                                   batch_size_each)
+        labels_pred_mapped.extend(ragged2list(
+            *remap_ragged(train_table, offsets, labels_pred)))
+
+        # Reference
+        offsets, labels_true = dense2ragged(labels_true, padded_value=-1)
+        labels_true_mapped.extend(ragged2list(
+            *remap_ragged(eval_table, offsets, labels_true)))
+        positions.extend(positions_batch)
+
+    # Compute edit distance in the original order
+    per_list = compute_error_rate(
+        restore_order(labels_true_mapped, positions),
+        restore_order(labels_pred_mapped, positions),
+        padded_value=-1,
+        num_worker=num_worker)
+    per_mean = per_list.sum() / dataset.data_num
+
+    if is_per_utterance:
+        return per_mean, per_list
     return per_mean
 
 
 def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=None,
-                is_progressbar=False, is_multitask=False):
+                is_progressbar=False, is_multitask=False, num_worker=1,
+                max_frame_num=None, is_per_utterance=False):
     """Evaluate trained model by Character Error Rate.
     Args:
         session: session of training model
         decode_op: operation for decoding
         network: network to evaluate
         dataset: An instance of a `Dataset` class
-        eval_batch_size: int, the batch size when evaluating the model
+        eval_batch_size: int, the batch size when evaluating the model. This
+            is used only when max_frame_num is None.
         is_progressbar: if True, visualize the progressbar
         is_multitask: if True, evaluate the multitask model
+        num_worker: int, the number of processes to compute edit distance
+        max_frame_num: int, the number of frames in each mini-batch of
+            utterances sorted by length (see eval_batch.py)
+        is_per_utterance: if True, also return CER of each utterance
     Return:
         cer_mean: An average of CER
+        cer_list: np.ndarray of CER of each utterance in the original order
+            of the dataset (only if is_per_utterance is True)
     """
-    if eval_batch_size is not None:
-        batch_size = eval_batch_size
-    else:
-        batch_size = dataset.batch_size
-
-    num_examples = dataset.data_num
-    iteration = int(num_examples / batch_size)
-    if (num_examples / batch_size) != int(num_examples / batch_size):
-        iteration += 1
-    cer_sum = 0
-
-    # Make data generator
-    mini_batch = dataset.next_batch(batch_size=batch_size)
+    str_true_list, str_pred_list, positions = [], [], []
 
     map_file_path = '../metrics/mapping_files/ctc/character_to_num.txt'
-    for step in wrap_iterator(range(iteration), is_progressbar):
+    vocab = load_vocabulary(map_file_path)
+
+    # Utterances sorted by length
+    mini_batches = eval_batches(dataset, max_frame_num=max_frame_num,
+                                batch_size=eval_batch_size)
+    for batch, positions_batch in wrap_iterator(mini_batches,
+                                                is_progressbar):
         # Create feed dictionary for next mini batch
         if not is_multitask:
-            inputs, labels_true, inputs_seq_len, _ = mini_batch.__next__()
+            inputs, labels_true, inputs_seq_len, _ = batch
         else:
-            inputs, labels_true, _, inputs_seq_len, _ = mini_batch.__next__()
+            inputs, labels_true, _, inputs_seq_len, _ = batch
 
         feed_dict = {
             network.inputs: inputs,
@@ -178,23 +179,105 @@ def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=None,
         batch_size_each = len(inputs_seq_len)
 
         labels_pred_st = session.run(decode_op, feed_dict=feed_dict)
-        labels_pred = sparsetensor2list(labels_pred_st, batch_size_each)
-
-        for i_batch in range(batch_size_each):
+        offsets, labels_pred = sparsetensor2ragged(labels_pred_st,
+                                                   batch_size_each)
+        str_pred_batch = vocab.decode_batch(offsets, labels_pred)
 
-            # Convert from list to string
-            str_true = num2char(labels_true[i_batch], map_file_path)
-            str_pred = num2char(labels_pred[i_batch], map_file_path)
+        # Convert from list to string
+        offsets, labels_true = dense2ragged(labels_true, padded_value=-1)
+        str_true_batch = vocab.decode_batch(offsets, labels_true)
 
+        for str_true, str_pred in zip(str_true_batch, str_pred_batch):
             # Remove silence(_) labels
-            str_true = re.sub(r'[_,.\'-?!]+', "", str_true)
-            str_pred = re.sub(r'[_,.\'-?!]+', "", str_pred)
+            str_true_list.append(re.sub(r'[_,.\'-?!]+', "", str_true))
+            str_pred_list.append(re.sub(r'[_,.\'-?!]+', "", str_pred))
+        positions.extend(positions_batch)
+
+    # Compute edit distance in the original order
+    cer_list = compute_error_rate(restore_order(str_true_list, positions),
+                                  restore_order(str_pred_list, positions),
+                                  num_worker=num_worker)
+    cer_mean = cer_list.sum() / dataset.data_num
+
+    if is_per_utterance:
+        return cer_mean, cer_list
+    return cer_mean
+
+
+def do_eval_per_cached(cache, label_type, beam_width=None,
+                       is_progressbar=False, num_worker=1,
+                       is_per_utterance=False):
+    """Evaluate log posteriors in a cache by Phone Error Rate without
+       TensorFlow (see experiments/utils/data/posterior_cache.py).
+    Args:
+        cache: An instance of `PosteriorCache`
+        label_type: string, phone39 or phone48 or phone61 (the label type
+            the model is trained with)
+        beam_width: int, beam width for beam search. If None, use greedy
+            decoding.
+        is_progressbar: if True, visualize the progressbar
+        num_worker: int, the number of processes to decode and compute edit
+            distance
+        is_per_utterance: if True, also return PER of each utterance
+    Returns:
+        per_mean: An average of PER
+        per_list: np.ndarray of PER of each utterance (only if
+            is_per_utterance is True)
+    """
+    train_table, eval_table = _make_39phone_tables(label_type,
+                                                   cache.label_type)
+
+    labels_pred = cache.decode(beam_width=beam_width, num_worker=num_worker,
+                               is_progressbar=is_progressbar)
+    labels_pred_mapped = ragged2list(
+        *remap_ragged(train_table, *dense2ragged(labels_pred)))
+    labels_true = [cache.label(i) for i in range(cache.data_num)]
+    labels_true_mapped = ragged2list(
+        *remap_ragged(eval_table, *dense2ragged(labels_true)))
+
+    per_list = compute_error_rate(labels_true_mapped, labels_pred_mapped,
+                                  padded_value=-1,
+                                  num_worker=num_worker)
+    per_mean = per_list.sum() / cache.data_num
+
+    if is_per_utterance:
+        return per_mean, per_list
+    return per_mean
+
+
+def do_eval_cer_cached(cache, beam_width=None, is_progressbar=False,
+                       num_worker=1, is_per_utterance=False):
+    """Evaluate log posteriors in a cache by Character Error Rate without
+       TensorFlow (see experiments/utils/data/posterior_cache.py).
+    Args:
+        cache: An instance of `PosteriorCache`
+        beam_width: int, beam width for beam search. If None, use greedy
+            decoding.
+        is_progressbar: if True, visualize the progressbar
+        num_worker: int, the number of processes to decode and compute edit
+            distance
+        is_per_utterance: if True, also return CER of each utterance
+    Return:
+        cer_mean: An average of CER
+        cer_list: np.ndarray of CER of each utterance (only if
+            is_per_utterance is True)
+    """
+    map_file_path = '../metrics/mapping_files/ctc/character_to_num.txt'
+    vocab = load_vocabulary(map_file_path)
+
+    labels_pred = cache.decode(beam_width=beam_width, num_worker=num_worker,
+                               is_progressbar=is_progressbar)
 
-            # Compute edit distance
-            cer_each = Levenshtein.distance(
-                str_pred, str_true) / len(list(str_true))
-            cer_sum += cer_each
+    # Remove silence(_) labels
+    str_pred_list = [re.sub(r'[_,.\'-?!]+', "", vocab.decode(l))
+                     for l in labels_pred]
+    str_true_list = [re.sub(r'[_,.\'-?!]+', "", vocab.decode(cache.label(i)))
+                     for i in range(cache.data_num)]
 
-    cer_mean = cer_sum / dataset.data_num
+    cer_list = compute_error_rate(str_true_list, str_pred_list,
+                                  num_worker=num_worker)
+    cer_mean = cer_list.sum() / cache.data_num
 
+    if is_per_utterance:
+        return cer_mean, cer_list
     return cer_mean
@@ -8,58 +8,66 @@ from __future__ import division
 from __future__ import print_function
 
 import re
-import Levenshtein
 
-from experiments.timit.metrics.mapping import map_to_39phone
-from experiments.timit.metrics.edit_distance import compute_edit_distance
-from experiments.utils.labels.character import num2char
-from experiments.utils.labels.phone import num2phone, phone2num
-from experiments.utils.sparsetensor import list2sparsetensor
+from experiments.timit.metrics.mapping import make_39phone_table
+from experiments.utils.edit_distance import compute_error_rate
+from experiments.utils.labels.vocabulary import load_vocabulary
+from experiments.utils.data.eval_batch import eval_batches, restore_order
+from experiments.utils.labels.ragged import dense2ragged, remap_ragged, ragged2list, truncate_after_eos
 from experiments.utils.exception_func import exception
 from experiments.utils.progressbar import wrap_iterator
 
 
 @exception
-def do_eval_per(session, decode_op, per_op, network, dataset, label_type,
-                eos_index, eval_batch_size=None, is_progressbar=False):
-    """Evaluate trained model by Phone Error Rate.
+def do_eval_per(session, decode_op, network, dataset, label_type,
+                eos_index, eval_batch_size=None, is_progressbar=False,
+                num_worker=1, max_frame_num=None, is_per_utterance=False):
+    """Evaluate trained model by Phone Error Rate. PER of each utterance
+       is the edit distance divided by the number of phones in the ground
+       truth (the former TensorFlow evaluation divided it by the number of
+       phones in the hypothesis).
     Args:
         session: session of training model
         decode_op: operation for decoding
-        per_op: operation for computing phone error rate
         network: network to evaluate
         dataset: An instance of a `Dataset' class
         label_type: string, phone39 or phone48 or phone61
         eos_index: int, the index of <EOS> class
-        eval_batch_size: int, the batch size when evaluating the model
+        eval_batch_size: int, the batch size when evaluating the model. This
+            is used only when max_frame_num is None.
         is_progressbar: if True, visualize the progressbar
+        num_worker: int, the number of processes to compute edit distance
+        max_frame_num: int, the number of frames in each mini-batch of
+            utterances sorted by length (see eval_batch.py)
+        is_per_utterance: if True, also return PER of each utterance
     Returns:
         per_global: An average of PER
+        per_list: np.ndarray of PER of each utterance in the original order
+            of the dataset (only if is_per_utterance is True)
     """
-    if eval_batch_size is not None:
-        batch_size = eval_batch_size
-    else:
-        batch_size = dataset.batch_size
-
     train_label_type = label_type
     data_label_type = dataset.label_type
 
-    num_examples = dataset.data_num
-    iteration = int(num_examples / batch_size)
-    if (num_examples / batch_size) != int(num_examples / batch_size):
-        iteration += 1
-    per_global = 0
-
-    # Make data generator
-    mini_batch = dataset.next_batch(batch_size=batch_size)
+    labels_true_all, labels_pred_all, positions = [], [], []
 
     phone2num_map_file_path = '../metrics/mapping_files/attention/phone2num_' + \
         train_label_type[5:7] + '.txt'
     phone2num_39_map_file_path = '../metrics/mapping_files/attention/phone2num_39.txt'
     phone2phone_map_file_path = '../metrics/mapping_files/phone2phone.txt'
-    for step in wrap_iterator(range(iteration), is_progressbar):
+
+    # Lookup table from indices of phones to those of 39 phones
+    table = make_39phone_table(
+        load_vocabulary(phone2num_map_file_path),
+        load_vocabulary(phone2num_39_map_file_path),
+        train_label_type, phone2phone_map_file_path)
+
+    # Utterances sorted by length
+    mini_batches = eval_batches(dataset, max_frame_num=max_frame_num,
+                                batch_size=eval_batch_size)
+    for batch, positions_batch in wrap_iterator(mini_batches,
+                                                is_progressbar):
         # Create feed dictionary for next mini-batch
-        inputs, att_labels_true, _, inputs_seq_len, _, _ = mini_batch.__next__()
+        inputs, att_labels_true, _, inputs_seq_len, _, _ = batch
 
         feed_dict = {
             network.inputs: inputs,
@@ -68,98 +76,71 @@ def do_eval_per(session, decode_op, per_op, network, dataset, label_type,
             network.keep_prob_hidden: 1.0
         }
 
-        batch_size_each = len(inputs_seq_len)
-
-        if False:
-            # Evaluate by 61 phones
-            per_local = session.run(per_op, feed_dict=feed_dict)
-            per_global += per_local * batch_size_each
-
+        # Evaluate by 39 phones
+        predicted_ids = session.run(decode_op, feed_dict=feed_dict)
+        predicted_ids = truncate_after_eos(predicted_ids, eos_index)
+        att_labels_true = truncate_after_eos(att_labels_true, eos_index)
+
+        # Hypothesis
+        offsets, labels_pred = dense2ragged(predicted_ids)
+        labels_pred_all.extend(ragged2list(
+            *remap_ragged(table, offsets, labels_pred)))
+
+        # Reference
+        if data_label_type != 'phone39':
+            offsets, labels_true = dense2ragged(att_labels_true)
+            labels_true_all.extend(ragged2list(
+                *remap_ragged(table, offsets, labels_true)))
         else:
-            # Evaluate by 39 phones
-            predicted_ids = session.run(decode_op, feed_dict=feed_dict)
-            predicted_ids_phone39 = []
-            labels_true_phone39 = []
-            for i_batch in range(batch_size_each):
-                # Convert from num to phone (-> list of phone strings)
-                phone_pred_seq = num2phone(
-                    predicted_ids[i_batch], phone2num_map_file_path)
-                phone_pred_list = phone_pred_seq.split(' ')
-
-                # Mapping to 39 phones (-> list of phone strings)
-                phone_pred_list = map_to_39phone(
-                    phone_pred_list, train_label_type,
-                    phone2phone_map_file_path)
-
-                # Convert from phone to num (-> list of phone indices)
-                phone_pred_list = phone2num(
-                    phone_pred_list, phone2num_39_map_file_path)
-                predicted_ids_phone39.append(phone_pred_list)
-
-                if data_label_type != 'phone39':
-                    # Convert from num to phone (-> list of phone strings)
-                    phone_true_seq = num2phone(
-                        att_labels_true[i_batch], phone2num_map_file_path)
-                    phone_true_list = phone_true_seq.split(' ')
-
-                    # Mapping to 39 phones (-> list of phone strings)
-                    phone_true_list = map_to_39phone(
-                        phone_true_list, train_label_type,
-                        phone2phone_map_file_path)
-
-                    # Convert from phone to num (-> list of phone indices)
-                    phone_true_list = phone2num(
-                        phone_true_list, phone2num_39_map_file_path)
-                    labels_true_phone39.append(phone_true_list)
-                else:
-                    labels_true_phone39 = att_labels_true
-
-            # Compute edit distance
-            labels_true_st = list2sparsetensor(
-                labels_true_phone39, padded_value=eos_index)
-            labels_pred_st = list2sparsetensor(
-                predicted_ids_phone39, padded_value=eos_index)
-            per_local = compute_edit_distance(
-                session, labels_true_st, labels_pred_st)
-            per_global += per_local * batch_size_each
-
-    per_global /= dataset.data_num
-
+            labels_true_all.extend(att_labels_true)
+        positions.extend(positions_batch)
+
+    # Compute edit distance in the original order
+    per_list = compute_error_rate(restore_order(labels_true_all, positions),
+                                  restore_order(labels_pred_all, positions),
+                                  padded_value=eos_index,
+                                  num_worker=num_worker)
+    per_global = per_list.sum() / dataset.data_num
+
+    if is_per_utterance:
+        return per_global, per_list
     return per_global
 
 
 @exception
 def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=None,
-                is_progressbar=False):
+                is_progressbar=False, num_worker=1, max_frame_num=None,
+                is_per_utterance=False):
     """Evaluate trained model by Character Error Rate.
     Args:
         session: session of training model
         decode_op: operation for decoding
         network: network to evaluate
         dataset: An instance of a `Dataset` class
-        eval_batch_size: int, batch size when evaluating the model
+        eval_batch_size: int, batch size when evaluating the model. This is
+            used only when max_frame_num is None.
         is_progressbar: if True, visualize the progressbar
+        num_worker: int, the number of processes to compute edit distance
+        max_frame_num: int, the number of frames in each mini-batch of
+            utterances sorted by length (see eval_batch.py)
+        is_per_utterance: if True, also return CER of each utterance
     Return:
         cer_mean: An average of CER
+        cer_list: np.ndarray of CER of each utterance in the original order
+            of the dataset (only if is_per_utterance is True)
     """
-    if eval_batch_size is not None:
-        batch_size = eval_batch_size
-    else:
-        batch_size = dataset.batch_size
-
-    # Make data generator
-    mini_batch = dataset.next_batch(batch_size=batch_size)
-
-    num_examples = dataset.data_num
-    iteration = int(num_examples / batch_size)
-    if (num_examples / batch_size) != int(num_examples / batch_size):
-        iteration += 1
-    cer_sum = 0
+    str_true_list, str_pred_list, positions = [], [], []
 
     map_file_path = '../metrics/mapping_files/attention/char2num.txt'
-    for step in wrap_iterator(range(iteration), is_progressbar):
+    vocab = load_vocabulary(map_file_path)
+
+    # Utterances sorted by length
+    mini_batches = eval_batches(dataset, max_frame_num=max_frame_num,
+                                batch_size=eval_batch_size)
+    for batch, positions_batch in wrap_iterator(mini_batches,
+                                                is_progressbar):
         # Create feed dictionary for next mini-batch
-        inputs, att_labels_true, _, inputs_seq_len, _, _ = mini_batch.__next__()
+        inputs, att_labels_true, _, inputs_seq_len, _, _ = batch
 
         feed_dict = {
             network.inputs: inputs,
@@ -168,24 +149,26 @@ def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=None,
             network.keep_prob_hidden: 1.0
         }
 
-        batch_size_each = len(inputs_seq_len)
-
         predicted_ids = session.run(decode_op, feed_dict=feed_dict)
-        for i_batch in range(batch_size_each):
 
-            # Convert from list to string
-            str_true = num2char(att_labels_true[i_batch], map_file_path)
-            str_pred = num2char(predicted_ids[i_batch], map_file_path)
+        # Convert from list to string
+        str_true_batch = vocab.decode_batch(*dense2ragged(
+            truncate_after_eos(att_labels_true, dataset.eos_index)))
+        str_pred_batch = vocab.decode_batch(*dense2ragged(
+            truncate_after_eos(predicted_ids, dataset.eos_index)))
 
+        for str_true, str_pred in zip(str_true_batch, str_pred_batch):
             # Remove silence(_) labels
-            str_true = re.sub(r'[_<>,.\'-?!]+', "", str_true)
-            str_pred = re.sub(r'[_<>,.\'-?!]+', "", str_pred)
-
-            # Compute edit distance
-            cer_each = Levenshtein.distance(
-                str_pred, str_true) / len(list(str_true))
-            cer_sum += cer_each
-
-    cer_mean = cer_sum / dataset.data_num
-
+            str_true_list.append(re.sub(r'[_<>,.\'-?!]+', "", str_true))
+            str_pred_list.append(re.sub(r'[_<>,.\'-?!]+', "", str_pred))
+        positions.extend(positions_batch)
+
+    # Compute edit distance in the original order
+    cer_list = compute_error_rate(restore_order(str_true_list, positions),
+                                  restore_order(str_pred_list, positions),
+                                  num_worker=num_worker)
+    cer_mean = cer_list.sum() / dataset.data_num
+
+    if is_per_utterance:
+        return cer_mean, cer_list
     return cer_mean
@@ -7,18 +7,25 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from os.path import abspath
 
-def map_to_39phone(phone_list, label_type, map_file_path):
-    """Map from 61 or 48 phones to 39 phones.
+_PHONE_MAP_CACHE = {}
+
+
+def load_phone_map(label_type, map_file_path):
+    """Load a mapping from 61 or 48 phones to 39 phones, or return the cached
+       one.
     Args:
-        phone_list: list of phones (string)
         label_type: phone48 or phone61
         map_file_path: path to the mapping file
     Returns:
-        phone_list: list of 39 phones (string)
+        map_dict:
+            key => phone (string)
+            value => 39 phone (string). '' means the phone is removed.
     """
-    if label_type == 'phone39':
-        return phone_list
+    key = (label_type, abspath(map_file_path))
+    if key in _PHONE_MAP_CACHE:
+        return _PHONE_MAP_CACHE[key]
 
     # Read a mapping file
     map_dict = {}
@@ -34,6 +41,24 @@ def map_to_39phone(phone_list, label_type, map_file_path):
                 if line[1] != 'nan':
                     map_dict[line[1]] = line[2]
 
+    _PHONE_MAP_CACHE[key] = map_dict
+    return map_dict
+
+
+def map_to_39phone(phone_list, label_type, map_file_path):
+    """Map from 61 or 48 phones to 39 phones.
+    Args:
+        phone_list: list of phones (string)
+        label_type: phone48 or phone61
+        map_file_path: path to the mapping file
+    Returns:
+        phone_list: list of 39 phones (string)
+    """
+    if label_type == 'phone39':
+        return phone_list
+
+    map_dict = load_phone_map(label_type, map_file_path)
+
     # Map to 39 phones
     for i in range(len(phone_list)):
         phone_list[i] = map_dict[phone_list[i]]
@@ -43,3 +68,21 @@ def map_to_39phone(phone_list, label_type, map_file_path):
         phone_list.remove('')
 
     return phone_list
+
+
+def make_39phone_table(vocab, vocab_39, label_type, map_file_path):
+    """Make a lookup table from indices of 61 or 48 phones to indices of 39
+       phones. Use it with `np.take` (see remap_ragged).
+    Args:
+        vocab: An instance of `Vocabulary` of 61 or 48 phones
+        vocab_39: An instance of `Vocabulary` of 39 phones
+        label_type: phone39 or phone48 or phone61
+        map_file_path: path to the mapping file
+    Returns:
+        table: np.ndarray of size `[len(vocab)]`. -1 means the phone is
+            removed.
+    """
+    if label_type == 'phone39':
+        return vocab.map_table(vocab_39)
+    return vocab.map_table(vocab_39,
+                           load_phone_map(label_type, map_file_path))
@@ -8,6 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 from os.path import join, isfile
+from collections import OrderedDict
 import sys
 import time
 import tensorflow as tf
@@ -20,29 +21,61 @@ from experiments.timit.data.load_dataset_ctc import Dataset
 from experiments.timit.metrics.ctc import do_eval_per, do_eval_cer
 from experiments.utils.directory import mkdir, mkdir_join
 from experiments.utils.parameter import count_total_parameters
-from experiments.utils.csv import save_loss, save_ler
-from experiments.utils.sparsetensor import list2sparsetensor
+from experiments.utils.distributed import Replica
+from experiments.utils.trainer import Trainer
+from experiments.utils.data.multi_gpu import make_tower_feed_dict
 from models.ctc.load_model import load
+from models.recurrent.cell import checkpoint_var_list
+from models.tower import get_devices
 
 
-def do_train(network, param):
+def do_train(network, param, replica=None):
     """Run training. If target labels are phone, the model is evaluated by PER
     with 39 phones.
     Args:
         network: network to train
         param: A dictionary of parameters
+        replica: An instance of `Replica` in distributed training. If None,
+            train in this process only
     """
+    # Synchronous data-parallel training with towers on num_gpu devices.
+    # Set device_type to cpu to run towers on virtual CPU devices.
+    num_gpu = param.get('num_gpu', 1)
+    device_type = param.get('device_type', 'gpu')
+
+    # Make mini-batches up to max_frame_num frames instead of batch_size
+    max_frame_num = None
+    if param['max_frame_num'] != 0:
+        max_frame_num = param['max_frame_num']
+
+    # Evaluate in mini-batches of utterances sorted by length up to this
+    # number of frames (see experiments/utils/data/eval_batch.py)
+    eval_max_frame_num = param.get('eval_max_frame_num')
+
     # Load dataset
     train_data = Dataset(data_type='train', label_type=param['label_type'],
                          batch_size=param['batch_size'],
                          num_stack=param['num_stack'],
                          num_skip=param['num_skip'],
-                         is_sorted=True)
+                         is_sorted=True,
+                         num_gpu=num_gpu,
+                         max_frame_num=max_frame_num)
     dev_data = Dataset(data_type='dev', label_type=param['label_type'],
                        batch_size=param['batch_size'],
                        num_stack=param['num_stack'],
                        num_skip=param['num_skip'],
-                       is_sorted=False)
+                       is_sorted=False,
+                       num_gpu=num_gpu)
+    if num_gpu == 1:
+        dev_data_eval = dev_data
+    else:
+        # Evaluation is done on the first tower without dividing
+        dev_data_eval = Dataset(data_type='dev',
+                                label_type=param['label_type'],
+                                batch_size=param['batch_size'],
+                                num_stack=param['num_stack'],
+                                num_skip=param['num_skip'],
+                                is_sorted=False)
     if param['label_type'] == 'character':
         test_data = Dataset(data_type='test', label_type='character',
                             batch_size=1,
@@ -56,54 +89,98 @@ def do_train(network, param):
                             num_skip=param['num_skip'],
                             is_sorted=False)
 
+    # Each worker trains on its own shard of the training data
+    if replica is None:
+        replica = Replica(param)
+    iter_per_epoch = replica.shard(train_data)
+
     # Tell TensorFlow that the model will be built into the default graph
-    with tf.Graph().as_default():
-
-        # Define placeholders
-        network.inputs = tf.placeholder(
-            tf.float32,
-            shape=[None, None, network.input_size],
-            name='input')
-        indices_pl = tf.placeholder(tf.int64, name='indices')
-        values_pl = tf.placeholder(tf.int32, name='values')
-        shape_pl = tf.placeholder(tf.int64, name='shape')
-        network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
-        network.inputs_seq_len = tf.placeholder(tf.int64,
-                                                shape=[None],
-                                                name='inputs_seq_len')
+    # (variables are placed on parameter servers in distributed training)
+    with tf.Graph().as_default(), tf.device(replica.device()):
+
+        # Define placeholders of each tower
+        tower_placeholders = []
+        for i_tower in range(num_gpu):
+            suffix = '' if num_gpu == 1 else str(i_tower)
+            tower_placeholders.append((
+                tf.placeholder(tf.float32,
+                               shape=[None, None, network.input_size],
+                               name='input' + suffix),
+                # NOTE: padded labels are converted into SparseTensor in the
+                # graph
+                tf.placeholder(tf.int32,
+                               shape=[None, None],
+                               name='labels' + suffix),
+                tf.placeholder(tf.int64,
+                               shape=[None],
+                               name='inputs_seq_len' + suffix)))
+        # The first tower is used for decoding and evaluation
+        network.inputs, network.labels, network.inputs_seq_len = \
+            tower_placeholders[0]
         network.keep_prob_input = tf.placeholder(tf.float32,
                                                  name='keep_prob_input')
         network.keep_prob_hidden = tf.placeholder(tf.float32,
                                                   name='keep_prob_hidden')
 
         # Add to the graph each operation (including model definition)
-        loss_op, logits = network.compute_loss(network.inputs,
-                                               network.labels,
-                                               network.inputs_seq_len,
-                                               network.keep_prob_input,
-                                               network.keep_prob_hidden)
-        train_op = network.train(
-            loss_op,
-            optimizer=param['optimizer'],
-            learning_rate_init=float(param['learning_rate']),
-            decay_steps=param['decay_steps'],
-            decay_rate=param['decay_rate'])
+        if num_gpu == 1:
+            loss_op, logits = network.compute_loss(network.inputs,
+                                                   network.labels,
+                                                   network.inputs_seq_len,
+                                                   network.keep_prob_input,
+                                                   network.keep_prob_hidden)
+            train_op = network.train(
+                loss_op,
+                optimizer=param['optimizer'],
+                learning_rate_init=float(param['learning_rate']),
+                decay_steps=param['decay_steps'],
+                decay_rate=param['decay_rate'],
+                num_replicas=replica.num_replicas,
+                accumulate_steps=param.get('accumulate_steps', 1))
+        else:
+            inputs_list, labels_list, inputs_seq_len_list = zip(
+                *tower_placeholders)
+            losses, logits_list = network.compute_tower_loss(
+                inputs_list,
+                labels_list,
+                inputs_seq_len_list,
+                network.keep_prob_input,
+                network.keep_prob_hidden,
+                devices=get_devices(num_gpu, device_type))
+            loss_op = tf.add_n(losses) / num_gpu
+            # The gradients of towers are averaged
+            train_op = network.train(
+                losses,
+                optimizer=param['optimizer'],
+                learning_rate_init=float(param['learning_rate']),
+                decay_steps=param['decay_steps'],
+                decay_rate=param['decay_rate'],
+                num_replicas=replica.num_replicas,
+                accumulate_steps=param.get('accumulate_steps', 1))
+            logits = logits_list[0]
+        # LER by greedy decoding is monitored during training
+        decode_op_greedy = network.decoder(logits,
+                                           network.inputs_seq_len,
+                                           decode_type='greedy')
+        ler_op_greedy = network.compute_ler(decode_op_greedy, network.labels)
+
+        # Build the summary tensor based on the TensorFlow collection of
+        # summaries (before beam search is added for evaluation)
+        summary_train = tf.summary.merge(network.summaries_train)
+        summary_dev = tf.summary.merge(network.summaries_dev)
+
         decode_op = network.decoder(logits,
                                     network.inputs_seq_len,
                                     decode_type='beam_search',
                                     beam_width=20)
         ler_op = network.compute_ler(decode_op, network.labels)
 
-        # Build the summary tensor based on the TensorFlow collection of
-        # summaries
-        summary_train = tf.summary.merge(network.summaries_train)
-        summary_dev = tf.summary.merge(network.summaries_dev)
-
         # Add the variable initializer operation
         init_op = tf.global_variables_initializer()
 
         # Create a saver for writing training checkpoints
-        saver = tf.train.Saver(max_to_keep=None)
+        saver = tf.train.Saver(var_list=checkpoint_var_list(),
+                               max_to_keep=None)
 
         # Count total parameters
         parameters_dict, total_parameters = count_total_parameters(
@@ -118,183 +195,154 @@ def do_train(network, param):
         mini_batch_train = train_data.next_batch()
         mini_batch_dev = dev_data.next_batch()
 
-        csv_steps, csv_loss_train, csv_loss_dev = [], [], []
-        csv_ler_train, csv_ler_dev = [], []
+        def next_feed_dict_train():
+            with tf.device('/cpu:0'):
+                inputs, labels, inputs_seq_len, _ = mini_batch_train.__next__()
+            feed_dict = make_tower_feed_dict(
+                tower_placeholders,
+                _split(num_gpu, inputs, labels, inputs_seq_len))
+            feed_dict[network.keep_prob_input] = network.dropout_ratio_input
+            feed_dict[network.keep_prob_hidden] = \
+                network.dropout_ratio_hidden
+            return feed_dict, train_data.next_epoch_flag
+
+        def next_feed_dict_dev():
+            with tf.device('/cpu:0'):
+                inputs, labels, inputs_seq_len, _ = mini_batch_dev.__next__()
+            feed_dict = make_tower_feed_dict(
+                tower_placeholders,
+                _split(num_gpu, inputs, labels, inputs_seq_len))
+            # Evaluation mode
+            feed_dict[network.keep_prob_input] = 1.0
+            feed_dict[network.keep_prob_hidden] = 1.0
+            return feed_dict
+
         # Create a session for running operation on the graph
-        with tf.Session() as sess:
+        config = tf.ConfigProto(allow_soft_placement=True)
+        if device_type == 'cpu':
+            config.device_count['CPU'] = num_gpu
+        with replica.session(init_op, network.sync_optimizer,
+                             config=config) as sess:
 
             # Instantiate a SummaryWriter to output summaries and the graph
             summary_writer = tf.summary.FileWriter(
                 network.model_dir, sess.graph)
 
-            # Initialize parameters
-            sess.run(init_op)
+            # Updated in epoch_end_fn
+            best = {'error': 1}
 
-            # Train model
-            iter_per_epoch = int(train_data.data_num / param['batch_size'])
-            train_step = train_data.data_num / param['batch_size']
-            if train_step != int(train_step):
-                iter_per_epoch += 1
-            max_steps = iter_per_epoch * param['num_epoch']
-            start_time_train = time.time()
-            start_time_epoch = time.time()
-            start_time_step = time.time()
-            error_best = 1
-            for step in range(max_steps):
-
-                # Create feed dictionary for next mini batch (train)
-                with tf.device('/cpu:0'):
-                    inputs, labels, inputs_seq_len, _ = mini_batch_train.__next__()
-                feed_dict_train = {
-                    network.inputs: inputs,
-                    network.labels: list2sparsetensor(labels, padded_value=-1),
-                    network.inputs_seq_len: inputs_seq_len,
-                    network.keep_prob_input: network.dropout_ratio_input,
-                    network.keep_prob_hidden: network.dropout_ratio_hidden
-                }
-
-                # Update parameters
-                sess.run(train_op, feed_dict=feed_dict_train)
-
-                if (step + 1) % 10 == 0:
-
-                    # Create feed dictionary for next mini batch (dev)
+            def epoch_end_fn(epoch):
+                # Only the chief saves and evaluates the model
+                if not replica.is_chief:
+                    return
+
+                # Save model (check point)
+                checkpoint_file = join(network.model_dir, 'model.ckpt')
+                save_path = saver.save(
+                    sess, checkpoint_file, global_step=epoch)
+                print("Model saved in file: %s" % save_path)
+
+                if epoch >= 10:
+                    start_time_eval = time.time()
                     with tf.device('/cpu:0'):
-                        inputs, labels, inputs_seq_len, _ = mini_batch_dev.__next__()
-                    feed_dict_dev = {
-                        network.inputs: inputs,
-                        network.labels: list2sparsetensor(labels,
-                                                          padded_value=-1),
-                        network.inputs_seq_len: inputs_seq_len,
-                        network.keep_prob_input: network.dropout_ratio_input,
-                        network.keep_prob_hidden: network.dropout_ratio_hidden
-                    }
-
-                    # Compute loss
-                    loss_train = sess.run(loss_op, feed_dict=feed_dict_train)
-                    loss_dev = sess.run(loss_op, feed_dict=feed_dict_dev)
-                    csv_steps.append(step)
-                    csv_loss_train.append(loss_train)
-                    csv_loss_dev.append(loss_dev)
-
-                    # Change to evaluation mode
-                    feed_dict_train[network.keep_prob_input] = 1.0
-                    feed_dict_train[network.keep_prob_hidden] = 1.0
-                    feed_dict_dev[network.keep_prob_input] = 1.0
-                    feed_dict_dev[network.keep_prob_hidden] = 1.0
-
-                    # Compute accuracy & update event file
-                    ler_train, summary_str_train = sess.run(
-                        [ler_op, summary_train], feed_dict=feed_dict_train)
-                    ler_dev, summary_str_dev = sess.run(
-                        [ler_op, summary_dev], feed_dict=feed_dict_dev)
-                    csv_ler_train.append(ler_train)
-                    csv_ler_dev.append(ler_dev)
-                    summary_writer.add_summary(summary_str_train, step + 1)
-                    summary_writer.add_summary(summary_str_dev, step + 1)
-                    summary_writer.flush()
-
-                    duration_step = time.time() - start_time_step
-                    print("Step %d: loss = %.3f (%.3f) / ler = %.4f (%.4f) (%.3f min)" %
-                          (step + 1, loss_train, loss_dev, ler_train,
-                           ler_dev, duration_step / 60))
-                    sys.stdout.flush()
-                    start_time_step = time.time()
-
-                # Save checkpoint and evaluate model per epoch
-                if (step + 1) % iter_per_epoch == 0 or (step + 1) == max_steps:
-                    duration_epoch = time.time() - start_time_epoch
-                    epoch = (step + 1) // iter_per_epoch
-                    print('-----EPOCH:%d (%.3f min)-----' %
-                          (epoch, duration_epoch / 60))
-
-                    # Save model (check point)
-                    checkpoint_file = join(network.model_dir, 'model.ckpt')
-                    save_path = saver.save(
-                        sess, checkpoint_file, global_step=epoch)
-                    print("Model saved in file: %s" % save_path)
-
-                    if epoch >= 10:
-                        start_time_eval = time.time()
-                        with tf.device('/cpu:0'):
-                            if param['label_type'] == 'character':
-                                print('=== Dev Data Evaluation ===')
-                                cer_dev_epoch = do_eval_cer(
+                        if param['label_type'] == 'character':
+                            print('=== Dev Data Evaluation ===')
+                            cer_dev_epoch = do_eval_cer(
+                                session=sess,
+                                decode_op=decode_op,
+                                network=network,
+                                dataset=dev_data_eval,
+                                max_frame_num=eval_max_frame_num)
+                            print('  CER: %f %%' % (cer_dev_epoch * 100))
+
+                            if cer_dev_epoch < best['error']:
+                                best['error'] = cer_dev_epoch
+                                print('■■■ ↑Best Score (CER)↑ ■■■')
+
+                                print('=== Test Data Evaluation ===')
+                                cer_test = do_eval_cer(
                                     session=sess,
                                     decode_op=decode_op,
                                     network=network,
-                                    dataset=dev_data,
-                                    eval_batch_size=1)
-                                print('  CER: %f %%' % (cer_dev_epoch * 100))
-
-                                if cer_dev_epoch < error_best:
-                                    error_best = cer_dev_epoch
-                                    print('■■■ ↑Best Score (CER)↑ ■■■')
-
-                                    print('=== Test Data Evaluation ===')
-                                    cer_test = do_eval_cer(
-                                        session=sess,
-                                        decode_op=decode_op,
-                                        network=network,
-                                        dataset=test_data,
-                                        eval_batch_size=1)
-                                    print('  CER: %f %%' % (cer_test * 100))
-
-                            else:
-                                print('=== Dev Data Evaluation ===')
-                                per_dev_epoch = do_eval_per(
+                                    dataset=test_data,
+                                    max_frame_num=eval_max_frame_num)
+                                print('  CER: %f %%' % (cer_test * 100))
+
+                        else:
+                            print('=== Dev Data Evaluation ===')
+                            per_dev_epoch = do_eval_per(
+                                session=sess,
+                                decode_op=decode_op,
+                                network=network,
+                                dataset=dev_data_eval,
+                                label_type=param['label_type'],
+                                max_frame_num=eval_max_frame_num)
+                            print('  PER: %f %%' % (per_dev_epoch * 100))
+
+                            if per_dev_epoch < best['error']:
+                                best['error'] = per_dev_epoch
+                                print('■■■ ↑Best Score (PER)↑ ■■■')
+
+                                print('=== Test Data Evaluation ===')
+                                per_test = do_eval_per(
                                     session=sess,
                                     decode_op=decode_op,
-                                    per_op=ler_op,
                                     network=network,
-                                    dataset=dev_data,
+                                    dataset=test_data,
                                     label_type=param['label_type'],
-                                    eval_batch_size=1)
-                                print('  PER: %f %%' % (per_dev_epoch * 100))
-
-                                if per_dev_epoch < error_best:
-                                    error_best = per_dev_epoch
-                                    print('■■■ ↑Best Score (PER)↑ ■■■')
-
-                                    print('=== Test Data Evaluation ===')
-                                    per_test = do_eval_per(
-                                        session=sess,
-                                        decode_op=decode_op,
-                                        per_op=ler_op,
-                                        network=network,
-                                        dataset=test_data,
-                                        label_type=param['label_type'],
-                                        eval_batch_size=1)
-                                    print('  PER: %f %%' % (per_test * 100))
-
-                        duration_eval = time.time() - start_time_eval
-                        print('Evaluation time: %.3f min' %
-                              (duration_eval / 60))
-
-                start_time_epoch = time.time()
-                start_time_step = time.time()
-
-            duration_train = time.time() - start_time_train
-            print('Total time: %.3f hour' % (duration_train / 3600))
+                                    max_frame_num=eval_max_frame_num)
+                                print('  PER: %f %%' % (per_test * 100))
+
+                    duration_eval = time.time() - start_time_eval
+                    print('Evaluation time: %.3f min' %
+                          (duration_eval / 60))
+
+            # Train model
+            trainer = Trainer(session=sess,
+                              train_op=train_op,
+                              loss_op=loss_op,
+                              metric_ops=OrderedDict([('ler', ler_op_greedy)]),
+                              summary_writer=summary_writer,
+                              summary_train=summary_train,
+                              summary_dev=summary_dev,
+                              apply_op=network.apply_op,
+                              accumulate_steps=param.get(
+                                  'accumulate_steps', 1))
+            trainer.run(num_epoch=param['num_epoch'],
+                        iter_per_epoch=iter_per_epoch,
+                        next_feed_dict_train=next_feed_dict_train,
+                        next_feed_dict_dev=next_feed_dict_dev,
+                        epoch_end_fn=epoch_end_fn)
 
             # Save train & dev loss, ler
-            save_loss(csv_steps, csv_loss_train, csv_loss_dev,
-                      save_path=network.model_dir)
-            save_ler(csv_steps, csv_ler_train, csv_ler_dev,
-                     save_path=network.model_dir)
+            trainer.save(save_path=network.model_dir)
 
             # Training was finished correctly
             with open(join(network.model_dir, 'complete.txt'), 'w') as f:
                 f.write('')
 
 
-def main(config_path):
+def _split(num_gpu, *batch):
+    """Return a mini-batch in the divided form of split_batch."""
+    if num_gpu == 1:
+        return tuple([item] for item in batch)
+    # Already divided by the dataset
+    return batch
+
+
+def main(config_path, job_name=None, task_index=0):
 
     # Load a config file (.yml)
     with open(config_path, "r") as f:
         config = yaml.load(f)
         param = config['param']
 
+    # Parameter servers only serve variables
+    replica = Replica(param, job_name, task_index)
+    if replica.job_name == 'ps':
+        replica.join()
+        return
+
     # Except for a blank class
     if param['label_type'] == 'phone61':
         param['num_classes'] = 61
@@ -305,6 +353,12 @@ def main(config_path):
     elif param['label_type'] == 'character':
         param['num_classes'] = 33
 
+    # Latency-controlled BLSTM (blstm_ctc only)
+    lc_param = {}
+    if param.get('lc_chunk_size', 0) != 0:
+        lc_param['lc_chunk_size'] = param['lc_chunk_size']
+        lc_param['lc_right_context'] = param.get('lc_right_context', 0)
+
     # Model setting
     CTCModel = load(model_type=param['model'])
     network = CTCModel(batch_size=param['batch_size'],
@@ -318,7 +372,9 @@ def main(config_path):
                        dropout_ratio_input=param['dropout_input'],
                        dropout_ratio_hidden=param['dropout_hidden'],
                        num_proj=param['num_proj'],
-                       weight_decay=param['weight_decay'])
+                       weight_decay=param['weight_decay'],
+                       cell_impl=param.get('cell_impl', 'standard'),
+                       **lc_param)
 
     network.model_name = param['model']
     network.model_name += '_' + str(param['num_unit'])
@@ -335,10 +391,24 @@ def main(config_path):
         network.model_name += '_stack' + str(param['num_stack'])
     if param['weight_decay'] != 0:
         network.model_name += '_weightdecay' + str(param['weight_decay'])
+    if param.get('cell_impl', 'standard') != 'standard':
+        network.model_name += '_' + param['cell_impl']
+    if param.get('num_gpu', 1) != 1:
+        network.model_name += '_gpu' + str(param['num_gpu'])
+    if len(lc_param) != 0:
+        network.model_name += '_lc' + str(lc_param['lc_chunk_size'])
+        network.model_name += '_' + str(lc_param['lc_right_context'])
     if param['decay_rate'] != 1:
         network.model_name += '_lrdecay' + \
             str(param['decay_steps'] + param['decay_rate'])
 
+    if param.get('accumulate_steps', 1) > 1:
+        network.model_name += '_accum' + str(param['accumulate_steps'])
+    network.model_name += replica.name
+    if not replica.is_chief:
+        # Workers except the chief save logs in their own directories
+        network.model_name += '_worker' + str(replica.task_index)
+
     # Set save path
     network.model_dir = mkdir('/n/sd8/inaguma/result/timit/')
     network.model_dir = mkdir_join(network.model_dir, 'ctc')
@@ -360,12 +430,21 @@ def main(config_path):
 
     sys.stdout = open(join(network.model_dir, 'train.log'), 'w')
     print(network.model_name)
-    do_train(network=network, param=param)
+    do_train(network=network, param=param, replica=replica)
 
 
 if __name__ == '__main__':
 
     args = sys.argv
-    if len(args) != 2:
-        raise ValueError
-    main(config_path=args[1])
+    if len(args) != 2 and len(args) != 4:
+        raise ValueError(
+            ("Set a config file (and the job name and task index in "
+             "distributed training).\n"
+             "Usase: python " + args[0] + " config_path "
+             "(job_name task_index)"))
+    if len(args) == 4:
+        # See experiments/utils/launch_cluster.py
+        main(config_path=args[1], job_name=args[2],
+             task_index=int(args[3]))
+    else:
+        main(config_path=args[1])
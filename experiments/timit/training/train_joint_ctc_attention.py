@@ -8,6 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 from os.path import join, isfile
+from collections import OrderedDict
 import sys
 import time
 import tensorflow as tf
@@ -18,11 +19,12 @@ import shutil
 sys.path.append('../../../')
 from experiments.timit.data.load_dataset_joint_ctc_attention import Dataset
 from experiments.timit.metrics.joint_ctc_attention import do_eval_per, do_eval_cer
-from experiments.utils.sparsetensor import list2sparsetensor
 from experiments.utils.directory import mkdir, mkdir_join
 from experiments.utils.parameter import count_total_parameters
-from experiments.utils.csv import save_loss, save_ler
+from experiments.utils.edit_distance import compute_error_rate
+from experiments.utils.trainer import Trainer
 from models.attention.joint_ctc_attention import JointCTCAttention
+from models.recurrent.cell import checkpoint_var_list
 
 
 def do_train(network, param):
@@ -32,6 +34,10 @@ def do_train(network, param):
         network: network to train
         param: A dictionary of parameters
     """
+    # Evaluate in mini-batches of utterances sorted by length up to this
+    # number of frames (see experiments/utils/data/eval_batch.py)
+    eval_max_frame_num = param.get('eval_max_frame_num')
+
     # Load dataset
     train_data = Dataset(data_type='train', label_type=param['label_type'],
                          batch_size=param['batch_size'],
@@ -58,26 +64,10 @@ def do_train(network, param):
         network.att_labels = tf.placeholder(tf.int32,
                                             shape=[None, None],
                                             name='att_labels')
-        indices_pl = tf.placeholder(tf.int64, name='ctc_indices')
-        values_pl = tf.placeholder(tf.int32, name='ctc_values')
-        shape_pl = tf.placeholder(tf.int64, name='ctc_shape')
-        network.ctc_labels = tf.SparseTensor(indices_pl,
-                                             values_pl,
-                                             shape_pl)
-
-        # These are prepared for computing LER
-        indices_true_pl = tf.placeholder(tf.int64, name='indices_true')
-        values_true_pl = tf.placeholder(tf.int32, name='values_true')
-        shape_true_pl = tf.placeholder(tf.int64, name='shape_true')
-        network.att_labels_true_st = tf.SparseTensor(indices_true_pl,
-                                                     values_true_pl,
-                                                     shape_true_pl)
-        indices_pred_pl = tf.placeholder(tf.int64, name='indices_pred')
-        values_pred_pl = tf.placeholder(tf.int32, name='values_pred')
-        shape_pred_pl = tf.placeholder(tf.int64, name='shape_pred')
-        network.att_labels_pred_st = tf.SparseTensor(indices_pred_pl,
-                                                     values_pred_pl,
-                                                     shape_pred_pl)
+        # NOTE: padded labels are converted into SparseTensor in the graph
+        network.ctc_labels = tf.placeholder(tf.int32,
+                                            shape=[None, None],
+                                            name='ctc_labels')
         network.inputs_seq_len = tf.placeholder(tf.int32,
                                                 shape=[None],
                                                 name='inputs_seq_len')
@@ -108,8 +98,6 @@ def do_train(network, param):
             decoder_outputs_infer,
             decode_type='greedy',
             beam_width=20)
-        ler_op = network.compute_ler(network.att_labels_true_st,
-                                     network.att_labels_pred_st)
 
         # Build the summary tensor based on the TensorFlow collection of
         # summaries
@@ -120,7 +108,8 @@ def do_train(network, param):
         init_op = tf.global_variables_initializer()
 
         # Create a saver for writing training checkpoints
-        saver = tf.train.Saver(max_to_keep=None)
+        saver = tf.train.Saver(var_list=checkpoint_var_list(),
+                               max_to_keep=None)
 
         # Count total param
         parameters_dict, total_parameters = count_total_parameters(
@@ -135,8 +124,39 @@ def do_train(network, param):
         mini_batch_train = train_data.next_batch()
         mini_batch_dev = dev_data.next_batch()
 
-        csv_steps, csv_loss_train, csv_loss_dev = [], [], []
-        csv_ler_train, csv_ler_dev = [], []
+        def next_feed_dict_train():
+            inputs, att_labels, ctc_labels, inputs_seq_len, att_labels_seq_len, _ = mini_batch_train.__next__()
+            return {
+                network.inputs: inputs,
+                network.att_labels: att_labels,
+                network.inputs_seq_len: inputs_seq_len,
+                network.att_labels_seq_len: att_labels_seq_len,
+                network.ctc_labels: ctc_labels,
+                network.keep_prob_input: network.dropout_ratio_input,
+                network.keep_prob_hidden: network.dropout_ratio_hidden,
+                network.lr: float(param['learning_rate'])
+            }, train_data.next_epoch_flag
+
+        def next_feed_dict_dev():
+            inputs, att_labels, ctc_labels, inputs_seq_len, att_labels_seq_len, _ = mini_batch_dev.__next__()
+            # Evaluation mode
+            return {
+                network.inputs: inputs,
+                network.att_labels: att_labels,
+                network.inputs_seq_len: inputs_seq_len,
+                network.att_labels_seq_len: att_labels_seq_len,
+                network.ctc_labels: ctc_labels,
+                network.keep_prob_input: 1.0,
+                network.keep_prob_hidden: 1.0
+            }
+
+        def ler_fn(values, feed_dict):
+            # LER of greedy predictions of the attention decoder
+            ler = compute_error_rate(feed_dict[network.att_labels],
+                                     values['predicted_ids'],
+                                     padded_value=param['eos_index']).mean()
+            return OrderedDict([('ler', ler)])
+
         # Create a session for running operation on the graph
         with tf.Session() as sess:
 
@@ -147,189 +167,91 @@ def do_train(network, param):
             # Initialize param
             sess.run(init_op)
 
-            # Train model
-            iter_per_epoch = int(train_data.data_num / param['batch_size'])
-            train_step = train_data.data_num / param['batch_size']
-            if train_step != int(train_step):
-                iter_per_epoch += 1
-            max_steps = iter_per_epoch * param['num_epoch']
-            start_time_train = time.time()
-            start_time_epoch = time.time()
-            start_time_step = time.time()
-            error_best = 1
-            for step in range(max_steps):
-
-                # Create feed dictionary for next mini batch (train)
-                inputs, att_labels_train, ctc_labels_st, inputs_seq_len, att_labels_seq_len, _ = mini_batch_train.__next__()
-                feed_dict_train = {
-                    network.inputs: inputs,
-                    network.att_labels: att_labels_train,
-                    network.inputs_seq_len: inputs_seq_len,
-                    network.att_labels_seq_len: att_labels_seq_len,
-                    network.ctc_labels: ctc_labels_st,
-                    network.keep_prob_input: network.dropout_ratio_input,
-                    network.keep_prob_hidden: network.dropout_ratio_hidden,
-                    network.lr: float(param['learning_rate'])
-                }
-
-                # Create feed dictionary for next mini batch (dev)
-                inputs, att_labels_dev, ctc_labels_st, inputs_seq_len, att_labels_seq_len, _ = mini_batch_dev.__next__()
-                feed_dict_dev = {
-                    network.inputs: inputs,
-                    network.att_labels: att_labels_dev,
-                    network.inputs_seq_len: inputs_seq_len,
-                    network.att_labels_seq_len: att_labels_seq_len,
-                    network.ctc_labels: ctc_labels_st,
-                    network.keep_prob_input: network.dropout_ratio_input,
-                    network.keep_prob_hidden: network.dropout_ratio_hidden
-                }
-
-                # Update param
-                sess.run(train_op, feed_dict=feed_dict_train)
-
-                if (step + 1) % 10 == 0:
-
-                    # Compute loss
-                    loss_train = sess.run(loss_op, feed_dict=feed_dict_train)
-                    loss_dev = sess.run(loss_op, feed_dict=feed_dict_dev)
-                    csv_steps.append(step)
-                    csv_loss_train.append(loss_train)
-                    csv_loss_dev.append(loss_dev)
-
-                    # Change to evaluation mode
-                    feed_dict_train[network.keep_prob_input] = 1.0
-                    feed_dict_train[network.keep_prob_hidden] = 1.0
-                    feed_dict_dev[network.keep_prob_input] = 1.0
-                    feed_dict_dev[network.keep_prob_hidden] = 1.0
-
-                    # Predict class ids &  update event file
-                    predicted_ids_train, summary_str_train = sess.run(
-                        [decode_op_infer, summary_train],
-                        feed_dict=feed_dict_train)
-                    predicted_ids_dev, summary_str_dev = sess.run(
-                        [decode_op_infer, summary_dev],
-                        feed_dict=feed_dict_dev)
-                    summary_writer.add_summary(summary_str_train, step + 1)
-                    summary_writer.add_summary(summary_str_dev, step + 1)
-                    summary_writer.flush()
-
-                    # Convert to sparsetensor to compute LER
-                    feed_dict_ler_train = {
-                        network.att_labels_true_st: list2sparsetensor(
-                            att_labels_train,
-                            padded_value=param['eos_index']),
-                        network.att_labels_pred_st: list2sparsetensor(
-                            predicted_ids_train,
-                            padded_value=param['eos_index'])
-                    }
-                    feed_dict_ler_dev = {
-                        network.att_labels_true_st: list2sparsetensor(
-                            att_labels_dev,
-                            padded_value=param['eos_index']),
-                        network.att_labels_pred_st: list2sparsetensor(
-                            predicted_ids_dev,
-                            padded_value=param['eos_index'])
-                    }
-
-                    # Compute accuracy
-                    ler_train = sess.run(
-                        ler_op, feed_dict=feed_dict_ler_train)
-                    ler_dev = sess.run(
-                        ler_op, feed_dict=feed_dict_ler_dev)
-                    csv_ler_train.append(ler_train)
-                    csv_ler_dev.append(ler_dev)
-
-                    duration_step = time.time() - start_time_step
-                    print("Step %d: loss = %.3f (%.3f) / ler = %.4f (%.4f) (%.3f min)" %
-                          (step + 1, loss_train, loss_dev, ler_train, ler_dev,
-                           duration_step / 60))
-                    sys.stdout.flush()
-                    start_time_step = time.time()
-
-                # Save checkpoint and evaluate model per epoch
-                if (step + 1) % iter_per_epoch == 0 or (step + 1) == max_steps:
-                    duration_epoch = time.time() - start_time_epoch
-                    epoch = (step + 1) // iter_per_epoch
-                    print('-----EPOCH:%d (%.3f min)-----' %
-                          (epoch, duration_epoch / 60))
-
-                    # Save model (check point)
-                    checkpoint_file = join(network.model_dir, 'model.ckpt')
-                    save_path = saver.save(
-                        sess, checkpoint_file, global_step=epoch)
-                    print("Model saved in file: %s" % save_path)
-
-                    if epoch >= 20:
-                        start_time_eval = time.time()
-                        if param['label_type'] == 'character':
-                            print('=== Dev Data Evaluation ===')
-                            cer_dev_epoch = do_eval_cer(
+            # Updated in epoch_end_fn
+            best = {'error': 1}
+
+            def epoch_end_fn(epoch):
+                # Save model (check point)
+                checkpoint_file = join(network.model_dir, 'model.ckpt')
+                save_path = saver.save(
+                    sess, checkpoint_file, global_step=epoch)
+                print("Model saved in file: %s" % save_path)
+
+                if epoch >= 20:
+                    start_time_eval = time.time()
+                    if param['label_type'] == 'character':
+                        print('=== Dev Data Evaluation ===')
+                        cer_dev_epoch = do_eval_cer(
+                            session=sess,
+                            decode_op=decode_op_infer,
+                            network=network,
+                            dataset=dev_data,
+                            max_frame_num=eval_max_frame_num)
+                        print('  CER: %f %%' % (cer_dev_epoch * 100))
+
+                        if cer_dev_epoch < best['error']:
+                            best['error'] = cer_dev_epoch
+                            print('■■■ ↑Best Score (CER)↑ ■■■')
+
+                            print('=== Test Data Evaluation ===')
+                            cer_test = do_eval_cer(
                                 session=sess,
                                 decode_op=decode_op_infer,
                                 network=network,
-                                dataset=dev_data,
-                                eval_batch_size=1)
-                            print('  CER: %f %%' % (cer_dev_epoch * 100))
-
-                            if cer_dev_epoch < error_best:
-                                error_best = cer_dev_epoch
-                                print('■■■ ↑Best Score (CER)↑ ■■■')
-
-                                print('=== Test Data Evaluation ===')
-                                cer_test = do_eval_cer(
-                                    session=sess,
-                                    decode_op=decode_op_infer,
-                                    network=network,
-                                    dataset=test_data,
-                                    eval_batch_size=1)
-                                print('  CER: %f %%' %
-                                      (cer_test * 100))
-
-                        else:
-                            print('=== Dev Data Evaluation ===')
-                            per_dev_epoch = do_eval_per(
+                                dataset=test_data,
+                                max_frame_num=eval_max_frame_num)
+                            print('  CER: %f %%' %
+                                  (cer_test * 100))
+
+                    else:
+                        print('=== Dev Data Evaluation ===')
+                        per_dev_epoch = do_eval_per(
+                            session=sess,
+                            decode_op=decode_op_infer,
+                            network=network,
+                            dataset=dev_data,
+                            label_type=param['label_type'],
+                            eos_index=param['eos_index'],
+                            max_frame_num=eval_max_frame_num)
+                        print('  PER: %f %%' % (per_dev_epoch * 100))
+
+                        if per_dev_epoch < best['error']:
+                            best['error'] = per_dev_epoch
+                            print('■■■ ↑Best Score (PER)↑ ■■■')
+
+                            print('=== Test Data Evaluation ===')
+                            per_test = do_eval_per(
                                 session=sess,
                                 decode_op=decode_op_infer,
-                                per_op=ler_op,
                                 network=network,
-                                dataset=dev_data,
+                                dataset=test_data,
                                 label_type=param['label_type'],
                                 eos_index=param['eos_index'],
-                                eval_batch_size=1)
-                            print('  PER: %f %%' % (per_dev_epoch * 100))
-
-                            if per_dev_epoch < error_best:
-                                error_best = per_dev_epoch
-                                print('■■■ ↑Best Score (PER)↑ ■■■')
-
-                                print('=== Test Data Evaluation ===')
-                                per_test = do_eval_per(
-                                    session=sess,
-                                    decode_op=decode_op_infer,
-                                    per_op=ler_op,
-                                    network=network,
-                                    dataset=test_data,
-                                    label_type=param['label_type'],
-                                    eos_index=param['eos_index'],
-                                    eval_batch_size=1)
-                                print('  PER: %f %%' %
-                                      (per_test * 100))
-
-                        duration_eval = time.time() - start_time_eval
-                        print('Evaluation time: %.3f min' %
-                              (duration_eval / 60))
-
-                start_time_epoch = time.time()
-                start_time_step = time.time()
-
-            duration_train = time.time() - start_time_train
-            print('Total time: %.3f hour' % (duration_train / 3600))
+                                max_frame_num=eval_max_frame_num)
+                            print('  PER: %f %%' %
+                                  (per_test * 100))
+
+                    duration_eval = time.time() - start_time_eval
+                    print('Evaluation time: %.3f min' %
+                          (duration_eval / 60))
+
+            # Train model
+            trainer = Trainer(session=sess,
+                              train_op=train_op,
+                              loss_op=loss_op,
+                              metric_ops=OrderedDict(
+                                  [('predicted_ids', decode_op_infer)]),
+                              metric_fn=ler_fn,
+                              summary_writer=summary_writer,
+                              summary_train=summary_train,
+                              summary_dev=summary_dev)
+            trainer.run(num_epoch=param['num_epoch'],
+                        next_feed_dict_train=next_feed_dict_train,
+                        next_feed_dict_dev=next_feed_dict_dev,
+                        epoch_end_fn=epoch_end_fn)
 
             # Save train & dev loss, ler
-            save_loss(csv_steps, csv_loss_train, csv_loss_dev,
-                      save_path=network.model_dir)
-            save_ler(csv_steps, csv_ler_train, csv_loss_dev,
-                     save_path=network.model_dir)
+            trainer.save(save_path=network.model_dir)
 
             # Training was finished correctly
             with open(join(network.model_dir, 'complete.txt'), 'w') as f:
@@ -391,7 +313,8 @@ def main(config_path):
         clip_activation_decoder=param['clip_activation_decoder'],
         dropout_ratio_input=param['dropout_input'],
         dropout_ratio_hidden=param['dropout_hidden'],
-        weight_decay=param['weight_decay'])
+        weight_decay=param['weight_decay'],
+        cell_impl=param.get('cell_impl', 'standard'))
 
     network.model_name = param['model']
     network.model_name += '_encoder' + str(param['encoder_num_unit'])
@@ -409,6 +332,8 @@ def main(config_path):
             str(param['attention_weights_tempareture'])
     if param['weight_decay'] != 0:
         network.model_name += '_weightdecay' + str(param['weight_decay'])
+    if param.get('cell_impl', 'standard') != 'standard':
+        network.model_name += '_' + param['cell_impl']
 
     # Set save path
     network.model_dir = mkdir('/n/sd8/inaguma/result/timit/')
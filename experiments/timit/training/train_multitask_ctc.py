@@ -8,6 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 from os.path import join, isfile
+from collections import OrderedDict
 import sys
 import time
 import tensorflow as tf
@@ -20,19 +21,26 @@ from experiments.timit.data.load_dataset_multitask_ctc import Dataset
 from experiments.timit.metrics.ctc import do_eval_per, do_eval_cer
 from experiments.utils.directory import mkdir, mkdir_join
 from experiments.utils.parameter import count_total_parameters
-from experiments.utils.csv import save_loss, save_ler
-from experiments.utils.sparsetensor import list2sparsetensor
+from experiments.utils.distributed import Replica
+from experiments.utils.trainer import Trainer
 from models.ctc.load_model_multitask import load
+from models.recurrent.cell import checkpoint_var_list
 
 
-def do_train(network, param):
+def do_train(network, param, replica=None):
     """Run multi-task training. The target labels in the main task is
     characters and those in the sub task is 61 phones. The model is
     evaluated by CER and PER with 39 phones.
     Args:
         network: network to train
         param: A dictionary of parameters
+        replica: An instance of `Replica` in distributed training. If None,
+            train in this process only
     """
+    # Evaluate in mini-batches of utterances sorted by length up to this
+    # number of frames (see experiments/utils/data/eval_batch.py)
+    eval_max_frame_num = param.get('eval_max_frame_num')
+
     # Load dataset
     train_data = Dataset(data_type='train',
                          label_type_main='character',
@@ -56,24 +64,27 @@ def do_train(network, param):
                         num_skip=param['num_skip'],
                         is_sorted=False)
 
+    # Each worker trains on its own shard of the training data
+    if replica is None:
+        replica = Replica(param)
+    iter_per_epoch = replica.shard(train_data)
+
     # Tell TensorFlow that the model will be built into the default graph
-    with tf.Graph().as_default():
+    # (variables are placed on parameter servers in distributed training)
+    with tf.Graph().as_default(), tf.device(replica.device()):
 
         # Define placeholders
         network.inputs = tf.placeholder(
             tf.float32,
             shape=[None, None, network.input_size],
             name='input')
-        indices_pl = tf.placeholder(tf.int64, name='indices')
-        values_pl = tf.placeholder(tf.int32, name='values')
-        shape_pl = tf.placeholder(tf.int64, name='shape')
-        network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
-        indices_sub_pl = tf.placeholder(tf.int64, name='indices_sub')
-        values_sub_pl = tf.placeholder(tf.int32, name='values_sub')
-        shape_sub_pl = tf.placeholder(tf.int64, name='shape_sub')
-        network.labels_sub = tf.SparseTensor(indices_sub_pl,
-                                             values_sub_pl,
-                                             shape_sub_pl)
+        # NOTE: padded labels are converted into SparseTensor in the graph
+        network.labels = tf.placeholder(tf.int32,
+                                        shape=[None, None],
+                                        name='labels')
+        network.labels_sub = tf.placeholder(tf.int32,
+                                            shape=[None, None],
+                                            name='labels_sub')
         network.inputs_seq_len = tf.placeholder(tf.int64,
                                                 shape=[None],
                                                 name='inputs_seq_len')
@@ -95,7 +106,24 @@ def do_train(network, param):
             optimizer=param['optimizer'],
             learning_rate_init=float(param['learning_rate']),
             decay_steps=param['decay_steps'],
-            decay_rate=param['decay_rate'])
+            decay_rate=param['decay_rate'],
+            num_replicas=replica.num_replicas,
+            accumulate_steps=param.get('accumulate_steps', 1))
+        # LER by greedy decoding is monitored during training
+        decode_op_main_greedy, decode_op_sub_greedy = network.decoder(
+            logits_main,
+            logits_sub,
+            network.inputs_seq_len,
+            decode_type='greedy')
+        ler_op_main_greedy, ler_op_sub_greedy = network.compute_ler(
+            decode_op_main_greedy, decode_op_sub_greedy,
+            network.labels, network.labels_sub)
+
+        # Build the summary tensor based on the TensorFlow collection of
+        # summaries (before beam search is added for evaluation)
+        summary_train = tf.summary.merge(network.summaries_train)
+        summary_dev = tf.summary.merge(network.summaries_dev)
+
         decode_op_main, decode_op_sub = network.decoder(
             logits_main,
             logits_sub,
@@ -106,16 +134,12 @@ def do_train(network, param):
             decode_op_main, decode_op_sub,
             network.labels, network.labels_sub)
 
-        # Build the summary tensor based on the TensorFlow collection of
-        # summaries
-        summary_train = tf.summary.merge(network.summaries_train)
-        summary_dev = tf.summary.merge(network.summaries_dev)
-
         # Add the variable initializer operation
         init_op = tf.global_variables_initializer()
 
         # Create a saver for writing training checkpoints
-        saver = tf.train.Saver(max_to_keep=None)
+        saver = tf.train.Saver(var_list=checkpoint_var_list(),
+                               max_to_keep=None)
 
         # Count total parameters
         parameters_dict, total_parameters = count_total_parameters(
@@ -126,192 +150,142 @@ def do_train(network, param):
               (len(parameters_dict.keys()),
                "{:,}".format(total_parameters / 1000000)))
 
-        csv_steps, csv_loss_train, csv_loss_dev = [], [], []
-        csv_cer_train, csv_cer_dev = [], []
-        csv_per_train, csv_per_dev = [], []
+        # Make mini-batch generator
+        mini_batch_train = train_data.next_batch()
+        mini_batch_dev = dev_data.next_batch()
+
+        def next_feed_dict_train():
+            with tf.device('/cpu:0'):
+                inputs, labels_char, labels_phone, inputs_seq_len, _ = mini_batch_train.__next__()
+            return {
+                network.inputs: inputs,
+                network.labels: labels_char,
+                network.labels_sub: labels_phone,
+                network.inputs_seq_len: inputs_seq_len,
+                network.keep_prob_input: network.dropout_ratio_input,
+                network.keep_prob_hidden: network.dropout_ratio_hidden
+            }, train_data.next_epoch_flag
+
+        def next_feed_dict_dev():
+            with tf.device('/cpu:0'):
+                inputs, labels_char, labels_phone, inputs_seq_len, _ = mini_batch_dev.__next__()
+            # Evaluation mode
+            return {
+                network.inputs: inputs,
+                network.labels: labels_char,
+                network.labels_sub: labels_phone,
+                network.inputs_seq_len: inputs_seq_len,
+                network.keep_prob_input: 1.0,
+                network.keep_prob_hidden: 1.0
+            }
+
         # Create a session for running operation on the graph
-        with tf.Session() as sess:
+        with replica.session(init_op,
+                             network.sync_optimizer) as sess:
 
             # Instantiate a SummaryWriter to output summaries and the graph
             summary_writer = tf.summary.FileWriter(
                 network.model_dir, sess.graph)
 
-            # Initialize parameters
-            sess.run(init_op)
-
-            # Make mini-batch generator
-            mini_batch_train = train_data.next_batch()
-            mini_batch_dev = dev_data.next_batch()
-
-            # Train model
-            iter_per_epoch = int(train_data.data_num / param['batch_size'])
-            train_step = train_data.data_num / param['batch_size']
-            if train_step != int(train_step):
-                iter_per_epoch += 1
-            max_steps = iter_per_epoch * param['num_epoch']
-            start_time_train = time.time()
-            start_time_epoch = time.time()
-            start_time_step = time.time()
-            cer_dev_best = 1
-            for step in range(max_steps):
-
-                # Create feed dictionary for next mini batch (train)
-                with tf.device('/cpu:0'):
-                    inputs, labels_char, labels_phone, inputs_seq_len, _ = mini_batch_train.__next__()
-                feed_dict_train = {
-                    network.inputs: inputs,
-                    network.labels: list2sparsetensor(labels_char,
-                                                      padded_value=-1),
-                    network.labels_sub: list2sparsetensor(labels_phone,
-                                                          padded_value=-1),
-                    network.inputs_seq_len: inputs_seq_len,
-                    network.keep_prob_input: network.dropout_ratio_input,
-                    network.keep_prob_hidden: network.dropout_ratio_hidden
-                }
-
-                # Update parameters
-                sess.run(train_op, feed_dict=feed_dict_train)
-
-                if (step + 1) % 10 == 0:
-
-                    # Create feed dictionary for next mini batch (dev)
-                    with tf.device('/cpu:0'):
-                        inputs, labels_char, labels_phone, inputs_seq_len, _ = mini_batch_dev.__next__()
-                    feed_dict_dev = {
-                        network.inputs: inputs,
-                        network.labels:  list2sparsetensor(labels_char,
-                                                           padded_value=-1),
-                        network.labels_sub: list2sparsetensor(labels_phone,
-                                                              padded_value=-1),
-                        network.inputs_seq_len: inputs_seq_len,
-                        network.keep_prob_input: network.dropout_ratio_input,
-                        network.keep_prob_hidden: network.dropout_ratio_hidden
-                    }
-
-                    # Compute loss
-                    loss_train = sess.run(loss_op, feed_dict=feed_dict_train)
-                    loss_dev = sess.run(loss_op, feed_dict=feed_dict_dev)
-                    csv_steps.append(step)
-                    csv_loss_train.append(loss_train)
-                    csv_loss_dev.append(loss_dev)
-
-                    # Change to evaluation mode
-                    feed_dict_train[network.keep_prob_input] = 1.0
-                    feed_dict_train[network.keep_prob_hidden] = 1.0
-                    feed_dict_dev[network.keep_prob_input] = 1.0
-                    feed_dict_dev[network.keep_prob_hidden] = 1.0
-
-                    # Compute accuracy & update event file
-                    cer_train, per_train, summary_str_train = sess.run(
-                        [ler_op_main, ler_op_sub, summary_train],
-                        feed_dict=feed_dict_train)
-                    cer_dev, per_dev, summary_str_dev = sess.run(
-                        [ler_op_main, ler_op_sub,  summary_dev],
-                        feed_dict=feed_dict_dev)
-                    csv_cer_train.append(cer_train)
-                    csv_cer_dev.append(cer_dev)
-                    csv_per_train.append(per_train)
-                    csv_per_dev.append(per_dev)
-                    summary_writer.add_summary(summary_str_train, step + 1)
-                    summary_writer.add_summary(summary_str_dev, step + 1)
-                    summary_writer.flush()
-
-                    duration_step = time.time() - start_time_step
-                    print("Step % d: loss = %.3f (%.3f) / cer = %.4f (%.4f) / per = % .4f (%.4f) (%.3f min)" %
-                          (step + 1, loss_train, loss_dev, cer_train, cer_dev,
-                           per_train, per_dev, duration_step / 60))
-                    sys.stdout.flush()
-                    start_time_step = time.time()
-
-                # Save checkpoint and evaluate model per epoch
-                if (step + 1) % iter_per_epoch == 0 or (step + 1) == max_steps:
-                    duration_epoch = time.time() - start_time_epoch
-                    epoch = (step + 1) // iter_per_epoch
-                    print('-----EPOCH:%d (%.3f min)-----' %
-                          (epoch, duration_epoch / 60))
-
-                    # Save model (check point)
-                    checkpoint_file = join(network.model_dir, 'model.ckpt')
-                    save_path = saver.save(
-                        sess, checkpoint_file, global_step=epoch)
-                    print("Model saved in file: %s" % save_path)
-
-                    if epoch >= 10:
-                        start_time_eval = time.time()
-                        print('=== Dev Data Evaluation ===')
-                        cer_dev_epoch = do_eval_cer(
+            # Updated in epoch_end_fn
+            best = {'error': 1}
+
+            def epoch_end_fn(epoch):
+                # Save model (check point)
+                checkpoint_file = join(network.model_dir, 'model.ckpt')
+                save_path = saver.save(
+                    sess, checkpoint_file, global_step=epoch)
+                print("Model saved in file: %s" % save_path)
+
+                # Only the chief evaluates the model
+                if epoch >= 10 and replica.is_chief:
+                    start_time_eval = time.time()
+                    print('=== Dev Data Evaluation ===')
+                    cer_dev_epoch = do_eval_cer(
+                        session=sess,
+                        decode_op=decode_op_main,
+                        network=network,
+                        dataset=dev_data,
+                        max_frame_num=eval_max_frame_num,
+                        is_multitask=True)
+                    print('  CER: %f %%' % (cer_dev_epoch * 100))
+                    per_dev_epoch = do_eval_per(
+                        session=sess,
+                        decode_op=decode_op_sub,
+                        network=network,
+                        dataset=dev_data,
+                        label_type=param['label_type_sub'],
+                        max_frame_num=eval_max_frame_num,
+                        is_multitask=True)
+                    print('  PER: %f %%' % (per_dev_epoch * 100))
+
+                    if cer_dev_epoch < best['error']:
+                        best['error'] = cer_dev_epoch
+                        print('■■■ ↑Best Score (CER)↑ ■■■')
+
+                        print('=== Test Data Evaluation ===')
+                        cer_test = do_eval_cer(
                             session=sess,
                             decode_op=decode_op_main,
                             network=network,
-                            dataset=dev_data,
-                            eval_batch_size=1,
+                            dataset=test_data,
+                            max_frame_num=eval_max_frame_num,
                             is_multitask=True)
-                        print('  CER: %f %%' % (cer_dev_epoch * 100))
-                        per_dev_epoch = do_eval_per(
+                        print('  CER: %f %%' % (cer_test * 100))
+                        per_test = do_eval_per(
                             session=sess,
                             decode_op=decode_op_sub,
-                            per_op=ler_op_sub,
                             network=network,
-                            dataset=dev_data,
+                            dataset=test_data,
                             label_type=param['label_type_sub'],
-                            eval_batch_size=1,
+                            max_frame_num=eval_max_frame_num,
                             is_multitask=True)
-                        print('  PER: %f %%' % (per_dev_epoch * 100))
-
-                        if cer_dev_epoch < cer_dev_best:
-                            cer_dev_best = cer_dev_epoch
-                            print('■■■ ↑Best Score (CER)↑ ■■■')
-
-                            print('=== Test Data Evaluation ===')
-                            cer_test = do_eval_cer(
-                                session=sess,
-                                decode_op=decode_op_main,
-                                network=network,
-                                dataset=test_data,
-                                eval_batch_size=1,
-                                is_multitask=True)
-                            print('  CER: %f %%' % (cer_test * 100))
-                            per_test = do_eval_per(
-                                session=sess,
-                                decode_op=decode_op_sub,
-                                per_op=ler_op_sub,
-                                network=network,
-                                dataset=test_data,
-                                label_type=param['label_type_sub'],
-                                eval_batch_size=1,
-                                is_multitask=True)
-                            print('  PER: %f %%' % (per_test * 100))
-
-                        duration_eval = time.time() - start_time_eval
-                        print('Evaluation time: %.3f min' %
-                              (duration_eval / 60))
-
-                        start_time_epoch = time.time()
-                        start_time_step = time.time()
-
-            duration_train = time.time() - start_time_train
-            print('Total time: %.3f hour' % (duration_train / 3600))
-
-            # Save train & dev loss, ler
-            save_loss(csv_steps, csv_loss_train, csv_loss_dev,
-                      save_path=network.model_dir)
-            save_ler(csv_steps, csv_cer_train, csv_cer_dev,
-                     save_path=network.model_dir)
-            save_ler(csv_steps, csv_per_train, csv_per_dev,
-                     save_path=network.model_dir)
+                        print('  PER: %f %%' % (per_test * 100))
+
+                    duration_eval = time.time() - start_time_eval
+                    print('Evaluation time: %.3f min' %
+                          (duration_eval / 60))
+
+            # Train model
+            trainer = Trainer(session=sess,
+                              train_op=train_op,
+                              loss_op=loss_op,
+                              metric_ops=OrderedDict(
+                                  [('cer', ler_op_main_greedy),
+                                   ('per', ler_op_sub_greedy)]),
+                              summary_writer=summary_writer,
+                              summary_train=summary_train,
+                              summary_dev=summary_dev,
+                              apply_op=network.apply_op,
+                              accumulate_steps=param.get(
+                                  'accumulate_steps', 1))
+            trainer.run(num_epoch=param['num_epoch'],
+                        iter_per_epoch=iter_per_epoch,
+                        next_feed_dict_train=next_feed_dict_train,
+                        next_feed_dict_dev=next_feed_dict_dev,
+                        epoch_end_fn=epoch_end_fn)
+
+            # Save train & dev loss, cer, per
+            trainer.save(save_path=network.model_dir)
 
             # Training was finished correctly
             with open(join(network.model_dir, 'complete.txt'), 'w') as f:
                 f.write('')
 
 
-def main(config_path):
+def main(config_path, job_name=None, task_index=0):
 
     # Load a config file (.yml)
     with open(config_path, "r") as f:
         config = yaml.load(f)
         param = config['param']
 
+    # Parameter servers only serve variables
+    replica = Replica(param, job_name, task_index)
+    if replica.job_name == 'ps':
+        replica.join()
+        return
+
     if param['label_type_sub'] == 'phone61':
         param['num_classes_sub'] = 61
     elif param['label_type_sub'] == 'phone48':
@@ -335,7 +309,8 @@ def main(config_path):
                        dropout_ratio_input=param['dropout_input'],
                        dropout_ratio_hidden=param['dropout_hidden'],
                        num_proj=param['num_proj'],
-                       weight_decay=param['weight_decay'])
+                       weight_decay=param['weight_decay'],
+                       cell_impl=param.get('cell_impl', 'standard'))
 
     network.model_name = param['model']
     network.model_name += '_' + str(param['num_unit'])
@@ -353,11 +328,20 @@ def main(config_path):
         network.model_name += '_stack' + str(param['num_stack'])
     if param['weight_decay'] != 0:
         network.model_name += '_weightdecay' + str(param['weight_decay'])
+    if param.get('cell_impl', 'standard') != 'standard':
+        network.model_name += '_' + param['cell_impl']
     network.model_name += '_taskweight' + str(param['main_task_weight'])
     if param['decay_rate'] != 1:
         network.model_name += '_lrdecay' + \
             str(param['decay_steps'] + param['decay_rate'])
 
+    if param.get('accumulate_steps', 1) > 1:
+        network.model_name += '_accum' + str(param['accumulate_steps'])
+    network.model_name += replica.name
+    if not replica.is_chief:
+        # Workers except the chief save logs in their own directories
+        network.model_name += '_worker' + str(replica.task_index)
+
     # Set save path
     network.model_dir = mkdir('/n/sd8/inaguma/result/timit/')
     network.model_dir = mkdir_join(network.model_dir, 'ctc')
@@ -380,12 +364,21 @@ def main(config_path):
 
     sys.stdout = open(join(network.model_dir, 'train.log'), 'w')
     print(network.model_name)
-    do_train(network=network, param=param)
+    do_train(network=network, param=param, replica=replica)
 
 
 if __name__ == '__main__':
 
     args = sys.argv
-    if len(args) != 2:
-        raise ValueError
-    main(config_path=args[1])
+    if len(args) != 2 and len(args) != 4:
+        raise ValueError(
+            ("Set a config file (and the job name and task index in "
+             "distributed training).\n"
+             "Usase: python " + args[0] + " config_path "
+             "(job_name task_index)"))
+    if len(args) == 4:
+        # See experiments/utils/launch_cluster.py
+        main(config_path=args[1], job_name=args[2],
+             task_index=int(args[3]))
+    else:
+        main(config_path=args[1])
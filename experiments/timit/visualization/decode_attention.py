@@ -16,6 +16,8 @@ sys.path.append('../../../')
 from experiments.timit.data.load_dataset_attention import Dataset
 from experiments.visualization.util_decode_attention import decode_test
 from models.attention import blstm_attention_seq2seq
+from models.checkpoint import restore_checkpoint
+from models.frozen_graph import FrozenGraph
 
 
 def do_decode(network, param, epoch=None):
@@ -63,9 +65,6 @@ def do_decode(network, param, epoch=None):
         decode_type='greedy',
         beam_width=20)
 
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
-
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
 
@@ -76,7 +75,7 @@ def do_decode(network, param, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
-            saver.restore(sess, model_path)
+            restore_checkpoint(sess, model_path)
             print("Model restored: " + model_path)
         else:
             raise ValueError('There are not any checkpoints.')
@@ -90,8 +89,36 @@ def do_decode(network, param, epoch=None):
                     save_path=None)
 
 
+def do_decode_frozen(network, param):
+    """Decode the Attention outputs of the model exported by
+       export_attention.py.
+    Args:
+        network: An instance of `FrozenGraph`
+        param: A dictionary of parameters
+    """
+    # Load dataset
+    test_data = Dataset(data_type='test', label_type=param['label_type'],
+                        batch_size=1,
+                        eos_index=param['eos_index'],
+                        is_sorted=False, is_progressbar=True)
+
+    # Visualize
+    decode_test(session=network.session,
+                decode_op=network.decode_op,
+                network=network,
+                dataset=test_data,
+                label_type=param['label_type'],
+                save_path=None)
+
+
 def main(model_path, epoch):
 
+    # A frozen graph exported by export_attention.py
+    graph_path = None
+    if model_path.endswith('.pb'):
+        graph_path = model_path
+        model_path = os.path.dirname(graph_path)
+
     # Load config file
     with open(os.path.join(model_path, 'config.yml'), "r") as f:
         config = yaml.load(f)
@@ -114,6 +141,12 @@ def main(model_path, epoch):
         param['sos_index'] = 1
         param['eos_index'] = 2
 
+    if graph_path is not None:
+        network = FrozenGraph(graph_path, model_dir=model_path)
+        print(graph_path)
+        do_decode_frozen(network=network, param=param)
+        return
+
     # Model setting
     # AttentionModel = load(model_type=param['model'])
     network = blstm_attention_seq2seq.BLSTMAttetion(
@@ -139,7 +172,8 @@ def main(model_path, epoch):
         clip_activation_decoder=param['clip_activation_decoder'],
         dropout_ratio_input=param['dropout_input'],
         dropout_ratio_hidden=param['dropout_hidden'],
-        weight_decay=param['weight_decay'])
+        weight_decay=param['weight_decay'],
+        cell_impl=param.get('cell_impl', 'standard'))
 
     network.model_dir = model_path
     print(network.model_dir)
@@ -158,5 +192,6 @@ if __name__ == '__main__':
     else:
         raise ValueError(
             ("Set a path to saved model.\n"
-             "Usase: python decode_attention.py path_to_saved_model (epoch)"))
+             "Usase: python decode_attention.py path_to_saved_model (epoch)\n"
+             "       python decode_attention.py path_to_frozen_graph.pb"))
     main(model_path=model_path, epoch=epoch)
@@ -15,7 +15,9 @@ import yaml
 sys.path.append('../../../')
 from experiments.timit.data.load_dataset_ctc import Dataset
 from experiments.timit.visualization.util_decode_ctc import decode_test
+from models.checkpoint import restore_checkpoint
 from models.ctc.load_model import load
+from models.frozen_graph import FrozenGraph
 
 
 def do_decode(network, param, epoch=None):
@@ -37,10 +39,9 @@ def do_decode(network, param, epoch=None):
         tf.float32,
         shape=[None, None, network.input_size],
         name='input')
-    indices_pl = tf.placeholder(tf.int64, name='indices')
-    values_pl = tf.placeholder(tf.int32, name='values')
-    shape_pl = tf.placeholder(tf.int64, name='shape')
-    network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+    network.labels = tf.placeholder(tf.int32,
+                                    shape=[None, None],
+                                    name='labels')
     network.inputs_seq_len = tf.placeholder(tf.int64,
                                             shape=[None],
                                             name='inputs_seq_len')
@@ -60,9 +61,6 @@ def do_decode(network, param, epoch=None):
                                 decode_type='beam_search',
                                 beam_width=20)
 
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
-
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
 
@@ -73,7 +71,7 @@ def do_decode(network, param, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
-            saver.restore(sess, model_path)
+            restore_checkpoint(sess, model_path)
             print("Model restored: " + model_path)
         else:
             raise ValueError('There are not any checkpoints.')
@@ -87,8 +85,36 @@ def do_decode(network, param, epoch=None):
                     save_path=network.model_dir)
 
 
+def do_decode_frozen(network, param):
+    """Decode the CTC outputs of the model exported by export_ctc.py.
+    Args:
+        network: An instance of `FrozenGraph`
+        param: A dictionary of parameters
+    """
+    # Load dataset
+    test_data = Dataset(data_type='test', label_type=param['label_type'],
+                        batch_size=1,
+                        num_stack=param['num_stack'],
+                        num_skip=param['num_skip'],
+                        is_sorted=False, is_progressbar=True)
+
+    # Visualize
+    decode_test(session=network.session,
+                decode_op=network.decode_op,
+                network=network,
+                dataset=test_data,
+                label_type=param['label_type'],
+                save_path=network.model_dir)
+
+
 def main(model_path, epoch):
 
+    # A frozen graph exported by export_ctc.py
+    graph_path = None
+    if model_path.endswith('.pb'):
+        graph_path = model_path
+        model_path = os.path.dirname(graph_path)
+
     # Load config file
     with open(os.path.join(model_path, 'config.yml'), "r") as f:
         config = yaml.load(f)
@@ -104,6 +130,12 @@ def main(model_path, epoch):
     elif param['label_type'] == 'character':
         param['num_classes'] = 33
 
+    if graph_path is not None:
+        network = FrozenGraph(graph_path, model_dir=model_path)
+        print(graph_path)
+        do_decode_frozen(network=network, param=param)
+        return
+
     # Model setting
     CTCModel = load(model_type=param['model'])
     network = CTCModel(
@@ -118,7 +150,8 @@ def main(model_path, epoch):
         dropout_ratio_input=param['dropout_input'],
         dropout_ratio_hidden=param['dropout_hidden'],
         num_proj=param['num_proj'],
-        weight_decay=param['weight_decay'])
+        weight_decay=param['weight_decay'],
+        cell_impl=param.get('cell_impl', 'standard'))
 
     network.model_dir = model_path
     print(network.model_dir)
@@ -137,5 +170,6 @@ if __name__ == '__main__':
     else:
         raise ValueError(
             ("Set a path to saved model.\n"
-             "Usase: python decode_ctc.py path_to_saved_model"))
+             "Usase: python decode_ctc.py path_to_saved_model\n"
+             "       python decode_ctc.py path_to_frozen_graph.pb"))
     main(model_path=model_path, epoch=epoch)
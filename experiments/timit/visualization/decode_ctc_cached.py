@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Decode the CTC outputs in the posterior cache (TIMIT corpus) without
+   TensorFlow. Dump them by eval_ctc.py --dump (or eval_multitask_ctc.py
+   --dump) first.
+
+   Usage:
+       python decode_ctc_cached.py path_to_saved_model \
+           [epoch=N] [beam_width=N]
+   beam_width of 0 means greedy decoding.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import yaml
+
+sys.path.append('../../../')
+from experiments.timit.visualization.util_decode_ctc import decode_cached
+from experiments.utils.data.posterior_cache import PosteriorCache
+from experiments.utils.data.posterior_cache import cache_path
+from experiments.utils.data.posterior_cache import checkpoint_name
+
+
+def do_decode(model_path, param, epoch=None, beam_width=20):
+    """Decode the cached log posteriors.
+    Args:
+        model_path: path to the saved model
+        param: A dictionary of parameters
+        epoch: int, the epoch of the checkpoint
+        beam_width: int, beam width for beam search. 0 means greedy decoding.
+    """
+    checkpoint = checkpoint_name(model_path, epoch)
+    print(checkpoint)
+    if beam_width == 0:
+        beam_width = None
+
+    if 'label_type_sub' in param:
+        print('===== character =====')
+        cache_main = PosteriorCache(
+            cache_path(model_path, checkpoint, 'test', task='main'))
+        decode_cached(cache_main, label_type='character',
+                      beam_width=beam_width)
+        print('\n===== phone =====')
+        cache_sub = PosteriorCache(
+            cache_path(model_path, checkpoint, 'test', task='sub'))
+        decode_cached(cache_sub, label_type=param['label_type_sub'],
+                      beam_width=beam_width)
+    else:
+        cache = PosteriorCache(cache_path(model_path, checkpoint, 'test'))
+        decode_cached(cache, label_type=param['label_type'],
+                      beam_width=beam_width)
+
+
+def main(model_path, epoch=None, beam_width=20):
+
+    # Load config file
+    with open(os.path.join(model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        param = config['param']
+
+    do_decode(model_path=model_path, param=param, epoch=epoch,
+              beam_width=beam_width)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) < 2:
+        raise ValueError(
+            ("Set a path to saved model.\n"
+             "Usase: python decode_ctc_cached.py path_to_saved_model "
+             "[epoch=N] [beam_width=N]"))
+    options = dict(arg.split('=', 1) for arg in args[2:])
+    main(model_path=args[1],
+         epoch=options.get('epoch'),
+         beam_width=int(options.get('beam_width', 20)))
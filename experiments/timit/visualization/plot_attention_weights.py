@@ -16,6 +16,7 @@ sys.path.append('../../../')
 from experiments.timit.data.load_dataset_attention import Dataset
 from experiments.timit.visualization.util_plot_attention import attention_test
 from models.attention import blstm_attention_seq2seq
+from models.checkpoint import restore_checkpoint
 
 
 def do_plot(network, param, epoch=None):
@@ -64,9 +65,6 @@ def do_plot(network, param, epoch=None):
         beam_width=20)
     attention_weights_op = decoder_outputs_infer.attention_scores
 
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
-
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
 
@@ -77,7 +75,7 @@ def do_plot(network, param, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
-            saver.restore(sess, model_path)
+            restore_checkpoint(sess, model_path)
             print("Model restored: " + model_path)
         else:
             raise ValueError('There are not any checkpoints.')
@@ -142,7 +140,8 @@ def main(model_path, epoch):
         clip_activation_decoder=param['clip_activation_decoder'],
         dropout_ratio_input=param['dropout_input'],
         dropout_ratio_hidden=param['dropout_hidden'],
-        weight_decay=param['weight_decay'])
+        weight_decay=param['weight_decay'],
+        cell_impl=param.get('cell_impl', 'standard'))
 
     network.model_dir = model_path
     print(network.model_dir)
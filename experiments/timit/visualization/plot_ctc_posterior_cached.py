@@ -0,0 +1,74 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Plot the CTC posteriors in the posterior cache (TIMIT corpus) without
+   TensorFlow. Dump them by eval_ctc.py --dump (or eval_multitask_ctc.py
+   --dump) first.
+
+   Usage:
+       python plot_ctc_posterior_cached.py path_to_saved_model [epoch=N]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import yaml
+
+sys.path.append('../../../')
+from experiments.timit.visualization.util_plot_ctc import posterior_cached
+from experiments.timit.visualization.util_plot_ctc import posterior_cached_multitask
+from experiments.utils.data.posterior_cache import PosteriorCache
+from experiments.utils.data.posterior_cache import cache_path
+from experiments.utils.data.posterior_cache import checkpoint_name
+
+
+def do_plot(model_path, param, epoch=None):
+    """Plot the cached CTC posteriors.
+    Args:
+        model_path: path to the saved model
+        param: A dictionary of parameters
+        epoch: int, the epoch of the checkpoint
+    """
+    checkpoint = checkpoint_name(model_path, epoch)
+    print(checkpoint)
+
+    if 'label_type_sub' in param:
+        cache_main = PosteriorCache(
+            cache_path(model_path, checkpoint, 'test', task='main'))
+        cache_sub = PosteriorCache(
+            cache_path(model_path, checkpoint, 'test', task='sub'))
+        posterior_cached_multitask(cache_main, cache_sub,
+                                   label_type_second=param['label_type_sub'],
+                                   save_path=model_path,
+                                   show=False)
+    else:
+        cache = PosteriorCache(cache_path(model_path, checkpoint, 'test'))
+        posterior_cached(cache,
+                         label_type=param['label_type'],
+                         save_path=model_path,
+                         show=True)
+
+
+def main(model_path, epoch=None):
+
+    # Load config file
+    with open(os.path.join(model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        param = config['param']
+
+    do_plot(model_path=model_path, param=param, epoch=epoch)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) < 2:
+        raise ValueError(
+            ("Set a path to saved model.\n"
+             "Usase: python plot_ctc_posterior_cached.py path_to_saved_model "
+             "[epoch=N]"))
+    options = dict(arg.split('=', 1) for arg in args[2:])
+    main(model_path=args[1], epoch=options.get('epoch'))
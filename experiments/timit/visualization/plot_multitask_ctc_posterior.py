@@ -15,6 +15,7 @@ import yaml
 sys.path.append('../../../')
 from experiments.timit.data.load_dataset_multitask_ctc import Dataset
 from experiments.timit.visualization.util_plot_ctc import posterior_test_multitask
+from models.checkpoint import restore_checkpoint
 from models.ctc.load_model_multitask import load
 
 
@@ -39,16 +40,12 @@ def do_plot(network, param, epoch=None):
         tf.float32,
         shape=[None, None, network.input_size],
         name='input')
-    indices_pl = tf.placeholder(tf.int64, name='indices')
-    values_pl = tf.placeholder(tf.int32, name='values')
-    shape_pl = tf.placeholder(tf.int64, name='shape')
-    network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
-    indices_sub_pl = tf.placeholder(tf.int64, name='indices_sub')
-    values_sub_pl = tf.placeholder(tf.int32, name='values_sub')
-    shape_sub_pl = tf.placeholder(tf.int64, name='shape_sub')
-    network.labels_sub = tf.SparseTensor(indices_sub_pl,
-                                         values_sub_pl,
-                                         shape_sub_pl)
+    network.labels = tf.placeholder(tf.int32,
+                                    shape=[None, None],
+                                    name='labels')
+    network.labels_sub = tf.placeholder(tf.int32,
+                                        shape=[None, None],
+                                        name='labels_sub')
     network.inputs_seq_len = tf.placeholder(tf.int64,
                                             shape=[None],
                                             name='inputs_seq_len')
@@ -68,9 +65,6 @@ def do_plot(network, param, epoch=None):
     posteriors_op_main, posteriors_op_sub = network.posteriors(
         logits_main, logits_sub)
 
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
-
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
 
@@ -81,7 +75,7 @@ def do_plot(network, param, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
-            saver.restore(sess, model_path)
+            restore_checkpoint(sess, model_path)
             print("Model restored: " + model_path)
         else:
             raise ValueError('There are not any checkpoints.')
@@ -128,7 +122,8 @@ def main(model_path, epoch):
         dropout_ratio_input=param['dropout_input'],
         dropout_ratio_hidden=param['dropout_hidden'],
         num_proj=param['num_proj'],
-        weight_decay=param['weight_decay'])
+        weight_decay=param['weight_decay'],
+        cell_impl=param.get('cell_impl', 'standard'))
 
     network.model_dir = model_path
     print(network.model_dir)
@@ -7,8 +7,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-from experiments.utils.labels.character import num2char
-from experiments.utils.labels.phone import num2phone
+from experiments.utils.labels.vocabulary import load_vocabulary
 
 
 def decode_test(session, decode_op, network, dataset, label_type,
@@ -33,6 +32,7 @@ def decode_test(session, decode_op, network, dataset, label_type,
     else:
         map_file_path = '../metrics/mapping_files/attention/phone2num_' + \
             label_type[5:7] + '.txt'
+    vocab = load_vocabulary(map_file_path)
 
     # if save_path is not None:
     #     sys.stdout = open(join(network.model_dir, 'decode.txt'), 'w')
@@ -54,15 +54,14 @@ def decode_test(session, decode_op, network, dataset, label_type,
 
         if label_type == 'character':
             print('----- wav: %s -----' % input_names[0])
-            print('True: %s' % num2char(
-                labels_true[0][1:-1], map_file_path))
-            print('Pred: %s' % num2char(
-                labels_pred[0], map_file_path).replace('>', ''))
+            print('True: %s' % vocab.decode(labels_true[0][1:-1]))
+            print('Pred: %s' % vocab.decode(
+                labels_pred[0]).replace('>', ''))
 
         else:
             print('----- wav: %s -----' % input_names[0])
-            print('True: %s' % num2phone(
-                labels_true[0][1:-1], map_file_path))
+            print('True: %s' % vocab.decode(
+                labels_true[0][1:-1], delimiter=' '))
 
-            print('Pred: %s' % num2phone(
-                labels_pred[0], map_file_path).replace('>', ''))
+            print('Pred: %s' % vocab.decode(
+                labels_pred[0], delimiter=' ').replace('>', ''))
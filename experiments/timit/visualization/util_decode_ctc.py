@@ -10,8 +10,7 @@ from __future__ import print_function
 from os.path import join
 import sys
 
-from experiments.utils.labels.character import num2char
-from experiments.utils.labels.phone import num2phone
+from experiments.utils.labels.vocabulary import load_vocabulary
 from experiments.utils.sparsetensor import sparsetensor2list
 
 
@@ -37,13 +36,14 @@ def decode_test(session, decode_op, network, dataset, label_type,
     else:
         map_file_path = '../metrics/mapping_files/ctc/phone2num_' + \
             label_type[5:7] + '.txt'
+    vocab = load_vocabulary(map_file_path)
 
     if save_path is not None:
         sys.stdout = open(join(network.model_dir, 'decode.txt'), 'w')
 
     for step in range(iteration):
         # Create feed dictionary for next mini batch
-        inputs, labels_true_st, inputs_seq_len, input_names = mini_batch.__next__()
+        inputs, labels_true, inputs_seq_len, input_names = mini_batch.__next__()
 
         feed_dict = {
             network.inputs: inputs,
@@ -54,23 +54,18 @@ def decode_test(session, decode_op, network, dataset, label_type,
 
         # Visualize
         labels_pred_st = session.run(decode_op, feed_dict=feed_dict)
-        labels_true = sparsetensor2list(labels_true_st, batch_size=1)
         labels_pred = sparsetensor2list(labels_pred_st, batch_size=1)
 
         if label_type == 'character':
             print('----- wav: %s -----' % input_names[0])
-            print('True: %s' % num2char(
-                labels_true[0], map_file_path))
-            print('Pred: %s' % num2char(
-                labels_pred[0], map_file_path))
+            print('True: %s' % vocab.decode(labels_true[0]))
+            print('Pred: %s' % vocab.decode(labels_pred[0]))
 
         else:
             print('----- wav: %s -----' % input_names[0])
-            print('True: %s' % num2phone(
-                labels_true[0], map_file_path))
+            print('True: %s' % vocab.decode(labels_true[0], delimiter=' '))
 
-            print('Pred: %s' % num2phone(
-                labels_pred[0], map_file_path))
+            print('Pred: %s' % vocab.decode(labels_pred[0], delimiter=' '))
 
 
 def decode_test_multitask(session, decode_op_main, decode_op_second, network,
@@ -97,9 +92,10 @@ def decode_test_multitask(session, decode_op_main, decode_op_second, network,
     # Decode character
     print('===== character =====')
     map_file_path = '../metrics/mapping_files/ctc/char2num.txt'
+    vocab = load_vocabulary(map_file_path)
     for step in range(iteration):
         # Create feed dictionary for next mini batch
-        inputs, labels_true_st, _, inputs_seq_len, input_names = mini_batch.__next__()
+        inputs, labels_true, _, inputs_seq_len, input_names = mini_batch.__next__()
 
         feed_dict = {
             network.inputs: inputs,
@@ -110,22 +106,20 @@ def decode_test_multitask(session, decode_op_main, decode_op_second, network,
 
         # Visualize
         labels_pred_st = session.run(decode_op_main, feed_dict=feed_dict)
-        labels_true = sparsetensor2list(labels_true_st, batch_size=1)
         labels_pred = sparsetensor2list(labels_pred_st, batch_size=1)
 
         print('----- wav: %s -----' % input_names[0])
-        print('True: %s' % num2char(
-            labels_true[0], map_file_path))
-        print('Pred: %s' % num2char(
-            labels_pred[0], map_file_path))
+        print('True: %s' % vocab.decode(labels_true[0]))
+        print('Pred: %s' % vocab.decode(labels_pred[0]))
 
     # Decode phone
     print('\n===== phone =====')
     map_file_path = '../metrics/mapping_files/ctc/phone2num_' + \
         label_type_second[5:7] + '.txt'
+    vocab = load_vocabulary(map_file_path)
     for step in range(iteration):
         # Create feed dictionary for next mini batch
-        inputs, _, labels_true_st, inputs_seq_len, input_names = mini_batch.__next__()
+        inputs, _, labels_true, inputs_seq_len, input_names = mini_batch.__next__()
 
         feed_dict = {
             network.inputs: inputs,
@@ -136,12 +130,45 @@ def decode_test_multitask(session, decode_op_main, decode_op_second, network,
 
         # Visualize
         labels_pred_st = session.run(decode_op_second, feed_dict=feed_dict)
-        labels_true = sparsetensor2list(labels_true_st, batch_size=1)
         labels_pred = sparsetensor2list(labels_pred_st, batch_size=1)
 
         print('----- wav: %s -----' % input_names[0])
-        print('True: %s' % num2phone(
-            labels_true[0], map_file_path))
+        print('True: %s' % vocab.decode(labels_true[0], delimiter=' '))
 
-        print('Pred: %s' % num2phone(
-            labels_pred[0], map_file_path))
+        print('Pred: %s' % vocab.decode(labels_pred[0], delimiter=' '))
+
+
+def decode_cached(cache, label_type, beam_width=None, save_path=None):
+    """Visualize label outputs of CTC model from the posterior cache without
+       TensorFlow (see experiments/utils/data/posterior_cache.py).
+    Args:
+        cache: An instance of `PosteriorCache`
+        label_type: string, phone39 or phone48 or phone61 or character (the
+            label type the model is trained with)
+        beam_width: int, beam width for beam search. If None, use greedy
+            decoding.
+        save_path: path to save decoding results
+    """
+    def load_vocab(label_type):
+        if label_type == 'character':
+            map_file_path = '../metrics/mapping_files/ctc/char2num.txt'
+        else:
+            map_file_path = '../metrics/mapping_files/ctc/phone2num_' + \
+                label_type[5:7] + '.txt'
+        return load_vocabulary(map_file_path)
+
+    # Labels in the cache may be of another label type (e.g. phone39)
+    vocab_pred = load_vocab(label_type)
+    vocab_true = load_vocab(cache.label_type)
+    delimiter = '' if label_type == 'character' else ' '
+
+    if save_path is not None:
+        sys.stdout = open(join(save_path, 'decode.txt'), 'w')
+
+    labels_pred = cache.decode(beam_width=beam_width)
+    for i in range(cache.data_num):
+        print('----- wav: %s -----' % cache.names[i])
+        print('True: %s' % vocab_true.decode(cache.label(i),
+                                             delimiter=delimiter))
+        print('Pred: %s' % vocab_pred.decode(labels_pred[i],
+                                             delimiter=delimiter))
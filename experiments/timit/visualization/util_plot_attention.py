@@ -13,8 +13,7 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 
-from experiments.utils.labels.character import num2char
-from experiments.utils.labels.phone import num2phone
+from experiments.utils.labels.vocabulary import load_vocabulary
 from experiments.utils.directory import mkdir_join
 
 plt.style.use('ggplot')
@@ -53,11 +52,7 @@ def attention_test(session, decode_op, attention_weights_op, network, dataset,
             label_type[5:7] + '.txt'
 
     # Load mapping file
-    map_dict = {}
-    with open(map_file_path, 'r') as f:
-        for line in f:
-            line = line.strip().split()
-            map_dict[int(line[1])] = line[0]
+    map_dict = load_vocabulary(map_file_path).index2token
 
     for step in range(iteration):
         # Create feed dictionary for next mini batch
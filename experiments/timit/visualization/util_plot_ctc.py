@@ -134,6 +134,55 @@ def posterior_test_multitask(session, posteriors_op_main, posteriors_op_second,
             show=show)
 
 
+def posterior_cached(cache, label_type, save_path=None, show=False):
+    """Visualize label posteriors of CTC model from the posterior cache
+       without TensorFlow (see experiments/utils/data/posterior_cache.py).
+    Args:
+        cache: An instance of `PosteriorCache`
+        label_type: string, phone39 or phone48 or phone61 or character
+        save_path: path to save ctc outputs
+        show: if True, show each figure
+    """
+    save_path = mkdir_join(save_path, 'ctc_output')
+
+    for i in range(cache.data_num):
+        probs = np.exp(cache.log_posteriors(i))
+        if label_type != 'character':
+            plot_probs_ctc_phone(probs=probs,
+                                 wav_index=str(cache.names[i]),
+                                 label_type=label_type,
+                                 save_path=save_path,
+                                 show=show)
+        else:
+            plot_probs_ctc_char(probs=probs,
+                                wav_index=str(cache.names[i]),
+                                save_path=save_path,
+                                show=show)
+
+
+def posterior_cached_multitask(cache_main, cache_second, label_type_second,
+                               save_path=None, show=False):
+    """Visualize label posteriors of the multi-task CTC model from the
+       posterior cache without TensorFlow.
+    Args:
+        cache_main: An instance of `PosteriorCache` of the main task
+        cache_second: An instance of `PosteriorCache` of the second task
+        label_type_second: string, phone39 or phone48 or phone61
+        save_path: path to save ctc outpus
+        show: if True, show each figure
+    """
+    save_path = mkdir_join(save_path, 'ctc_output')
+
+    for i in range(cache_main.data_num):
+        plot_probs_ctc_char_phone(
+            probs_char=np.exp(cache_main.log_posteriors(i)),
+            probs_phone=np.exp(cache_second.log_posteriors(i)),
+            wav_index=str(cache_main.names[i]),
+            label_type_second=label_type_second,
+            save_path=save_path,
+            show=show)
+
+
 def plot_probs_ctc_phone(probs, wav_index, label_type, save_path, show):
     """Plot posteriors of phones.
     Args:
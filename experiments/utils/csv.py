@@ -14,6 +14,7 @@ def save_loss(steps, loss_train, loss_dev, save_path):
     np.savetxt(os.path.join(save_path, "loss.csv"), loss_graph, delimiter=",")
 
 
-def save_ler(steps, ler_train, ler_dev, save_path):
+def save_ler(steps, ler_train, ler_dev, save_path, name='ler'):
     loss_graph = np.column_stack((steps, ler_train, ler_dev))
-    np.savetxt(os.path.join(save_path, "ler.csv"), loss_graph, delimiter=",")
+    np.savetxt(os.path.join(save_path, name + ".csv"), loss_graph,
+               delimiter=",")
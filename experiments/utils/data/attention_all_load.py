@@ -10,15 +10,19 @@ from __future__ import division
 from __future__ import print_function
 
 from os.path import basename
-import random
 import numpy as np
-import tensorflow as tf
+
+from experiments.utils.data.packed_corpus import PackedCorpus
+from experiments.utils.data.sampler import BatchSampler
+from experiments.utils.data.multi_gpu import split_batch
 
 
 class DatasetBase(object):
 
     def __init__(self, data_type, label_type, batch_size, eos_index,
-                 is_sorted=True, is_progressbar=False, num_gpu=1):
+                 is_sorted=True, is_progressbar=False, num_gpu=1,
+                 bucket_size=None, max_frame_num=None,
+                 max_label_num=None):
         """Load all dataset in advance.
         Args:
             data_type: string
@@ -27,6 +31,13 @@ class DatasetBase(object):
             is_sorted: if True, sort dataset by frame num
             is_progressbar: if True, visualize progressbar
             num_gpu: int, if more than 1, divide batch_size by num_gpu
+            bucket_size: int, if set with is_sorted, shuffle utterances
+                within buckets of this number of utterances sorted by frame
+                num
+            max_frame_num: int, if set, make mini-batches up to this number
+                of frames including padding instead of using batch_size
+            max_label_num: int, if set with max_frame_num, also limit the
+                total number of labels in each mini-batch
         """
         self.data_type = data_type
         self.label_type = label_type
@@ -46,17 +57,71 @@ class DatasetBase(object):
         self.input_paths = None
         self.label_paths = None
         self.data_num = None
+        self.packed = None
 
         # 3. Load all dataset in advance
         self.input_list = None
         self.label_list = None
-        self.rest = set(range(0, self.data_num, 1))
+        self.sampler = None
+
+    def _init_sampler(self, bucket_size=None, max_frame_num=None,
+                      max_label_num=None):
+        """Set the sampler of mini-batches. Utterances are sorted by frame
+           num (bucket_size is None) or shuffled within buckets of
+           `bucket_size` utterances if `is_sorted` is True, and shuffled
+           otherwise. With multiple GPUs, the last utterances of each epoch
+           are dropped so that every mini-batch is divided into all GPUs.
+        Args:
+            bucket_size: int, the number of utterances in each bucket
+            max_frame_num: int, if set, make mini-batches up to this number
+                of frames including padding instead of using batch_size
+            max_label_num: int, if set with max_frame_num, also limit the
+                total number of labels in each mini-batch
+        """
+        if not self.is_sorted:
+            mode = 'random'
+        elif bucket_size is None:
+            mode = 'sorted'
+        else:
+            mode = 'bucket'
+        if max_frame_num is not None and self.num_gpu > 1:
+            raise ValueError(
+                'max_frame_num is not supported with multiple GPUs.')
+        seq_lens = [x.shape[0] for x in self.input_list]
+
+        label_lens = None
+        if max_label_num is not None:
+            label_lens = [len(x) for x in self.label_list]
+
+        self.sampler = BatchSampler(seq_lens, mode=mode,
+                                    bucket_size=bucket_size,
+                                    max_frame_num=max_frame_num,
+                                    label_lens=label_lens,
+                                    max_label_num=max_label_num,
+                                    divisor=self.num_gpu)
+
+    def _open_packed(self, packed_path):
+        """Load all dataset from the packed corpus instead of one .npy file
+           per utterance. Each utterance is a zero-copy view of the memory
+           map. See experiments/utils/data/packed_corpus.py.
+        Args:
+            packed_path: path to the directory of the packed corpus
+        """
+        self.packed = PackedCorpus(packed_path, label_keys=['labels'])
+        self.frame_num_dict = self.packed.frame_num_dict
+        # NOTE: The basename of each path is the utterance name
+        self.input_paths = self.packed.names
+        self.data_num = self.packed.data_num
+
+        indices = range(self.data_num)
+        self.input_list = self.packed.input_list(indices)
+        self.label_paths = None
+        self.label_list = self.packed.label_list(indices, key='labels')
 
-    def next_batch(self, batch_size=None, session=None):
+    def next_batch(self, batch_size=None):
         """Make mini-batch.
         Args:
             batch_size: int, the size of mini-batch
-            session:
         Returns:
             inputs: list of input data, size `[batch_size]`
             labels: list of target labels, size `[batch_size]`
@@ -66,43 +131,16 @@ class DatasetBase(object):
             input_names: list of file name of input data of size `[batch_size]`
 
             If num_gpu > 1, each return is divide into list of size `[num_gpu]`
+            `next_epoch_flag` of the dataset is set to True when the
+            mini-batch is the last one in the epoch.
         """
-        if session is None and self.num_gpu != 1:
-            raise ValueError('Set session when using multiple GPUs.')
-
         if batch_size is None:
             batch_size = self.batch_size
 
-        next_epoch_flag = False
-
         while True:
-            # sorted dataset
-            if self.is_sorted:
-                if len(self.rest) > batch_size:
-                    data_indices = list(self.rest)[:batch_size]
-                    self.rest -= set(data_indices)
-                else:
-                    data_indices = list(self.rest)
-                    self.rest = set(range(0, self.data_num, 1))
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-            # not sorted dataset
-            else:
-                if len(self.rest) > batch_size:
-                    # Randomly sample mini-batch
-                    data_indices = random.sample(list(self.rest), batch_size)
-                    self.rest -= set(data_indices)
-                else:
-                    data_indices = list(self.rest)
-                    self.rest = set(range(0, self.data_num, 1))
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                    # Shuffle selected mini-batch
-                    random.shuffle(data_indices)
+            data_indices, next_epoch_flag = self.sampler.sample(batch_size)
+            if next_epoch_flag and self.data_type == 'train':
+                print('---Next epoch---')
 
             # Compute max frame num in mini-batch
             max_frame_num = max(map(lambda x: x.shape[0],
@@ -138,26 +176,11 @@ class DatasetBase(object):
             # GPU
             ##########
             if self.num_gpu > 1:
-                divide_num = self.num_gpu
-                if next_epoch_flag:
-                    for i in range(self.num_gpu, 0, -1):
-                        if len(self.rest) % i == 0:
-                            divide_num = i
-                            break
-                    next_epoch_flag = False
-
                 # Now we split the mini-batch data by num_gpu
-                inputs = tf.split(inputs, divide_num, axis=0)
-                labels = tf.split(labels, divide_num, axis=0)
-                inputs_seq_len = tf.split(inputs_seq_len, divide_num, axis=0)
-                labels_seq_len = tf.split(labels_seq_len, divide_num, axis=0)
-                input_names = tf.split(input_names, divide_num, axis=0)
-
-                # Convert from SparseTensor to numpy.ndarray
-                inputs = list(map(session.run, inputs))
-                labels = list(map(session.run, labels))
-                inputs_seq_len = list(map(session.run, inputs_seq_len))
-                labels_seq_len = list(map(session.run, labels_seq_len))
-                input_names = list(map(session.run, input_names))
+                (inputs, labels, inputs_seq_len, labels_seq_len,
+                 input_names) = split_batch(
+                    (inputs, labels, inputs_seq_len, labels_seq_len,
+                     input_names), self.num_gpu)
 
+            self.next_epoch_flag = next_epoch_flag
             yield inputs, labels, inputs_seq_len, labels_seq_len, input_names
@@ -12,13 +12,19 @@ from __future__ import print_function
 from os.path import basename
 import random
 import numpy as np
-import tensorflow as tf
 
+from experiments.utils.data.prefetch import prefetch, PrefetchStats
+from experiments.utils.data.packed_corpus import PackedCorpus
+from experiments.utils.data.sampler import BatchSampler
+from experiments.utils.data.multi_gpu import split_batch
 
 class DatasetBase(object):
 
     def __init__(self, data_type, label_type, batch_size, eos_index,
-                 is_sorted=True, is_progressbar=False, num_gpu=1):
+                 is_sorted=True, is_progressbar=False, num_gpu=1,
+                 bucket_size=None, max_frame_num=None,
+                 max_label_num=None,
+                 num_prefetch=0, num_prefetch_thread=1):
         """Load mini-batch in each step.
         Args:
             data_type: string
@@ -29,6 +35,17 @@ class DatasetBase(object):
             is_sorted: if True, sort dataset by frame num
             is_progressbar: if True, visualize progressbar
             num_gpu: int, if more than 1, divide batch_size by num_gpu
+            bucket_size: int, if set with is_sorted, shuffle utterances
+                within buckets of this number of utterances sorted by frame
+                num
+            max_frame_num: int, if set, make mini-batches up to this number
+                of frames including padding instead of using batch_size
+            max_label_num: int, if set with max_frame_num, also limit the
+                total number of labels in each mini-batch
+            num_prefetch: int, the number of mini-batches to build in advance
+                in background threads. If 0, build each mini-batch on demand
+            num_prefetch_thread: int, the number of threads to build
+                mini-batches
         """
         self.data_type = data_type
         self.label_type = label_type
@@ -37,6 +54,9 @@ class DatasetBase(object):
         self.is_sorted = is_sorted
         self.is_progressbar = is_progressbar
         self.num_gpu = num_gpu
+        self.num_prefetch = num_prefetch
+        self.num_prefetch_thread = num_prefetch_thread
+        self.prefetch_stats = None
 
         self.input_size = None
         self.dataset_path = None
@@ -49,14 +69,69 @@ class DatasetBase(object):
         self.input_paths = None
         self.label_paths = None
         self.data_num = None
+        self.packed = None
 
-        self.rest = set(range(0, self.data_num, 1))
+        self.sampler = None
 
-    def next_batch(self, batch_size=None, session=None):
+    def _init_sampler(self, bucket_size=None, max_frame_num=None,
+                      max_label_num=None):
+        """Set the sampler of mini-batches. Utterances are sorted by frame
+           num (bucket_size is None) or shuffled within buckets of
+           `bucket_size` utterances if `is_sorted` is True, and shuffled
+           otherwise. With multiple GPUs, the last utterances of each epoch
+           are dropped so that every mini-batch is divided into all GPUs.
+        Args:
+            bucket_size: int, the number of utterances in each bucket
+            max_frame_num: int, if set, make mini-batches up to this number
+                of frames including padding instead of using batch_size
+            max_label_num: int, if set with max_frame_num, also limit the
+                total number of labels in each mini-batch
+        """
+        if not self.is_sorted:
+            mode = 'random'
+        elif bucket_size is None:
+            mode = 'sorted'
+        else:
+            mode = 'bucket'
+        if max_frame_num is not None and self.num_gpu > 1:
+            raise ValueError(
+                'max_frame_num is not supported with multiple GPUs.')
+        seq_lens = [self.frame_num_dict[basename(path).split('.')[0]]
+                    for path in self.input_paths]
+
+        label_lens = None
+        if max_label_num is not None:
+            if self.packed is not None:
+                label_lens = self.packed.label_lens['labels']
+            else:
+                # NOTE: Read only headers of .npy files
+                label_lens = [np.load(path, mmap_mode='r').shape[0]
+                              for path in self.label_paths]
+
+        self.sampler = BatchSampler(seq_lens, mode=mode,
+                                    bucket_size=bucket_size,
+                                    max_frame_num=max_frame_num,
+                                    label_lens=label_lens,
+                                    max_label_num=max_label_num,
+                                    divisor=self.num_gpu)
+
+    def _open_packed(self, packed_path):
+        """Read dataset from the packed corpus instead of one .npy file per
+           utterance. See experiments/utils/data/packed_corpus.py.
+        Args:
+            packed_path: path to the directory of the packed corpus
+        """
+        self.packed = PackedCorpus(packed_path, label_keys=['labels'])
+        self.frame_num_dict = self.packed.frame_num_dict
+        # NOTE: The basename of each path is the utterance name
+        self.input_paths = self.packed.names
+        self.label_paths = None
+        self.data_num = self.packed.data_num
+
+    def next_batch(self, batch_size=None):
         """Make mini-batch.
         Args:
             batch_size: int, the size of mini-batch
-            session:
         Returns:
             inputs: list of input data, size `[batch_size]`
             labels: list of target labels, size `[batch_size]`
@@ -66,121 +141,129 @@ class DatasetBase(object):
                 `[batch_size]`
 
             If num_gpu > 1, each return is divide into list of size `[num_gpu]`
+            `next_epoch_flag` of the dataset is set to True when the
+            mini-batch is the last one in the epoch.
         """
-        if session is None and self.num_gpu != 1:
-            raise ValueError('Set session when using multiple GPUs.')
-
         if batch_size is None:
             batch_size = self.batch_size
 
-        next_epoch_flag = False
+        def load(sample):
+            data_indices, next_epoch_flag = sample
+            return self._load_batch(data_indices), next_epoch_flag
+
+        # Load mini-batches in background threads
+        sample_generator = self._sample_indices(batch_size)
+        if self.num_prefetch > 0:
+            self.prefetch_stats = PrefetchStats(self.num_prefetch)
+            batch_generator = prefetch(sample_generator, load,
+                                       num_prefetch=self.num_prefetch,
+                                       num_worker=self.num_prefetch_thread,
+                                       stats=self.prefetch_stats)
+        else:
+            batch_generator = (load(sample) for sample in sample_generator)
+
+        try:
+            for batch, next_epoch_flag in batch_generator:
+                (inputs, labels, inputs_seq_len, labels_seq_len,
+                 input_names) = batch
+
+                ##########
+                # GPU
+                ##########
+                if self.num_gpu > 1:
+                    # Now we split the mini-batch data by num_gpu
+                    (inputs, labels, inputs_seq_len, labels_seq_len,
+                     input_names) = split_batch(
+                        (inputs, labels, inputs_seq_len, labels_seq_len,
+                         input_names), self.num_gpu)
 
+                # NOTE: This is set when the mini-batch is consumed, so it is
+                # not ahead of the training loop with prefetching
+                self.next_epoch_flag = next_epoch_flag
+                yield (inputs, labels, inputs_seq_len, labels_seq_len,
+                       input_names)
+        finally:
+            # Stop the background threads when this generator is closed
+            batch_generator.close()
+
+    def _sample_indices(self, batch_size):
+        """Generate indices of utterances in each mini-batch.
+        Args:
+            batch_size: int, the size of mini-batch
+        Returns:
+            data_indices: list of indices of utterances
+            next_epoch_flag: if True, the mini-batch is the last one in the
+                epoch
+        """
         while True:
-            # sorted dataset
-            if self.is_sorted:
-                if len(self.rest) > batch_size:
-                    data_indices = list(self.rest)[:batch_size]
-                    self.rest -= set(data_indices)
-                else:
-                    data_indices = list(self.rest)
-                    self.rest = set(range(0, self.data_num, 1))
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                # Shuffle selected mini-batch
-                random.shuffle(data_indices)
-
-            # not sorted dataset
-            else:
-                if len(self.rest) > batch_size:
-                    # Randomly sample mini-batch
-                    data_indices = random.sample(
-                        list(self.rest), batch_size)
-                    self.rest -= set(data_indices)
-                else:
-                    data_indices = list(self.rest)
-                    self.rest = set(range(0, self.data_num, 1))
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                    # Shuffle selected mini-batch
-                    random.shuffle(data_indices)
-
-            # Load dataset in mini-batch
+            data_indices, next_epoch_flag = self.sampler.sample(batch_size)
+            if next_epoch_flag and self.data_type == 'train':
+                print('---Next epoch---')
+
+            # Shuffle selected mini-batch
+            random.shuffle(data_indices)
+
+            yield data_indices, next_epoch_flag
+
+    def _load_batch(self, data_indices):
+        """Load & pad utterances in a mini-batch. This is thread-safe as long
+           as `data_indices` is given by `_sample_indices`.
+        Args:
+            data_indices: list of indices of utterances
+        Returns:
+            inputs: A numpy array of size `[B, T, input_size]`
+            labels: A numpy array of size `[B, max_label_len]`
+            inputs_seq_len: A numpy array of size `[B]`
+            labels_seq_len: A numpy array of size `[B]`
+            input_names: list of file name of input data of size `[B]`
+        """
+        # Load dataset in mini-batch
+        if self.packed is not None:
+            input_list = self.packed.input_list(data_indices)
+            label_list = self.packed.label_list(data_indices)
+        else:
             input_list = np.array(list(
                 map(lambda path: np.load(path),
                     np.take(self.input_paths, data_indices, axis=0))))
             label_list = np.array(list(
                 map(lambda path: np.load(path),
                     np.take(self.label_paths, data_indices, axis=0))))
-            input_names = list(
-                map(lambda path: basename(path).split('.')[0],
-                    np.take(self.input_paths, data_indices, axis=0)))
+        input_names = list(
+            map(lambda path: basename(path).split('.')[0],
+                np.take(self.input_paths, data_indices, axis=0)))
+
+        # Compute max frame num in mini-batch
+        max_frame_num = max(map(lambda x: x.shape[0], input_list))
 
-            # Compute max frame num in mini-batch
-            max_frame_num = max(map(lambda x: x.shape[0], input_list))
+        # Compute max target label length in mini-batch
+        max_seq_len = max(map(len, label_list))
 
-            # Compute max target label length in mini-batch
-            max_seq_len = max(map(len, label_list))
+        # Initialization
+        inputs = np.zeros(
+            (len(data_indices), max_frame_num, self.input_size),
+            dtype=np.float32)
+        # Padding with <EOS>
+        if not self.is_test:
+            labels = np.array([[self.eos_index] * max_seq_len]
+                              * len(data_indices), dtype=np.int32)
+        else:
+            labels = [None] * len(data_indices)
+        inputs_seq_len = np.empty(
+            (len(data_indices),), dtype=np.int32)
+        labels_seq_len = np.zeros(
+            (len(data_indices),), dtype=np.int32)
 
-            # Initialization
-            inputs = np.zeros(
-                (len(data_indices), max_frame_num, self.input_size),
-                dtype=np.float32)
-            # Padding with <EOS>
+        # Set values of each data in mini-batch
+        for i_batch in range(len(data_indices)):
+            data_i = input_list[i_batch]
+            frame_num = data_i.shape[0]
+            inputs[i_batch, : frame_num, :] = data_i
             if not self.is_test:
-                labels = np.array([[self.eos_index] * max_seq_len]
-                                  * len(data_indices), dtype=np.int32)
+                labels[i_batch, :len(label_list[i_batch])
+                       ] = label_list[i_batch]
             else:
-                labels = [None] * len(data_indices)
-            inputs_seq_len = np.empty(
-                (len(data_indices),), dtype=np.int32)
-            labels_seq_len = np.zeros(
-                (len(data_indices),), dtype=np.int32)
-
-            # Set values of each data in mini-batch
-            for i_batch in range(len(data_indices)):
-                data_i = input_list[i_batch]
-                frame_num = data_i.shape[0]
-                inputs[i_batch, : frame_num, :] = data_i
-                if not self.is_test:
-                    labels[i_batch, :len(label_list[i_batch])
-                           ] = label_list[i_batch]
-                else:
-                    labels[i_batch] = label_list[i_batch]
-                inputs_seq_len[i_batch] = frame_num
-                labels_seq_len[i_batch] = len(label_list[i_batch])
-
-            ##########
-            # GPU
-            ##########
-            if self.num_gpu > 1:
-                divide_num = self.num_gpu
-                if next_epoch_flag:
-                    for i in range(self.num_gpu, 0, -1):
-                        if len(self.rest) % i == 0:
-                            divide_num = i
-                            break
-                    next_epoch_flag = False
-
-                # Now we split the mini-batch data by num_gpu
-                inputs = tf.split(inputs, divide_num, axis=0)
-                labels = tf.split(labels, divide_num, axis=0)
-                inputs_seq_len = tf.split(
-                    inputs_seq_len, divide_num, axis=0)
-                labels_seq_len = tf.split(
-                    labels_seq_len, divide_num, axis=0)
-                input_names = tf.split(input_names, divide_num, axis=0)
-
-                # Convert from SparseTensor to numpy.ndarray
-                inputs = list(map(session.run, inputs))
-                labels = list(map(session.run, labels))
-                inputs_seq_len = list(map(session.run, inputs_seq_len))
-                labels_seq_len = list(map(session.run, labels_seq_len))
-                input_names = list(map(session.run, input_names))
-                # TODO: Add is_test
-
-            yield (inputs, labels, inputs_seq_len, labels_seq_len,
-                   input_names)
+                labels[i_batch] = label_list[i_batch]
+            inputs_seq_len[i_batch] = frame_num
+            labels_seq_len[i_batch] = len(label_list[i_batch])
+
+        return inputs, labels, inputs_seq_len, labels_seq_len, input_names
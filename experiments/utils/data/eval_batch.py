@@ -0,0 +1,94 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Mini-batches for evaluation. All utterances of a dataset are sorted by
+   frame num and divided under a frame budget, so that each mini-batch has
+   little padding. Outputs gathered in this order are put back in the
+   original order of the dataset with `restore_order`.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import basename
+import numpy as np
+
+from experiments.utils.data.sampler import BatchSampler
+
+# The number of frames in each mini-batch including padding
+DEFAULT_EVAL_FRAME_NUM = 10000
+
+
+def eval_batches(dataset, max_frame_num=None, batch_size=None):
+    """Generate mini-batches of all utterances in a dataset once, sorted by
+       frame num. The sampler of the dataset is replaced during the
+       generation, and restored at the end.
+    Args:
+        dataset: An instance of a `Dataset` class
+        max_frame_num: int, the number of frames in each mini-batch
+            including padding. If None, DEFAULT_EVAL_FRAME_NUM is used
+            unless batch_size is set.
+        batch_size: int, the size of mini-batch. This is used only when
+            max_frame_num is None.
+    Returns (generator):
+        batch: A mini-batch made by `dataset.next_batch`. The last element
+            is the list of input names.
+        positions: np.ndarray of the positions of utterances in the
+            mini-batch in the original order of the dataset
+    """
+    if getattr(dataset, 'num_gpu', 1) > 1:
+        raise ValueError('Evaluate with a dataset of num_gpu=1.')
+    if max_frame_num is None and batch_size is None:
+        max_frame_num = DEFAULT_EVAL_FRAME_NUM
+
+    sampler = dataset.sampler
+    eval_sampler = BatchSampler(sampler.seq_lens,
+                                mode='sorted',
+                                max_frame_num=max_frame_num,
+                                data_indices=sampler.data_indices)
+    batch_num = eval_sampler.batch_num(batch_size)
+
+    # Positions of utterances by input name
+    # NOTE: Input names in mini-batches are made in the same way
+    names = np.take(dataset.input_paths, sampler.data_indices, axis=0)
+    name2position = {basename(path).split('.')[0]: i
+                     for i, path in enumerate(names)}
+
+    # NOTE: Background threads would sample mini-batches ahead from the
+    # sampler restored at the end, so mini-batches are loaded in this thread
+    has_prefetch = hasattr(dataset, 'num_prefetch')
+    if has_prefetch:
+        num_prefetch = dataset.num_prefetch
+        dataset.num_prefetch = 0
+    dataset.sampler = eval_sampler
+    mini_batch = dataset.next_batch(batch_size=batch_size)
+    try:
+        for _ in range(batch_num):
+            batch = mini_batch.__next__()
+            positions = np.array([name2position[name]
+                                  for name in batch[-1]], dtype=np.int64)
+            yield batch, positions
+    finally:
+        mini_batch.close()
+        dataset.sampler = sampler
+        if has_prefetch:
+            dataset.num_prefetch = num_prefetch
+
+
+def restore_order(items, positions):
+    """Put items gathered in the order of evaluation back in the original
+       order.
+    Args:
+        items: list of items of each utterance
+        positions: list or np.ndarray of the position of each item in the
+            original order (concatenated `positions` of `eval_batches`)
+    Returns:
+        items: list of items in the original order
+    """
+    if len(items) != len(positions):
+        raise ValueError('items and positions must be the same size.')
+    restored = [None] * len(items)
+    for item, position in zip(items, positions):
+        restored[position] = item
+    return restored
@@ -7,6 +7,7 @@ from __future__ import print_function
 
 from os.path import basename
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 from experiments.utils.progressbar import wrap_iterator
 
 
@@ -31,61 +32,173 @@ def stack_frame(input_list, input_paths, frame_num_dict, num_stack, num_skip, is
     if num_stack < num_skip:
         raise ValueError('num_skip must be less than num_stack.')
 
-    input_size = input_list[0].shape[1]
     utt_num = len(input_paths)
 
-    stacked_input_list = []
+    stacked_input_list = np.empty((utt_num,), dtype=object)
     for i_utt in wrap_iterator(range(utt_num), is_progressbar):
         # Per utterance
         input_name = basename(input_paths[i_utt]).split('.')[0]
         frame_num = frame_num_dict[input_name]
-        frame_num_decimated = frame_num / num_skip
-        if frame_num_decimated != int(frame_num_decimated):
-            frame_num_decimated += 1
-        frame_num_decimated = int(frame_num_decimated)
-
-        stacked_frames = np.zeros(
-            (frame_num_decimated, input_size * num_stack))
-        stack_count = 0  # counter for stacked_frames
-        stack = []
-        for i_frame, frame in enumerate(input_list[i_utt]):
-            #####################
-            # final frame
-            #####################
-            if i_frame == len(input_list[i_utt]) - 1:
-                # Stack the final frame
-                stack.append(frame)
-
-                while stack_count != int(frame_num_decimated):
-                    # Concatenate stacked frames
-                    for i_stack in range(len(stack)):
-                        stacked_frames[stack_count][input_size *
-                                                    i_stack:input_size * (i_stack + 1)] = stack[i_stack]
-                    stack_count += 1
-
-                    # Delete some frames to skip
-                    for _ in range(num_skip):
-                        if len(stack) != 0:
-                            stack.pop(0)
-
-            ########################
-            # first & middle frames
-            ########################
-            elif len(stack) < num_stack:
-                # Stack some frames until stack is filled
-                stack.append(frame)
-
-                if len(stack) == num_stack:
-                    # Concatenate stacked frames
-                    for i_stack in range(num_stack):
-                        stacked_frames[stack_count][input_size *
-                                                    i_stack:input_size * (i_stack + 1)] = stack[i_stack]
-                    stack_count += 1
-
-                    # Delete some frames to skip
-                    for _ in range(num_skip):
-                        stack.pop(0)
-
-        stacked_input_list.append(stacked_frames)
-
-    return np.array(stacked_input_list)
+        stacked_input_list[i_utt] = stack_frame_utterance(
+            input_list[i_utt], num_stack, num_skip, frame_num=frame_num)
+
+    return stacked_input_list
+
+
+def stack_frame_utterance(inputs, num_stack, num_skip, frame_num=None):
+    """Stack & skip frames of an utterance. The i-th output frame is the
+       concatenation of the (i * num_skip)-th to the
+       (i * num_skip + num_stack - 1)-th input frames. Frames after the last
+       one are filled with zeros.
+    Args:
+        inputs: A numpy array of size `[frame_num, input_size]`
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        frame_num: int, the number of frames. If None, use the length of
+            `inputs`.
+    Returns:
+        stacked_inputs: A float32 numpy array of size
+            `[ceil(frame_num / num_skip), input_size * num_stack]`
+    """
+    if num_stack < num_skip:
+        raise ValueError('num_skip must be less than num_stack.')
+
+    if frame_num is None:
+        frame_num = inputs.shape[0]
+    input_size = inputs.shape[1]
+    frame_num_decimated = -(-frame_num // num_skip)
+
+    # Pad with zeros so that the last window fits
+    padded_inputs = np.zeros(
+        ((frame_num_decimated - 1) * num_skip + num_stack, input_size),
+        dtype=np.float32)
+    frame_num_copied = min(frame_num, inputs.shape[0])
+    padded_inputs[:frame_num_copied] = inputs[:frame_num_copied]
+
+    # Overlapping windows as a view of padded_inputs
+    itemsize = padded_inputs.itemsize
+    stacked_inputs = as_strided(
+        padded_inputs,
+        shape=(frame_num_decimated, input_size * num_stack),
+        strides=(num_skip * input_size * itemsize, itemsize),
+        writeable=False)
+
+    return np.ascontiguousarray(stacked_inputs)
+
+
+def stack_frame_batch(inputs, inputs_seq_len, num_stack, num_skip):
+    """Stack & skip frames of a padded mini-batch. This is equivalent to
+       `stack_frame_utterance` per utterance, as long as the padded frames
+       are filled with zeros.
+    Args:
+        inputs: A numpy array of size `[batch_size, max_time, input_size]`
+        inputs_seq_len: A numpy array of size `[batch_size]`
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+    Returns:
+        stacked_inputs: A float32 numpy array of size
+            `[batch_size, ceil(max_time / num_skip), input_size * num_stack]`
+        stacked_inputs_seq_len: A numpy array of size `[batch_size]`
+    """
+    if num_stack < num_skip:
+        raise ValueError('num_skip must be less than num_stack.')
+
+    batch_size, max_time, input_size = inputs.shape
+    max_time_decimated = -(-max_time // num_skip)
+
+    # Pad with zeros so that the last window fits
+    padded_inputs = np.zeros(
+        (batch_size, (max_time_decimated - 1) * num_skip + num_stack,
+         input_size), dtype=np.float32)
+    padded_inputs[:, :max_time] = inputs
+
+    # Overlapping windows as a view of padded_inputs
+    itemsize = padded_inputs.itemsize
+    stacked_inputs = as_strided(
+        padded_inputs,
+        shape=(batch_size, max_time_decimated, input_size * num_stack),
+        strides=(padded_inputs.strides[0],
+                 num_skip * input_size * itemsize,
+                 itemsize),
+        writeable=False)
+    stacked_inputs_seq_len = -(-np.asarray(inputs_seq_len) // num_skip)
+
+    return (np.ascontiguousarray(stacked_inputs),
+            stacked_inputs_seq_len.astype(np.int32))
+
+
+class FrameStacker(object):
+    """Stack & skip frames of an utterance given chunk by chunk. Frames
+       which are not consumed yet are carried over to the next chunk, so
+       that the outputs are the same as `stack_frame_utterance` of the whole
+       utterance.
+    Args:
+        input_size: int, the dimensions of input vectors
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+    """
+
+    def __init__(self, input_size, num_stack, num_skip):
+        if num_stack < num_skip:
+            raise ValueError('num_skip must be less than num_stack.')
+
+        self.input_size = input_size
+        self.num_stack = num_stack
+        self.num_skip = num_skip
+        self.reset()
+
+    def reset(self):
+        """Start a new utterance."""
+        # Input frames from the start of the next output frame
+        self.buffer = np.zeros((0, self.input_size), dtype=np.float32)
+
+    def push(self, inputs):
+        """
+        Args:
+            inputs: A numpy array of size `[frame_num, input_size]`
+        Returns:
+            stacked_inputs: A float32 numpy array of size
+                `[N, input_size * num_stack]`, where N is the number of output
+                frames whose windows are complete
+        """
+        self.buffer = np.concatenate(
+            [self.buffer, np.asarray(inputs, dtype=np.float32)], axis=0)
+        if len(self.buffer) < self.num_stack:
+            return self._emit(0)
+        return self._emit(
+            1 + (len(self.buffer) - self.num_stack) // self.num_skip)
+
+    def flush(self):
+        """Emit the rest of output frames by padding zeros at the end of the
+           utterance, and start a new utterance.
+        Returns:
+            stacked_inputs: A float32 numpy array of size
+                `[N, input_size * num_stack]`
+        """
+        num_output = -(-len(self.buffer) // self.num_skip)
+        self.buffer = np.concatenate(
+            [self.buffer, np.zeros((self.num_stack, self.input_size),
+                                   dtype=np.float32)], axis=0)
+        stacked_inputs = self._emit(num_output)
+        self.reset()
+        return stacked_inputs
+
+    def _emit(self, num_output):
+        """Stack the first num_output windows in the buffer and drop the
+           frames which are not used in later windows.
+        """
+        if num_output == 0:
+            return np.zeros((0, self.input_size * self.num_stack),
+                            dtype=np.float32)
+
+        windows = np.ascontiguousarray(
+            self.buffer[:(num_output - 1) * self.num_skip + self.num_stack])
+        itemsize = windows.itemsize
+        stacked_inputs = as_strided(
+            windows,
+            shape=(num_output, self.input_size * self.num_stack),
+            strides=(self.num_skip * self.input_size * itemsize, itemsize),
+            writeable=False)
+        self.buffer = self.buffer[num_output * self.num_skip:]
+
+        return np.ascontiguousarray(stacked_inputs)
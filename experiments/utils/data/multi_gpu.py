@@ -0,0 +1,68 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Split mini-batches for the multi-GPU version."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+
+def compute_divide_num(batch_size, num_gpu):
+    """Compute the number of GPUs which a mini-batch is divided into.
+    Args:
+        batch_size: int, the size of mini-batch
+        num_gpu: int, the number of GPUs
+    Returns:
+        divide_num: int, the largest number which is less than or equal to
+            num_gpu and divides batch_size
+    """
+    for i in range(min(num_gpu, batch_size), 0, -1):
+        if batch_size % i == 0:
+            return i
+    return 1
+
+
+def split_batch(batch, num_gpu):
+    """Split each item in a mini-batch along the first axis in numpy.
+    Args:
+        batch: tuple of numpy arrays or lists of size `[batch_size, ...]`
+        num_gpu: int, the number of GPUs
+    Returns:
+        batch_split: tuple of lists of size `[divide_num]`, each of which
+            has the same type as the corresponding item in `batch`
+    """
+    batch_size = len(batch[0])
+    divide_num = compute_divide_num(batch_size, num_gpu)
+    size = batch_size // divide_num
+
+    batch_split = []
+    for item in batch:
+        batch_split.append(
+            [item[i * size:(i + 1) * size] for i in range(divide_num)])
+    return tuple(batch_split)
+
+
+def make_tower_feed_dict(placeholders_list, batch_split):
+    """Feed each part of a divided mini-batch to the placeholders of each
+       tower. Every tower must have its own part, because feeding a part to
+       more than one tower would count the utterances more than once in the
+       averaged gradients. The datasets drop the last utterances of each
+       epoch so that every mini-batch is divided into all towers (see
+       `divisor` of BatchSampler).
+    Args:
+        placeholders_list: list of tuples of placeholders of each tower, in
+            the same order as the items in `batch_split`
+        batch_split: tuple of lists of size `[divide_num]` (see split_batch)
+    Returns:
+        feed_dict: A dictionary of placeholders and divided items
+    """
+    if len(batch_split[0]) != len(placeholders_list):
+        raise ValueError(
+            'The mini-batch is divided into %d parts for %d towers.' %
+            (len(batch_split[0]), len(placeholders_list)))
+    feed_dict = {}
+    for i_tower, placeholders in enumerate(placeholders_list):
+        for placeholder, item in zip(placeholders, batch_split):
+            feed_dict[placeholder] = item[i_tower]
+    return feed_dict
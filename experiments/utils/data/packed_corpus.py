@@ -0,0 +1,232 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Packed corpus format. All utterances of a dataset are stored in one
+   contiguous float32 feature matrix and one ragged int32 array per label
+   type, together with an offset/length index. The arrays are opened as
+   memory maps, so that each utterance is a zero-copy slice.
+
+   Directory layout:
+       inputs.npy: `[total_frame_num, input_size]`, float32
+       <label_key>.npy: `[total_label_num]`, int32
+       index.npz:
+           names: utterance names
+           input_offsets, frame_nums: `[data_num]`, int64
+           <label_key>_offsets, <label_key>_lens: `[data_num]`, int64
+
+   Usage (convert the existing directory layout):
+       python packed_corpus.py path_to_inputs path_to_save \
+           labels=path_to_labels
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import join, isfile
+import sys
+import pickle
+import numpy as np
+
+sys.path.append('../../../')
+from experiments.utils.directory import mkdir
+from experiments.utils.progressbar import wrap_iterator
+
+INPUT_FILE_NAME = 'inputs.npy'
+INDEX_FILE_NAME = 'index.npz'
+
+
+class PackedCorpus(object):
+    """Read-only view of a packed corpus.
+    Args:
+        packed_path: path to the directory of the packed corpus
+        label_keys: list of label types to open. If None, open all label
+            types in the index.
+    """
+
+    def __init__(self, packed_path, label_keys=None):
+        self.packed_path = packed_path
+
+        index = np.load(join(packed_path, INDEX_FILE_NAME))
+        self.names = index['names']
+        self.input_offsets = index['input_offsets']
+        self.frame_nums = index['frame_nums']
+        self.data_num = len(self.names)
+
+        self.inputs = np.load(join(packed_path, INPUT_FILE_NAME),
+                              mmap_mode='r')
+        self.input_size = self.inputs.shape[1]
+
+        if label_keys is None:
+            label_keys = [key[:-len('_offsets')] for key in index.files
+                          if key.endswith('_offsets') and
+                          key != 'input_offsets']
+        self.labels, self.label_offsets, self.label_lens = {}, {}, {}
+        for key in label_keys:
+            self.labels[key] = np.load(join(packed_path, key + '.npy'),
+                                       mmap_mode='r')
+            self.label_offsets[key] = index[key + '_offsets']
+            self.label_lens[key] = index[key + '_lens']
+
+    @property
+    def frame_num_dict(self):
+        return dict(zip(self.names.tolist(), self.frame_nums.tolist()))
+
+    def input(self, index):
+        """Returns a zero-copy view of the input of an utterance.
+        Args:
+            index: int, the index of the utterance
+        Returns:
+            A memory-mapped array of size `[frame_num, input_size]`
+        """
+        offset = self.input_offsets[index]
+        return self.inputs[offset:offset + self.frame_nums[index]]
+
+    def label(self, index, key='labels'):
+        """Returns a zero-copy view of the label sequence of an utterance.
+        Args:
+            index: int, the index of the utterance
+            key: string, the label type
+        Returns:
+            A memory-mapped array of size `[label_num]`
+        """
+        offset = self.label_offsets[key][index]
+        return self.labels[key][offset:offset + self.label_lens[key][index]]
+
+    def input_list(self, indices):
+        """Returns inputs of utterances.
+        Args:
+            indices: list of indices of utterances
+        Returns:
+            An object array of zero-copy views
+        """
+        input_list = np.empty((len(indices),), dtype=object)
+        for i, index in enumerate(indices):
+            input_list[i] = self.input(index)
+        return input_list
+
+    def label_list(self, indices, key='labels'):
+        """Returns label sequences of utterances.
+        Args:
+            indices: list of indices of utterances
+            key: string, the label type
+        Returns:
+            An object array of zero-copy views
+        """
+        label_list = np.empty((len(indices),), dtype=object)
+        for i, index in enumerate(indices):
+            label_list[i] = self.label(index, key)
+        return label_list
+
+
+def pack_corpus(save_path, input_paths, label_paths_dict, input_names,
+                is_progressbar=False):
+    """Pack utterances into one feature matrix and ragged label arrays.
+    Args:
+        save_path: path to the directory to save the packed corpus
+        input_paths: list of paths to input data (.npy)
+        label_paths_dict:
+            key => label type (e.g. labels, labels_main, labels_sub)
+            value => list of paths to target labels (.npy)
+        input_names: list of utterance names
+        is_progressbar: if True, visualize progressbar
+    """
+    mkdir(save_path)
+    data_num = len(input_paths)
+
+    # Read shapes only
+    frame_nums = np.empty((data_num,), dtype=np.int64)
+    for i in range(data_num):
+        frame_nums[i] = np.load(input_paths[i], mmap_mode='r').shape[0]
+    input_size = np.load(input_paths[0], mmap_mode='r').shape[1]
+    input_offsets = np.zeros((data_num,), dtype=np.int64)
+    input_offsets[1:] = np.cumsum(frame_nums)[:-1]
+
+    # Write inputs directly to the file
+    inputs = np.lib.format.open_memmap(
+        join(save_path, INPUT_FILE_NAME), mode='w+', dtype=np.float32,
+        shape=(int(frame_nums.sum()), input_size))
+    print('=> Packing inputs...')
+    for i in wrap_iterator(range(data_num), is_progressbar):
+        inputs[input_offsets[i]:input_offsets[i] + frame_nums[i]] = np.load(
+            input_paths[i])
+    inputs.flush()
+    del inputs
+
+    index = {'names': np.array(input_names),
+             'input_offsets': input_offsets,
+             'frame_nums': frame_nums}
+    for key, label_paths in label_paths_dict.items():
+        if len(label_paths) != data_num:
+            raise ValueError(
+                'The numbers of inputs and labels (%s) are not same.' % key)
+        print('=> Packing ' + key + '...')
+        label_list = []
+        for i in wrap_iterator(range(data_num), is_progressbar):
+            label = np.load(label_paths[i])
+            if not np.issubdtype(label.dtype, np.integer):
+                raise ValueError(
+                    'Labels must be indices, but %s is %s.' %
+                    (label_paths[i], label.dtype))
+            label_list.append(label.astype(np.int32))
+        label_lens = np.array(list(map(len, label_list)), dtype=np.int64)
+        label_offsets = np.zeros((data_num,), dtype=np.int64)
+        label_offsets[1:] = np.cumsum(label_lens)[:-1]
+        np.save(join(save_path, key + '.npy'),
+                np.concatenate(label_list).astype(np.int32))
+        index[key + '_offsets'] = label_offsets
+        index[key + '_lens'] = label_lens
+
+    np.savez(join(save_path, INDEX_FILE_NAME), **index)
+
+
+def pack_directory(input_path, label_path_dict, save_path,
+                   is_progressbar=False):
+    """Convert the directory layout of one .npy file per utterance into the
+       packed corpus. Utterances are sorted by frame num in the same way as
+       the `Dataset` classes.
+    Args:
+        input_path: path to the directory of inputs, which has
+            frame_num.pickle
+        label_path_dict:
+            key => label type
+            value => path to the directory of target labels
+        save_path: path to the directory to save the packed corpus
+        is_progressbar: if True, visualize progressbar
+    """
+    with open(join(input_path, 'frame_num.pickle'), 'rb') as f:
+        frame_num_dict = pickle.load(f)
+    frame_num_tuple_sorted = sorted(frame_num_dict.items(),
+                                    key=lambda x: x[1])
+
+    def get_path(dir_path, input_name):
+        path = join(dir_path, input_name + '.npy')
+        if not isfile(path):
+            # CSJ: dataset/speaker_name/input_name.npy
+            speaker_name = input_name.split('_')[0]
+            path = join(dir_path, speaker_name, input_name + '.npy')
+        return path
+
+    input_names = [input_name for input_name, _ in frame_num_tuple_sorted]
+    input_paths = [get_path(input_path, name) for name in input_names]
+    label_paths_dict = {}
+    for key, label_path in label_path_dict.items():
+        label_paths_dict[key] = [get_path(label_path, name)
+                                 for name in input_names]
+
+    pack_corpus(save_path, input_paths, label_paths_dict, input_names,
+                is_progressbar=is_progressbar)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) < 4:
+        raise ValueError(
+            'Usage: python packed_corpus.py path_to_inputs path_to_save ' +
+            'label_key=path_to_labels [label_key=path_to_labels ...]')
+    label_path_dict = dict(arg.split('=', 1) for arg in args[3:])
+    pack_directory(input_path=args[1],
+                   label_path_dict=label_path_dict,
+                   save_path=args[2],
+                   is_progressbar=True)
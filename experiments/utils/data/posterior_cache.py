@@ -0,0 +1,328 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Cache of CTC log posteriors. The acoustic model is run once over a
+   dataset (the dump mode of the evaluation scripts). Decoding, evaluation
+   and plotting then read the log posteriors from the cache without
+   TensorFlow, e.g. to sweep beam widths.
+
+   The log posteriors of all utterances are one contiguous float32 matrix
+   opened as a memory map, and each utterance is a zero-copy slice, as in the
+   packed corpus (see packed_corpus.py). Utterances are indexed in the
+   original order of the dataset.
+
+   Directory layout:
+       <model_dir>/posteriors/<checkpoint name>/<data_type>[_<task>]/
+           log_posteriors.bin: `[total_frame_num, num_classes]`, float32
+           labels.npy: `[total_label_num]`, int32
+           index.npz:
+               names: utterance names
+               offsets, frame_nums: `[data_num]`, int64
+               label_offsets, label_lens: `[data_num]`, int64
+               num_classes, label_type, is_raw_label
+
+   Labels which are not indices (the test labels of kanji and kana in CSJ)
+   are stored as the code points of the joined string.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from multiprocessing import Pool
+import os
+from os.path import join, basename
+import numpy as np
+
+from experiments.utils.data.eval_batch import eval_batches
+from experiments.utils.progressbar import wrap_iterator
+from models.ctc.streaming_decoder import GreedyStreamingDecoder
+from models.ctc.streaming_decoder import BeamSearchStreamingDecoder
+
+CACHE_DIR_NAME = 'posteriors'
+LOG_POSTERIOR_FILE_NAME = 'log_posteriors.bin'
+LABEL_FILE_NAME = 'labels.npy'
+INDEX_FILE_NAME = 'index.npz'
+
+
+def checkpoint_name(model_dir, epoch=None):
+    """Find the name of a checkpoint without TensorFlow.
+    Args:
+        model_dir: path to the directory of the saved model
+        epoch: int, the epoch of the checkpoint. If None, use the last saved
+            checkpoint.
+    Returns:
+        name: string, e.g. model.ckpt-30
+    """
+    if epoch is not None:
+        return 'model.ckpt-' + str(epoch)
+
+    # The state file written by tf.train.Saver
+    state_path = join(model_dir, 'checkpoint')
+    if os.path.isfile(state_path):
+        with open(state_path, 'r') as f:
+            for line in f:
+                if line.startswith('model_checkpoint_path:'):
+                    return basename(line.split(':', 1)[1].strip().strip('"'))
+    raise ValueError('There are not any checkpoints.')
+
+
+def cache_path(model_dir, checkpoint, data_type, task=None):
+    """
+    Args:
+        model_dir: path to the directory of the saved model
+        checkpoint: string, the name of the checkpoint (or the path to it)
+        data_type: string, the data type of the dataset
+        task: string, main or sub in the multi-task model, or None
+    Returns:
+        path: path to the directory of the cache
+    """
+    dir_name = data_type if task is None else data_type + '_' + task
+    return join(model_dir, CACHE_DIR_NAME, basename(checkpoint), dir_name)
+
+
+class PosteriorCacheWriter(object):
+    """Write log posteriors of utterances to a cache. Utterances can be added
+       in any order, and are indexed in the order of their positions in the
+       dataset at `close`.
+    Args:
+        save_path: path to the directory of the cache
+        label_type: string, the label type of labels stored with the log
+            posteriors
+    """
+
+    def __init__(self, save_path, label_type):
+        if not os.path.isdir(save_path):
+            os.makedirs(save_path)
+        self.save_path = save_path
+        self.label_type = label_type
+        self.num_classes = None
+        self.is_raw_label = None
+
+        self.positions, self.names, self.frame_nums = [], [], []
+        self.label_list = []
+        self.f = open(join(save_path, LOG_POSTERIOR_FILE_NAME), 'wb')
+
+    def add(self, position, name, log_posteriors, label):
+        """
+        Args:
+            position: int, the position of the utterance in the dataset
+            name: string, the name of the utterance
+            log_posteriors: np.ndarray of size `[frame_num, num_classes]`
+            label: np.ndarray of label indices, or a sequence of strings
+        """
+        log_posteriors = np.ascontiguousarray(log_posteriors,
+                                              dtype=np.float32)
+        if self.num_classes is None:
+            self.num_classes = log_posteriors.shape[1]
+        if log_posteriors.ndim != 2 or (
+                log_posteriors.shape[1] != self.num_classes):
+            raise ValueError('log_posteriors must be `[frame_num, %d]`.' %
+                             self.num_classes)
+
+        label = np.asarray(label)
+        is_raw_label = not np.issubdtype(label.dtype, np.integer)
+        if self.is_raw_label is None:
+            self.is_raw_label = is_raw_label
+        if is_raw_label != self.is_raw_label:
+            raise ValueError('Labels must be all indices or all strings.')
+        if is_raw_label:
+            label = np.array([ord(c) for c in ''.join(label.tolist())],
+                             dtype=np.int32)
+
+        self.f.write(log_posteriors.tobytes())
+        self.positions.append(position)
+        self.names.append(name)
+        self.frame_nums.append(len(log_posteriors))
+        self.label_list.append(label.astype(np.int32))
+
+    def close(self):
+        """Write labels and the index."""
+        self.f.close()
+        if len(set(self.positions)) != len(self.positions):
+            raise ValueError('Each utterance must be added once.')
+
+        # Offsets in the order of writing
+        frame_nums = np.array(self.frame_nums, dtype=np.int64)
+        offsets = np.zeros((len(frame_nums),), dtype=np.int64)
+        offsets[1:] = np.cumsum(frame_nums)[:-1]
+
+        # Index in the order of the dataset
+        order = np.argsort(self.positions, kind='mergesort')
+        label_list = [self.label_list[i] for i in order]
+        label_lens = np.array(list(map(len, label_list)), dtype=np.int64)
+        label_offsets = np.zeros((len(label_lens),), dtype=np.int64)
+        label_offsets[1:] = np.cumsum(label_lens)[:-1]
+        if len(label_list) > 0:
+            labels = np.concatenate(label_list)
+        else:
+            labels = np.zeros((0,), dtype=np.int32)
+        np.save(join(self.save_path, LABEL_FILE_NAME), labels)
+
+        np.savez(join(self.save_path, INDEX_FILE_NAME),
+                 names=np.array(self.names)[order],
+                 offsets=offsets[order],
+                 frame_nums=frame_nums[order],
+                 label_offsets=label_offsets,
+                 label_lens=label_lens,
+                 num_classes=self.num_classes,
+                 label_type=self.label_type,
+                 is_raw_label=bool(self.is_raw_label))
+
+
+class PosteriorCache(object):
+    """Read-only view of a cache of log posteriors.
+    Args:
+        cache_path: path to the directory of the cache
+    """
+
+    def __init__(self, cache_path):
+        if not os.path.isfile(join(cache_path, INDEX_FILE_NAME)):
+            raise ValueError(
+                'There is not a cache of posteriors in %s. Dump posteriors '
+                'with the evaluation script first.' % cache_path)
+        self.cache_path = cache_path
+
+        index = np.load(join(cache_path, INDEX_FILE_NAME))
+        self.names = index['names']
+        self.offsets = index['offsets']
+        self.frame_nums = index['frame_nums']
+        self.label_offsets = index['label_offsets']
+        self.label_lens = index['label_lens']
+        self.num_classes = int(index['num_classes'])
+        self.label_type = str(index['label_type'])
+        self.is_raw_label = bool(index['is_raw_label'])
+        self.data_num = len(self.names)
+
+        self.all_log_posteriors = np.memmap(
+            join(cache_path, LOG_POSTERIOR_FILE_NAME), dtype=np.float32,
+            mode='r', shape=(int(self.frame_nums.sum()), self.num_classes))
+        self.labels = np.load(join(cache_path, LABEL_FILE_NAME),
+                              mmap_mode='r')
+
+    @property
+    def blank_index(self):
+        # Blank class is set to the last class in TensorFlow
+        return self.num_classes - 1
+
+    def log_posteriors(self, index):
+        """Returns a zero-copy view of the log posteriors of an utterance.
+        Args:
+            index: int, the index of the utterance
+        Returns:
+            A memory-mapped array of size `[frame_num, num_classes]`
+        """
+        offset = self.offsets[index]
+        return self.all_log_posteriors[offset:offset + self.frame_nums[index]]
+
+    def label(self, index):
+        """
+        Args:
+            index: int, the index of the utterance
+        Returns:
+            label: np.ndarray of label indices, or list of characters if
+                labels are not indices
+        """
+        offset = self.label_offsets[index]
+        label = np.array(self.labels[offset:offset + self.label_lens[index]])
+        if self.is_raw_label:
+            return [chr(c) for c in label]
+        return label
+
+    def decode(self, beam_width=None, indices=None, num_worker=1,
+               is_progressbar=False):
+        """Decode the log posteriors of utterances by numpy decoders (see
+           models/ctc/streaming_decoder.py).
+        Args:
+            beam_width: int, beam width for beam search. If None, use greedy
+                decoding.
+            indices: list of indices of utterances. If None, decode all
+                utterances.
+            num_worker: int, the number of processes. If more than 1,
+                utterances are divided among a process pool.
+            is_progressbar: if True, visualize progressbar
+        Returns:
+            labels_pred: list of np.ndarray of decoded labels
+        """
+        if indices is None:
+            indices = range(self.data_num)
+        args = ((self.log_posteriors(i), self.blank_index, beam_width)
+                for i in wrap_iterator(indices, is_progressbar))
+
+        if num_worker > 1:
+            pool = Pool(num_worker)
+            try:
+                labels_pred = pool.map(_decode, args, 16)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            labels_pred = list(map(_decode, args))
+        return labels_pred
+
+
+def _decode(args):
+    log_posteriors, blank_index, beam_width = args
+    if beam_width is None:
+        decoder = GreedyStreamingDecoder(blank_index)
+    else:
+        decoder = BeamSearchStreamingDecoder(blank_index, beam_width)
+    return np.array(decoder.step(log_posteriors), dtype=np.int32)
+
+
+def dump_posteriors(session, log_posteriors_ops, outputs_seq_len_op,
+                    network, dataset, save_paths, label_types,
+                    max_frame_num=None, is_progressbar=False):
+    """Run the acoustic model over a dataset once and write log posteriors
+       of each task to a cache.
+    Args:
+        session: session of training model
+        log_posteriors_ops: list of operations for computing log posteriors
+            of size `[batch_size, max_time, num_classes]` of each task (see
+            `log_posteriors` of the CTC models)
+        outputs_seq_len_op: operation for computing lengths of the log
+            posteriors
+        network: network to evaluate
+        dataset: An instance of a `Dataset` class. Labels of the i-th task
+            are the (i + 1)-th element of each mini-batch.
+        save_paths: list of paths to the cache of each task
+        label_types: list of label types of each task in the dataset
+        max_frame_num: int, the number of frames in each mini-batch of
+            utterances sorted by length (see eval_batch.py)
+        is_progressbar: if True, visualize progressbar
+    """
+    if not (len(log_posteriors_ops) == len(save_paths) == len(label_types)):
+        raise ValueError(
+            'Set save_paths and label_types of each log_posteriors_op.')
+    writers = [PosteriorCacheWriter(save_path, label_type)
+               for save_path, label_type in zip(save_paths, label_types)]
+
+    mini_batches = eval_batches(dataset, max_frame_num=max_frame_num)
+    for batch, positions in wrap_iterator(mini_batches, is_progressbar):
+        inputs, inputs_seq_len, input_names = batch[0], batch[-2], batch[-1]
+
+        feed_dict = {
+            network.inputs: inputs,
+            network.inputs_seq_len: inputs_seq_len,
+            network.keep_prob_input: 1.0,
+            network.keep_prob_hidden: 1.0
+        }
+
+        outputs = session.run(list(log_posteriors_ops) + [outputs_seq_len_op],
+                              feed_dict=feed_dict)
+        outputs_seq_len = outputs[-1]
+
+        for i_task, writer in enumerate(writers):
+            log_posteriors, labels = outputs[i_task], batch[1 + i_task]
+            for i_batch, position in enumerate(positions):
+                label = labels[i_batch]
+                if isinstance(label, np.ndarray) and np.issubdtype(
+                        label.dtype, np.integer):
+                    # Remove padding
+                    label = label[label != -1]
+                writer.add(position, input_names[i_batch],
+                           log_posteriors[i_batch, :outputs_seq_len[i_batch]],
+                           label)
+
+    for writer in writers:
+        writer.close()
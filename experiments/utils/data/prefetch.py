@@ -0,0 +1,121 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Build mini-batches on worker threads ahead of the training loop."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from six.moves import queue
+
+
+class PrefetchStats(object):
+    """Statistics of the prefetch queue.
+    Args:
+        num_prefetch: int, the maximum number of batches in the queue
+    """
+
+    def __init__(self, num_prefetch):
+        self.num_prefetch = num_prefetch
+        self.queue_depth = 0
+        self.wait_time = 0.
+        self.batch_num = 0
+
+    def update(self, queue_depth, wait_time):
+        self.queue_depth = queue_depth
+        self.wait_time += wait_time
+        self.batch_num += 1
+
+    @property
+    def wait_time_mean(self):
+        if self.batch_num == 0:
+            return 0.
+        return self.wait_time / self.batch_num
+
+    def reset(self):
+        self.wait_time = 0.
+        self.batch_num = 0
+
+    def __str__(self):
+        return 'queue: %d/%d, data wait: %.3f sec/batch' % (
+            self.queue_depth, self.num_prefetch, self.wait_time_mean)
+
+
+def prefetch(index_generator, load_fn, num_prefetch, num_worker=1,
+             stats=None):
+    """Load mini-batches in the background and yield them in order.
+    Args:
+        index_generator: A generator yielding the arguments of `load_fn`
+            (e.g. indices of utterances in each mini-batch)
+        load_fn: A function to build a mini-batch from the output of
+            `index_generator`
+        num_prefetch: int, the maximum number of mini-batches built in advance
+        num_worker: int, the number of threads to build mini-batches
+        stats: An instance of `PrefetchStats` to record the queue depth and
+            the time waiting for data
+    Returns:
+        A generator yielding the outputs of `load_fn` in the same order as
+            `index_generator`. Close it (`close()`) to stop the background
+            threads.
+    """
+    if num_prefetch < 1:
+        raise ValueError('num_prefetch must be more than 0.')
+
+    executor = ThreadPoolExecutor(max_workers=num_worker)
+    future_queue = queue.Queue(maxsize=num_prefetch)
+    stop_event = threading.Event()
+
+    def producer():
+        # NOTE: The queue is bounded, so that index_generator never goes
+        # ahead of the consumer by more than num_prefetch mini-batches
+        try:
+            for args in index_generator:
+                if stop_event.is_set():
+                    return
+                future_queue.put(executor.submit(load_fn, args))
+            # The end of index_generator
+            future_queue.put(None)
+        except Exception as e:
+            # Re-raise in the consumer thread
+            future = Future()
+            future.set_exception(e)
+            future_queue.put(future)
+
+    thread = threading.Thread(target=producer)
+    thread.daemon = True
+    thread.start()
+
+    try:
+        while True:
+            start_time = time.time()
+            future = future_queue.get()
+            if future is None:
+                return
+            batch = future.result()
+            if stats is not None:
+                stats.update(future_queue.qsize(), time.time() - start_time)
+            yield batch
+    finally:
+        # Stop the producer when the generator is closed. It may be blocked
+        # on the full queue, so keep taking mini-batches out of the queue.
+        stop_event.set()
+        while thread.is_alive():
+            _cancel_all(future_queue)
+            thread.join(0.01)
+        _cancel_all(future_queue)
+        executor.shutdown(wait=True)
+
+
+def _cancel_all(future_queue):
+    """Cancel the loading of all mini-batches in the queue."""
+    while True:
+        try:
+            future = future_queue.get_nowait()
+        except queue.Empty:
+            return
+        if future is not None:
+            future.cancel()
@@ -0,0 +1,274 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Sample indices of utterances in each mini-batch. The order of an epoch is
+   fixed as a permuted index array at the beginning of the epoch, and each
+   mini-batch is a slice of it.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+SAMPLE_MODES = ['sorted', 'bucket', 'random']
+
+
+class BatchSampler(object):
+    """Sampler of mini-batches.
+    Args:
+        seq_lens: list of the number of frames of each utterance
+        mode: string, sorted or bucket or random
+            sorted: sort utterances by length in ascending order
+            bucket: divide utterances sorted by length into buckets of
+                `bucket_size` utterances, shuffle utterances within each
+                bucket, and shuffle the order of mini-batches
+            random: shuffle all utterances
+        bucket_size: int, the number of utterances in each bucket. This is
+            used only in bucket mode. If None, use 10 mini-batches.
+        max_frame_num: int, if set, fill each mini-batch with utterances
+            until the number of frames including padding exceeds this value,
+            instead of using a fixed batch size. An utterance longer than
+            this value makes a mini-batch by itself.
+        label_lens: list of the number of labels of each utterance. This is
+            necessary only when `max_label_num` is set.
+        max_label_num: int, if set with `max_frame_num`, also limit the total
+            number of labels in each mini-batch
+        data_indices: list of indices of utterances to sample (e.g. the
+            shard of a worker). If None, all utterances are sampled.
+        divisor: int, if more than 1, drop the last utterances of each
+            epoch so that the number of utterances in each epoch is
+            divisible by this value (e.g. num_gpu, so that the last
+            mini-batch is divided into all towers). The dropped utterances
+            are the longest ones in sorted mode, and change every epoch in
+            the other modes. This is not used with `max_frame_num`.
+    """
+
+    def __init__(self, seq_lens, mode='sorted', bucket_size=None,
+                 max_frame_num=None, label_lens=None, max_label_num=None,
+                 data_indices=None, divisor=1):
+        if mode not in SAMPLE_MODES:
+            raise ValueError('mode must be "sorted" or "bucket" or "random".')
+        if bucket_size is not None and bucket_size < 1:
+            raise ValueError('bucket_size must be more than 0.')
+        if max_label_num is not None:
+            if max_frame_num is None:
+                raise ValueError('Set max_frame_num to use max_label_num.')
+            if label_lens is None:
+                raise ValueError('Set label_lens to use max_label_num.')
+        if divisor < 1:
+            raise ValueError('divisor must be more than 0.')
+
+        self.seq_lens = np.array(seq_lens, dtype=np.int64)
+        self.mode = mode
+        self.bucket_size = bucket_size
+        self.max_frame_num = max_frame_num
+        self.max_label_num = max_label_num
+        if label_lens is not None:
+            self.label_lens = np.array(label_lens, dtype=np.int64)
+        else:
+            self.label_lens = None
+        if data_indices is not None:
+            self.data_indices = np.array(data_indices, dtype=np.int64)
+        else:
+            self.data_indices = np.arange(len(self.seq_lens))
+        self.data_num = len(self.data_indices)
+        self.divisor = divisor
+        if max_frame_num is None and divisor > 1:
+            self.epoch_data_num = self.data_num - self.data_num % divisor
+            if self.data_num > 0 and self.epoch_data_num == 0:
+                raise ValueError(
+                    'The number of utterances must be divisor or more.')
+        else:
+            self.epoch_data_num = self.data_num
+        self.sorted_indices = self.data_indices[np.argsort(
+            self.seq_lens[self.data_indices], kind='mergesort')]
+
+        self.epoch_indices = None
+        self.offset = 0
+
+        # Boundaries of mini-batches in epoch_indices
+        self.batch_offsets = None
+        self.batch_index = 0
+
+        # Padding statistics
+        self.padding_ratio = 0.
+        self.padded_frame_num = 0
+        self.frame_num = 0
+
+    @property
+    def rest(self):
+        """The number of utterances not sampled yet in the current epoch."""
+        if self.epoch_indices is None:
+            return self.epoch_data_num
+        return self.epoch_data_num - self.offset
+
+    def reset(self, batch_size=1):
+        """Make the order of utterances in a new epoch.
+        Args:
+            batch_size: int, the size of mini-batch. This is not used with
+                `max_frame_num`.
+        """
+        self.epoch_indices = self._epoch_order(
+            batch_size)[:self.epoch_data_num]
+        self.offset = 0
+        self.batch_index = 0
+
+        if self.max_frame_num is not None:
+            self.batch_offsets = self._plan_batches(self.epoch_indices)
+        else:
+            self.batch_offsets = np.append(
+                np.arange(0, self.epoch_data_num, batch_size),
+                self.epoch_data_num)
+
+        if self.mode == 'bucket':
+            self._shuffle_batches()
+
+    def _epoch_order(self, batch_size):
+        """Make the order of utterances in an epoch without changing the
+           state of the sampler.
+        Args:
+            batch_size: int, the size of mini-batch
+        Returns:
+            indices: A numpy array of indices of utterances
+        """
+        if self.mode == 'sorted':
+            return self.sorted_indices
+        elif self.mode == 'random':
+            return np.random.permutation(self.data_indices)
+
+        bucket_size = self.bucket_size
+        if bucket_size is None:
+            bucket_size = batch_size * 10
+
+        # Shuffle within each bucket
+        bucket_ids = np.arange(self.data_num) // bucket_size
+        keys = np.random.random(self.data_num)
+        return self.sorted_indices[np.lexsort((keys, bucket_ids))]
+
+    def _plan_batches(self, indices):
+        """Divide utterances into mini-batches under the frame budget.
+        Args:
+            indices: A numpy array of indices of utterances in the order of
+                the epoch
+        Returns:
+            batch_offsets: A numpy array of boundaries of mini-batches in
+                `indices` of size `[batch_num + 1]`
+        """
+        batch_offsets = [0]
+        max_seq_len, label_num = 0, 0
+        for i, index in enumerate(indices):
+            seq_len = self.seq_lens[index]
+            batch_size = i - batch_offsets[-1]
+            max_seq_len = max(max_seq_len, seq_len)
+            if self.max_label_num is not None:
+                label_num += self.label_lens[index]
+
+            if batch_size > 0:
+                if max_seq_len * (batch_size + 1) > self.max_frame_num or (
+                        self.max_label_num is not None and
+                        label_num > self.max_label_num):
+                    # Start a new mini-batch from this utterance
+                    batch_offsets.append(i)
+                    max_seq_len = seq_len
+                    if self.max_label_num is not None:
+                        label_num = self.label_lens[index]
+        batch_offsets.append(len(indices))
+        return np.array(batch_offsets, dtype=np.int64)
+
+    def _shuffle_batches(self):
+        """Shuffle the order of mini-batches in the epoch. The last
+           mini-batch may be smaller than the others, so keep it at the end
+           of the epoch.
+        """
+        batch_num = len(self.batch_offsets) - 1
+        batch_order = np.arange(batch_num)
+        batch_order[:-1] = np.random.permutation(batch_num - 1)
+
+        batch_lens = np.diff(self.batch_offsets)
+        batch_ids = np.repeat(np.arange(batch_num), batch_lens)
+        self.epoch_indices = self.epoch_indices[
+            np.argsort(batch_order[batch_ids], kind='mergesort')]
+        batch_lens[batch_order] = batch_lens.copy()
+        self.batch_offsets = np.append(0, np.cumsum(batch_lens))
+
+    def batch_num(self, batch_size):
+        """The number of mini-batches in the current epoch, or the next one
+           if the current epoch is over. This does not change the state of
+           the sampler.
+
+           NOTE: With `max_frame_num`, the number of mini-batches depends on
+           the order of utterances. In random and bucket mode, the number of
+           an epoch not planned yet is the one of a random order, and the
+           epoch actually sampled may have a different number. Use
+           `next_epoch_flag` of `sample` to find the end of an epoch.
+        Args:
+            batch_size: int, the size of mini-batch. This is not used with
+                `max_frame_num`.
+        Returns:
+            batch_num: int
+        """
+        if self.max_frame_num is None:
+            return -(-self.epoch_data_num // batch_size)
+        if self.epoch_indices is not None:
+            return len(self.batch_offsets) - 1
+        # The mini-batches of the bucket mode are planned before shuffling
+        # the order of them
+        return len(self._plan_batches(self._epoch_order(batch_size))) - 1
+
+    def sample(self, batch_size):
+        """Sample indices of utterances in the next mini-batch.
+        Args:
+            batch_size: int, the size of mini-batch. This is not used with
+                `max_frame_num`.
+        Returns:
+            data_indices: list of indices of utterances
+            next_epoch_flag: if True, the mini-batch is the last one in the
+                epoch
+        """
+        if self.epoch_indices is None:
+            self.reset(batch_size)
+
+        if self.max_frame_num is not None:
+            batch_size = (self.batch_offsets[self.batch_index + 1] -
+                          self.batch_offsets[self.batch_index])
+            self.batch_index += 1
+
+        next_epoch_flag = False
+        if self.rest > batch_size:
+            data_indices = self.epoch_indices[
+                self.offset:self.offset + batch_size]
+            self.offset += batch_size
+        else:
+            data_indices = self.epoch_indices[self.offset:]
+            next_epoch_flag = True
+            self.epoch_indices = None
+
+        self._update_padding(data_indices)
+
+        return data_indices.tolist(), next_epoch_flag
+
+    def _update_padding(self, data_indices):
+        seq_lens = self.seq_lens[data_indices]
+        padded_frame_num = seq_lens.max() * len(seq_lens)
+        frame_num = seq_lens.sum()
+        self.padding_ratio = 1 - frame_num / padded_frame_num
+        self.padded_frame_num += padded_frame_num
+        self.frame_num += frame_num
+
+    @property
+    def padding_ratio_mean(self):
+        """The ratio of padded frames in all mini-batches since the last
+           `reset_stats`."""
+        if self.padded_frame_num == 0:
+            return 0.
+        return 1 - self.frame_num / self.padded_frame_num
+
+    def reset_stats(self):
+        self.padded_frame_num = 0
+        self.frame_num = 0
+
+    def __str__(self):
+        return 'padding: %.3f (last batch: %.3f)' % (
+            self.padding_ratio_mean, self.padding_ratio)
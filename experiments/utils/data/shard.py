@@ -0,0 +1,89 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Divide a dataset into shards for workers of distributed training. Each
+   worker samples mini-batches only from its own shard.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import basename
+import numpy as np
+
+from experiments.utils.data.sampler import BatchSampler
+
+
+def speaker_name(input_name):
+    """
+    Args:
+        input_name: string, the name of an utterance (e.g. A01M0097_0000211)
+    Returns:
+        string, the name of the speaker
+    """
+    return input_name.split('_')[0]
+
+
+def shard_indices(input_names, num_shard, shard_index, by_speaker=False):
+    """
+    Args:
+        input_names: list of names of utterances
+        num_shard: int, the number of shards
+        shard_index: int, the index of the shard to return
+        by_speaker: if True, all utterances of a speaker belong to the same
+            shard. Speakers are assigned to the shard with the fewest
+            utterances in descending order of the number of utterances.
+            If False, utterances are assigned in turn.
+    Returns:
+        data_indices: A numpy array of indices of utterances in the shard
+    """
+    if not 0 <= shard_index < num_shard:
+        raise ValueError('shard_index must be in [0, num_shard).')
+
+    if not by_speaker:
+        return np.arange(shard_index, len(input_names), num_shard)
+
+    speaker_dict = {}
+    for i, input_name in enumerate(input_names):
+        speaker_dict.setdefault(speaker_name(input_name), []).append(i)
+    if len(speaker_dict) < num_shard:
+        raise ValueError('The number of speakers (%d) is less than num_shard.'
+                         % len(speaker_dict))
+
+    # Sort by speaker name to break ties in the same way in every worker
+    speakers = sorted(speaker_dict.keys(),
+                      key=lambda x: (-len(speaker_dict[x]), x))
+    shard_sizes = np.zeros(num_shard, dtype=np.int64)
+    data_indices = []
+    for speaker in speakers:
+        i_shard = int(np.argmin(shard_sizes))
+        shard_sizes[i_shard] += len(speaker_dict[speaker])
+        if i_shard == shard_index:
+            data_indices.extend(speaker_dict[speaker])
+    return np.array(sorted(data_indices), dtype=np.int64)
+
+
+def shard_dataset(dataset, num_shard, shard_index, by_speaker=False):
+    """Restrict the sampler of a dataset to a shard. Call this before
+       `next_batch`.
+    Args:
+        dataset: An instance of a `Dataset` class
+        num_shard: int, the number of shards
+        shard_index: int, the index of the shard of this worker
+        by_speaker: if True, divide by speaker (see shard_indices)
+    """
+    input_names = [basename(path).split('.')[0]
+                   for path in dataset.input_paths]
+    data_indices = shard_indices(input_names, num_shard, shard_index,
+                                 by_speaker)
+
+    sampler = dataset.sampler
+    dataset.sampler = BatchSampler(sampler.seq_lens,
+                                   mode=sampler.mode,
+                                   bucket_size=sampler.bucket_size,
+                                   max_frame_num=sampler.max_frame_num,
+                                   label_lens=sampler.label_lens,
+                                   max_label_num=sampler.max_label_num,
+                                   data_indices=data_indices,
+                                   divisor=sampler.divisor)
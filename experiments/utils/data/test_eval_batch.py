@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import basename
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../../')
+from experiments.utils.data.eval_batch import DEFAULT_EVAL_FRAME_NUM
+from experiments.utils.data.eval_batch import eval_batches, restore_order
+from experiments.utils.data.sampler import BatchSampler
+from experiments.utils.labels.ragged import truncate_after_eos
+
+
+class ToyDataset(object):
+    """Dataset of random lengths. Utterances are shuffled within each
+       mini-batch as in datasets loading each mini-batch."""
+
+    def __init__(self, data_num, batch_size):
+        self.batch_size = batch_size
+        self.num_gpu = 1
+        self.num_prefetch = 2
+        self.data_num = data_num
+        self.seq_lens = np.random.randint(1, 500, size=data_num)
+        self.input_paths = np.array(
+            ['/path/to/utt%d.npy' % i for i in range(data_num)])
+        self.sampler = BatchSampler(self.seq_lens, mode='random')
+
+    def next_batch(self, batch_size=None):
+        if batch_size is None:
+            batch_size = self.batch_size
+        # Mini-batches are loaded in this thread during evaluation
+        assert self.num_prefetch == 0
+        while True:
+            data_indices, _ = self.sampler.sample(batch_size)
+            np.random.shuffle(data_indices)
+            inputs_seq_len = self.seq_lens[data_indices]
+            input_names = [basename(path).split('.')[0] for path in
+                           np.take(self.input_paths, data_indices, axis=0)]
+            yield inputs_seq_len, input_names
+
+
+class TestEvalBatch(unittest.TestCase):
+
+    def test(self):
+        self.check_eval_batches(max_frame_num=None, batch_size=None)
+        self.check_eval_batches(max_frame_num=2000, batch_size=None)
+        self.check_eval_batches(max_frame_num=1, batch_size=None)
+        self.check_eval_batches(max_frame_num=None, batch_size=7)
+
+    def check_eval_batches(self, max_frame_num, batch_size):
+
+        print('----- max_frame_num: %s, batch_size: %s -----' %
+              (str(max_frame_num), str(batch_size)))
+
+        dataset = ToyDataset(data_num=103, batch_size=10)
+        sampler = dataset.sampler
+
+        frame_budget = max_frame_num
+        if max_frame_num is None and batch_size is None:
+            frame_budget = DEFAULT_EVAL_FRAME_NUM
+
+        seq_lens, names, positions = [], [], []
+        batch_max_seq_lens = []
+        for batch, positions_batch in eval_batches(
+                dataset, max_frame_num=max_frame_num, batch_size=batch_size):
+            inputs_seq_len, input_names = batch
+            if frame_budget is None:
+                self.assertTrue(len(input_names) <= batch_size)
+            elif len(input_names) > 1:
+                # Frame budget including padding
+                self.assertTrue(
+                    max(inputs_seq_len) * len(input_names) <= frame_budget)
+            batch_max_seq_lens.append(max(inputs_seq_len))
+            seq_lens.extend(inputs_seq_len)
+            names.extend(input_names)
+            positions.extend(positions_batch)
+
+        # Mini-batches are sorted by length
+        self.assertTrue(np.all(np.diff(batch_max_seq_lens) >= 0))
+
+        # Each utterance is evaluated once, and put back in the original
+        # order
+        self.assertEqual(sorted(positions), list(range(dataset.data_num)))
+        self.assertEqual(restore_order(names, positions),
+                         ['utt%d' % i for i in range(dataset.data_num)])
+        self.assertEqual(restore_order(seq_lens, positions),
+                         list(dataset.seq_lens))
+
+        # The dataset is restored
+        self.assertIs(dataset.sampler, sampler)
+        self.assertEqual(dataset.num_prefetch, 2)
+
+    def test_error(self):
+        dataset = ToyDataset(data_num=10, batch_size=2)
+        dataset.num_gpu = 2
+        with self.assertRaises(ValueError):
+            next(eval_batches(dataset))
+        with self.assertRaises(ValueError):
+            restore_order([1, 2], [0])
+
+    def test_truncate_after_eos(self):
+        labels = np.array([[3, 4, 1, 5, 1],
+                           [3, 1, 1, 1, 1],
+                           [3, 4, 5, 6, 7]])
+        truncated = truncate_after_eos(labels, eos_index=1)
+        self.assertEqual([list(l) for l in truncated],
+                         [[3, 4, 1], [3, 1], [3, 4, 5, 6, 7]])
+
+
+if __name__ == '__main__':
+    unittest.main()
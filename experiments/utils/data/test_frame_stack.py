@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../../')
+from experiments.utils.data.frame_stack import stack_frame, stack_frame_utterance
+from experiments.utils.data.frame_stack import stack_frame_batch, FrameStacker
+
+
+def stack_frame_loop(inputs, num_stack, num_skip):
+    """The former implementation of stack_frame_utterance, which stacks
+       frames one by one."""
+    frame_num, input_size = inputs.shape
+    frame_num_decimated = -(-frame_num // num_skip)
+
+    stacked_frames = np.zeros((frame_num_decimated, input_size * num_stack))
+    stack_count = 0
+    stack = []
+    for i_frame, frame in enumerate(inputs):
+        if i_frame == frame_num - 1:
+            # Stack the final frame and fill the rest with zeros
+            stack.append(frame)
+            while stack_count != frame_num_decimated:
+                for i_stack in range(len(stack)):
+                    stacked_frames[stack_count][
+                        input_size * i_stack:
+                        input_size * (i_stack + 1)] = stack[i_stack]
+                stack_count += 1
+                for _ in range(num_skip):
+                    if len(stack) != 0:
+                        stack.pop(0)
+
+        elif len(stack) < num_stack:
+            stack.append(frame)
+            if len(stack) == num_stack:
+                for i_stack in range(num_stack):
+                    stacked_frames[stack_count][
+                        input_size * i_stack:
+                        input_size * (i_stack + 1)] = stack[i_stack]
+                stack_count += 1
+                for _ in range(num_skip):
+                    stack.pop(0)
+
+    return stacked_frames
+
+
+class TestFrameStack(unittest.TestCase):
+    def test(self):
+        # Including utterances shorter than num_stack
+        for num_stack, num_skip in [(1, 1), (3, 1), (3, 2), (3, 3), (5, 3),
+                                    (4, 4)]:
+            for frame_num in [1, 2, 3, 4, 7, 30]:
+                self.check_utterance(frame_num, num_stack, num_skip)
+            self.check_batch([1, 2, 9, 30], num_stack, num_skip)
+
+        with self.assertRaises(ValueError):
+            stack_frame_utterance(np.zeros((5, 3)), 2, 3)
+
+    def check_utterance(self, frame_num, num_stack, num_skip):
+        inputs = np.random.randn(frame_num, 3).astype(np.float32)
+        stacked_inputs = stack_frame_utterance(inputs, num_stack, num_skip)
+        stacked_inputs_loop = stack_frame_loop(inputs, num_stack, num_skip)
+        self.assertEqual(stacked_inputs.dtype, np.float32)
+        self.assertTrue(np.array_equal(stacked_inputs, stacked_inputs_loop))
+
+    def check_batch(self, frame_nums, num_stack, num_skip):
+        input_list = [np.random.randn(frame_num, 3).astype(np.float32)
+                      for frame_num in frame_nums]
+        input_paths = ['/path/to/utt%d.npy' % i
+                       for i in range(len(frame_nums))]
+        frame_num_dict = {'utt%d' % i: frame_num
+                          for i, frame_num in enumerate(frame_nums)}
+        stacked_input_list = stack_frame(input_list, input_paths,
+                                         frame_num_dict, num_stack, num_skip)
+
+        # Padded mini-batch
+        inputs = np.zeros((len(frame_nums), max(frame_nums), 3),
+                          dtype=np.float32)
+        for i, frame_num in enumerate(frame_nums):
+            inputs[i, :frame_num] = input_list[i]
+        stacked_inputs, stacked_inputs_seq_len = stack_frame_batch(
+            inputs, np.array(frame_nums), num_stack, num_skip)
+
+        for i, frame_num in enumerate(frame_nums):
+            stacked_inputs_loop = stack_frame_loop(input_list[i], num_stack,
+                                                   num_skip)
+            self.assertTrue(np.array_equal(stacked_input_list[i],
+                                           stacked_inputs_loop))
+            self.assertEqual(stacked_inputs_seq_len[i],
+                             len(stacked_inputs_loop))
+            self.assertTrue(np.array_equal(
+                stacked_inputs[i, :len(stacked_inputs_loop)],
+                stacked_inputs_loop))
+
+
+class TestFrameStacker(unittest.TestCase):
+    def test(self):
+        for num_stack, num_skip in [(1, 1), (3, 3), (5, 3), (4, 1)]:
+            for frame_num in [1, 2, 7, 30]:
+                for chunk_size in [1, 2, 5, 100]:
+                    self.check_streaming(frame_num, num_stack, num_skip,
+                                         chunk_size)
+
+    def check_streaming(self, frame_num, num_stack, num_skip, chunk_size):
+        inputs = np.random.randn(frame_num, 3).astype(np.float32)
+        stacked_inputs = stack_frame_utterance(inputs, num_stack, num_skip)
+
+        stacker = FrameStacker(3, num_stack, num_skip)
+        for _ in range(2):
+            # The stacker is reset after flush
+            outputs = []
+            for t in range(0, frame_num, chunk_size):
+                outputs.append(stacker.push(inputs[t:t + chunk_size]))
+            outputs.append(stacker.flush())
+            outputs = np.concatenate(outputs, axis=0)
+            self.assertTrue(np.array_equal(outputs, stacked_inputs))
+
+
+if __name__ == '__main__':
+    unittest.main()
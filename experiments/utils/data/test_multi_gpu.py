@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import join
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../../../')
+from experiments.utils.data.ctc_each_load import DatasetBase
+from experiments.utils.data.multi_gpu import compute_divide_num, split_batch
+from experiments.utils.data.multi_gpu import make_tower_feed_dict
+
+
+class ToyDataset(DatasetBase):
+    """Dataset of random utterances saved in a temporary directory."""
+
+    def __init__(self, data_path, data_num, batch_size, num_gpu):
+        self.data_type = 'train'
+        self.label_type = 'toy'
+        self.batch_size = batch_size * num_gpu
+        self.num_stack = None
+        self.num_skip = None
+        self.is_sorted = True
+        self.is_progressbar = False
+        self.num_gpu = num_gpu
+        self.num_prefetch = 0
+        self.num_prefetch_thread = 1
+        self.prefetch_stats = None
+        self.input_size = 3
+        self.is_test = False
+        self.packed = None
+
+        self.frame_num_dict = {}
+        input_paths, label_paths = [], []
+        for i in range(data_num):
+            input_name = 'utt%d' % i
+            frame_num = np.random.randint(5, 20)
+            self.frame_num_dict[input_name] = frame_num
+            input_paths.append(join(data_path, input_name + '.npy'))
+            label_paths.append(join(data_path, input_name + '_label.npy'))
+            np.save(input_paths[-1],
+                    np.random.randn(frame_num, self.input_size))
+            np.save(label_paths[-1],
+                    np.random.randint(0, 10, size=frame_num // 2 + 1))
+        self.input_paths = np.array(input_paths)
+        self.label_paths = np.array(label_paths)
+        self.data_num = data_num
+
+        self._init_sampler()
+
+
+class TestMultiGPU(unittest.TestCase):
+
+    def test(self):
+        self.assertEqual(compute_divide_num(64, 4), 4)
+        self.assertEqual(compute_divide_num(30, 4), 3)
+        self.assertEqual(compute_divide_num(7, 4), 1)
+        self.assertEqual(compute_divide_num(2, 4), 2)
+
+        batch = (np.arange(12).reshape(6, 2), ['a', 'b', 'c', 'd', 'e', 'f'])
+        inputs, names = split_batch(batch, num_gpu=4)
+        self.assertEqual(len(inputs), 3)
+        self.assertEqual(names[2], ['e', 'f'])
+
+        placeholders_list = [('inputs%d' % i, 'names%d' % i)
+                             for i in range(3)]
+        feed_dict = make_tower_feed_dict(placeholders_list, (inputs, names))
+        self.assertEqual(len(feed_dict), 6)
+        self.assertEqual(feed_dict['names0'], ['a', 'b'])
+        self.assertEqual(feed_dict['names2'], ['e', 'f'])
+
+        # A mini-batch divided into fewer parts than towers is not fed
+        # cyclically
+        placeholders_list.append(('inputs3', 'names3'))
+        with self.assertRaises(ValueError):
+            make_tower_feed_dict(placeholders_list, (inputs, names))
+
+        self.check_graph_size(data_num=103, batch_size=8, num_gpu=4)
+        self.check_graph_size(data_num=50, batch_size=5, num_gpu=2)
+
+    def check_graph_size(self, data_num, batch_size, num_gpu):
+
+        print('----- data_num: %d, batch_size: %d, num_gpu: %d -----' %
+              (data_num, batch_size, num_gpu))
+
+        data_path = tempfile.mkdtemp()
+        try:
+            dataset = ToyDataset(data_path, data_num, batch_size, num_gpu)
+
+            tf.reset_default_graph()
+            graph = tf.get_default_graph()
+            op_num = len(graph.get_operations())
+
+            mini_batch = dataset.next_batch()
+            utt_num = 0
+            for _ in range(3 * (data_num // (batch_size * num_gpu) + 1)):
+                inputs, labels, inputs_seq_len, input_names = next(mini_batch)
+                # The last utterances of each epoch are dropped, so every
+                # mini-batch is divided into all GPUs
+                self.assertEqual(len(inputs), num_gpu)
+                for inputs_gpu, labels_gpu, inputs_seq_len_gpu in zip(
+                        inputs, labels, inputs_seq_len):
+                    self.assertEqual(len(inputs_gpu), len(inputs[0]))
+                    self.assertEqual(len(labels_gpu), len(inputs_gpu))
+                    self.assertEqual(len(inputs_seq_len_gpu), len(inputs_gpu))
+                    utt_num += len(inputs_gpu)
+
+                # No op is added to the graph per mini-batch
+                self.assertEqual(len(graph.get_operations()), op_num)
+            self.assertTrue(utt_num >= 2 * data_num)
+        finally:
+            shutil.rmtree(data_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../../../')
+from experiments.utils.data.packed_corpus import PackedCorpus
+from experiments.utils.data.packed_corpus import pack_corpus, pack_directory
+
+
+class TestPackedCorpus(unittest.TestCase):
+
+    def setUp(self):
+        self.save_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.save_path)
+
+    def _make_directory(self, frame_num_dict, input_size):
+        """Save one .npy file per utterance as the existing layout."""
+        input_path = join(self.save_path, 'inputs')
+        label_paths = {'labels': join(self.save_path, 'labels'),
+                       'labels_sub': join(self.save_path, 'labels_sub')}
+        inputs, labels = {}, {'labels': {}, 'labels_sub': {}}
+        for input_name, frame_num in frame_num_dict.items():
+            inputs[input_name] = np.random.randn(
+                frame_num, input_size).astype(np.float32)
+            labels['labels'][input_name] = np.random.randint(
+                0, 10, size=frame_num // 2)
+            labels['labels_sub'][input_name] = np.random.randint(
+                0, 5, size=3)
+
+            if input_name.startswith('S'):
+                # CSJ: dataset/speaker_name/input_name.npy
+                sub_dir = input_name.split('_')[0]
+            else:
+                sub_dir = ''
+            for dir_path, data in [(input_path, inputs)] + [
+                    (label_paths[key], labels[key]) for key in labels]:
+                if not os.path.isdir(join(dir_path, sub_dir)):
+                    os.makedirs(join(dir_path, sub_dir))
+                np.save(join(dir_path, sub_dir, input_name + '.npy'),
+                        data[input_name])
+
+        with open(join(input_path, 'frame_num.pickle'), 'wb') as f:
+            pickle.dump(frame_num_dict, f)
+        return input_path, label_paths, inputs, labels
+
+    def test_pack_directory(self):
+        frame_num_dict = {'utt_a': 7, 'utt_b': 3, 'S01_0001': 12,
+                          'S01_0002': 5, 'utt_c': 1}
+        input_path, label_paths, inputs, labels = self._make_directory(
+            frame_num_dict, input_size=4)
+        packed_path = join(self.save_path, 'packed')
+        pack_directory(input_path, label_paths, packed_path)
+
+        corpus = PackedCorpus(packed_path)
+        self.assertEqual(corpus.data_num, len(frame_num_dict))
+        self.assertEqual(corpus.input_size, 4)
+        self.assertEqual(sorted(corpus.labels.keys()),
+                         ['labels', 'labels_sub'])
+        self.assertEqual(corpus.frame_num_dict, frame_num_dict)
+
+        # Sorted by frame num
+        self.assertEqual(list(corpus.names),
+                         ['utt_c', 'utt_b', 'S01_0002', 'utt_a', 'S01_0001'])
+        self.assertEqual(list(corpus.frame_nums), [1, 3, 5, 7, 12])
+
+        for i, input_name in enumerate(corpus.names):
+            input_i = corpus.input(i)
+            self.assertEqual(input_i.dtype, np.float32)
+            self.assertTrue(np.array_equal(input_i, inputs[input_name]))
+            for key in ['labels', 'labels_sub']:
+                label_i = corpus.label(i, key)
+                self.assertEqual(label_i.dtype, np.int32)
+                self.assertTrue(np.array_equal(label_i,
+                                               labels[key][input_name]))
+
+        indices = [4, 0, 2]
+        input_list = corpus.input_list(indices)
+        label_list = corpus.label_list(indices, 'labels_sub')
+        for i, index in enumerate(indices):
+            input_name = corpus.names[index]
+            self.assertTrue(np.array_equal(input_list[i],
+                                           inputs[input_name]))
+            self.assertTrue(np.array_equal(label_list[i],
+                                           labels['labels_sub'][input_name]))
+
+        # Open only some label types
+        corpus = PackedCorpus(packed_path, label_keys=['labels_sub'])
+        self.assertEqual(list(corpus.labels.keys()), ['labels_sub'])
+
+    def test_error(self):
+        input_paths, label_paths = [], []
+        for i in range(2):
+            input_paths.append(join(self.save_path, 'input%d.npy' % i))
+            np.save(input_paths[-1], np.zeros((3, 2), dtype=np.float32))
+            label_paths.append(join(self.save_path, 'label%d.npy' % i))
+        input_names = ['utt0', 'utt1']
+
+        # Raw strings (e.g. the kanji labels of the CSJ eval sets)
+        np.save(label_paths[0], np.array([1, 2]))
+        np.save(label_paths[1], np.array(list(u'あい')))
+        with self.assertRaises(ValueError):
+            pack_corpus(join(self.save_path, 'packed'), input_paths,
+                        {'labels': label_paths}, input_names)
+
+        # Float labels
+        np.save(label_paths[1], np.array([1.0, 2.0]))
+        with self.assertRaises(ValueError):
+            pack_corpus(join(self.save_path, 'packed'), input_paths,
+                        {'labels': label_paths}, input_names)
+
+        # The numbers of inputs and labels differ
+        with self.assertRaises(ValueError):
+            pack_corpus(join(self.save_path, 'packed'), input_paths,
+                        {'labels': label_paths[:1]}, input_names)
+
+
+if __name__ == '__main__':
+    unittest.main()
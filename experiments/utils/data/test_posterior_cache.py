@@ -0,0 +1,180 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import basename
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../../../')
+from experiments.utils.data.posterior_cache import PosteriorCache
+from experiments.utils.data.posterior_cache import PosteriorCacheWriter
+from experiments.utils.data.posterior_cache import dump_posteriors
+from experiments.utils.data.posterior_cache import cache_path
+from experiments.utils.data.posterior_cache import checkpoint_name
+from experiments.utils.data.sampler import BatchSampler
+from models.ctc.streaming_decoder import GreedyStreamingDecoder
+
+
+def _log_softmax(logits):
+    logits = logits - np.max(logits, axis=-1, keepdims=True)
+    return logits - np.log(np.sum(np.exp(logits), axis=-1, keepdims=True))
+
+
+class ToyNetwork(object):
+    inputs = 'inputs'
+    inputs_seq_len = 'inputs_seq_len'
+    keep_prob_input = 'keep_prob_input'
+    keep_prob_hidden = 'keep_prob_hidden'
+
+
+class ToySession(object):
+    """Log posteriors of each frame are fixed by the input."""
+
+    def __init__(self, log_posteriors_dict):
+        self.log_posteriors_dict = log_posteriors_dict
+
+    def run(self, fetches, feed_dict=None):
+        inputs = feed_dict['inputs']
+        # Time reduction by 2
+        outputs_seq_len = (feed_dict['inputs_seq_len'] + 1) // 2
+        results = []
+        for op in fetches[:-1]:
+            log_posteriors = self.log_posteriors_dict[op]
+            results.append(np.stack(
+                [log_posteriors[int(x[0, 0])] for x in inputs]))
+        return results + [outputs_seq_len]
+
+
+class ToyDataset(object):
+    """Dataset of labels of indices (padded with -1) and raw labels."""
+
+    def __init__(self, data_num, max_seq_len):
+        self.num_gpu = 1
+        self.data_num = data_num
+        self.seq_lens = np.random.randint(1, max_seq_len + 1, size=data_num)
+        self.input_paths = np.array(
+            ['/path/to/utt%d.npy' % i for i in range(data_num)])
+        self.labels = [np.random.randint(0, 5, size=np.random.randint(1, 6))
+                       for _ in range(data_num)]
+        self.raw_labels = [np.array(list(u'あいう'[:i % 3 + 1]))
+                           for i in range(data_num)]
+        self.sampler = BatchSampler(self.seq_lens, mode='random')
+
+    def next_batch(self, batch_size=None):
+        while True:
+            data_indices, _ = self.sampler.sample(batch_size)
+            max_seq_len = max(self.seq_lens[data_indices])
+            # The first frame is the index of the utterance
+            inputs = np.zeros((len(data_indices), max_seq_len, 1))
+            inputs[:, 0, 0] = data_indices
+            max_label_len = max(len(self.labels[i]) for i in data_indices)
+            labels = np.full((len(data_indices), max_label_len), -1,
+                             dtype=np.int32)
+            for i_batch, i in enumerate(data_indices):
+                labels[i_batch, :len(self.labels[i])] = self.labels[i]
+            raw_labels = [self.raw_labels[i] for i in data_indices]
+            input_names = [basename(path).split('.')[0] for path in
+                           np.take(self.input_paths, data_indices, axis=0)]
+            yield (inputs, labels, raw_labels,
+                   self.seq_lens[data_indices], input_names)
+
+
+class TestPosteriorCache(unittest.TestCase):
+
+    def setUp(self):
+        self.save_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.save_path)
+
+    def test_dump(self):
+        dataset = ToyDataset(data_num=37, max_seq_len=40)
+        max_time = (max(dataset.seq_lens) + 1) // 2
+        log_posteriors_dict = {
+            'main': _log_softmax(
+                np.random.randn(dataset.data_num, max_time, 6) * 3),
+            'sub': _log_softmax(
+                np.random.randn(dataset.data_num, max_time, 4))}
+
+        save_paths = [cache_path(self.save_path, 'model.ckpt-3', 'test',
+                                 task) for task in ['main', 'sub']]
+        dump_posteriors(ToySession(log_posteriors_dict), ['main', 'sub'],
+                        'outputs_seq_len', ToyNetwork(), dataset,
+                        save_paths=save_paths,
+                        label_types=['character', 'kana'],
+                        max_frame_num=200)
+
+        # Indices
+        cache = PosteriorCache(save_paths[0])
+        self.assertEqual(cache.data_num, dataset.data_num)
+        self.assertEqual(cache.num_classes, 6)
+        self.assertEqual(cache.blank_index, 5)
+        self.assertEqual(cache.label_type, 'character')
+        self.assertFalse(cache.is_raw_label)
+        for i in range(dataset.data_num):
+            # Utterances are in the original order
+            self.assertEqual(cache.names[i], 'utt%d' % i)
+            frame_num = (dataset.seq_lens[i] + 1) // 2
+            np.testing.assert_allclose(
+                cache.log_posteriors(i),
+                log_posteriors_dict['main'][i, :frame_num], rtol=1e-6)
+            np.testing.assert_array_equal(cache.label(i), dataset.labels[i])
+
+        # Strings
+        cache_sub = PosteriorCache(save_paths[1])
+        self.assertEqual(cache_sub.num_classes, 4)
+        self.assertTrue(cache_sub.is_raw_label)
+        for i in range(dataset.data_num):
+            self.assertEqual(''.join(cache_sub.label(i)),
+                             ''.join(dataset.raw_labels[i]))
+
+        # Decoding
+        labels_pred = cache.decode()
+        for i in range(dataset.data_num):
+            decoder = GreedyStreamingDecoder(cache.blank_index)
+            self.assertEqual(list(labels_pred[i]),
+                             decoder.step(cache.log_posteriors(i)))
+        labels_pred_beam = cache.decode(beam_width=4, indices=[0, 1])
+        labels_pred_beam_parallel = cache.decode(beam_width=4,
+                                                 indices=[0, 1],
+                                                 num_worker=2)
+        self.assertEqual(len(labels_pred_beam), 2)
+        for l, l_parallel in zip(labels_pred_beam, labels_pred_beam_parallel):
+            np.testing.assert_array_equal(l, l_parallel)
+
+    def test_writer(self):
+        writer = PosteriorCacheWriter(self.save_path, 'phone39')
+        writer.add(1, 'b', np.zeros((3, 4)), np.array([1, 2]))
+        with self.assertRaises(ValueError):
+            writer.add(2, 'c', np.zeros((3, 5)), np.array([1]))
+        with self.assertRaises(ValueError):
+            writer.add(2, 'c', np.zeros((3, 4)), np.array(['a']))
+        writer.add(1, 'b', np.zeros((3, 4)), np.array([1, 2]))
+        with self.assertRaises(ValueError):
+            writer.close()
+
+    def test_checkpoint_name(self):
+        self.assertEqual(checkpoint_name(self.save_path, epoch=5),
+                         'model.ckpt-5')
+        with self.assertRaises(ValueError):
+            checkpoint_name(self.save_path)
+        with open(self.save_path + '/checkpoint', 'w') as f:
+            f.write('model_checkpoint_path: "%s/model.ckpt-12"\n' %
+                    self.save_path)
+            f.write('all_model_checkpoint_paths: "%s/model.ckpt-12"\n' %
+                    self.save_path)
+        self.assertEqual(checkpoint_name(self.save_path), 'model.ckpt-12')
+        with self.assertRaises(ValueError):
+            PosteriorCache(cache_path(self.save_path, 'model.ckpt-12',
+                                      'test'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import threading
+import time
+import unittest
+
+sys.path.append('../../../')
+from experiments.utils.data.prefetch import prefetch, PrefetchStats
+
+
+def load_slowly(i):
+    time.sleep(0.001 * (i % 3))
+    return i * 2
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test(self):
+        stats = PrefetchStats(num_prefetch=4)
+        batch_generator = prefetch(iter(range(50)), load_slowly,
+                                   num_prefetch=4, num_worker=3,
+                                   stats=stats)
+        # Mini-batches are yielded in order
+        self.assertEqual(list(batch_generator),
+                         [i * 2 for i in range(50)])
+        self.assertEqual(stats.batch_num, 50)
+        self.assertTrue(stats.queue_depth <= 4)
+
+    def test_error(self):
+        with self.assertRaises(ValueError):
+            next(prefetch(iter(range(3)), load_slowly, num_prefetch=0))
+
+        def index_generator():
+            yield 1
+            raise IOError('Failed to read')
+
+        batch_generator = prefetch(index_generator(), load_slowly,
+                                   num_prefetch=2)
+        self.assertEqual(next(batch_generator), 2)
+        # The exception is raised in the consumer thread
+        with self.assertRaises(IOError):
+            next(batch_generator)
+
+    def test_close(self):
+        thread_num = threading.active_count()
+        sampled = []
+
+        def index_generator():
+            # Infinite like the samplers of datasets
+            i = 0
+            while True:
+                sampled.append(i)
+                yield i
+                i += 1
+
+        batch_generator = prefetch(index_generator(), load_slowly,
+                                   num_prefetch=3, num_worker=2)
+        for _ in range(5):
+            next(batch_generator)
+        time.sleep(0.05)
+        # The producer is blocked on the full queue
+        self.assertTrue(len(sampled) <= 5 + 3 + 1)
+
+        # The producer and the workers are stopped
+        batch_generator.close()
+        self.assertEqual(threading.active_count(), thread_num)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../../')
+from experiments.utils.data.sampler import BatchSampler
+
+
+class TestBatchSampler(unittest.TestCase):
+    def test(self):
+        seq_lens = np.random.randint(1, 1000, size=103)
+        for mode in ['sorted', 'bucket', 'random']:
+            self.check_sampling(seq_lens, mode, batch_size=10)
+            self.check_sampling(seq_lens, mode, batch_size=1)
+            self.check_sampling(seq_lens, mode, batch_size=103)
+            self.check_sampling(seq_lens, mode, batch_size=200)
+        self.check_sampling(seq_lens, 'bucket', batch_size=10,
+                            bucket_size=1)
+
+        for mode in ['sorted', 'bucket', 'random']:
+            self.check_divisor(seq_lens, mode, batch_size=8, divisor=4)
+            self.check_divisor(seq_lens, mode, batch_size=100, divisor=4)
+        with self.assertRaises(ValueError):
+            BatchSampler(seq_lens[:3], divisor=4)
+
+        # Frame budget
+        label_lens = np.random.randint(1, 100, size=103)
+        for mode in ['sorted', 'bucket', 'random']:
+            self.check_frame_budget(seq_lens, label_lens, mode,
+                                    max_frame_num=5000)
+            self.check_frame_budget(seq_lens, label_lens, mode,
+                                    max_frame_num=5000, max_label_num=300)
+            self.check_frame_budget(seq_lens, label_lens, mode,
+                                    max_frame_num=1)
+
+    def check_sampling(self, seq_lens, mode, batch_size, bucket_size=None):
+
+        print('----- mode: %s, batch_size: %d -----' % (mode, batch_size))
+
+        sampler = BatchSampler(seq_lens, mode=mode, bucket_size=bucket_size)
+        for epoch in range(2):
+            data_indices_epoch = []
+            while True:
+                data_indices, next_epoch_flag = sampler.sample(batch_size)
+                data_indices_epoch.extend(data_indices)
+                self.assertTrue(len(data_indices) <= batch_size)
+                self.assertTrue(0 <= sampler.padding_ratio < 1)
+                if next_epoch_flag:
+                    break
+                self.assertEqual(len(data_indices), batch_size)
+
+            # Each utterance is sampled once per epoch
+            self.assertEqual(sorted(data_indices_epoch),
+                             list(range(len(seq_lens))))
+
+            if mode == 'sorted':
+                self.assertTrue(np.all(
+                    np.diff(seq_lens[data_indices_epoch]) >= 0))
+        print(sampler)
+
+        if bucket_size == 1:
+            # Buckets of one utterance keep sorted mini-batches
+            sampler_sorted = BatchSampler(seq_lens, mode='sorted')
+            for _ in range(len(seq_lens) // batch_size + 1):
+                sampler_sorted.sample(batch_size)
+            self.assertAlmostEqual(sampler.padding_ratio_mean,
+                                   sampler_sorted.padding_ratio_mean)
+
+    def check_divisor(self, seq_lens, mode, batch_size, divisor):
+
+        print('----- mode: %s, batch_size: %d, divisor: %d -----' %
+              (mode, batch_size, divisor))
+
+        sampler = BatchSampler(seq_lens, mode=mode, divisor=divisor)
+        epoch_data_num = len(seq_lens) // divisor * divisor
+        self.assertEqual(sampler.batch_num(batch_size),
+                         -(-epoch_data_num // batch_size))
+        for epoch in range(2):
+            data_indices_epoch = []
+            while True:
+                data_indices, next_epoch_flag = sampler.sample(batch_size)
+                # Every mini-batch is divisible
+                self.assertEqual(len(data_indices) % divisor, 0)
+                data_indices_epoch.extend(data_indices)
+                if next_epoch_flag:
+                    break
+
+            # The last utterances are dropped, and the others are sampled
+            # once per epoch
+            self.assertEqual(len(data_indices_epoch), epoch_data_num)
+            self.assertEqual(len(set(data_indices_epoch)), epoch_data_num)
+            if mode == 'sorted':
+                self.assertEqual(
+                    sorted(data_indices_epoch),
+                    sorted(np.argsort(seq_lens, kind='mergesort')[
+                        :epoch_data_num]))
+
+    def check_frame_budget(self, seq_lens, label_lens, mode, max_frame_num,
+                           max_label_num=None):
+
+        print('----- mode: %s, max_frame_num: %d -----' %
+              (mode, max_frame_num))
+
+        sampler = BatchSampler(seq_lens, mode=mode,
+                               max_frame_num=max_frame_num,
+                               label_lens=label_lens,
+                               max_label_num=max_label_num)
+        for epoch in range(2):
+            # batch_num does not plan the next epoch
+            batch_num_next = sampler.batch_num(batch_size=10)
+            self.assertIsNone(sampler.epoch_indices)
+            self.assertEqual(sampler.rest, len(seq_lens))
+
+            data_indices_epoch = []
+            i = 0
+            while True:
+                data_indices, next_epoch_flag = sampler.sample(batch_size=10)
+                if i == 0:
+                    # The number of mini-batches in the current epoch
+                    batch_num = sampler.batch_num(batch_size=10)
+                    if mode == 'sorted':
+                        self.assertEqual(batch_num, batch_num_next)
+                data_indices_epoch.extend(data_indices)
+                self.assertEqual(next_epoch_flag, i == batch_num - 1)
+                i += 1
+
+                # An utterance longer than the budget makes a mini-batch
+                if len(data_indices) > 1:
+                    self.assertTrue(
+                        seq_lens[data_indices].max() * len(data_indices) <=
+                        max_frame_num)
+                    if max_label_num is not None:
+                        self.assertTrue(
+                            label_lens[data_indices].sum() <= max_label_num)
+                if next_epoch_flag:
+                    break
+            self.assertEqual(i, batch_num)
+
+            self.assertEqual(sorted(data_indices_epoch),
+                             list(range(len(seq_lens))))
+        print(sampler)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../../')
+from experiments.utils.data.sampler import BatchSampler
+from experiments.utils.data.shard import shard_indices, speaker_name
+
+
+class TestShard(unittest.TestCase):
+
+    def test(self):
+        input_names = ['S%02d_%04d' % (np.random.randint(0, 10), i)
+                       for i in range(103)]
+        for num_shard in [1, 2, 3]:
+            self.check_shard(input_names, num_shard, by_speaker=False)
+            self.check_shard(input_names, num_shard, by_speaker=True)
+
+        with self.assertRaises(ValueError):
+            shard_indices(input_names, 2, 2)
+        with self.assertRaises(ValueError):
+            shard_indices(['A_0', 'A_1', 'B_0'], 3, 0, by_speaker=True)
+
+    def check_shard(self, input_names, num_shard, by_speaker):
+
+        print('----- num_shard: %d, by_speaker: %s -----' %
+              (num_shard, str(by_speaker)))
+
+        seq_lens = np.random.randint(1, 1000, size=len(input_names))
+        shards = [shard_indices(input_names, num_shard, i, by_speaker)
+                  for i in range(num_shard)]
+
+        # Shards are disjoint and cover all utterances
+        self.assertEqual(sorted(np.concatenate(shards).tolist()),
+                         list(range(len(input_names))))
+
+        if by_speaker:
+            # A speaker belongs to only one shard
+            speakers = [set(speaker_name(input_names[i]) for i in shard)
+                        for shard in shards]
+            for i in range(num_shard):
+                for j in range(i + 1, num_shard):
+                    self.assertEqual(len(speakers[i] & speakers[j]), 0)
+        else:
+            sizes = [len(shard) for shard in shards]
+            self.assertTrue(max(sizes) - min(sizes) <= 1)
+
+        # Each worker samples only from its shard
+        for shard in shards:
+            sampler = BatchSampler(seq_lens, mode='bucket',
+                                   data_indices=shard)
+            data_indices_epoch = []
+            while True:
+                data_indices, next_epoch_flag = sampler.sample(batch_size=8)
+                data_indices_epoch.extend(data_indices)
+                if next_epoch_flag:
+                    break
+            self.assertEqual(sorted(data_indices_epoch), sorted(shard))
+
+
+if __name__ == '__main__':
+    unittest.main()
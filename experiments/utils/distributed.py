@@ -0,0 +1,162 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Between-graph replicated training with parameter servers. Each process
+   of the cluster runs the same training script with its job name (ps or
+   worker) and task index. Variables are placed on the parameter servers,
+   and each worker builds its own graph and trains on its own shard of the
+   training data.
+
+   Parameters in the config file:
+       num_ps: int, the number of parameter servers (default: 1)
+       num_worker: int, the number of workers (default: 1)
+       port: int, the first port of the cluster on localhost
+           (default: 2222)
+       sync_replicas: if True, aggregate the gradients of all workers before
+           each update. If False, workers update variables asynchronously.
+           (default: True)
+   See experiments/utils/launch_cluster.py to start a cluster on one machine.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+from experiments.utils.data.shard import shard_dataset
+
+
+def make_cluster_spec(num_ps, num_worker, host='localhost', port=2222):
+    """
+    Args:
+        num_ps: int, the number of parameter servers
+        num_worker: int, the number of workers
+        host: string, host name of all tasks
+        port: int, the port of the first task. The other tasks use the
+            following ports (parameter servers first).
+    Returns:
+        An instance of `tf.train.ClusterSpec`
+    """
+    ps_hosts = ['%s:%d' % (host, port + i) for i in range(num_ps)]
+    worker_hosts = ['%s:%d' % (host, port + num_ps + i)
+                    for i in range(num_worker)]
+    return tf.train.ClusterSpec({'ps': ps_hosts, 'worker': worker_hosts})
+
+
+class Replica(object):
+    """The role of this process in distributed training.
+    Args:
+        param: A dictionary of parameters
+        job_name: string, ps or worker. If None, training is not distributed.
+        task_index: int, the index of the task in the job. The first worker
+            is the chief, which initializes variables, saves checkpoints and
+            evaluates the model.
+    """
+
+    def __init__(self, param, job_name=None, task_index=0):
+        if job_name not in [None, 'ps', 'worker']:
+            raise ValueError('job_name is "ps" or "worker".')
+
+        self.job_name = job_name
+        self.task_index = task_index
+        self.is_distributed = job_name is not None
+        self.is_chief = task_index == 0
+        self.num_ps = param.get('num_ps', 1)
+        self.num_worker = param.get('num_worker', 1)
+        self.is_sync = param.get('sync_replicas', True)
+
+        self.server = None
+        self.cluster = None
+        if self.is_distributed:
+            if param.get('num_gpu', 1) > 1:
+                raise ValueError(
+                    'num_gpu must be 1 in distributed training.')
+            if task_index >= (self.num_ps if job_name == 'ps'
+                              else self.num_worker):
+                raise ValueError('task_index is out of the cluster.')
+            self.cluster = make_cluster_spec(self.num_ps, self.num_worker,
+                                             port=param.get('port', 2222))
+            self.server = tf.train.Server(self.cluster,
+                                          job_name=job_name,
+                                          task_index=task_index)
+
+    @property
+    def num_replicas(self):
+        """The number of replicas to aggregate gradients of (see `train` of
+           the model), or None in asynchronous or local training."""
+        if self.is_distributed and self.is_sync:
+            return self.num_worker
+        return None
+
+    @property
+    def name(self):
+        """A suffix of the model name for distributed training."""
+        if not self.is_distributed:
+            return ''
+        name = '_ps%d_worker%d' % (self.num_ps, self.num_worker)
+        name += '_sync' if self.is_sync else '_async'
+        return name
+
+    def join(self):
+        """Serve variables until the process is killed (parameter servers)."""
+        self.server.join()
+
+    def device(self):
+        """
+        Returns:
+            A device function to place variables on parameter servers, or
+            None if training is not distributed
+        """
+        if not self.is_distributed:
+            return None
+        return tf.train.replica_device_setter(
+            worker_device='/job:worker/task:%d' % self.task_index,
+            cluster=self.cluster)
+
+    def shard(self, dataset, by_speaker=False):
+        """Restrict the training data to the shard of this worker.
+        Args:
+            dataset: An instance of a `Dataset` class
+            by_speaker: if True, divide by speaker instead of by utterance
+        Returns:
+            iter_per_epoch: int, the number of steps in each epoch (see
+                `Trainer.run`). This is common to all workers so that they
+                stop at the same time. With a frame budget, the number of
+                mini-batches of each shard may be different from this in
+                random and bucket mode. If None (training is not
+                distributed), each epoch ends with the last mini-batch of
+                the epoch.
+        """
+        if not self.is_distributed:
+            return None
+
+        iter_per_epoch = dataset.sampler.batch_num(dataset.batch_size)
+        shard_dataset(dataset, self.num_worker, self.task_index, by_speaker)
+        return -(-iter_per_epoch // self.num_worker)
+
+    def session(self, init_op, sync_optimizer=None, config=None):
+        """Create a session with initialized variables.
+        Args:
+            init_op: operation for initializing variables
+            sync_optimizer: An instance of `SyncReplicasOptimizer`, or None
+            config: An instance of `tf.ConfigProto`
+        Returns:
+            A `tf.Session`, or a `tf.train.MonitoredTrainingSession` in
+            distributed training. Workers except the chief wait until the
+            chief initializes variables.
+        """
+        if not self.is_distributed:
+            sess = tf.Session(config=config)
+            sess.run(init_op)
+            return sess
+
+        hooks = []
+        if sync_optimizer is not None:
+            hooks.append(sync_optimizer.make_session_run_hook(self.is_chief))
+        return tf.train.MonitoredTrainingSession(
+            master=self.server.target,
+            is_chief=self.is_chief,
+            scaffold=tf.train.Scaffold(init_op=init_op),
+            hooks=hooks,
+            config=config)
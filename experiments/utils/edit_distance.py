@@ -0,0 +1,146 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compute edit distance of a batch of label sequences without TensorFlow.
+   Each sequence pair is aligned by dynamic programming, where each row of
+   the table is computed at once with numpy, and the alignment is traced
+   back to count substitutions, insertions and deletions.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from multiprocessing import Pool
+import numpy as np
+
+
+def _truncate(labels, padded_value):
+    """Convert labels into a numpy array and remove padding.
+    Args:
+        labels: list or np.ndarray of labels, or string
+        padded_value: the value used for padding. Labels after its first
+            occurrence are removed. If None, labels are not truncated.
+    Returns:
+        labels: np.ndarray of labels
+    """
+    if isinstance(labels, str):
+        labels = list(labels)
+    labels = np.asarray(labels)
+    if padded_value is not None:
+        pad_indices = np.where(labels == padded_value)[0]
+        if len(pad_indices) > 0:
+            labels = labels[:pad_indices[0]]
+    return labels
+
+
+def edit_distance(labels_true, labels_pred):
+    """Compute edit distance between two label sequences.
+    Args:
+        labels_true: np.ndarray of ground truth labels
+        labels_pred: np.ndarray of predicted labels
+    Returns:
+        substitution: int, the number of substitutions
+        insertion: int, the number of insertions
+        deletion: int, the number of deletions
+    """
+    true_len, pred_len = len(labels_true), len(labels_pred)
+    if true_len == 0:
+        return 0, pred_len, 0
+    if pred_len == 0:
+        return 0, 0, true_len
+
+    # table[i, j] is the distance between labels_true[:i] and labels_pred[:j]
+    table = np.empty((true_len + 1, pred_len + 1), dtype=np.int64)
+    table[0] = np.arange(pred_len + 1)
+    index = np.arange(pred_len + 1)
+    cost = np.empty((pred_len + 1,), dtype=np.int64)
+    for i in range(1, true_len + 1):
+        cost[0] = i
+        # Substitution (or match) and deletion
+        np.minimum(table[i - 1, :-1] + (labels_pred != labels_true[i - 1]),
+                   table[i - 1, 1:] + 1, out=cost[1:])
+        # Insertion: table[i, j] = min_k(cost[k] + j - k)
+        table[i] = np.minimum.accumulate(cost - index) + index
+
+    # Trace back the alignment
+    substitution, insertion, deletion = 0, 0, 0
+    i, j = true_len, pred_len
+    while i > 0 and j > 0:
+        is_error = labels_pred[j - 1] != labels_true[i - 1]
+        if table[i, j] == table[i - 1, j - 1] + is_error:
+            substitution += int(is_error)
+            i -= 1
+            j -= 1
+        elif table[i, j] == table[i - 1, j] + 1:
+            deletion += 1
+            i -= 1
+        else:
+            insertion += 1
+            j -= 1
+    deletion += i
+    insertion += j
+
+    return substitution, insertion, deletion
+
+
+def _edit_distance_pair(pair):
+    return edit_distance(*pair)
+
+
+def compute_edit_distance(labels_true, labels_pred, padded_value=None,
+                          num_worker=1, chunk_size=64):
+    """Compute edit distance of each utterance in a batch.
+    Args:
+        labels_true: list of ground truth labels of size `[batch_size]`. Each
+            element is a list or np.ndarray of labels, or a string.
+        labels_pred: list of predicted labels of size `[batch_size]`
+        padded_value: the value used for padding. If None, labels are not
+            truncated.
+        num_worker: int, the number of processes. If more than 1, utterances
+            are divided among a process pool.
+        chunk_size: int, the number of utterances sent to a process at once
+    Returns:
+        errors: np.ndarray of size `[batch_size, 4]`. Each row is the
+            number of substitutions, insertions, deletions and labels in
+            the ground truth.
+    """
+    if len(labels_true) != len(labels_pred):
+        raise ValueError('labels_true and labels_pred must be the same size.')
+
+    pairs = [(_truncate(l_true, padded_value), _truncate(l_pred, padded_value))
+             for l_true, l_pred in zip(labels_true, labels_pred)]
+
+    if num_worker > 1 and len(pairs) > chunk_size:
+        pool = Pool(num_worker)
+        try:
+            counts = pool.map(_edit_distance_pair, pairs, chunk_size)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        counts = list(map(_edit_distance_pair, pairs))
+
+    errors = np.zeros((len(pairs), 4), dtype=np.int64)
+    if len(pairs) > 0:
+        errors[:, :3] = counts
+        errors[:, 3] = [len(l_true) for l_true, _ in pairs]
+    return errors
+
+
+def compute_error_rate(labels_true, labels_pred, padded_value=None,
+                       num_worker=1):
+    """Compute error rate normalized by the length of the ground truth in
+       each utterance.
+    Args:
+        labels_true: list of ground truth labels of size `[batch_size]`
+        labels_pred: list of predicted labels of size `[batch_size]`
+        padded_value: the value used for padding
+        num_worker: int, the number of processes
+    Returns:
+        error_rates: np.ndarray of size `[batch_size]`
+    """
+    errors = compute_edit_distance(labels_true, labels_pred,
+                                   padded_value=padded_value,
+                                   num_worker=num_worker)
+    return errors[:, :3].sum(axis=1) / errors[:, 3]
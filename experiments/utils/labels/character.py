@@ -7,6 +7,8 @@ from __future__ import print_function
 
 import numpy as np
 
+from experiments.utils.labels.vocabulary import load_vocabulary
+
 
 def char2num(str_char, map_file_path):
     """Convert from character to number.
@@ -16,20 +18,8 @@ def char2num(str_char, map_file_path):
     Returns:
         char_list: list of character indices
     """
-    char_list = list(str_char)
-
-    # Read mapping file
-    map_dict = {}
-    with open(map_file_path, 'r') as f:
-        for line in f:
-            line = line.strip().split()
-            map_dict[line[0]] = int(line[1])
-
     # Convert from character to number
-    for i in range(len(char_list)):
-        char_list[i] = map_dict[char_list[i]]
-
-    return np.array(char_list)
+    return load_vocabulary(map_file_path).encode(list(str_char))
 
 
 def kana2num(str_char, map_file_path):
@@ -43,12 +33,7 @@ def kana2num(str_char, map_file_path):
     kana_list = list(str_char)
     num_list = []
 
-    # Lead the mapping file
-    map_dict = {}
-    with open(map_file_path, 'r') as f:
-        for line in f:
-            line = line.strip().split()
-            map_dict[line[0]] = int(line[1])
+    map_dict = load_vocabulary(map_file_path).token2index
 
     i = 0
     while i < len(kana_list):
@@ -73,30 +58,27 @@ def kana2num(str_char, map_file_path):
     return np.array(num_list)
 
 
-def num2char(num_list, map_file_path, padded_value=-1):
+def num2char(num_list, map_file_path, padded_value=-1, offsets=None):
     """Convert from number to character.
     Args:
         num_list: np.ndarray, list of character indices. batch_size == 1 is
-            expected.
+            expected unless offsets is given.
         map_file_path: path to the mapping file
         padded_value: int, the value used for padding
+        offsets: np.ndarray of size `[batch_size + 1]`. If given, num_list is
+            regarded as labels of a ragged batch (see sparsetensor2ragged)
+            and a list of strings is returned.
     Returns:
-        str_char: string of characters
+        str_char: string of characters, or list of them of size
+            `[batch_size]` if offsets is given
     """
-    # Read mapping file
-    map_dict = {}
-    with open(map_file_path, 'r') as f:
-        for line in f:
-            line = line.strip().split()
-            map_dict[int(line[1])] = line[0]
+    vocab = load_vocabulary(map_file_path)
 
-    # Remove padded values
     assert type(num_list) == np.ndarray, 'num_list should be np.ndarray.'
-    num_list = np.delete(num_list, np.where(num_list == -1), axis=0)
+    if offsets is not None:
+        return vocab.decode_batch(offsets, num_list, delimiter='')
 
     # Convert from indices to the corresponding characters
-    char_list = list(map(lambda x: map_dict[x], num_list))
-
-    str_char = ''.join(char_list)
+    str_char = vocab.decode(num_list, padded_value=padded_value,
+                            delimiter='')
     return str_char
-    # TODO: change to batch version
@@ -7,6 +7,8 @@ from __future__ import print_function
 
 import numpy as np
 
+from experiments.utils.labels.vocabulary import load_vocabulary
+
 
 def phone2num(phone_list, map_file_path):
     """Convert from phone to number.
@@ -16,42 +18,30 @@ def phone2num(phone_list, map_file_path):
     Returns:
         phone_list: list of phone indices (int)
     """
-    # Read mapping file
-    map_dict = {}
-    with open(map_file_path, 'r') as f:
-        for line in f:
-            line = line.strip().split('  ')
-            map_dict[str(line[0])] = int(line[1])
-
     # Convert from phone to number
-    for i in range(len(phone_list)):
-        phone_list[i] = map_dict[phone_list[i]]
-
-    return np.array(phone_list)
+    return load_vocabulary(map_file_path).encode(phone_list)
 
 
-def num2phone(num_list, map_file_path, padded_value=-1):
+def num2phone(num_list, map_file_path, padded_value=-1, offsets=None):
     """Convert from number to phone.
     Args:
         num_list: list of phone indices
         map_file_path: path to the mapping file
         padded_value: int, the value used for padding
+        offsets: np.ndarray of size `[batch_size + 1]`. If given, num_list is
+            regarded as labels of a ragged batch (see sparsetensor2ragged)
+            and a list of strings is returned.
     Returns:
-        str_phone: string of phones
+        str_phone: string of phones, or list of them of size `[batch_size]`
+            if offsets is given
     """
-    # Read mapping file
-    map_dict = {}
-    with open(map_file_path, 'r') as f:
-        for line in f:
-            line = line.strip().split()
-            map_dict[int(line[1])] = line[0]
-
-    # Remove padded values
+    vocab = load_vocabulary(map_file_path)
+
     assert type(num_list) == np.ndarray, 'num_list should be np.ndarray.'
-    num_list = np.delete(num_list, np.where(num_list == -1), axis=0)
+    if offsets is not None:
+        return vocab.decode_batch(offsets, num_list, delimiter=' ')
 
     # Convert from indices to the corresponding phones
-    phone_list = list(map(lambda x: map_dict[x], num_list))
-    str_phone = ' '.join(phone_list)
-
+    str_phone = vocab.decode(num_list, padded_value=padded_value,
+                             delimiter=' ')
     return str_phone
@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Ragged batches of labels. A ragged batch consists of `values`, labels of
+   all inputs concatenated, and `offsets` of size `[batch_size + 1]`, where
+   labels of the i-th input are `values[offsets[i]:offsets[i + 1]]`.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+def dense2ragged(labels, padded_value=-1):
+    """Convert padded labels into a ragged batch.
+    Args:
+        labels: np.ndarray of size `[batch_size, max_label_len]`, or list of
+            np.ndarray of labels
+        padded_value: int, the value used for padding
+    Returns:
+        offsets: np.ndarray of size `[batch_size + 1]`
+        values: np.ndarray of labels of all inputs
+    """
+    if isinstance(labels, np.ndarray) and labels.ndim == 2:
+        mask = labels != padded_value
+        values = labels[mask]
+        label_nums = mask.sum(axis=1)
+    else:
+        labels = [np.asarray(l) for l in labels]
+        labels = [l[l != padded_value] for l in labels]
+        values = np.concatenate(labels) if len(labels) > 0 else np.array([])
+        label_nums = list(map(len, labels))
+    offsets = np.zeros((len(label_nums) + 1,), dtype=np.int64)
+    np.cumsum(label_nums, out=offsets[1:])
+    return offsets, values
+
+
+def remap_ragged(table, offsets, values):
+    """Map labels of a ragged batch with a lookup table.
+    Args:
+        table: np.ndarray, lookup table from old labels to new ones. -1
+            means the label is removed (see Vocabulary.map_table).
+        offsets: np.ndarray of size `[batch_size + 1]`
+        values: np.ndarray of labels of all inputs
+    Returns:
+        offsets: np.ndarray of size `[batch_size + 1]`
+        values: np.ndarray of mapped labels of all inputs
+    """
+    values = np.take(table, values)
+    is_kept = values != -1
+    kept_num = np.zeros((len(values) + 1,), dtype=np.int64)
+    np.cumsum(is_kept, out=kept_num[1:])
+    return kept_num[offsets], values[is_kept]
+
+
+def ragged2list(offsets, values):
+    """Convert a ragged batch into list of labels.
+    Args:
+        offsets: np.ndarray of size `[batch_size + 1]`
+        values: np.ndarray of labels of all inputs
+    Returns:
+        labels: list of np.ndarray of size `[batch_size]`
+    """
+    return np.split(values, offsets[1:-1])
+
+
+def truncate_after_eos(labels, eos_index):
+    """Remove labels after the first <EOS> (padding). Decoding a mini-batch
+       goes on until all inputs reach <EOS>, so this makes the labels of
+       each input the same as when it is decoded alone.
+    Args:
+        labels: np.ndarray of size `[batch_size, max_label_len]`, or list of
+            np.ndarray of labels
+        eos_index: int, the index of <EOS> class
+    Returns:
+        labels: list of np.ndarray of size `[batch_size]`
+    """
+    truncated = []
+    for l in labels:
+        l = np.asarray(l)
+        eos_indices = np.where(l == eos_index)[0]
+        if len(eos_indices) > 0:
+            l = l[:eos_indices[0] + 1]
+        truncated.append(l)
+    return truncated
@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Mapping between labels and indices. Each mapping file is read once per
+   process and the result is shared by all callers.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import abspath
+import numpy as np
+
+_VOCABULARY_CACHE = {}
+
+
+def load_vocabulary(map_file_path):
+    """Load a vocabulary from a mapping file, or return the cached one.
+    Args:
+        map_file_path: path to the mapping file. Each line consists of a
+            label (string) and its index.
+    Returns:
+        vocab: An instance of `Vocabulary`
+    """
+    key = abspath(map_file_path)
+    if key not in _VOCABULARY_CACHE:
+        _VOCABULARY_CACHE[key] = Vocabulary(map_file_path)
+    return _VOCABULARY_CACHE[key]
+
+
+class Vocabulary(object):
+    """Mapping between labels and indices.
+    Args:
+        map_file_path: path to the mapping file
+    """
+
+    def __init__(self, map_file_path):
+        self.map_file_path = map_file_path
+
+        self.token2index = {}
+        self.index2token = {}
+        with open(map_file_path, 'r') as f:
+            for line in f:
+                line = line.strip().split()
+                self.token2index[line[0]] = int(line[1])
+                self.index2token[int(line[1])] = line[0]
+
+        # Lookup tables from index to label and its length
+        self.size = max(self.index2token.keys()) + 1
+        self.token_array = np.empty((self.size,), dtype=object)
+        self.token_len_array = np.zeros((self.size,), dtype=np.int64)
+        for index, token in self.index2token.items():
+            self.token_array[index] = token
+            self.token_len_array[index] = len(token)
+
+    def __len__(self):
+        return self.size
+
+    def encode(self, token_list):
+        """Convert from labels to indices.
+        Args:
+            token_list: list of labels (string)
+        Returns:
+            index_list: np.ndarray of indices
+        """
+        return np.array([self.token2index[token] for token in token_list])
+
+    def decode(self, index_list, padded_value=-1, delimiter=''):
+        """Convert from indices to a string.
+        Args:
+            index_list: np.ndarray of indices
+            padded_value: int, the value used for padding
+            delimiter: string inserted between labels
+        Returns:
+            str_token: string of labels
+        """
+        index_list = np.asarray(index_list)
+        index_list = index_list[index_list != padded_value]
+        return delimiter.join([self.index2token[index]
+                               for index in index_list.tolist()])
+
+    def decode_batch(self, offsets, index_list, delimiter=''):
+        """Convert from indices of a ragged batch to strings. All labels are
+           joined at once and the result is sliced per input.
+        Args:
+            offsets: np.ndarray of size `[batch_size + 1]`. Indices of the
+                i-th input are `index_list[offsets[i]:offsets[i + 1]]`.
+            index_list: np.ndarray of indices of all inputs
+            delimiter: string inserted between labels
+        Returns:
+            str_list: list of strings of size `[batch_size]`
+        """
+        index_list = np.asarray(index_list, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if len(index_list) == 0:
+            return [''] * (len(offsets) - 1)
+
+        tokens = self.token_array[index_list]
+        if np.any(np.equal(tokens, None)):
+            # Same as the non-batch version
+            raise KeyError(int(index_list[np.equal(tokens, None)][0]))
+        str_all = delimiter.join(tokens)
+
+        # Position of each label in str_all
+        token_offsets = np.zeros((len(index_list) + 1,), dtype=np.int64)
+        np.cumsum(self.token_len_array[index_list] + len(delimiter),
+                  out=token_offsets[1:])
+        starts = token_offsets[offsets[:-1]]
+        ends = np.maximum(token_offsets[offsets[1:]] - len(delimiter), starts)
+
+        return [str_all[start:end] for start, end in zip(starts, ends)]
+
+    def map_table(self, vocab, token_map=None):
+        """Make a lookup table from indices of this vocabulary to indices of
+           another one.
+        Args:
+            vocab: An instance of `Vocabulary` to map to
+            token_map: dict mapping labels of this vocabulary to labels of
+                `vocab`. Labels mapped to '' are removed. Labels not in
+                token_map are mapped to the same labels in `vocab`.
+        Returns:
+            table: np.ndarray of size `[len(self)]`. -1 means the label is
+                removed.
+        """
+        table = np.full((self.size,), -1, dtype=np.int64)
+        for index, token in self.index2token.items():
+            if token_map is not None and token in token_map:
+                token = token_map[token]
+            if token != '':
+                table[index] = vocab.token2index[token]
+        return table
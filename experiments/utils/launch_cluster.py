@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Start a cluster of parameter servers and workers on one machine for
+   distributed training (see experiments/utils/distributed.py). The size of
+   the cluster is read from the config file. Parameter servers run on CPU,
+   and the i-th worker runs on the (i % len(gpu_indices))-th GPU.
+
+   Usage:
+       python launch_cluster.py train_script config_path (gpu_indices)
+   e.g.
+       python ../../utils/launch_cluster.py train_ctc.py \
+           ../config/ctc/blstm_rmsprop_phone61.yml 0,1
+   Logs of each process are written to log/{job_name}{task_index}.log.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import yaml
+
+
+def launch(train_script, config_path, gpu_indices, log_dir='log'):
+    """Start all processes of the cluster and wait for the workers.
+    Args:
+        train_script: path to the training script
+        config_path: path to the config file (.yml)
+        gpu_indices: list of strings, indices of GPUs for workers. If empty,
+            workers run on CPU.
+        log_dir: path to the directory of logs
+    Returns:
+        returncodes: list of return codes of workers
+    """
+    with open(config_path, "r") as f:
+        param = yaml.load(f)['param']
+    num_ps = param.get('num_ps', 1)
+    num_worker = param.get('num_worker', 1)
+
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+
+    def start(job_name, task_index, visible_devices):
+        env = dict(os.environ)
+        env['CUDA_VISIBLE_DEVICES'] = visible_devices
+        log_path = os.path.join(log_dir, job_name + str(task_index) + '.log')
+        return subprocess.Popen(
+            [sys.executable, train_script, config_path, job_name,
+             str(task_index)],
+            env=env,
+            stdout=open(log_path, 'w'),
+            stderr=subprocess.STDOUT)
+
+    ps_list = [start('ps', i, '') for i in range(num_ps)]
+    workers = []
+    for i in range(num_worker):
+        visible_devices = ''
+        if len(gpu_indices) > 0:
+            visible_devices = gpu_indices[i % len(gpu_indices)]
+        workers.append(start('worker', i, visible_devices))
+
+    try:
+        returncodes = [worker.wait() for worker in workers]
+    finally:
+        # Parameter servers never finish by themselves
+        for process in ps_list + workers:
+            if process.poll() is None:
+                process.kill()
+    return returncodes
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) < 3 or len(args) > 4:
+        raise ValueError(
+            ("Set a training script and a config file.\n"
+             "Usase: python launch_cluster.py train_script config_path "
+             "(gpu_indices)"))
+    gpu_indices = args[3].split(',') if len(args) == 4 else []
+    returncodes = launch(args[1], args[2], gpu_indices)
+    print('Return codes of workers: %s' % str(returncodes))
@@ -0,0 +1,174 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Collect concurrent requests into mini-batches. A mini-batch is closed
+   when it reaches the maximum batch size, when the next request would make
+   the number of frames including padding exceed the limit, or when the
+   oldest request has waited for the maximum delay.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+import time
+from concurrent.futures import Future
+from six.moves import queue
+
+
+class BatcherStats(object):
+    """Statistics of the dynamic batcher."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def update(self, batch_size, padded_frame_num, frame_num):
+        with self.lock:
+            self.batch_num += 1
+            self.request_num += batch_size
+            self.padded_frame_num += padded_frame_num
+            self.frame_num += frame_num
+
+    @property
+    def batch_size_mean(self):
+        if self.batch_num == 0:
+            return 0.
+        return self.request_num / self.batch_num
+
+    @property
+    def padding_ratio(self):
+        if self.padded_frame_num == 0:
+            return 0.
+        return 1. - self.frame_num / self.padded_frame_num
+
+    def reset(self):
+        self.batch_num = 0
+        self.request_num = 0
+        self.padded_frame_num = 0
+        self.frame_num = 0
+
+    def __str__(self):
+        return 'batch: %d, batch size: %.2f, padding: %.2f %%' % (
+            self.batch_num, self.batch_size_mean, self.padding_ratio * 100)
+
+
+class DynamicBatcher(object):
+    """Run requests from many threads in mini-batches on a single worker
+       thread.
+    Args:
+        run_fn: A function which takes a list of inputs and returns a list
+            of outputs in the same order
+        max_batch_size: int, the maximum number of requests in a mini-batch
+        max_frame_num: int, the maximum number of frames including padding
+            (`batch_size * max_time`) in a mini-batch. A request longer than
+            this value makes a mini-batch by itself. If None or 0, only
+            max_batch_size is used.
+        max_delay: float, the maximum time in seconds to wait for other
+            requests after the first request of a mini-batch arrives
+        stats: An instance of `BatcherStats`
+    """
+
+    def __init__(self, run_fn, max_batch_size, max_frame_num=None,
+                 max_delay=0.01, stats=None):
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size must be more than 0.')
+
+        self.run_fn = run_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_frame_num = max_frame_num if max_frame_num else None
+        self.max_delay = float(max_delay)
+        self.stats = stats
+
+        self._queue = queue.Queue()
+        # A request taken from the queue which did not fit in the previous
+        # mini-batch
+        self._pending = None
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._worker)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, inputs):
+        """Add a request.
+        Args:
+            inputs: A numpy array of size `[T, input_size]`
+        Returns:
+            future: An instance of `concurrent.futures.Future`. The result is
+                the output of `run_fn` for the inputs.
+        """
+        if self._closed:
+            raise ValueError('The batcher has been closed.')
+        future = Future()
+        self._queue.put((inputs, future))
+        return future
+
+    def close(self):
+        """Finish the requests in the queue and stop the worker thread."""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_request(self, timeout=None):
+        if self._pending is not None:
+            request, self._pending = self._pending, None
+            return request
+        if timeout is None:
+            return self._queue.get()
+        return self._queue.get(timeout=max(timeout, 0.))
+
+    def _next_batch(self):
+        """
+        Returns:
+            requests: list of `(inputs, future)`, or None if closed
+        """
+        request = self._next_request()
+        if request is None:
+            return None
+        requests = [request]
+        max_time = len(request[0])
+        deadline = time.time() + self.max_delay
+
+        while len(requests) < self.max_batch_size:
+            try:
+                request = self._next_request(deadline - time.time())
+            except queue.Empty:
+                break
+            if request is None:
+                # Run the rest of requests before closing
+                self._queue.put(None)
+                break
+
+            next_max_time = max(max_time, len(request[0]))
+            if self.max_frame_num is not None and \
+                    next_max_time * (len(requests) + 1) > self.max_frame_num:
+                self._pending = request
+                break
+            requests.append(request)
+            max_time = next_max_time
+
+        return requests
+
+    def _worker(self):
+        while True:
+            requests = self._next_batch()
+            if requests is None:
+                break
+
+            inputs_list = [inputs for inputs, _ in requests]
+            try:
+                outputs = self.run_fn(inputs_list)
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+
+            if self.stats is not None:
+                frame_nums = [len(inputs) for inputs in inputs_list]
+                self.stats.update(len(requests),
+                                  max(frame_nums) * len(requests),
+                                  sum(frame_nums))
+            for (_, future), output in zip(requests, outputs):
+                future.set_result(output)
@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Send concurrent requests to the transcription server, and report
+   latency percentiles and throughput.
+
+   Usage:
+       python load_generator.py url input_size (num_request) (concurrency)
+   Random features of 100-800 frames are sent to
+   `url` (e.g. http://localhost:8000/recognize).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import io
+import json
+import sys
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from six.moves.urllib import request as urllib_request
+
+
+def send_request(url, inputs, timeout=60.):
+    """
+    Args:
+        url: string, the URL of the server
+        inputs: A numpy array of size `[T, input_size]`
+        timeout: float, timeout in seconds
+    Returns:
+        result: A dictionary of the response
+        latency: float, the time in seconds until the response
+    """
+    f = io.BytesIO()
+    np.save(f, inputs.astype(np.float32))
+    req = urllib_request.Request(
+        url, data=f.getvalue(),
+        headers={'Content-Type': 'application/octet-stream'})
+
+    start_time = time.time()
+    response = urllib_request.urlopen(req, timeout=timeout)
+    result = json.loads(response.read().decode('utf-8'))
+    return result, time.time() - start_time
+
+
+def run_load(url, inputs_list, concurrency):
+    """Send all inputs with a fixed number of concurrent clients.
+    Args:
+        url: string, the URL of the server
+        inputs_list: list of numpy arrays of size `[T, input_size]`
+        concurrency: int, the number of concurrent clients
+    Returns:
+        results: list of dictionaries of responses
+        latencies: np.ndarray of latencies in seconds
+        elapsed_time: float, the time in seconds to finish all requests
+    """
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outputs = list(executor.map(lambda x: send_request(url, x),
+                                    inputs_list))
+    elapsed_time = time.time() - start_time
+
+    results = [result for result, _ in outputs]
+    latencies = np.array([latency for _, latency in outputs])
+    return results, latencies, elapsed_time
+
+
+def report(latencies, elapsed_time, frame_num, frame_shift=0.01):
+    """
+    Args:
+        latencies: np.ndarray of latencies in seconds
+        elapsed_time: float, the time in seconds to finish all requests
+        frame_num: int, the total number of frames sent
+        frame_shift: float, frame shift in seconds (after frame skipping)
+    Returns:
+        string of the summary
+    """
+    return ('requests: %d, p50: %.1f ms, p99: %.1f ms, '
+            'throughput: %.2f req/sec, %.1f x realtime') % (
+        len(latencies),
+        np.percentile(latencies, 50) * 1000,
+        np.percentile(latencies, 99) * 1000,
+        len(latencies) / elapsed_time,
+        frame_num * frame_shift / elapsed_time)
+
+
+def main(url, input_size, num_request, concurrency):
+
+    inputs_list = [np.random.randn(np.random.randint(100, 801), input_size)
+                   for _ in range(num_request)]
+
+    # Warm up
+    send_request(url, inputs_list[0])
+
+    _, latencies, elapsed_time = run_load(url, inputs_list, concurrency)
+    print(report(latencies, elapsed_time,
+                 sum(len(inputs) for inputs in inputs_list)))
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) < 3 or len(args) > 5:
+        raise ValueError(
+            ("Set the URL of the server and the input size.\n"
+             "Usase: python load_generator.py url input_size (num_request) "
+             "(concurrency)"))
+    num_request = int(args[3]) if len(args) >= 4 else 1000
+    concurrency = int(args[4]) if len(args) == 5 else 32
+    main(url=args[1], input_size=int(args[2]),
+         num_request=num_request, concurrency=concurrency)
@@ -0,0 +1,199 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Local HTTP server of transcription around a frozen graph exported by
+   export_ctc.py or export_attention.py. Concurrent requests are decoded
+   in mini-batches by a single session call.
+
+   Request:
+       POST /recognize with a .npy file (`np.save`) or JSON
+       `{"inputs": [[...], ...]}` of features of size `[T, input_size]`.
+       Features must be already stacked if the model uses frame stacking.
+   Response:
+       JSON `{"labels": [...], "text": "..."}`. text is returned only when
+       a mapping file is given.
+
+   Usage:
+       python server.py path_to_frozen_graph.pb (port) (map_file_path)
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import io
+import json
+import sys
+import numpy as np
+from six.moves import BaseHTTPServer, socketserver
+
+sys.path.append('../../../')
+from experiments.utils.serving.batcher import DynamicBatcher, BatcherStats
+from experiments.utils.sparsetensor import sparsetensor2list
+from experiments.utils.labels.vocabulary import load_vocabulary
+from models.frozen_graph import FrozenGraph
+
+
+class BatchRecognizer(object):
+    """Decode a list of utterances of different lengths at once.
+    Args:
+        network: An instance of `FrozenGraph`
+    """
+
+    def __init__(self, network):
+        self.network = network
+
+    def __call__(self, inputs_list):
+        """
+        Args:
+            inputs_list: list of numpy arrays of size `[T, input_size]`
+        Returns:
+            labels_list: list of lists of labels
+        """
+        batch_size = len(inputs_list)
+        inputs_seq_len = np.array([len(x) for x in inputs_list],
+                                  dtype=np.int32)
+
+        # Pad with zeros
+        inputs = np.zeros((batch_size, max(inputs_seq_len),
+                           self.network.input_size), dtype=np.float32)
+        for i_batch, x in enumerate(inputs_list):
+            inputs[i_batch, :len(x)] = x
+
+        labels_pred = self.network.session.run(
+            self.network.decode_op,
+            feed_dict={self.network.inputs: inputs,
+                       self.network.inputs_seq_len: inputs_seq_len})
+
+        if self.network.model_type == 'ctc':
+            return [labels.tolist() for labels in
+                    sparsetensor2list(labels_pred, batch_size)]
+
+        # Remove <EOS> and the rest
+        labels_list = []
+        for labels in labels_pred.tolist():
+            if self.network.eos_index in labels:
+                labels = labels[:labels.index(self.network.eos_index)]
+            labels_list.append(labels)
+        return labels_list
+
+
+def parse_inputs(body, content_type, input_size):
+    """
+    Args:
+        body: bytes of the request body
+        content_type: string, the value of the Content-Type header
+        input_size: int, the dimension of input vectors
+    Returns:
+        inputs: A numpy array of size `[T, input_size]`
+    """
+    if content_type is not None and 'json' in content_type:
+        inputs = np.array(json.loads(body.decode('utf-8'))['inputs'],
+                          dtype=np.float32)
+    else:
+        inputs = np.load(io.BytesIO(body)).astype(np.float32)
+
+    if inputs.ndim != 2 or inputs.shape[1] != input_size or \
+            inputs.shape[0] == 0:
+        raise ValueError('inputs must be of size [T, %d], but got %s.' %
+                         (input_size, str(inputs.shape)))
+    return inputs
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def make_server(batcher, input_size, host='localhost', port=8000,
+                vocab=None, timeout=60.):
+    """
+    Args:
+        batcher: An instance of `DynamicBatcher`
+        input_size: int, the dimension of input vectors
+        host: string, host name to bind
+        port: int, port number to bind. If 0, a free port is selected.
+        vocab: An instance of `Vocabulary` to convert labels to text
+        timeout: float, the maximum time in seconds to wait for the result
+    Returns:
+        server: An instance of `ThreadingHTTPServer`. Call `serve_forever()`.
+    """
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            if self.path != '/recognize':
+                self._reply(404, {'error': 'Not found.'})
+                return
+
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            try:
+                inputs = parse_inputs(body, self.headers['Content-Type'],
+                                      input_size)
+            except Exception as e:
+                self._reply(400, {'error': str(e)})
+                return
+
+            try:
+                labels = batcher.submit(inputs).result(timeout=timeout)
+            except Exception as e:
+                self._reply(500, {'error': str(e)})
+                return
+
+            result = {'labels': labels}
+            if vocab is not None:
+                result['text'] = vocab.decode(labels)
+            self._reply(200, result)
+
+        def _reply(self, code, result):
+            body = json.dumps(result).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Not to print every request
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(graph_path, port, map_file_path):
+
+    network = FrozenGraph(graph_path)
+    vocab = load_vocabulary(map_file_path) if map_file_path else None
+
+    stats = BatcherStats()
+    batcher = DynamicBatcher(BatchRecognizer(network),
+                             max_batch_size=32,
+                             max_frame_num=32 * 800,
+                             max_delay=0.01,
+                             stats=stats)
+    server = make_server(batcher, network.input_size, port=port,
+                         vocab=vocab)
+    print('Serving %s on port %d' % (graph_path, server.server_port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        network.close()
+        print(stats)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) < 2 or len(args) > 4:
+        raise ValueError(
+            ("Set a path to the frozen graph.\n"
+             "Usase: python server.py path_to_frozen_graph.pb (port) "
+             "(map_file_path)"))
+    port = int(args[2]) if len(args) >= 3 else 8000
+    map_file_path = args[3] if len(args) == 4 else None
+    main(graph_path=args[1], port=port, map_file_path=map_file_path)
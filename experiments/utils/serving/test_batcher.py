@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import threading
+import unittest
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append('../../../')
+from experiments.utils.serving.batcher import DynamicBatcher, BatcherStats
+
+
+class TestDynamicBatcher(unittest.TestCase):
+
+    def test(self):
+        self.check_batching(max_batch_size=8, max_frame_num=None)
+        self.check_batching(max_batch_size=8, max_frame_num=1000)
+        self.check_batching(max_batch_size=1, max_frame_num=None)
+        self.check_batching(max_batch_size=100, max_frame_num=300)
+
+    def check_batching(self, max_batch_size, max_frame_num):
+        batches = []
+        lock = threading.Lock()
+
+        def run_fn(inputs_list):
+            with lock:
+                batches.append([len(x) for x in inputs_list])
+            return [x.sum() for x in inputs_list]
+
+        stats = BatcherStats()
+        batcher = DynamicBatcher(run_fn,
+                                 max_batch_size=max_batch_size,
+                                 max_frame_num=max_frame_num,
+                                 max_delay=0.05,
+                                 stats=stats)
+
+        # Utterances longer than max_frame_num are included
+        inputs_list = [np.random.rand(np.random.randint(1, 500), 3)
+                       for _ in range(200)]
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            outputs = list(executor.map(
+                lambda x: batcher.submit(x).result(), inputs_list))
+        batcher.close()
+
+        # Each request gets its own output
+        for inputs, output in zip(inputs_list, outputs):
+            self.assertAlmostEqual(inputs.sum(), output)
+
+        self.assertEqual(sum(len(b) for b in batches), len(inputs_list))
+        self.assertEqual(stats.request_num, len(inputs_list))
+        self.assertEqual(stats.batch_num, len(batches))
+        for frame_nums in batches:
+            self.assertLessEqual(len(frame_nums), max_batch_size)
+            if max_frame_num is not None and len(frame_nums) > 1:
+                self.assertLessEqual(max(frame_nums) * len(frame_nums),
+                                     max_frame_num)
+        if max_batch_size > 1:
+            # Concurrent requests are batched
+            self.assertLess(len(batches), len(inputs_list))
+
+    def test_exception(self):
+        def run_fn(inputs_list):
+            raise RuntimeError('stand-in error')
+
+        batcher = DynamicBatcher(run_fn, max_batch_size=4)
+        future = batcher.submit(np.zeros((10, 3)))
+        self.assertRaises(RuntimeError, future.result)
+
+        # The worker keeps running after an exception
+        future = batcher.submit(np.zeros((10, 3)))
+        self.assertRaises(RuntimeError, future.result)
+        batcher.close()
+        self.assertRaises(ValueError, batcher.submit, np.zeros((10, 3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
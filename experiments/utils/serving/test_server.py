@@ -0,0 +1,93 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import threading
+import unittest
+from collections import namedtuple
+import numpy as np
+
+sys.path.append('../../../')
+from experiments.utils.serving.batcher import DynamicBatcher
+from experiments.utils.serving.server import BatchRecognizer, make_server
+from experiments.utils.serving.load_generator import run_load, send_request
+
+SparseTensorValue = namedtuple('SparseTensorValue',
+                               ['indices', 'values', 'dense_shape'])
+
+
+class StandInSession(object):
+    """Decode each frame into the index of the maximum feature. Frames are
+       merged as in CTC, and label 0 is blank."""
+
+    def run(self, decode_op, feed_dict):
+        inputs = feed_dict['inputs']
+        inputs_seq_len = feed_dict['inputs_seq_len']
+        indices, values = [], []
+        for i_batch, (x, seq_len) in enumerate(zip(inputs, inputs_seq_len)):
+            for i_l, label in enumerate(stand_in_decode(x[:seq_len])):
+                indices.append([i_batch, i_l])
+                values.append(label)
+        return SparseTensorValue(
+            np.array(indices, dtype=np.int64).reshape(-1, 2),
+            np.array(values, dtype=np.int32),
+            np.array([len(inputs), 1], dtype=np.int64))
+
+
+class StandInNetwork(object):
+    model_type = 'ctc'
+    eos_index = None
+    input_size = 4
+    inputs = 'inputs'
+    inputs_seq_len = 'inputs_seq_len'
+    decode_op = 'decode_op'
+    session = StandInSession()
+
+
+def stand_in_decode(inputs):
+    labels = []
+    prev = 0
+    for label in np.argmax(inputs, axis=1).tolist():
+        if label != prev and label != 0:
+            labels.append(label)
+        prev = label
+    return labels
+
+
+class TestServer(unittest.TestCase):
+
+    def test(self):
+        batcher = DynamicBatcher(BatchRecognizer(StandInNetwork()),
+                                 max_batch_size=8,
+                                 max_frame_num=2000,
+                                 max_delay=0.02)
+        server = make_server(batcher, StandInNetwork.input_size, port=0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = 'http://localhost:%d/recognize' % server.server_port
+
+        try:
+            inputs_list = [np.random.rand(np.random.randint(1, 300), 4)
+                           for _ in range(50)]
+            results, latencies, _ = run_load(url, inputs_list,
+                                             concurrency=16)
+            self.assertEqual(len(latencies), len(inputs_list))
+            for inputs, result in zip(inputs_list, results):
+                self.assertEqual(result['labels'], stand_in_decode(inputs))
+
+            # Invalid input size
+            self.assertRaises(Exception, send_request, url,
+                              np.zeros((10, 3)))
+        finally:
+            server.shutdown()
+            server.server_close()
+            batcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
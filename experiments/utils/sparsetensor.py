@@ -6,7 +6,6 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
-import tensorflow as tf
 
 
 def list2sparsetensor(labels, padded_value):
@@ -36,40 +35,55 @@ def list2sparsetensor(labels, padded_value):
     return labels_st
 
 
-def sparsetensor2list(labels_st, batch_size):
-    """Convert labels from sparse tensor to list.
+def sparsetensor2ragged(labels_st, batch_size):
+    """Convert labels from sparse tensor to a ragged batch.
     Args:
-        labels_st: A SparseTensor of labels
+        labels_st: A SparseTensor of labels, or list of indices, values,
+            dense_shape
         batch_size: int the size of mini-batch
     Returns:
-        labels: list of np.ndarray, size of `[batch_size]`. Each element is a
-            sequence of target labels of an input.
+        offsets: np.ndarray of size `[batch_size + 1]`. Labels of the i-th
+            input are `values[offsets[i]:offsets[i + 1]]`.
+        values: np.ndarray of labels of all inputs
     """
-    if isinstance(labels_st, tf.SparseTensorValue):
-        indices = labels_st.indices
-        values = labels_st.values
+    if hasattr(labels_st, 'indices'):
+        indices = np.asarray(labels_st.indices)
+        values = np.asarray(labels_st.values)
     else:
         # labels_st is expected to be a list [indices, values, shape]
-        indices = labels_st[0]
-        values = labels_st[1]
-        # TODO: Remove later
+        indices = np.asarray(labels_st[0])
+        values = np.asarray(labels_st[1])
 
-    if batch_size == 1:
-        return labels_st.values.reshape((1, -1))
+    if len(values) == 0:
+        # No input has labels
+        return np.zeros((batch_size + 1,), dtype=np.int64), values
 
-    labels = []
-    batch_boundary = np.where(indices[:, 1] == 0)[0]
+    # Sort labels by input in case indices are not in row-major order
+    if np.any(np.diff(indices[:, 0]) < 0) or np.any(
+            (np.diff(indices[:, 0]) == 0) & (np.diff(indices[:, 1]) < 0)):
+        order = np.lexsort((indices[:, 1], indices[:, 0]))
+        values = values[order]
+        indices = indices[order]
 
-    # TODO: fix error occurred when ctc models do not output any labels
-    # print(batch_boundary)
-    # if len(batch_boundary) != batch_size:
-    #     batch_boundary = np.array(batch_boundary.tolist() + [max(batch_boundary) + 1])
-    # print(indices)
+    # NOTE: inputs which have no labels (e.g. empty hypotheses of CTC
+    # decoders) are counted as 0
+    label_nums = np.bincount(indices[:, 0], minlength=batch_size)
+    offsets = np.zeros((batch_size + 1,), dtype=np.int64)
+    np.cumsum(label_nums, out=offsets[1:])
 
-    for i in range(batch_size - 1):
-        label_each_wav = values[batch_boundary[i]:batch_boundary[i + 1]]
-        labels.append(label_each_wav)
-    # Last one
-    labels.append(values[batch_boundary[-1]:])
+    return offsets, values
 
-    return labels
+
+def sparsetensor2list(labels_st, batch_size):
+    """Convert labels from sparse tensor to list.
+    Args:
+        labels_st: A SparseTensor of labels, or list of indices, values,
+            dense_shape
+        batch_size: int the size of mini-batch
+    Returns:
+        labels: list of np.ndarray, size of `[batch_size]`. Each element is a
+            sequence of target labels of an input. Inputs which have no
+            labels are empty arrays.
+    """
+    offsets, values = sparsetensor2ragged(labels_st, batch_size)
+    return np.split(values, offsets[1:-1])
@@ -0,0 +1,106 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import socket
+import sys
+import unittest
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../../')
+from experiments.utils.distributed import Replica, make_cluster_spec
+from experiments.utils.data.sampler import BatchSampler
+
+
+def _free_port():
+    sock = socket.socket()
+    sock.bind(('localhost', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class ToyDataset(object):
+
+    def __init__(self, data_num, batch_size):
+        self.batch_size = batch_size
+        self.input_paths = np.array(['/tmp/S%d_%04d.npy' % (i % 5, i)
+                                     for i in range(data_num)])
+        self.sampler = BatchSampler(np.random.randint(1, 100, data_num))
+
+
+class TestDistributed(unittest.TestCase):
+
+    def test(self):
+        cluster = make_cluster_spec(num_ps=2, num_worker=3, port=3000)
+        self.assertEqual(cluster.job_tasks('ps'),
+                         ['localhost:3000', 'localhost:3001'])
+        self.assertEqual(cluster.job_tasks('worker'),
+                         ['localhost:3002', 'localhost:3003',
+                          'localhost:3004'])
+
+        # Not distributed
+        replica = Replica({})
+        self.assertTrue(replica.is_chief)
+        self.assertIsNone(replica.num_replicas)
+        self.assertIsNone(replica.device())
+        self.assertEqual(replica.name, '')
+        dataset = ToyDataset(data_num=103, batch_size=10)
+        # Each epoch ends with the last mini-batch of the dataset
+        self.assertIsNone(replica.shard(dataset))
+        self.assertEqual(dataset.sampler.data_num, 103)
+
+        with self.assertRaises(ValueError):
+            Replica({}, job_name='chief')
+
+        self.check_training(is_sync=True)
+        self.check_training(is_sync=False)
+
+    def check_training(self, is_sync):
+
+        print('----- sync_replicas: %s -----' % str(is_sync))
+
+        # A cluster of one parameter server and one worker in this process
+        param = {'num_ps': 1, 'num_worker': 1, 'port': _free_port(),
+                 'sync_replicas': is_sync}
+        Replica(param, job_name='ps', task_index=0)
+        replica = Replica(param, job_name='worker', task_index=0)
+        self.assertEqual(replica.num_replicas, 1 if is_sync else None)
+        self.assertTrue(replica.name.endswith('sync'))
+
+        # The shard of the only worker is the whole dataset
+        dataset = ToyDataset(data_num=103, batch_size=10)
+        self.assertEqual(replica.shard(dataset), 11)
+        self.assertEqual(dataset.sampler.data_num, 103)
+
+        with tf.Graph().as_default(), tf.device(replica.device()):
+            w = tf.Variable(1.0, name='w')
+            loss = tf.square(w)
+            self.assertTrue(w.device.startswith('/job:ps'))
+            self.assertTrue(loss.device.startswith('/job:worker'))
+
+            global_step = tf.Variable(0, name='global_step', trainable=False)
+            optimizer = tf.train.GradientDescentOptimizer(0.1)
+            sync_optimizer = None
+            if replica.num_replicas is not None:
+                optimizer = tf.train.SyncReplicasOptimizer(
+                    optimizer,
+                    replicas_to_aggregate=replica.num_replicas,
+                    total_num_replicas=replica.num_replicas)
+                sync_optimizer = optimizer
+            train_op = optimizer.minimize(loss, global_step=global_step)
+            init_op = tf.global_variables_initializer()
+
+            with replica.session(init_op, sync_optimizer) as sess:
+                for _ in range(10):
+                    sess.run(train_op)
+                self.assertEqual(sess.run(global_step), 10)
+                self.assertAlmostEqual(sess.run(w), 0.8 ** 10, places=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
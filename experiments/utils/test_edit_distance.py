@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from experiments.utils.edit_distance import compute_edit_distance, compute_error_rate
+
+
+def edit_distance_naive(labels_true, labels_pred):
+    table = np.zeros((len(labels_true) + 1, len(labels_pred) + 1))
+    table[:, 0] = np.arange(len(labels_true) + 1)
+    table[0, :] = np.arange(len(labels_pred) + 1)
+    for i in range(1, len(labels_true) + 1):
+        for j in range(1, len(labels_pred) + 1):
+            table[i, j] = min(
+                table[i - 1, j] + 1, table[i, j - 1] + 1,
+                table[i - 1, j - 1] + (labels_true[i - 1] != labels_pred[j - 1]))
+    return table[-1, -1]
+
+
+class TestEditDistance(unittest.TestCase):
+
+    def test(self):
+        # Substitution, insertion and deletion
+        errors = compute_edit_distance(
+            [[1, 2, 3, 4], [1, 2, 3], [1, 2, 3], 'kitten', []],
+            [[1, 5, 3, 4], [1, 2, 3, 4], [1, 3], 'sitting', [1, 2]])
+        self.assertEqual(errors.tolist(), [[1, 0, 0, 4],
+                                           [0, 1, 0, 3],
+                                           [0, 0, 1, 3],
+                                           [2, 1, 0, 6],
+                                           [0, 2, 0, 0]])
+
+        # Padding
+        errors = compute_edit_distance([[1, 2, -1, -1]], [[1, 2, 3, -1]],
+                                       padded_value=-1)
+        self.assertEqual(errors.tolist(), [[0, 1, 0, 2]])
+
+        # Random sequences
+        labels_true = [np.random.randint(0, 5, size=np.random.randint(1, 30))
+                       for _ in range(200)]
+        labels_pred = [np.random.randint(0, 5, size=np.random.randint(0, 30))
+                       for _ in range(200)]
+        errors = compute_edit_distance(labels_true, labels_pred)
+        for l_true, l_pred, errors_i in zip(labels_true, labels_pred, errors):
+            self.assertEqual(errors_i[:3].sum(),
+                             edit_distance_naive(l_true, l_pred))
+            # Length of the hypothesis is consistent with the alignment
+            self.assertEqual(len(l_true) + errors_i[1] - errors_i[2],
+                             len(l_pred))
+
+        # Process pool
+        errors_pool = compute_edit_distance(labels_true, labels_pred,
+                                            num_worker=2, chunk_size=16)
+        self.assertTrue(np.all(errors == errors_pool))
+
+        error_rates = compute_error_rate(labels_true, labels_pred)
+        self.assertTrue(np.allclose(
+            error_rates, errors[:, :3].sum(axis=1) / errors[:, 3]))
+
+    def test_denominator(self):
+        # Normalized by the length of the ground truth, not the hypothesis
+        error_rates = compute_error_rate([[1, 2, 3, 4], [1], 'abcd'],
+                                         [[1, 2], [1, 2, 3], 'ab'])
+        self.assertEqual(error_rates.tolist(), [0.5, 2.0, 0.5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from experiments.utils.sparsetensor import list2sparsetensor, sparsetensor2list, sparsetensor2ragged
+from experiments.utils.labels.character import num2char
+from experiments.utils.labels.phone import num2phone
+
+
+class TestSparseTensor(unittest.TestCase):
+
+    def test(self):
+        labels = [np.array([1, 2, -1, -1]),
+                  np.array([-1, -1, -1, -1]),
+                  np.array([3, 0, 2, 1]),
+                  np.array([-1, -1, -1, -1])]
+        labels_st = list2sparsetensor(labels, padded_value=-1)
+
+        # Empty hypotheses are kept
+        labels_list = sparsetensor2list(labels_st, batch_size=4)
+        self.assertEqual(len(labels_list), 4)
+        for labels_i, labels_list_i in zip(labels, labels_list):
+            self.assertEqual(labels_i[labels_i != -1].tolist(),
+                             labels_list_i.tolist())
+
+        offsets, values = sparsetensor2ragged(labels_st, batch_size=4)
+        self.assertEqual(offsets.tolist(), [0, 2, 2, 6, 6])
+
+        # All hypotheses are empty
+        empty_st = [np.zeros((0, 2), dtype=np.int64),
+                    np.zeros((0,), dtype=np.int32),
+                    np.array([2, 0], dtype=np.int64)]
+        labels_list = sparsetensor2list(empty_st, batch_size=2)
+        self.assertEqual([len(l) for l in labels_list], [0, 0])
+
+        # Convert the ragged batch into strings at once
+        fd, map_file_path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'w') as f:
+                for i, token in enumerate(['a', 'b', 'cc', 'd']):
+                    f.write('%s  %d\n' % (token, i))
+            str_phone_list = num2phone(values, map_file_path,
+                                       offsets=offsets)
+            str_char_list = num2char(values, map_file_path, offsets=offsets)
+            for labels_i, str_phone, str_char in zip(
+                    labels, str_phone_list, str_char_list):
+                self.assertEqual(num2phone(labels_i, map_file_path),
+                                 str_phone)
+                self.assertEqual(num2char(labels_i, map_file_path),
+                                 str_char)
+            self.assertEqual(str_phone_list, ['b cc', '', 'd a cc b', ''])
+        finally:
+            os.remove(map_file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import OrderedDict
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from experiments.utils.trainer import Trainer
+
+
+class ToySession(object):
+    """Record fetches of each run. Values of operations are their names
+       (strings) or the step fed as `step`."""
+
+    def __init__(self):
+        self.runs = []
+
+    def run(self, fetches, feed_dict=None):
+        self.runs.append((fetches, feed_dict))
+        if not isinstance(fetches, dict):
+            return None
+        results = {}
+        for key, op in fetches.items():
+            if isinstance(op, dict):
+                results[key] = {name: feed_dict['step'] for name in op}
+            elif key == 'loss':
+                results[key] = float(feed_dict['step'])
+            else:
+                results[key] = op
+        return results
+
+
+class ToyWriter(object):
+
+    def __init__(self):
+        self.summaries = []
+
+    def add_summary(self, summary, step):
+        self.summaries.append((summary, step))
+
+    def flush(self):
+        pass
+
+
+class TestTrainer(unittest.TestCase):
+
+    def test(self):
+        self.check_run(accumulate_steps=1, metric_fn=None)
+        self.check_run(accumulate_steps=3, metric_fn=None)
+        self.check_run(accumulate_steps=1,
+                       metric_fn=lambda values, feed_dict: OrderedDict(
+                           [('ler', values['ler'] * 2)]))
+
+    def check_run(self, accumulate_steps, metric_fn):
+
+        print('----- accumulate_steps: %d, metric_fn: %s -----' %
+              (accumulate_steps, str(metric_fn is not None)))
+
+        sess = ToySession()
+        writer = ToyWriter()
+        trainer = Trainer(session=sess,
+                          train_op='train',
+                          loss_op='loss',
+                          metric_ops=OrderedDict([('ler', 'ler_greedy')]),
+                          metric_fn=metric_fn,
+                          summary_writer=writer,
+                          summary_train='summary_train',
+                          summary_dev='summary_dev',
+                          apply_op='apply' if accumulate_steps > 1 else None,
+                          accumulate_steps=accumulate_steps,
+                          print_step=4)
+
+        counter = {'train': 0, 'dev': 0}
+
+        def next_feed_dict_train():
+            counter['train'] += 1
+            # Epochs of 5 mini-batches
+            return ({'step': counter['train'] - 1, 'mode': 'train'},
+                    counter['train'] % 5 == 0)
+
+        def next_feed_dict_dev():
+            counter['dev'] += 1
+            return {'step': 100 + counter['dev'], 'mode': 'dev'}
+
+        epochs = []
+        trainer.run(num_epoch=2,
+                    next_feed_dict_train=next_feed_dict_train,
+                    next_feed_dict_dev=next_feed_dict_dev,
+                    epoch_end_fn=epochs.append)
+
+        self.assertEqual(counter['train'], 10)
+        # Dev mini-batches are loaded only on monitored steps
+        self.assertEqual(counter['dev'], 2)
+        self.assertEqual(epochs, [1, 2])
+
+        # One run per step (plus one run for each update with accumulation)
+        # and one run per dev mini-batch
+        train_runs = [fetches for fetches, feed_dict in sess.runs
+                      if feed_dict['mode'] == 'train']
+        dev_runs = [fetches for fetches, feed_dict in sess.runs
+                    if feed_dict['mode'] == 'dev']
+        apply_runs = [fetches for fetches in train_runs if fetches == 'apply']
+        self.assertEqual(len(train_runs) - len(apply_runs), 10)
+        self.assertEqual(len(dev_runs), 2)
+        if accumulate_steps > 1:
+            # Steps 3, 6, 9 and the last step
+            self.assertEqual(len(apply_runs), 4)
+        else:
+            self.assertEqual(len(apply_runs), 0)
+
+        # Loss, metrics and summary are fetched with train_op
+        monitored_runs = [fetches for fetches in train_runs
+                          if isinstance(fetches, dict) and
+                          'loss' in fetches]
+        self.assertEqual(len(monitored_runs), 2)
+        for fetches in monitored_runs:
+            self.assertEqual(fetches['train'], 'train')
+            self.assertEqual(fetches['summary'], 'summary_train')
+            self.assertEqual(fetches['metrics'], {'ler': 'ler_greedy'})
+        for fetches in dev_runs:
+            self.assertNotIn('train', fetches)
+            self.assertEqual(fetches['summary'], 'summary_dev')
+
+        self.assertEqual(writer.summaries,
+                         [('summary_train', 4), ('summary_dev', 4),
+                          ('summary_train', 8), ('summary_dev', 8)])
+
+        # Logs for csv files
+        self.assertEqual(trainer.csv_steps, [3, 7])
+        self.assertEqual(trainer.csv_loss_train, [3, 7])
+        self.assertEqual(trainer.csv_loss_dev, [101, 102])
+        scale = 1 if metric_fn is None else 2
+        self.assertEqual(trainer.csv_metrics_train['ler'],
+                         [3 * scale, 7 * scale])
+        self.assertEqual(trainer.csv_metrics_dev['ler'],
+                         [101 * scale, 102 * scale])
+
+        save_path = tempfile.mkdtemp()
+        try:
+            trainer.save(save_path)
+            ler = np.loadtxt(os.path.join(save_path, 'ler.csv'),
+                             delimiter=',')
+            self.assertEqual(ler.shape, (2, 3))
+            self.assertTrue(os.path.isfile(
+                os.path.join(save_path, 'loss.csv')))
+        finally:
+            shutil.rmtree(save_path)
+
+    def test_epoch(self):
+        # The number of mini-batches changes every epoch
+        self.check_epoch(epoch_lens=[4, 7, 3], iter_per_epoch=None,
+                         steps=[4, 11, 14])
+        # The number of steps is fixed regardless of the data loader
+        self.check_epoch(epoch_lens=[4, 7, 3], iter_per_epoch=5,
+                         steps=[5, 10, 15])
+
+    def check_epoch(self, epoch_lens, iter_per_epoch, steps):
+        sess = ToySession()
+        trainer = Trainer(session=sess,
+                          train_op='train',
+                          loss_op='loss',
+                          apply_op='apply',
+                          accumulate_steps=4,
+                          print_step=100)
+
+        epoch_ends = np.cumsum(epoch_lens * 2)
+        counter = {'train': 0}
+
+        def next_feed_dict_train():
+            counter['train'] += 1
+            return ({'step': counter['train'] - 1, 'mode': 'train'},
+                    counter['train'] in epoch_ends)
+
+        steps_epoch = []
+        trainer.run(num_epoch=3,
+                    iter_per_epoch=iter_per_epoch,
+                    next_feed_dict_train=next_feed_dict_train,
+                    next_feed_dict_dev=None,
+                    epoch_end_fn=lambda epoch: steps_epoch.append(
+                        counter['train']))
+        self.assertEqual(steps_epoch, steps)
+
+        # Accumulated gradients are applied at the last step
+        apply_steps = [feed_dict['step'] + 1 for fetches, feed_dict
+                       in sess.runs if fetches == 'apply']
+        self.assertEqual(apply_steps[-1], steps[-1])
+        self.assertEqual(apply_steps[:-1],
+                         list(range(4, steps[-1], 4)))
+
+
+if __name__ == '__main__':
+    unittest.main()
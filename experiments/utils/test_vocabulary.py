@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import abspath, dirname, join
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from experiments.timit.metrics.mapping import map_to_39phone, make_39phone_table
+from experiments.utils.labels.vocabulary import load_vocabulary
+from experiments.utils.labels.ragged import dense2ragged, remap_ragged, ragged2list
+from experiments.utils.labels.phone import num2phone, phone2num
+
+MAP_FILE_DIR = join(dirname(abspath(__file__)),
+                    '../timit/metrics/mapping_files/')
+
+
+class TestVocabulary(unittest.TestCase):
+
+    def test(self):
+        phone2num_39_map_file_path = MAP_FILE_DIR + 'ctc/phone39_to_num.txt'
+        phone2phone_map_file_path = MAP_FILE_DIR + 'phone2phone.txt'
+        vocab_39 = load_vocabulary(phone2num_39_map_file_path)
+
+        # Mapping files are loaded once
+        self.assertTrue(
+            load_vocabulary(phone2num_39_map_file_path) is vocab_39)
+
+        for label_type in ['phone39', 'phone48', 'phone61']:
+            print('----- %s -----' % label_type)
+            phone2num_map_file_path = MAP_FILE_DIR + \
+                'ctc/' + label_type + '_to_num.txt'
+            vocab = load_vocabulary(phone2num_map_file_path)
+            table = make_39phone_table(vocab, vocab_39, label_type,
+                                       phone2phone_map_file_path)
+
+            labels = [np.random.randint(0, len(vocab), size=label_len)
+                      for label_len in [10, 0, 1, 30]]
+            labels_padded = -np.ones((len(labels), 30), dtype=np.int32)
+            for i, labels_i in enumerate(labels):
+                labels_padded[i, :len(labels_i)] = labels_i
+
+            # id -> id mapping with a lookup table
+            labels_mapped = ragged2list(
+                *remap_ragged(table, *dense2ragged(labels_padded)))
+
+            # id -> string conversion of a batch
+            offsets, values = dense2ragged(labels)
+            str_phone_list = vocab.decode_batch(offsets, values,
+                                                delimiter=' ')
+
+            for labels_i, labels_mapped_i, str_phone in zip(
+                    labels, labels_mapped, str_phone_list):
+                self.assertEqual(
+                    num2phone(labels_i, phone2num_map_file_path), str_phone)
+
+                # Same as mapping through strings
+                phone_list = map_to_39phone(
+                    str_phone.split(' ') if len(labels_i) > 0 else [],
+                    label_type, phone2phone_map_file_path)
+                self.assertEqual(
+                    phone2num(phone_list,
+                              phone2num_39_map_file_path).tolist(),
+                    labels_mapped_i.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
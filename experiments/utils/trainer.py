@@ -0,0 +1,233 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Training loop shared by the training scripts. On logging steps, the loss,
+   metrics and summary of the training mini-batch are fetched in the same
+   `session.run` as the training operation, and those of a dev mini-batch in
+   a single `session.run`, so that no mini-batch is forwarded again only for
+   monitoring.
+
+   Metrics of the training mini-batch are computed in training mode (with
+   dropout). Use cheap operations for them such as LER by greedy decoding,
+   and keep beam search for the evaluation per epoch.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import OrderedDict
+import sys
+import time
+
+from experiments.utils.csv import save_loss, save_ler
+
+
+class Trainer(object):
+    """Run training steps and monitor the model.
+    Args:
+        session: session of training model
+        train_op: operation for training
+        loss_op: operation for computing loss
+        metric_ops: OrderedDict of names and operations fetched with the loss
+            (e.g. LER by greedy decoding), or None
+        metric_fn: function to compute metrics on host. It takes the
+            dictionary of fetched values of metric_ops and the feed
+            dictionary, and returns an OrderedDict of names and values. If
+            None, the fetched values are used as metrics.
+        summary_writer: An instance of `tf.summary.FileWriter`, or None
+        summary_train: summary operation for the training mini-batch
+        summary_dev: summary operation for the dev mini-batch
+        apply_op: operation to apply gradients accumulated over micro-batches
+            (see models/gradient_accumulation.py), or None
+        accumulate_steps: int, the number of micro-batches per update
+        print_step: int, the interval of steps to monitor the model
+    """
+
+    def __init__(self, session, train_op, loss_op, metric_ops=None,
+                 metric_fn=None, summary_writer=None, summary_train=None,
+                 summary_dev=None, apply_op=None, accumulate_steps=1,
+                 print_step=10):
+        self.session = session
+        self.train_op = train_op
+        self.loss_op = loss_op
+        self.metric_ops = metric_ops if metric_ops is not None else {}
+        self.metric_fn = metric_fn
+        self.summary_writer = summary_writer
+        self.summary_train = summary_train
+        self.summary_dev = summary_dev
+        self.apply_op = apply_op
+        self.accumulate_steps = accumulate_steps
+        self.print_step = print_step
+
+        # Logs for csv files
+        self.csv_steps = []
+        self.csv_loss_train, self.csv_loss_dev = [], []
+        self.csv_metrics_train, self.csv_metrics_dev = None, None
+
+        # The start time of the interval between monitored steps
+        self.start_time_step = None
+
+    def _fetches(self, summary_op):
+        fetches = {'loss': self.loss_op}
+        if len(self.metric_ops) > 0:
+            fetches['metrics'] = dict(self.metric_ops)
+        if summary_op is not None and self.summary_writer is not None:
+            fetches['summary'] = summary_op
+        return fetches
+
+    def _metrics(self, results, feed_dict):
+        values = results.get('metrics', {})
+        if self.metric_fn is not None:
+            return self.metric_fn(values, feed_dict)
+        return OrderedDict((name, values[name]) for name in self.metric_ops)
+
+    def _add_summary(self, results, step):
+        if 'summary' in results:
+            self.summary_writer.add_summary(results['summary'], step + 1)
+
+    def train_step(self, step, feed_dict, is_monitored=False,
+                   is_last_step=False):
+        """Update parameters with a mini-batch.
+        Args:
+            step: int, the index of the step
+            feed_dict: feed dictionary of the training mini-batch
+            is_monitored: if True, fetch the loss, metrics and summary in the
+                same run as train_op
+            is_last_step: if True, this is the last step of training, and
+                the accumulated gradients are applied
+        Returns:
+            loss: the loss of the mini-batch, or None if not monitored
+            metrics: OrderedDict of metrics, or None if not monitored
+        """
+        fetches = {'train': self.train_op}
+        if is_monitored:
+            fetches.update(self._fetches(self.summary_train))
+        results = self.session.run(fetches, feed_dict=feed_dict)
+
+        if self.apply_op is not None and (
+                (step + 1) % self.accumulate_steps == 0 or is_last_step):
+            # Apply gradients accumulated over micro-batches
+            self.session.run(self.apply_op, feed_dict=feed_dict)
+
+        if not is_monitored:
+            return None, None
+        self._add_summary(results, step)
+        return results['loss'], self._metrics(results, feed_dict)
+
+    def evaluate_step(self, step, feed_dict):
+        """Compute the loss, metrics and summary of a dev mini-batch at once.
+        Args:
+            step: int, the index of the step
+            feed_dict: feed dictionary of the dev mini-batch in evaluation
+                mode (keep_prob of 1.0)
+        Returns:
+            loss: the loss of the mini-batch
+            metrics: OrderedDict of metrics
+        """
+        results = self.session.run(self._fetches(self.summary_dev),
+                                   feed_dict=feed_dict)
+        self._add_summary(results, step)
+        return results['loss'], self._metrics(results, feed_dict)
+
+    def _log(self, step, loss_train, loss_dev, metrics_train, metrics_dev):
+        if self.csv_metrics_train is None:
+            self.csv_metrics_train = OrderedDict(
+                (name, []) for name in metrics_train)
+            self.csv_metrics_dev = OrderedDict(
+                (name, []) for name in metrics_dev)
+        self.csv_steps.append(step)
+        self.csv_loss_train.append(loss_train)
+        self.csv_loss_dev.append(loss_dev)
+        for name in metrics_train:
+            self.csv_metrics_train[name].append(metrics_train[name])
+            self.csv_metrics_dev[name].append(metrics_dev[name])
+
+    def run(self, num_epoch, next_feed_dict_train, next_feed_dict_dev,
+            iter_per_epoch=None, epoch_end_fn=None, print_fn=None):
+        """Train the model for num_epoch epochs.
+        Args:
+            num_epoch: int, the number of epochs
+            next_feed_dict_train: function that returns the feed dictionary
+                of the next training mini-batch and a flag which is True if
+                the mini-batch is the last one in the epoch (e.g.
+                `next_epoch_flag` of the dataset)
+            next_feed_dict_dev: function that returns the feed dictionary of
+                the next dev mini-batch in evaluation mode. This is called
+                only on monitored steps.
+            iter_per_epoch: int, if set, each epoch is this number of steps
+                regardless of the flag (e.g. so that all workers of
+                distributed training stop at the same time). If None, each
+                epoch ends with the last mini-batch of the epoch, so that the
+                number of steps may change every epoch with a frame budget.
+            epoch_end_fn: function called with the epoch at the end of each
+                epoch (e.g. to save the model and evaluate it), or None
+            print_fn: function called after the progress is printed (e.g. to
+                print statistics of the data loader), or None
+        """
+        start_time_train = time.time()
+        self.start_time_step = time.time()
+        step = 0
+        for epoch in range(1, num_epoch + 1):
+            start_time_epoch = time.time()
+            step_epoch = 0
+            next_epoch_flag = False
+            while not next_epoch_flag:
+                feed_dict_train, next_epoch_flag = next_feed_dict_train()
+                step_epoch += 1
+                if iter_per_epoch is not None:
+                    next_epoch_flag = step_epoch == iter_per_epoch
+
+                # Update parameters
+                is_monitored = (step + 1) % self.print_step == 0
+                loss_train, metrics_train = self.train_step(
+                    step, feed_dict_train, is_monitored,
+                    is_last_step=next_epoch_flag and epoch == num_epoch)
+
+                if is_monitored:
+                    self._monitor(step, loss_train, metrics_train,
+                                  next_feed_dict_dev(), print_fn)
+                step += 1
+
+            duration_epoch = time.time() - start_time_epoch
+            print('-----EPOCH:%d (%.3f min)-----' %
+                  (epoch, duration_epoch / 60))
+            if epoch_end_fn is not None:
+                epoch_end_fn(epoch)
+            self.start_time_step = time.time()
+
+        duration_train = time.time() - start_time_train
+        print('Total time: %.3f hour' % (duration_train / 3600))
+
+    def _monitor(self, step, loss_train, metrics_train, feed_dict_dev,
+                 print_fn=None):
+        loss_dev, metrics_dev = self.evaluate_step(step, feed_dict_dev)
+        self._log(step, loss_train, loss_dev, metrics_train, metrics_dev)
+        if self.summary_writer is not None:
+            self.summary_writer.flush()
+
+        duration_step = time.time() - self.start_time_step
+        message = 'Step %d: loss = %.3f (%.3f)' % (
+            step + 1, loss_train, loss_dev)
+        for name in metrics_train:
+            message += ' / %s = %.4f (%.4f)' % (
+                name, metrics_train[name], metrics_dev[name])
+        print(message + ' (%.3f min)' % (duration_step / 60))
+        if print_fn is not None:
+            print_fn(step)
+        sys.stdout.flush()
+        self.start_time_step = time.time()
+
+    def save(self, save_path):
+        """Save the loss and metrics of monitored steps to csv files.
+        Args:
+            save_path: path to the directory to save csv files
+        """
+        save_loss(self.csv_steps, self.csv_loss_train, self.csv_loss_dev,
+                  save_path=save_path)
+        if self.csv_metrics_train is None:
+            return
+        for name in self.csv_metrics_train:
+            save_ler(self.csv_steps, self.csv_metrics_train[name],
+                     self.csv_metrics_dev[name], save_path=save_path,
+                     name=name)
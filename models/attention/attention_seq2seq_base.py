@@ -9,8 +9,11 @@ from __future__ import print_function
 
 import tensorflow as tf
 from models.attention.decoders.beam_search.util import choose_top_k
+from models.attention.decoders.beam_search.util import tile_batch
 from models.attention.decoders.beam_search.namedtuple import BeamSearchConfig
 from models.attention.decoders.beam_search.beam_search_decoder import BeamSearchDecoder
+from models.tower import build_towers, compute_gradients
+from models.gradient_accumulation import micro_batch_weight, apply_gradients
 
 
 OPTIMIZER_CLS_NAMES = {
@@ -41,6 +44,8 @@ class AttentionBase(object):
         clip_grad: A float value. Range of gradient clipping (> 0)
         weight_decay: A float value. Regularization parameter for weight decay
         beam_width: if equal to 1, use greedy decoding
+        length_penalty_weight: Weight for the length penalty factor in beam
+            search. 0.0 disables the penalty.
     """
 
     def __init__(self):
@@ -158,7 +163,6 @@ class AttentionBase(object):
         # Output tensor has shape [2, 3].
         # tf.fill([2, 3], 9) ==> [[9, 9, 9]
         #                         [9, 9, 9]]
-        # TODO: beam_search_decoder
 
         decoder_initial_state = bridge(reuse=True)
 
@@ -171,6 +175,53 @@ class AttentionBase(object):
 
         return (decoder_outputs, final_state)
 
+    def _decode_infer_beam_search(self, bridge, encoder_outputs, labels):
+        """Runs beam search in inference mode. All utterances in a
+           mini-batch are decoded at once.
+        Args:
+            bridge:
+            encoder_outputs: A namedtuple of
+                outputs
+                final_state
+                attention_values
+                attention_values_length
+            labels: Target labels of size `[batch_size, time]`
+        Returns:
+            beam_search_outputs: An instance of `BeamSearchOutput`
+        """
+        batch_size = tf.shape(encoder_outputs.outputs)[0]
+
+        # Repeat encoder outputs of each utterance by the number of beams
+        encoder_outputs = encoder_outputs._replace(
+            outputs=tile_batch(encoder_outputs.outputs, self.beam_width),
+            attention_values=tile_batch(encoder_outputs.attention_values,
+                                        self.beam_width),
+            attention_values_length=tile_batch(
+                encoder_outputs.attention_values_length, self.beam_width))
+        decoder = self._create_decoder(encoder_outputs, labels)
+        decoder = self._beam_search_decoder_wrapper(
+            decoder,
+            beam_width=self.beam_width,
+            length_penalty_weight=self.length_penalty_weight)
+
+        target_embedding = self._generate_target_embedding(reuse=True)
+
+        helper_infer = tf.contrib.seq2seq.GreedyEmbeddingHelper(
+            embedding=target_embedding,  # embedding of predicted labels
+            start_tokens=tf.fill([batch_size * self.beam_width],
+                                 self.sos_index),
+            end_token=self.eos_index)
+
+        decoder_initial_state = tile_batch(bridge(reuse=True),
+                                           self.beam_width)
+
+        # Call beam search decoder class
+        beam_search_outputs, _ = decoder(
+            initial_state=decoder_initial_state,
+            helper=helper_infer)
+
+        return beam_search_outputs
+
     def compute_loss(self, inputs, labels, inputs_seq_len, labels_seq_len,
                      keep_prob_input, keep_prob_hidden, num_gpu=1, scope=None):
         """Operation for computing cross entropy sequence loss.
@@ -184,6 +235,8 @@ class AttentionBase(object):
             keep_prob_hidden: A float value. A probability to keep nodes in
                 hidden-hidden layers
             num_gpu: int, the number of GPUs
+            scope: string, the name scope of the tower. If set, only losses
+                in this scope are summed up.
         Returns:
             loss: operation for computing total loss (cross entropy sequence
                 loss + L2). This is a single scalar tensor to minimize.
@@ -230,7 +283,7 @@ class AttentionBase(object):
             tf.add_to_collection('losses', sequence_loss)
 
         # Compute total loss
-        loss = tf.add_n(tf.get_collection('losses'), name='total_loss')
+        loss = tf.add_n(tf.get_collection('losses', scope), name='total_loss')
 
         if num_gpu == 1:
             # Add a scalar summary for the snapshot of loss
@@ -241,16 +294,77 @@ class AttentionBase(object):
 
         return loss, logits, decoder_outputs_train, decoder_outputs_infer
 
+    def compute_tower_loss(self, inputs_list, labels_list,
+                           inputs_seq_len_list, labels_seq_len_list,
+                           keep_prob_input, keep_prob_hidden, devices,
+                           variable_device='/cpu:0'):
+        """Build a tower on each device with shared variables, and compute
+           cross entropy sequence loss of each tower.
+        Args:
+            inputs_list: list of inputs of each tower
+            labels_list: list of labels of each tower
+            inputs_seq_len_list: list of inputs_seq_len of each tower
+            labels_seq_len_list: list of labels_seq_len of each tower
+            keep_prob_input: A float value. A probability to keep nodes in
+                input-hidden layers
+            keep_prob_hidden: A float value. A probability to keep nodes in
+                hidden-hidden layers
+            devices: list of device names (see models.tower.get_devices)
+            variable_device: string, the device of the shared variables
+        Returns:
+            losses: list of losses of each tower. Pass this to `train` to
+                average the gradients of towers.
+            outputs_list: list of
+                `(logits, decoder_outputs_train, decoder_outputs_infer)` of
+                each tower
+        """
+        def build_fn(i_tower, scope):
+            return self.compute_loss(inputs_list[i_tower],
+                                     labels_list[i_tower],
+                                     inputs_seq_len_list[i_tower],
+                                     labels_seq_len_list[i_tower],
+                                     keep_prob_input,
+                                     keep_prob_hidden,
+                                     num_gpu=len(devices),
+                                     scope=scope)
+
+        outputs = build_towers(build_fn, devices, variable_device)
+        losses = [output[0] for output in outputs]
+        outputs_list = [output[1:] for output in outputs]
+
+        # Add a scalar summary for the snapshot of the mean loss
+        loss_mean = tf.add_n(losses) / len(losses)
+        self.summaries_train.append(
+            tf.summary.scalar('loss_train', loss_mean))
+        self.summaries_dev.append(
+            tf.summary.scalar('loss_dev', loss_mean))
+
+        return losses, outputs_list
+
     def train(self, loss, optimizer, learning_rate_init=None,
-              clip_grad_by_norm=False, is_scheduled=False):
+              clip_grad_by_norm=False, is_scheduled=False,
+              num_replicas=None, accumulate_steps=None):
         """Operation for training.
         Args:
-            loss: An operation for computing loss
+            loss: An operation for computing loss, or list of losses of each
+                tower. In the latter, the gradients of towers are averaged
+                before clipping.
             optimizer: string, name of the optimizer in OPTIMIZER_CLS_NAMES
             learning_rate_init: initial learning rate
             clip_grad_by_norm: if True, clip gradients by norm of the
                 value of self.clip_grad
             is_scheduled: if True, schedule learning rate at each epoch
+            num_replicas: int, the number of workers in synchronous
+                distributed training. If set, the gradients of all workers
+                are aggregated before being applied once. The wrapped
+                optimizer is kept as `self.sync_optimizer` to make the
+                session hook. If None, workers update variables
+                asynchronously (or training is not distributed).
+            accumulate_steps: int, the number of micro-batches to accumulate
+                (clipped) gradients over. If set, train_op only accumulates
+                gradients, and `self.apply_op` must be run after every
+                accumulate_steps runs of train_op to update variables and
+                global_step. If None or 1, `self.apply_op` is None.
         Returns:
             train_op: operation for training
         """
@@ -276,7 +390,15 @@ class AttentionBase(object):
             optimizer = OPTIMIZER_CLS_NAMES[optimizer](
                 learning_rate=learning_rate_init)
 
-        # TODO: Optionally wrap with SyncReplicasOptimizer
+        # Aggregate gradients of all workers
+        self.sync_optimizer = None
+        if num_replicas is not None:
+            optimizer = tf.train.SyncReplicasOptimizer(
+                optimizer,
+                replicas_to_aggregate=num_replicas,
+                total_num_replicas=num_replicas)
+            self.sync_optimizer = optimizer
+
         # TODO: create_learning_rate_decay_fn
 
         # Create a variable to track the global step
@@ -287,20 +409,32 @@ class AttentionBase(object):
             train_op = self._gradient_clipping(loss,
                                                optimizer,
                                                clip_grad_by_norm,
-                                               global_step)
+                                               global_step,
+                                               accumulate_steps)
+        elif isinstance(loss, (list, tuple)) or accumulate_steps:
+            # Apply (or accumulate) the average gradients of towers
+            trainable_vars = tf.trainable_variables()
+            grads = compute_gradients(loss, trainable_vars)
+            train_op, self.apply_op = apply_gradients(
+                optimizer,
+                zip(grads, trainable_vars),
+                global_step,
+                accumulate_steps,
+                weight=micro_batch_weight(loss))
         else:
             # Use the optimizer to apply the gradients that minimize the loss
             # and also increment the global step counter as a single training
             # step
             train_op = optimizer.minimize(loss, global_step=global_step)
+            self.apply_op = None
 
         return train_op
 
     def _gradient_clipping(self, loss, optimizer, clip_grad_by_norm,
-                           global_step):
-        # Compute gradients
+                           global_step, accumulate_steps=None):
+        # Compute gradients (averaged over towers)
         trainable_vars = tf.trainable_variables()
-        grads = tf.gradients(loss, trainable_vars)
+        grads = compute_gradients(loss, trainable_vars)
 
         # TODO: Optionally add gradient noise
 
@@ -311,7 +445,7 @@ class AttentionBase(object):
                 if grad is not None:
                     grad = tf.clip_by_norm(grad,
                                            clip_norm=self.clip_grad)
-                    clipped_grads.append(grad)
+                    clipped_grads.append((grad, var))
 
                     # Add histograms for gradients.
                     # self.summaries_train.append(
@@ -326,7 +460,7 @@ class AttentionBase(object):
                         grad,
                         clip_value_min=-self.clip_grad,
                         clip_value_max=self.clip_grad)
-                    clipped_grads.append(grad)
+                    clipped_grads.append((grad, var))
 
                     # Add histograms for gradients.
                     # self.summaries_train.append(
@@ -335,11 +469,13 @@ class AttentionBase(object):
 
                     # self._tensorboard_statistics(trainable_vars)
 
-        # Create gradient updates
-        train_op = optimizer.apply_gradients(
-            zip(clipped_grads, trainable_vars),
-            global_step=global_step,
-            name='train')
+        # Create gradient updates (variables without gradients are skipped)
+        train_op, self.apply_op = apply_gradients(
+            optimizer,
+            clipped_grads,
+            global_step,
+            accumulate_steps,
+            weight=micro_batch_weight(loss))
 
         return train_op
 
@@ -357,24 +493,49 @@ class AttentionBase(object):
             beam_width: beam width for beam search
         Return:
             decoded_train: operation for decoding in training
-            decoded_infer: operation for decoding in inference
+            decoded_infer: operation for decoding in inference. In beam
+                search, this is the best hypothesis of size
+                `[batch_size, time]`.
         """
         if decode_type not in ['greedy', 'beam_search']:
             raise ValueError('decode_type is "greedy" or "beam_search".')
 
+        decoded_train = decoder_outputs_train.predicted_ids
+
         if decode_type == 'greedy':
-            decoded_train = decoder_outputs_train.predicted_ids
             decoded_infer = decoder_outputs_infer.predicted_ids
 
         elif decode_type == 'beam_search':
             if beam_width is None:
                 raise ValueError('Set beam_width.')
-            raise NotImplementedError
+            if self.beam_width <= 1:
+                raise ValueError(
+                    'Set beam_width larger than 1 when creating the model.')
+            if beam_width != self.beam_width:
+                raise ValueError(
+                    'beam_width should be the same as the one of the model '
+                    '(%d), you provided %d.' % (self.beam_width, beam_width))
+            decoded_infer = self.beam_search_outputs.predicted_ids[:, 0, :]
 
         return decoded_train, decoded_infer
 
+    def nbest_decoder(self):
+        """Operation for n-best decoding by beam search.
+        Returns:
+            beam_search_outputs: An instance of `BeamSearchOutput`
+                predicted_ids: `[batch_size, beam_width, time]`
+                scores: `[batch_size, beam_width]`
+                lengths: `[batch_size, beam_width]`
+                Hypotheses are sorted by scores in descending order.
+        """
+        if self.beam_width <= 1:
+            raise ValueError(
+                'Set beam_width larger than 1 when creating the model.')
+        return self.beam_search_outputs
+
     def compute_ler(self, labels_true, labels_pred):
-        """Operation for computing LER (Label Error Rate).
+        """Operation for computing LER (Label Error Rate). The edit distance
+           of each utterance is normalized by the length of labels_true.
         Args:
             labels_true: A SparseTensor
             labels_pred: A SparseTensor
@@ -50,6 +50,16 @@ class BLSTMAttetion(AttentionBase):
         dropout_ratio_hidden: A float value. Dropout ratio in hidden-hidden
             layers
         weight_decay: A float value. Regularization parameter for weight decay
+        beam_width: int, the number of beams in beam search. If 1 or less,
+            beam search is not performed.
+        length_penalty_weight: A float value. Weight for the length penalty
+            in beam search. 0.0 disables the penalty.
+        lc_chunk_size: int, the chunk size of the latency-controlled BLSTM
+            encoder. If None or 0, the encoder is a standard BLSTM.
+        lc_right_context: int, the number of right context frames of the
+            latency-controlled BLSTM encoder
+        cell_impl: string, standard or block or fused. The implementation of
+            the encoder cells (see models.recurrent.cell).
         time-major:
     """
 
@@ -78,7 +88,11 @@ class BLSTMAttetion(AttentionBase):
                  dropout_ratio_hidden=1.0,
                  weight_decay=0.0,
                  beam_width=1,
+                 length_penalty_weight=0.0,
                  time_major=False,
+                 lc_chunk_size=None,
+                 lc_right_context=0,
+                 cell_impl='standard',
                  name='blstm_attention_seq2seq'):
 
         # AttentionBase.__init__(self)
@@ -108,7 +122,11 @@ class BLSTMAttetion(AttentionBase):
         self.dropout_ratio_hidden = float(dropout_ratio_hidden)
         self.weight_decay = float(weight_decay)
         self.beam_width = int(beam_width)
+        self.length_penalty_weight = float(length_penalty_weight)
         self.time_major = time_major
+        self.lc_chunk_size = lc_chunk_size
+        self.lc_right_context = lc_right_context
+        self.cell_impl = cell_impl
         self.name = name
 
         # NOTE: attention_weights_tempareture is good for narrow focus.
@@ -139,7 +157,10 @@ class BLSTMAttetion(AttentionBase):
             num_layer=self.encoder_num_layer,
             parameter_init=self.parameter_init,
             clip_activation=self.clip_activation_encoder,
-            num_proj=None)
+            num_proj=None,
+            cell_impl=self.cell_impl,
+            lc_chunk_size=self.lc_chunk_size,
+            lc_right_context=self.lc_right_context)
 
         encoder_outputs = encoder(inputs=inputs,
                                   inputs_seq_len=inputs_seq_len,
@@ -211,13 +232,6 @@ class BLSTMAttetion(AttentionBase):
         # NOTE: initial_state and helper will be substituted in
         # self._decode_train() or self._decode_infer()
 
-        # Wrap decoder
-        # decoder_train = self._beam_search_decoder_wrapper(decoder_train,
-        #                                                   beam_width=20)
-        # decoder_infer = self._beam_search_decoder_wrapper(decoder_infer,
-        #                                                   beam_width=20)
-        # TODO: inferenceだけwrapしたい
-
         # Connect between encoder and decoder
         bridge = InitialStateBridge(
             encoder_outputs=encoder_outputs,
@@ -239,6 +253,13 @@ class BLSTMAttetion(AttentionBase):
             encoder_outputs=encoder_outputs)
         # NOTE: decoder_outputs are time-major
 
+        # Beam search in inference
+        if self.beam_width > 1:
+            self.beam_search_outputs = self._decode_infer_beam_search(
+                bridge=bridge,
+                encoder_outputs=encoder_outputs,
+                labels=labels)
+
         # Transpose from time-major to batch-major
         if self.time_major:
             logits = time2batch(decoder_outputs_train.logits)
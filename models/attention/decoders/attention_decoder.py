@@ -82,6 +82,7 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         # Not initialized yet
         self.initial_state = None
         self.helper = None
+        self.attention_keys = None
 
     def __call__(self, *args, **kwargs):
         # TODO: variable_scope
@@ -175,7 +176,9 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         Returns:
             finished:
             first_inputs:
-            initial_state:
+            initial_state: A tuple of `(cell_state, attention_weights)`.
+                The attention weights of the previous step are kept in the
+                loop state for location-based attention.
         """
         print('=== initialize =====')
         # Create inputs for the first time step
@@ -186,9 +189,16 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         batch_size = tf.shape(first_inputs)[0]
         encoder_num_unit = self.attention_values.get_shape().as_list()[-1]
         attention_context = tf.zeros(shape=[batch_size, encoder_num_unit])
-        self.attention_weights = tf.zeros(
+        attention_weights = tf.zeros(
             shape=[batch_size, tf.shape(self.attention_values)[1]])
 
+        # Project the encoder outputs once for all decoding steps
+        # NOTE: Use the same variable scope as `step` so that variables are
+        # shared with models which compute the projection at each step
+        with tf.variable_scope("step", reuse=self.reuse):
+            self.attention_keys = self.attention_layer.prepare_memory(
+                self.attention_encoder_states)
+
         # Create first inputs
         first_inputs = tf.concat([first_inputs, attention_context], axis=1)
         # ex.) tf.concat
@@ -197,7 +207,7 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         # tf.shape(tf.concat([t3, t4], 0)) ==> [4, 3]
         # tf.shape(tf.concat([t3, t4], 1)) ==> [2, 6]
 
-        return finished, first_inputs, self.initial_state
+        return finished, first_inputs, (self.initial_state, attention_weights)
 
     def compute_output(self, cell_output, attention_weights):
         """Computes the decoder outputs at each time.
@@ -217,7 +227,8 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
             current_decoder_state=cell_output,
             values=self.attention_values,
             values_length=self.attention_values_length,
-            attention_weights=attention_weights)
+            attention_weights=attention_weights,
+            keys=self.attention_keys)
 
         # TODO: Make this a parameter: We may or may not want this.
         # Transform attention context.
@@ -284,25 +295,24 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         Args:
            time: scalar `int32` tensor.
            inputs: A input tensors.
-           state: A state tensors and TensorArrays.
+           state: A tuple of `(cell_state, attention_weights)`
            name: Name scope for any created operations.
         Returns:
             A tuple of `(outputs, naxt_state, next_inputs, finished)`
                 outputs: An instance of AttentionDecoderOutput
-                next_state: A state tensors and TensorArrays
+                next_state: A tuple of `(cell_state, attention_weights)`
                 next_inputs: The tensor that should be used as input for the
                     next step
                 finished: A boolean tensor telling whether the sequence is
                     complete, for each sequence in the batch.
         """
         print('===== step =====')
+        cell_state, attention_weights_prev = state
         with tf.variable_scope("step", reuse=self.reuse):
             # Call LSTMCell
-            cell_output_prev, cell_state_prev = self.cell(inputs, state)
-            attention_weights_prev = self.attention_weights
+            cell_output_prev, cell_state_prev = self.cell(inputs, cell_state)
             cell_output, logits, attention_weights, attention_context = self.compute_output(
                 cell_output_prev, attention_weights_prev)
-            self.attention_weights = attention_weights
 
             sample_ids = self.helper.sample(time=time,
                                             outputs=logits,
@@ -321,4 +331,5 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
                 state=cell_state_prev,
                 sample_ids=sample_ids)
 
-            return (outputs, next_state, next_inputs, finished)
+            return (outputs, (next_state, attention_weights),
+                    next_inputs, finished)
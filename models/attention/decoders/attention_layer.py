@@ -42,8 +42,32 @@ class AttentionLayer(object):
         # TODO: variable_scope
         return self._build(*args, **kwargs)
 
+    def prepare_memory(self, encoder_states):
+        """Compute the projection of the encoder outputs, which does not
+           depend on the decoder state. Call this once before decoding and
+           pass the result to every step as `keys`.
+        Args:
+            encoder_states: The sequence of encoder outputs
+                A tensor of shape `[batch_size, input_time, encoder_num_units]`
+        Returns:
+            keys: V * h_j, a tensor of shape
+                `[batch_size, input_time, num_unit]`, or None if the
+                attention type does not use it (location)
+        """
+        if self.attention_type == 'location':
+            return None
+
+        # V * h_j (j: input time index)
+        Vh = tf.contrib.layers.fully_connected(
+            inputs=encoder_states,
+            num_outputs=self.num_unit,
+            activation_fn=None,
+            # reuse=True,
+            scope="Vh")
+        return Vh
+
     def _build(self, encoder_states, current_decoder_state, values,
-               values_length, attention_weights):
+               values_length, attention_weights, keys=None):
         """Computes attention scores and outputs.
         Args:
             encoder_states: The outputs of the encoder and equivalent to
@@ -59,6 +83,8 @@ class AttentionLayer(object):
             values_length: An int32 tensor of shape `[batch_size]` defining
                 the sequence length of the attention values.
             attention_weights:
+            keys: The output of `prepare_memory`. If None, the projection of
+                `encoder_states` is computed in this step.
         Returns:
             A tuple `(attention_weights, attention_context)`.
                 `attention_weights` is vector of length `time` where each
@@ -73,7 +99,8 @@ class AttentionLayer(object):
         # e_ij = f(V * h_j,  W * s_{i-1}, (U * f_ij))
         energy = self.attention_score_func(encoder_states,
                                            current_decoder_state,
-                                           attention_weights)
+                                           attention_weights,
+                                           keys=keys)
 
         # Replace all scores for padded inputs with tf.float32.min
         num_scores = tf.shape(energy)[1]  # max_time
@@ -118,7 +145,7 @@ class AttentionLayer(object):
         return (attention_weights, attention_context)
 
     def attention_score_func(self, encoder_states, current_decoder_state,
-                             attention_weights):
+                             attention_weights, keys=None):
         """An attention layer that calculates attention scores.
         Args:
             encoder_states: The sequence of encoder outputs
@@ -126,6 +153,7 @@ class AttentionLayer(object):
             current_decoder_state: The current state of the docoder
                 A tensor of shape `[batch_size, decoder_num_units]`
             attention_weights: A tensor of size `[batch_size, input_time]`
+            keys: The output of `prepare_memory`
         Returns:
             attention_sum: The summation of attention scores
                 A tensor of shape `[batch_size, input_time]`
@@ -142,14 +170,11 @@ class AttentionLayer(object):
             # reuse=True,
             scope="Ws")
 
-        if self.attention_type != 'location':
-            # V * h_j (j: input time index)
-            Vh = tf.contrib.layers.fully_connected(
-                inputs=encoder_states,
-                num_outputs=self.num_unit,
-                activation_fn=None,
-                # reuse=True,
-                scope="Vh")
+        # V * h_j (j: input time index)
+        if keys is None:
+            Vh = self.prepare_memory(encoder_states)
+        else:
+            Vh = keys
         # NOTE: Bias terms are already included in these layers
 
         if self.attention_type == 'content':
@@ -174,8 +199,9 @@ class AttentionLayer(object):
             # e_ij = wT * tanh(W * s_{i-1} + U * f_ij + bias)
             ############################################################
             with tf.control_dependencies(None):
-                F = tf.Variable(tf.truncated_normal(
-                    shape=[100, 1, 10], stddev=0.1), name='filter')
+                F = tf.get_variable(
+                    'filter', shape=[100, 1, 10],
+                    initializer=tf.truncated_normal_initializer(stddev=0.1))
 
             f = tf.nn.conv1d(tf.expand_dims(attention_weights, axis=2), F,
                              stride=1, padding='SAME',
@@ -203,8 +229,9 @@ class AttentionLayer(object):
             # e_ij = wT * tanh(W * s_{i-1} + V * h_j + U * f_ij + bias)
             ############################################################
             with tf.control_dependencies(None):
-                F = tf.Variable(tf.truncated_normal(
-                    shape=[100, 1, 10], stddev=0.1), name='filter')
+                F = tf.get_variable(
+                    'filter', shape=[100, 1, 10],
+                    initializer=tf.truncated_normal_initializer(stddev=0.1))
 
             f = tf.nn.conv1d(tf.expand_dims(attention_weights, axis=2), F,
                              stride=1, padding='SAME',
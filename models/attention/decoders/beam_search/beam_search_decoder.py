@@ -0,0 +1,247 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A decoder that performs beam search over a mini-batch in the graph."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+from models.attention.decoders.attention_decoder import AttentionDecoderOutput
+from models.attention.decoders.dynamic_decoder import dynamic_decode
+from models.attention.decoders.beam_search.namedtuple import BeamSearchState
+from models.attention.decoders.beam_search.namedtuple import BeamSearchStepOutput
+from models.attention.decoders.beam_search.namedtuple import BeamSearchOutput
+from models.attention.decoders.beam_search.util import gather_beams
+from models.attention.decoders.beam_search.util import gather_flat
+from models.attention.decoders.beam_search.util import gather_tree
+from models.attention.decoders.beam_search.util import length_penalty
+from models.attention.decoders.beam_search.util import mask_finished_probs
+
+
+class BeamSearchDecoder(tf.contrib.seq2seq.Decoder):
+    """Wraps an attention decoder to perform beam search. All beams of all
+       utterances are decoded at each step at once, and the successors are
+       chosen among `[batch_size, beam_width * vocab_size]` candidates.
+    Args:
+        decoder: An instance of `AttentionDecoder`. Its encoder outputs must
+            be tiled by `beam_search.util.tile_batch` in advance.
+        config: An instance of `BeamSearchConfig`
+    """
+
+    def __init__(self, decoder, config, name='beam_search_decoder'):
+        self.decoder = decoder
+        self.config = config
+        self.name = name
+
+    def __call__(self, *args, **kwargs):
+        return self._build(*args, **kwargs)
+
+    @property
+    def output_size(self):
+        return BeamSearchStepOutput(
+            scores=tf.TensorShape([self.config.beam_width]),
+            predicted_ids=tf.TensorShape([self.config.beam_width]),
+            beam_parent_ids=tf.TensorShape([self.config.beam_width]))
+
+    @property
+    def output_dtype(self):
+        return BeamSearchStepOutput(
+            scores=tf.float32,
+            predicted_ids=tf.int32,
+            beam_parent_ids=tf.int32)
+
+    @property
+    def batch_size(self):
+        return self.decoder.batch_size // self.config.beam_width
+
+    def _build(self, initial_state, helper):
+        """
+        Args:
+            initial_state: A tensor or tuple of tensors used as the initial
+                cell state of size `[batch_size * beam_width, ...]`
+            helper: An instance of `tf.contrib.seq2seq.Helper` whose
+                batch size is `batch_size * beam_width`
+        Returns:
+            A tuple of `(outputs, final_state)`
+                outputs: An instance of `BeamSearchOutput`
+                final_state: An instance of `BeamSearchState`
+        """
+        # Share variables with the decoder in inference
+        self.decoder.mode = tf.contrib.learn.ModeKeys.INFER
+        self.decoder.reuse = True
+        self.decoder._setup(initial_state, helper)
+
+        scope = tf.get_variable_scope()
+        scope.set_initializer(tf.random_uniform_initializer(
+            -self.decoder.parameter_init,
+            self.decoder.parameter_init))
+
+        outputs, final_state = dynamic_decode(
+            decoder=self,
+            output_time_major=True,
+            impute_finished=False,
+            maximum_iterations=self.decoder.max_decode_length,
+            scope='dynamic_decoder')
+
+        return self.finalize(outputs, final_state)
+
+    def initialize(self, name=None):
+        """
+        Args:
+            name:
+        Returns:
+            finished: A boolean tensor of size `[batch_size]`
+            first_inputs: A tensor of size `[batch_size * beam_width, ...]`
+            initial_state: A tuple of
+                `(cell_state, attention_weights, BeamSearchState)`
+        """
+        _, first_inputs, (cell_state, attention_weights) = (
+            self.decoder.initialize())
+
+        batch_size = self.batch_size
+        beam_width = self.config.beam_width
+
+        # All beams are the same at first, so expand only the first one
+        log_probs = tf.one_hot(
+            tf.zeros([batch_size], dtype=tf.int32), depth=beam_width,
+            on_value=0., off_value=tf.float32.min, dtype=tf.float32)
+        beam_state = BeamSearchState(
+            log_probs=log_probs,
+            finished=tf.zeros([batch_size, beam_width], dtype=tf.bool),
+            lengths=tf.zeros([batch_size, beam_width], dtype=tf.int32))
+        finished = tf.zeros([batch_size], dtype=tf.bool)
+
+        return (finished, first_inputs,
+                (cell_state, attention_weights, beam_state))
+
+    def step(self, time, inputs, state, name=None):
+        """Perform a decoding step.
+        Args:
+            time: scalar `int32` tensor.
+            inputs: A tensor of size `[batch_size * beam_width, ...]`
+            state: A tuple of
+                `(cell_state, attention_weights, BeamSearchState)`. The
+                attention weights of the previous step are used by
+                location-based attention.
+            name: Name scope for any created operations.
+        Returns:
+            A tuple of `(outputs, next_state, next_inputs, finished)`
+                outputs: An instance of `BeamSearchStepOutput`
+                next_state: A tuple of
+                    `(cell_state, attention_weights, BeamSearchState)`
+                next_inputs: A tensor of size `[batch_size * beam_width, ...]`
+                finished: A boolean tensor of size `[batch_size]`. True if
+                    all beams of the utterance have emitted <EOS>.
+        """
+        cell_state, attention_weights, beam_state = state
+        batch_size = self.batch_size
+        beam_width = self.config.beam_width
+        vocab_size = self.config.vocab_size
+
+        with tf.variable_scope("step", reuse=self.decoder.reuse):
+            cell_output, cell_state = self.decoder.cell(inputs, cell_state)
+            cell_output, logits, attention_weights, attention_context = self.decoder.compute_output(
+                cell_output, attention_weights)
+
+        # Scores of all candidates: `[batch_size, beam_width, vocab_size]`
+        step_log_probs = tf.reshape(tf.nn.log_softmax(logits),
+                                    [batch_size, beam_width, vocab_size])
+        step_log_probs = mask_finished_probs(
+            step_log_probs, self.config.eos_token, beam_state.finished)
+        total_log_probs = tf.expand_dims(
+            beam_state.log_probs, axis=2) + step_log_probs
+
+        # Finished beams keep their lengths
+        candidate_lengths = beam_state.lengths + tf.to_int32(
+            tf.logical_not(beam_state.finished))
+        scores = total_log_probs / tf.expand_dims(
+            length_penalty(candidate_lengths,
+                           self.config.length_penalty_weight), axis=2)
+
+        # Choose successors among `[batch_size, beam_width * vocab_size]`
+        scores_flat = tf.reshape(scores, [batch_size, -1])
+        next_scores, word_indices = self.config.choose_successors_fn(
+            scores_flat, self.config)
+        next_word_ids = tf.mod(word_indices, vocab_size)
+        next_beam_ids = tf.floordiv(word_indices, vocab_size)
+
+        next_log_probs = gather_flat(
+            tf.reshape(total_log_probs, [batch_size, -1]), word_indices)
+        next_lengths = gather_flat(candidate_lengths, next_beam_ids)
+        next_finished = tf.logical_or(
+            gather_flat(beam_state.finished, next_beam_ids),
+            tf.equal(next_word_ids, self.config.eos_token))
+
+        next_beam_state = BeamSearchState(
+            log_probs=next_log_probs,
+            finished=next_finished,
+            lengths=next_lengths)
+
+        # Reorder the decoder states according to the chosen beams
+        cell_state = gather_beams(
+            cell_state, next_beam_ids, batch_size, beam_width)
+        attention_weights = gather_beams(
+            attention_weights, next_beam_ids, batch_size, beam_width)
+        attention_context = gather_beams(
+            attention_context, next_beam_ids, batch_size, beam_width)
+
+        sample_ids = tf.reshape(next_word_ids, [-1])
+        decoder_outputs = AttentionDecoderOutput(
+            logits=logits,
+            predicted_ids=sample_ids,
+            cell_output=cell_output,
+            attention_scores=attention_weights,
+            attention_context=attention_context)
+        _, next_inputs, cell_state = self.decoder.helper.next_inputs(
+            time=time,
+            outputs=decoder_outputs,
+            state=cell_state,
+            sample_ids=sample_ids)
+
+        outputs = BeamSearchStepOutput(
+            scores=next_scores,
+            predicted_ids=next_word_ids,
+            beam_parent_ids=next_beam_ids)
+        finished = tf.reduce_all(next_finished, axis=1)
+
+        return (outputs, (cell_state, attention_weights, next_beam_state),
+                next_inputs, finished)
+
+    def finalize(self, outputs, final_state):
+        """Trace back the beams and make n-best lists.
+        Args:
+            outputs: An instance of `BeamSearchStepOutput`. Each element is
+                a tensor of size `[time, batch_size, beam_width]`.
+            final_state: A tuple of
+                `(cell_state, attention_weights, BeamSearchState)`
+        Returns:
+            A tuple of `(outputs, final_state)`
+                outputs: An instance of `BeamSearchOutput`
+                final_state: An instance of `BeamSearchState`
+        """
+        _, _, beam_state = final_state
+
+        # `[time, batch_size, beam_width]`
+        predicted_ids = gather_tree(outputs.predicted_ids,
+                                    outputs.beam_parent_ids)
+
+        # Convert to `[batch_size, beam_width, time]`
+        predicted_ids = tf.transpose(predicted_ids, [1, 2, 0])
+
+        # Pad labels after <EOS> with <EOS>
+        max_time = tf.shape(predicted_ids)[2]
+        mask = tf.less(tf.reshape(tf.range(max_time), [1, 1, -1]),
+                       tf.expand_dims(beam_state.lengths, axis=2))
+        predicted_ids = tf.where(
+            mask, predicted_ids,
+            tf.fill(tf.shape(predicted_ids), self.config.eos_token))
+
+        outputs = BeamSearchOutput(
+            predicted_ids=predicted_ids,
+            scores=outputs.scores[-1],
+            lengths=beam_state.lengths)
+
+        return (outputs, beam_state)
@@ -0,0 +1,89 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Namedtuples used in beam search."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import namedtuple
+
+
+class BeamSearchConfig(namedtuple(
+        "BeamSearchConfig",
+        [
+            "beam_width",
+            "vocab_size",
+            "eos_token",
+            "length_penalty_weight",
+            "choose_successors_fn"
+        ])):
+    """Configuration object for beam search.
+    Args:
+        beam_width: int, the number of beams to use
+        vocab_size: int, output vocabulary size
+        eos_token: index of the end of sentence tag (<EOS>)
+        length_penalty_weight: Weight for the length penalty factor. 0.0
+            disables the penalty.
+        choose_successors_fn: A function used to choose beam successors
+            based on their scores.
+            Maps from (scores, config) => (chosen scores, chosen_ids)
+    """
+    pass
+
+
+class BeamSearchState(namedtuple(
+        "BeamSearchState",
+        [
+            "log_probs",
+            "finished",
+            "lengths"
+        ])):
+    """State for a single step of beam search.
+    Args:
+        log_probs: The current log probabilities of all beams.
+            A tensor of size `[batch_size, beam_width]`
+        finished: A boolean tensor of size `[batch_size, beam_width]`. True
+            if the beam has emitted <EOS>.
+        lengths: The number of labels in each beam including <EOS>.
+            A tensor of size `[batch_size, beam_width]`
+    """
+    pass
+
+
+class BeamSearchStepOutput(namedtuple(
+        "BeamSearchStepOutput",
+        [
+            "scores",
+            "predicted_ids",
+            "beam_parent_ids"
+        ])):
+    """Outputs for a single step of beam search.
+    Args:
+        scores: Scores of each beam after the length penalty.
+            A tensor of size `[batch_size, beam_width]`
+        predicted_ids: The labels chosen at this step.
+            A tensor of size `[batch_size, beam_width]`
+        beam_parent_ids: The beams which the chosen labels follow.
+            A tensor of size `[batch_size, beam_width]`
+    """
+    pass
+
+
+class BeamSearchOutput(namedtuple(
+        "BeamSearchOutput",
+        [
+            "predicted_ids",
+            "scores",
+            "lengths"
+        ])):
+    """N-best lists of beam search, sorted by scores in descending order.
+    Args:
+        predicted_ids: A tensor of size `[batch_size, beam_width, time]`.
+            Labels after <EOS> are padded with <EOS>.
+        scores: A tensor of size `[batch_size, beam_width]`
+        lengths: The number of labels in each hypothesis including <EOS>.
+            A tensor of size `[batch_size, beam_width]`
+    """
+    pass
@@ -0,0 +1,164 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Utilities for batched beam search. Hypotheses of all utterances in a
+   mini-batch are decoded at once, where the i-th beam of the b-th utterance
+   is stored in the (b * beam_width + i)-th row of the decoder inputs.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+from tensorflow.python.util import nest
+
+
+def tile_batch(tensor, beam_width):
+    """Repeat each utterance in a mini-batch beam_width times.
+    Args:
+        tensor: A tensor of size `[batch_size, ...]`, or a nested structure
+            of tensors
+        beam_width: int, the number of beams
+    Returns:
+        A tensor of size `[batch_size * beam_width, ...]`
+    """
+    def _tile(t):
+        t = tf.convert_to_tensor(t)
+        t_tiled = tf.expand_dims(t, axis=1)
+        multiples = tf.concat(
+            [[1, beam_width], tf.ones([tf.rank(t) - 1], dtype=tf.int32)],
+            axis=0)
+        t_tiled = tf.tile(t_tiled, multiples)
+        t_tiled = tf.reshape(
+            t_tiled, tf.concat([[-1], tf.shape(t)[1:]], axis=0))
+        # Keep static shapes except for the batch dimension
+        t_tiled.set_shape(
+            tf.TensorShape([None]).concatenate(t.get_shape()[1:]))
+        return t_tiled
+
+    return nest.map_structure(_tile, tensor)
+
+
+def gather_beams(tensor, beam_indices, batch_size, beam_width):
+    """Gather beams in each utterance.
+    Args:
+        tensor: A tensor of size `[batch_size * beam_width, ...]`, or a
+            nested structure of tensors
+        beam_indices: A tensor of size `[batch_size, beam_width]`. The i-th
+            beam of the b-th utterance is replaced with the
+            `beam_indices[b, i]`-th beam of the same utterance.
+        batch_size: A scalar tensor, the size of mini-batch
+        beam_width: int, the number of beams
+    Returns:
+        A tensor of size `[batch_size * beam_width, ...]`
+    """
+    beam_offsets = tf.expand_dims(tf.range(batch_size) * beam_width, axis=1)
+    flat_indices = tf.reshape(beam_indices + beam_offsets, [-1])
+    return nest.map_structure(lambda t: tf.gather(t, flat_indices), tensor)
+
+
+def gather_flat(tensor, indices):
+    """Gather elements in each row.
+    Args:
+        tensor: A tensor of size `[batch_size, num]`
+        indices: A tensor of size `[batch_size, k]`
+    Returns:
+        A tensor of size `[batch_size, k]`
+    """
+    batch_size = tf.shape(tensor)[0]
+    num = tf.shape(tensor)[1]
+    row_offsets = tf.expand_dims(tf.range(batch_size) * num, axis=1)
+    flat = tf.gather(tf.reshape(tensor, [-1]), indices + row_offsets)
+    gathered = tf.reshape(flat, tf.shape(indices))
+    gathered.set_shape(indices.get_shape())
+    return gathered
+
+
+def choose_top_k(scores_flat, config):
+    """Choose the top-k beams of each utterance.
+    Args:
+        scores_flat: A tensor of size `[batch_size, beam_width * vocab_size]`
+        config: An instance of `BeamSearchConfig`
+    Returns:
+        next_scores: A tensor of size `[batch_size, beam_width]`, sorted in
+            descending order
+        word_indices: Indices in `scores_flat`.
+            A tensor of size `[batch_size, beam_width]`
+    """
+    next_scores, word_indices = tf.nn.top_k(
+        scores_flat, k=config.beam_width, sorted=True)
+    return next_scores, word_indices
+
+
+def length_penalty(sequence_lengths, penalty_factor):
+    """Calculate the length penalty according to
+        https://arxiv.org/abs/1609.08144.
+            Wu, Yonghui, et al. "Google's neural machine translation system:
+                Bridging the gap between human and machine translation."
+            arXiv preprint arXiv:1609.08144 (2016).
+    Args:
+        sequence_lengths: A tensor of sequence lengths
+        penalty_factor: A float value. 0.0 disables the penalty.
+    Returns:
+        A tensor of the same size as `sequence_lengths`
+    """
+    if penalty_factor == 0:
+        return tf.ones_like(sequence_lengths, dtype=tf.float32)
+    return tf.pow((5. + tf.to_float(sequence_lengths)) / 6., penalty_factor)
+
+
+def mask_finished_probs(log_probs, eos_token, finished):
+    """Only allow finished beams to emit <EOS> again with no cost, so that
+       their scores are kept.
+    Args:
+        log_probs: A tensor of size `[batch_size, beam_width, vocab_size]`
+        eos_token: index of <EOS>
+        finished: A boolean tensor of size `[batch_size, beam_width]`
+    Returns:
+        A tensor of size `[batch_size, beam_width, vocab_size]`
+    """
+    vocab_size = tf.shape(log_probs)[2]
+    eos_log_probs = tf.one_hot(eos_token, depth=vocab_size,
+                               on_value=0., off_value=log_probs.dtype.min,
+                               dtype=log_probs.dtype)
+    finished = tf.tile(tf.expand_dims(finished, axis=2), [1, 1, vocab_size])
+    return tf.where(finished,
+                    tf.zeros_like(log_probs) + eos_log_probs,
+                    log_probs)
+
+
+def gather_tree(step_ids, parent_ids):
+    """Trace back the beams from the last step.
+    Args:
+        step_ids: The labels chosen at each step.
+            A tensor of size `[time, batch_size, beam_width]`
+        parent_ids: The beams which the labels at each step follow.
+            A tensor of size `[time, batch_size, beam_width]`
+    Returns:
+        A tensor of size `[time, batch_size, beam_width]`. The i-th beam
+        at each step belongs to the i-th hypothesis at the last step.
+    """
+    max_time = tf.shape(step_ids)[0]
+    batch_size = tf.shape(step_ids)[1]
+    beam_width = tf.shape(step_ids)[2]
+    beam_offsets = tf.expand_dims(tf.range(batch_size) * beam_width, axis=1)
+
+    def _gather(tensor, beam_indices):
+        flat = tf.gather(tf.reshape(tensor, [-1]),
+                         tf.reshape(beam_indices + beam_offsets, [-1]))
+        return tf.reshape(flat, [batch_size, beam_width])
+
+    def body(time, beam_indices, ids_ta):
+        ids_ta = ids_ta.write(time, _gather(step_ids[time], beam_indices))
+        beam_indices = _gather(parent_ids[time], beam_indices)
+        return time - 1, beam_indices, ids_ta
+
+    initial_beam_indices = tf.tile(
+        tf.expand_dims(tf.range(beam_width), axis=0), [batch_size, 1])
+    _, _, ids_ta = tf.while_loop(
+        cond=lambda time, *_: time >= 0,
+        body=body,
+        loop_vars=[max_time - 1, initial_beam_indices,
+                   tf.TensorArray(step_ids.dtype, size=max_time)])
+    return ids_ta.stack()
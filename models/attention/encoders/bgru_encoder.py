@@ -9,6 +9,7 @@ from __future__ import print_function
 
 import tensorflow as tf
 from models.attention.encoders.encoder_base import EncoderOutput, EncoderBase
+from models.recurrent.cell import gru_cell
 
 
 class BGRUEncoder(EncoderBase):
@@ -20,6 +21,8 @@ class BGRUEncoder(EncoderBase):
             initialize weight parameters
         clip_activation: not used
         num_proj: not used
+        cell_impl: string, standard or block or fused. fused is the same as
+            block in GRU.
     """
 
     def __init__(self,
@@ -28,11 +31,12 @@ class BGRUEncoder(EncoderBase):
                  parameter_init=0.1,
                  clip_activation=50,  # not used
                  num_proj=None,  # not used
+                 cell_impl='standard',
                  name='bgru_encoder'):
 
         EncoderBase.__init__(self, num_unit, num_layer,
                              parameter_init, clip_activation,
-                             num_proj, name)
+                             num_proj, name, cell_impl=cell_impl)
 
     def _build(self, inputs, inputs_seq_len,
                keep_prob_input, keep_prob_hidden):
@@ -70,8 +74,8 @@ class BGRUEncoder(EncoderBase):
                     maxval=self.parameter_init)
 
                 with tf.variable_scope('gru', initializer=initializer):
-                    gru_fw = tf.contrib.rnn.GRUCell(self.num_unit)
-                    gru_bw = tf.contrib.rnn.GRUCell(self.num_unit)
+                    gru_fw = gru_cell(self.num_unit, self.cell_impl)
+                    gru_bw = gru_cell(self.num_unit, self.cell_impl)
 
                 # Dropout (output)
                 gru_fw = tf.contrib.rnn.DropoutWrapper(
@@ -9,6 +9,10 @@ from __future__ import print_function
 
 import tensorflow as tf
 from models.attention.encoders.encoder_base import EncoderOutput, EncoderBase
+from models.recurrent.cell import lstm_cell
+from models.recurrent.fused_rnn import fused_bidirectional_lstm
+from models.recurrent.latency_controlled import latency_controlled_bidirectional_rnn
+from models.recurrent.latency_controlled import right_context_inputs
 
 
 class BLSTMEncoder(EncoderBase):
@@ -20,6 +24,12 @@ class BLSTMEncoder(EncoderBase):
             initialize weight parameters
         clip_activation: A float value. Range of activation clipping (> 0)
         num_proj: int, the number of nodes in recurrent projection layer
+        cell_impl: string, standard or block or fused
+        lc_chunk_size: int, the number of frames in each chunk of the
+            latency-controlled BLSTM. If None or 0, the whole utterance is
+            used in the backward direction.
+        lc_right_context: int, the number of right context frames used in
+            the backward direction of each chunk
     """
 
     def __init__(self,
@@ -28,11 +38,25 @@ class BLSTMEncoder(EncoderBase):
                  parameter_init=0.1,
                  clip_activation=50,
                  num_proj=None,
+                 cell_impl='standard',
+                 lc_chunk_size=None,
+                 lc_right_context=0,
                  name='blstm_encoder'):
 
         EncoderBase.__init__(self, num_unit, num_layer,
                              parameter_init, clip_activation,
-                             num_proj, name)
+                             num_proj, name, cell_impl=cell_impl)
+
+        # Latency-controlled BLSTM
+        if lc_chunk_size is None or lc_chunk_size == 0:
+            self.lc_chunk_size = None
+            self.lc_right_context = 0
+        else:
+            if cell_impl == 'fused':
+                raise ValueError(
+                    'Latency-controlled BLSTM does not support fused cells.')
+            self.lc_chunk_size = int(lc_chunk_size)
+            self.lc_right_context = int(lc_right_context or 0)
 
     def _build(self, inputs, inputs_seq_len,
                keep_prob_input, keep_prob_hidden):
@@ -61,6 +85,13 @@ class BLSTMEncoder(EncoderBase):
                                 keep_prob_input,
                                 name='dropout_input')
 
+        if self.lc_chunk_size is not None and self.lc_right_context > 0:
+            context_inputs, context_seq_len = right_context_inputs(
+                outputs, inputs_seq_len,
+                self.lc_chunk_size, self.lc_right_context)
+        else:
+            context_inputs, context_seq_len = None, None
+
         # Hidden layers
         for i_layer in range(self.num_layer):
             with tf.name_scope('blstm_encoder_hidden' + str(i_layer + 1)):
@@ -69,46 +100,64 @@ class BLSTMEncoder(EncoderBase):
                     minval=-self.parameter_init,
                     maxval=self.parameter_init)
 
-                lstm_fw = tf.contrib.rnn.LSTMCell(
-                    self.num_unit,
-                    use_peepholes=True,
-                    cell_clip=self.clip_activation,
-                    initializer=initializer,
-                    num_proj=None,
-                    forget_bias=1.0,
-                    state_is_tuple=True)
-                lstm_bw = tf.contrib.rnn.LSTMCell(
-                    self.num_unit,
-                    use_peepholes=True,
-                    cell_clip=self.clip_activation,
-                    initializer=initializer,
-                    num_proj=self.num_proj,
-                    forget_bias=1.0,
-                    state_is_tuple=True)
-
-                # Dropout (output)
-                lstm_fw = tf.contrib.rnn.DropoutWrapper(
-                    lstm_fw,
-                    output_keep_prob=keep_prob_hidden)
-                lstm_bw = tf.contrib.rnn.DropoutWrapper(
-                    lstm_bw,
-                    output_keep_prob=keep_prob_hidden)
-
-                # _init_state_fw = lstm_fw.zero_state(self.batch_size,
-                #                                     tf.float32)
-                # _init_state_bw = lstm_bw.zero_state(self.batch_size,
-                #                                     tf.float32)
-                # initial_state_fw=_init_state_fw,
-                # initial_state_bw=_init_state_bw,
-
-                # Stacking
-                (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
-                    cell_fw=lstm_fw,
-                    cell_bw=lstm_bw,
-                    inputs=outputs,
-                    sequence_length=inputs_seq_len,
-                    dtype=tf.float32,
-                    scope='blstm_dynamic' + str(i_layer + 1))
+                if self.cell_impl == 'fused':
+                    (outputs_fw, outputs_bw), final_state = fused_bidirectional_lstm(
+                        outputs, inputs_seq_len, self.num_unit, initializer,
+                        clip_activation=self.clip_activation,
+                        scope='blstm_dynamic' + str(i_layer + 1))
+
+                    # Dropout (output)
+                    outputs_fw = tf.nn.dropout(outputs_fw, keep_prob_hidden)
+                    outputs_bw = tf.nn.dropout(outputs_bw, keep_prob_hidden)
+                else:
+                    lstm_fw = lstm_cell(
+                        self.num_unit, self.cell_impl,
+                        initializer=initializer,
+                        clip_activation=self.clip_activation,
+                        num_proj=None)
+                    lstm_bw = lstm_cell(
+                        self.num_unit, self.cell_impl,
+                        initializer=initializer,
+                        clip_activation=self.clip_activation,
+                        num_proj=self.num_proj)
+
+                    # Dropout (output)
+                    lstm_fw = tf.contrib.rnn.DropoutWrapper(
+                        lstm_fw,
+                        output_keep_prob=keep_prob_hidden)
+                    lstm_bw = tf.contrib.rnn.DropoutWrapper(
+                        lstm_bw,
+                        output_keep_prob=keep_prob_hidden)
+
+                    # _init_state_fw = lstm_fw.zero_state(self.batch_size,
+                    #                                     tf.float32)
+                    # _init_state_bw = lstm_bw.zero_state(self.batch_size,
+                    #                                     tf.float32)
+                    # initial_state_fw=_init_state_fw,
+                    # initial_state_bw=_init_state_bw,
+
+                    if self.lc_chunk_size is not None:
+                        (outputs_fw, outputs_bw), context_outputs, final_state = latency_controlled_bidirectional_rnn(
+                            cell_fw=lstm_fw,
+                            cell_bw=lstm_bw,
+                            inputs=outputs,
+                            inputs_seq_len=inputs_seq_len,
+                            chunk_size=self.lc_chunk_size,
+                            context_inputs=context_inputs,
+                            context_seq_len=context_seq_len,
+                            scope='blstm_dynamic' + str(i_layer + 1))
+                        if context_outputs is not None:
+                            context_inputs = tf.concat(
+                                axis=3, values=list(context_outputs))
+                    else:
+                        # Stacking
+                        (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
+                            cell_fw=lstm_fw,
+                            cell_bw=lstm_bw,
+                            inputs=outputs,
+                            sequence_length=inputs_seq_len,
+                            dtype=tf.float32,
+                            scope='blstm_dynamic' + str(i_layer + 1))
 
                 # Concatenate each direction
                 outputs = tf.concat(axis=2, values=[outputs_fw, outputs_bw])
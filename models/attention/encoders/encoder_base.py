@@ -5,6 +5,7 @@
 
 from collections import namedtuple
 import tensorflow as tf
+from models.recurrent.cell import check_cell_impl
 
 
 class EncoderOutput(
@@ -25,6 +26,8 @@ class EncoderBase(object):
             initialize weight parameters
         clip_activation: A float value. Range of activation clipping (> 0)
         num_proj: int, the number of nodes in recurrent projection layer
+        cell_impl: string, standard or block or fused. The implementation of
+            recurrent cells (see models.recurrent.cell).
     """
 
     def __init__(self,
@@ -33,7 +36,8 @@ class EncoderBase(object):
                  parameter_init,
                  clip_activation,
                  num_proj,
-                 name=None):
+                 name=None,
+                 cell_impl='standard'):
 
         self.num_unit = num_unit
         self.num_layer = num_layer
@@ -42,6 +46,9 @@ class EncoderBase(object):
         self.num_proj = num_proj
         self.name = name
 
+        check_cell_impl(cell_impl, num_proj)
+        self.cell_impl = cell_impl
+
     def __call__(self, *args, **kwargs):
         # TODO: variable_scope
         with tf.name_scope('Encoder'):
@@ -9,6 +9,7 @@ from __future__ import print_function
 
 import tensorflow as tf
 from models.attention.encoders.encoder_base import EncoderOutput, EncoderBase
+from models.recurrent.cell import gru_cell
 
 
 class GRUEncoder(EncoderBase):
@@ -20,6 +21,8 @@ class GRUEncoder(EncoderBase):
             initialize weight parameters
         clip_activation: not used
         num_proj: not used
+        cell_impl: string, standard or block or fused. fused is the same as
+            block in GRU.
     """
 
     def __init__(self,
@@ -28,11 +31,12 @@ class GRUEncoder(EncoderBase):
                  parameter_init=0.1,
                  clip_activation=50,  # not used
                  num_proj=None,  # not used
+                 cell_impl='standard',
                  name='gru_encoder'):
 
         EncoderBase.__init__(self, num_unit, num_layer,
                              parameter_init, clip_activation,
-                             num_proj, name)
+                             num_proj, name, cell_impl=cell_impl)
 
     def _build(self, inputs, inputs_seq_len,
                keep_prob_input, keep_prob_hidden):
@@ -71,7 +75,7 @@ class GRUEncoder(EncoderBase):
                     maxval=self.parameter_init)
 
                 with tf.variable_scope('gru', initializer=initializer):
-                    gru = tf.contrib.rnn.GRUCell(self.num_unit)
+                    gru = gru_cell(self.num_unit, self.cell_impl)
 
                 # Dropout (output)
                 gru = tf.contrib.rnn.DropoutWrapper(
@@ -9,6 +9,8 @@ from __future__ import print_function
 
 import tensorflow as tf
 from models.attention.encoders.encoder_base import EncoderOutput, EncoderBase
+from models.recurrent.cell import lstm_cell
+from models.recurrent.fused_rnn import fused_lstm
 
 
 class LSTMEncoder(EncoderBase):
@@ -19,6 +21,7 @@ class LSTMEncoder(EncoderBase):
         parameter_init: A float value. Range of uniform distribution to
             initialize weight parameters
         clip_activation: A float value. Range of activation clipping (> 0)
+        cell_impl: string, standard or block or fused
     """
 
     def __init__(self,
@@ -27,11 +30,12 @@ class LSTMEncoder(EncoderBase):
                  parameter_init=0.1,
                  clip_activation=50,
                  num_proj=None,
+                 cell_impl='standard',
                  name='lstm_encoder'):
 
         EncoderBase.__init__(self, num_unit, num_layer,
                              parameter_init, clip_activation,
-                             num_proj, name)
+                             num_proj, name, cell_impl=cell_impl)
 
     def _build(self, inputs, inputs_seq_len,
                keep_prob_input, keep_prob_hidden):
@@ -59,6 +63,15 @@ class LSTMEncoder(EncoderBase):
         outputs = tf.nn.dropout(inputs,
                                 keep_prob_input,
                                 name='dropout_input')
+
+        if self.cell_impl == 'fused':
+            outputs, final_state = self._build_fused(
+                outputs, inputs_seq_len, keep_prob_hidden)
+            return EncoderOutput(outputs=outputs,
+                                 final_state=final_state,
+                                 attention_values=outputs,
+                                 attention_values_length=inputs_seq_len)
+
         # Hidden layers
         lstm_list = []
         for i_layer in range(self.num_layer):
@@ -68,14 +81,11 @@ class LSTMEncoder(EncoderBase):
                     minval=-self.parameter_init,
                     maxval=self.parameter_init)
 
-                lstm = tf.contrib.rnn.LSTMCell(
-                    self.num_unit,
-                    use_peepholes=True,
-                    cell_clip=self.clip_activation,
+                lstm = lstm_cell(
+                    self.num_unit, self.cell_impl,
                     initializer=initializer,
-                    num_proj=self.num_proj,
-                    forget_bias=1.0,
-                    state_is_tuple=True)
+                    clip_activation=self.clip_activation,
+                    num_proj=self.num_proj)
 
                 # Dropout (output)
                 lstm = tf.contrib.rnn.DropoutWrapper(
@@ -96,3 +106,40 @@ class LSTMEncoder(EncoderBase):
                              final_state=final_state,
                              attention_values=outputs,
                              attention_values_length=inputs_seq_len)
+
+    def _build_fused(self, inputs, inputs_seq_len, keep_prob_hidden):
+        """Construct hidden layers computed by fused kernels. Variables have
+           the same names as those of MultiRNNCell.
+        Args:
+            inputs: A tensor of `[batch_size, time, input_dim]`
+            inputs_seq_len: A tensor of `[batch_size]`
+            keep_prob_hidden: A float value. A probability to keep nodes in
+                hidden-hidden layers
+        Returns:
+            outputs: A tensor of `[batch_size, time, num_unit]`
+            final_state: A tuple of LSTMStateTuple in each layer
+        """
+        # Convert to time-major only once for all layers
+        outputs = tf.transpose(inputs, [1, 0, 2])
+
+        final_state = []
+        for i_layer in range(self.num_layer):
+            with tf.name_scope('lstm_encoder_hidden' + str(i_layer + 1)):
+
+                initializer = tf.random_uniform_initializer(
+                    minval=-self.parameter_init,
+                    maxval=self.parameter_init)
+
+                outputs, state = fused_lstm(
+                    outputs, inputs_seq_len, self.num_unit, initializer,
+                    clip_activation=self.clip_activation,
+                    scope='rnn/multi_rnn_cell/cell_' + str(i_layer),
+                    time_major=True)
+                final_state.append(state)
+
+                # Dropout (output)
+                outputs = tf.nn.dropout(outputs, keep_prob_hidden)
+
+        outputs = tf.transpose(outputs, [1, 0, 2])
+
+        return outputs, tuple(final_state)
@@ -9,6 +9,8 @@ from __future__ import print_function
 
 import tensorflow as tf
 from models.attention.encoders.encoder_base import EncoderOutput, EncoderBase
+from models.recurrent.cell import lstm_cell
+from models.recurrent.fused_rnn import fused_bidirectional_lstm
 
 
 class PyramidalBLSTMEncoder(EncoderBase):
@@ -20,6 +22,11 @@ class PyramidalBLSTMEncoder(EncoderBase):
             initialize weight parameters
         clip_activation: A float value. Range of activation clipping (> 0)
         num_proj: not used
+        downsample_list: list of int of size `[num_layer]`. The time
+            resolution is reduced by each factor before each layer by
+            concatenating adjacent frames. By default, it is halved before
+            every layer but the first one.
+        cell_impl: string, standard or block or fused
     """
 
     def __init__(self,
@@ -29,6 +36,8 @@ class PyramidalBLSTMEncoder(EncoderBase):
                  clip_activation=50,
                  num_proj=None,
                  concat=False,
+                 downsample_list=None,
+                 cell_impl='standard',
                  name='pblstm_encoder'):
 
         # if num_unit % 2 != 0:
@@ -36,7 +45,15 @@ class PyramidalBLSTMEncoder(EncoderBase):
 
         EncoderBase.__init__(self, num_unit, num_layer,
                              parameter_init, clip_activation,
-                             num_proj, name)
+                             num_proj, name, cell_impl=cell_impl)
+
+        if downsample_list is None:
+            downsample_list = [1] + [2] * (num_layer - 1)
+        if len(downsample_list) != num_layer:
+            raise ValueError(
+                'downsample_list should have num_layer (%d) elements, '
+                'you provided %d.' % (num_layer, len(downsample_list)))
+        self.downsample_list = [int(factor) for factor in downsample_list]
 
     def _build(self, inputs, inputs_seq_len,
                keep_prob_input, keep_prob_hidden):
@@ -73,76 +90,56 @@ class PyramidalBLSTMEncoder(EncoderBase):
                     minval=-self.parameter_init,
                     maxval=self.parameter_init)
 
-                lstm_fw = tf.contrib.rnn.LSTMCell(
-                    self.num_unit,
-                    use_peepholes=True,
-                    cell_clip=self.clip_activation,
-                    initializer=initializer,
-                    num_proj=None,
-                    forget_bias=1.0,
-                    state_is_tuple=True)
-                lstm_bw = tf.contrib.rnn.LSTMCell(
-                    self.num_unit,
-                    use_peepholes=True,
-                    cell_clip=self.clip_activation,
-                    initializer=initializer,
-                    num_proj=self.num_proj,
-                    forget_bias=1.0,
-                    state_is_tuple=True)
-
-                # Dropout (output)
-                lstm_fw = tf.contrib.rnn.DropoutWrapper(
-                    lstm_fw,
-                    output_keep_prob=keep_prob_hidden)
-                lstm_bw = tf.contrib.rnn.DropoutWrapper(
-                    lstm_bw,
-                    output_keep_prob=keep_prob_hidden)
-
-                # _init_state_fw = lstm_fw.zero_state(self.batch_size,
-                #                                     tf.float32)
-                # _init_state_bw = lstm_bw.zero_state(self.batch_size,
-                #                                     tf.float32)
-                # initial_state_fw=_init_state_fw,
-                # initial_state_bw=_init_state_bw,
-
-                if i_layer > 0:
-                    # Convert to `[time, batch_size, input_size]`
-                    outputs = tf.transpose(outputs, (1, 0, 2))
-                    max_time = tf.shape(outputs)[0]
-                    batch_size = tf.shape(outputs)[1]
-                    feature_dim = outputs.get_shape().as_list()[2]
-
-                    max_time_half = tf.floor(max_time / 2) + 1
-
-                    # Apply concat_fn to each tensor in outputs along
-                    # dimension 0 (times-axis)
-                    i_time = tf.constant(0)
-                    final_time, outputs, tensor_list = tf.while_loop(
-                        cond=lambda t, hidden, tensor_list: t < max_time,
-                        body=lambda t, hidden, tensor_list: self._concat_fn(
-                            t, hidden, tensor_list),
-                        loop_vars=[i_time, outputs, tf.Variable([])],
-                        shape_invariants=[i_time.get_shape(),
-                                          outputs.get_shape(),
-                                          tf.TensorShape([None])])
-
-                    outputs = tf.stack(tensor_list, axis=0)
-
-                    inputs_seq_len = tf.cast(tf.floor(
-                        tf.cast(inputs_seq_len, tf.float32) / 2),
-                        tf.int32)
-
-                    # Transpose to `[batch_size, time, input_size]`
-                    outputs = tf.transpose(outputs, (1, 0, 2))
-
-                # Stacking
-                (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
-                    cell_fw=lstm_fw,
-                    cell_bw=lstm_bw,
-                    inputs=outputs,
-                    sequence_length=inputs_seq_len,
-                    dtype=tf.float32,
-                    scope='pblstm_dynamic_' + str(i_layer + 1))
+                # Reduce time resolution
+                if self.downsample_list[i_layer] > 1:
+                    outputs, inputs_seq_len = self._time_reduction(
+                        outputs, inputs_seq_len,
+                        factor=self.downsample_list[i_layer])
+
+                if self.cell_impl == 'fused':
+                    (outputs_fw, outputs_bw), final_state = fused_bidirectional_lstm(
+                        outputs, inputs_seq_len, self.num_unit, initializer,
+                        clip_activation=self.clip_activation,
+                        scope='pblstm_dynamic_' + str(i_layer + 1))
+
+                    # Dropout (output)
+                    outputs_fw = tf.nn.dropout(outputs_fw, keep_prob_hidden)
+                    outputs_bw = tf.nn.dropout(outputs_bw, keep_prob_hidden)
+                else:
+                    lstm_fw = lstm_cell(
+                        self.num_unit, self.cell_impl,
+                        initializer=initializer,
+                        clip_activation=self.clip_activation,
+                        num_proj=None)
+                    lstm_bw = lstm_cell(
+                        self.num_unit, self.cell_impl,
+                        initializer=initializer,
+                        clip_activation=self.clip_activation,
+                        num_proj=self.num_proj)
+
+                    # Dropout (output)
+                    lstm_fw = tf.contrib.rnn.DropoutWrapper(
+                        lstm_fw,
+                        output_keep_prob=keep_prob_hidden)
+                    lstm_bw = tf.contrib.rnn.DropoutWrapper(
+                        lstm_bw,
+                        output_keep_prob=keep_prob_hidden)
+
+                    # _init_state_fw = lstm_fw.zero_state(self.batch_size,
+                    #                                     tf.float32)
+                    # _init_state_bw = lstm_bw.zero_state(self.batch_size,
+                    #                                     tf.float32)
+                    # initial_state_fw=_init_state_fw,
+                    # initial_state_bw=_init_state_bw,
+
+                    # Stacking
+                    (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
+                        cell_fw=lstm_fw,
+                        cell_bw=lstm_bw,
+                        inputs=outputs,
+                        sequence_length=inputs_seq_len,
+                        dtype=tf.float32,
+                        scope='pblstm_dynamic_' + str(i_layer + 1))
 
                 # Concatenate each direction
                 outputs = tf.concat(axis=2, values=[outputs_fw, outputs_bw])
@@ -152,39 +149,31 @@ class PyramidalBLSTMEncoder(EncoderBase):
                              attention_values=outputs,
                              attention_values_length=inputs_seq_len)
 
-    def _concat_fn(self, current_time, x, tensor_list):
-        """Concatenate each 2 time steps to reduce time resolution.
+    def _time_reduction(self, outputs, inputs_seq_len, factor):
+        """Concatenate every `factor` frames to reduce time resolution.
+           Frames are padded with zeros up to a multiple of factor.
         Args:
-            current_time: The current timestep
-            x: A tensor of size `[max_time, batch_size, feature_dim]`
-            result: A tensor of size `[t, batch_size, feature_dim * 2]`
+            outputs: A tensor of size `[batch_size, max_time, feature_dim]`
+            inputs_seq_len: A tensor of `[batch_size]`
+            factor: int, the reduction factor
         Returns:
-            current_time: current_time + 2
-            x: A tensor of size `[max_time, batch_size, feature_dim]`
-            result: A tensor of size `[t + 1, batch_size, feature_dim * 2]`
+            outputs: A tensor of size
+                `[batch_size, ceil(max_time / factor), feature_dim * factor]`
+            inputs_seq_len: A tensor of `[batch_size]`, ceil of the
+                original lengths divided by factor
         """
-        print(tensor_list)
-        print(current_time)
-        print('-----')
-
-        batch_size = tf.shape(x)[1]
-        feature_dim = x.get_shape().as_list()[2]
-
-        # Concat features in 2 timesteps
-        concat_x = tf.concat(
-            axis=0,
-            values=[tf.reshape(x[current_time],
-                               shape=[1, batch_size, feature_dim]),
-                    tf.reshape(x[current_time + 1],
-                               shape=[1, batch_size, feature_dim])])
+        batch_size = tf.shape(outputs)[0]
+        max_time = tf.shape(outputs)[1]
+        feature_dim = outputs.get_shape().as_list()[2]
 
-        # Reshape to `[1, batch_size, feature_dim * 2]`
-        concat_x = tf.reshape(concat_x,
-                              shape=[1, batch_size, feature_dim * 2])
+        # Pad to a multiple of factor
+        pad_num = tf.mod(factor - tf.mod(max_time, factor), factor)
+        outputs = tf.pad(outputs, [[0, 0], [0, pad_num], [0, 0]])
 
-        tensor_list = tf.concat(axis=0, values=[tensor_list, [concat_x]])
+        # Reshape to `[batch_size, max_time / factor, feature_dim * factor]`
+        outputs = tf.reshape(outputs,
+                             shape=[batch_size, -1, feature_dim * factor])
 
-        # Skip 2 timesteps
-        current_time += 2
+        inputs_seq_len = (inputs_seq_len + factor - 1) // factor
 
-        return current_time, x, tensor_list
+        return outputs, inputs_seq_len
@@ -23,6 +23,8 @@ from models.attention.decoders.attention_decoder import AttentionDecoder
 from models.attention.decoders.attention_decoder import AttentionDecoderOutput
 from models.attention.decoders.dynamic_decoder import _transpose_batch_time as time2batch
 from models.attention.bridge import InitialStateBridge
+from models.ctc.ctc_base import dense2sparse
+from models.gradient_accumulation import add_micro_batch_weight
 
 
 class JointCTCAttention(AttentionBase):
@@ -58,6 +60,12 @@ class JointCTCAttention(AttentionBase):
         dropout_ratio_hidden: A float value. Dropout ratio in hidden-hidden
             layers
         weight_decay: A float value. Regularization parameter for weight decay
+        beam_width: int, the number of beams in beam search. If 1 or less,
+            beam search is not performed.
+        length_penalty_weight: A float value. Weight for the length penalty
+            in beam search. 0.0 disables the penalty.
+        cell_impl: string, standard or block or fused. The implementation of
+            the encoder cells (see models.recurrent.cell).
         time_major:
     """
 
@@ -88,7 +96,9 @@ class JointCTCAttention(AttentionBase):
                  dropout_ratio_hidden=1.0,
                  weight_decay=0.0,
                  beam_width=0,
+                 length_penalty_weight=0.0,
                  time_major=False,
+                 cell_impl='standard',
                  name='blstm_attention_seq2seq'):
 
         # AttentionBase.__init__(self)
@@ -118,7 +128,9 @@ class JointCTCAttention(AttentionBase):
         self.dropout_ratio_hidden = float(dropout_ratio_hidden)
         self.weight_decay = float(weight_decay)
         self.beam_width = int(beam_width)
+        self.length_penalty_weight = float(length_penalty_weight)
         self.time_major = time_major
+        self.cell_impl = cell_impl
         self.name = name
 
         # NOTE: attention_weights_tempareture is good for narrow focus.
@@ -154,7 +166,8 @@ class JointCTCAttention(AttentionBase):
             num_layer=self.encoder_num_layer,
             parameter_init=self.parameter_init,
             clip_activation=self.clip_activation_encoder,
-            num_proj=None)
+            num_proj=None,
+            cell_impl=self.cell_impl)
 
         encoder_outputs = encoder(inputs=inputs,
                                   inputs_seq_len=inputs_seq_len,
@@ -227,12 +240,6 @@ class JointCTCAttention(AttentionBase):
         # NOTE: initial_state and helper will be substituted in
         # self._decode_train() or self._decode_infer()
 
-        # Wrap decoder
-        # decoder_train = self._beam_search_decoder_wrapper(decoder_train,
-        #                                                   beam_width=20)
-        # decoder_infer = self._beam_search_decoder_wrapper(decoder_infer,
-        #                                                   beam_width=20)
-
         # Connect between encoder and decoder
         bridge = InitialStateBridge(
             encoder_outputs=encoder_outputs,
@@ -254,6 +261,13 @@ class JointCTCAttention(AttentionBase):
             encoder_outputs=encoder_outputs)
         # NOTE: decoder_outputs are time-major
 
+        # Beam search in inference
+        if self.beam_width > 1:
+            self.beam_search_outputs = self._decode_infer_beam_search(
+                bridge=bridge,
+                encoder_outputs=encoder_outputs,
+                labels=labels)
+
         # Transpose from time-major to batch-major
         if self.time_major:
             att_logits = time2batch(decoder_outputs_train.logits)
@@ -303,13 +317,14 @@ class JointCTCAttention(AttentionBase):
         # `[batch_size, time, input_size_splice]`
         batch_size = tf.shape(inputs)[0]
 
-        with tf.name_scope('ctc_output'):
+        with tf.variable_scope('ctc_output'):
             # Affine
-            W_ctc_output = tf.Variable(tf.truncated_normal(
-                shape=[self.encoder_num_unit * 2, self.ctc_num_classes],
-                stddev=0.1, name='W_ctc_output'))
-            b_ctc_output = tf.Variable(tf.zeros(
-                shape=[self.ctc_num_classes], name='b_ctc_output'))
+            W_ctc_output = tf.get_variable(
+                'W_ctc_output', shape=[self.encoder_num_unit * 2, self.ctc_num_classes],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
+            b_ctc_output = tf.get_variable(
+                'b_ctc_output', shape=[self.ctc_num_classes],
+                initializer=tf.zeros_initializer())
             ctc_logits_2d = tf.matmul(ctc_outputs, W_ctc_output) + b_ctc_output
 
             # Reshape back to the original shape
@@ -331,7 +346,9 @@ class JointCTCAttention(AttentionBase):
             att_labels: A tensor of `[batch_size, time]`
             inputs_seq_len: A tensor of `[batch_size]`
             att_labels_seq_len: A tensor of `[batch_size]`
-            ctc_labels:
+            ctc_labels: A SparseTensor of target labels of CTC, or an int32
+                tensor of target labels of size `[batch_size, max_label_len]`
+                padded with -1
             keep_prob_input: A float value. A probability to keep nodes in
                 input-hidden layers
             keep_prob_hidden: A float value. A probability to keep nodes in
@@ -346,6 +363,9 @@ class JointCTCAttention(AttentionBase):
             decoder_outputs_train:
             decoder_outputs_infer:
         """
+        if not isinstance(ctc_labels, tf.SparseTensor):
+            ctc_labels = dense2sparse(ctc_labels)
+
         # Build model graph
         att_logits, ctc_logits, decoder_outputs_train, decoder_outputs_infer = self._build(
             inputs, att_labels, inputs_seq_len, att_labels_seq_len,
@@ -381,8 +401,10 @@ class JointCTCAttention(AttentionBase):
             # Calculate the average log perplexity
             # self.loss = tf.reduce_sum(losses) / tf.to_float(
             #     tf.reduce_sum(self.labels_seq_len - 1))
-            sequence_loss = tf.reduce_sum(sequence_losses,
-                                          name='sequence_loss_mean')
+            # Averaged over utterances like the CTC loss, so that both are
+            # weighted correctly in gradient accumulation
+            sequence_loss = tf.reduce_mean(sequence_losses,
+                                           name='sequence_loss_mean')
             tf.add_to_collection(
                 'losses', sequence_loss * self.att_task_weight)
 
@@ -400,7 +422,12 @@ class JointCTCAttention(AttentionBase):
             tf.add_to_collection('losses', ctc_loss * self.ctc_task_weight)
 
         # Compute total loss
-        loss = tf.add_n(tf.get_collection('losses'), name='total_loss')
+        loss = tf.add_n(tf.get_collection('losses', scope), name='total_loss')
+
+        # Weight of this mini-batch in gradient accumulation. Both losses are
+        # averaged over utterances, and weighting by the size makes them the
+        # averages over all utterances of the accumulated micro-batches.
+        add_micro_batch_weight(loss, tf.shape(inputs_seq_len)[0])
 
         if num_gpu == 1:
             # Add a scalar summary for the snapshot of loss
@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Restore checkpoints, including ones saved before the output and
+   bottleneck layers of the CTC models and the location filters of the
+   attention layer were created by `tf.get_variable`. In those checkpoints,
+   these variables are named by their name scopes and the order of
+   creation, e.g. `output/Variable` and `output/Variable_1` instead of
+   `output/W_output` and `output/b_output`.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+from models.recurrent.cell import checkpoint_var_list
+
+# Variable names to the last part of the names in legacy checkpoints
+LEGACY_VAR_MAP = {
+    'W_output': 'Variable',
+    'b_output': 'Variable_1',
+    'W_output_main': 'Variable',
+    'b_output_main': 'Variable_1',
+    'W_output_sub': 'Variable',
+    'b_output_sub': 'Variable_1',
+    'W_ctc_output': 'Variable',
+    'b_ctc_output': 'Variable_1',
+    'W_bottleneck': 'Variable',
+    'b_bottleneck': 'Variable_1',
+    'filter': 'filter',
+}
+
+
+def legacy_name(var_name, var_shape, checkpoint_shapes):
+    """Find the name of a variable in a legacy checkpoint.
+    Args:
+        var_name: string, the name of a variable (without `:0`)
+        var_shape: list of the dimensions of the variable
+        checkpoint_shapes: dict from names of variables in the checkpoint to
+            their shapes
+    Returns:
+        name: string, the name in the checkpoint, or None if the variable
+            is not renamed
+    """
+    scope, _, base_name = var_name.rpartition('/')
+    if base_name not in LEGACY_VAR_MAP:
+        return None
+
+    if base_name == 'filter':
+        # Created in the name scopes of the decoder loop
+        suffix = LEGACY_VAR_MAP[base_name]
+    else:
+        # Created in the name scope of the same name as the variable scope
+        suffix = scope.rpartition('/')[2] + '/' + LEGACY_VAR_MAP[base_name]
+
+    candidates = [name for name, shape in checkpoint_shapes.items()
+                  if (name == suffix or name.endswith('/' + suffix)) and
+                  list(shape) == list(var_shape)]
+    if len(candidates) != 1:
+        raise ValueError('%s is not found in the checkpoint (candidates: %s).'
+                         % (var_name, ', '.join(sorted(candidates))))
+    return candidates[0]
+
+
+def restore_var_list(model_path, var_list=None):
+    """Make a dictionary of variables for `tf.train.Saver` to restore a
+       checkpoint. Variables are looked up by the names of
+       `checkpoint_var_list`, and by their legacy names if they are missing
+       in the checkpoint.
+    Args:
+        model_path: path to the checkpoint
+        var_list: list of variables. By default, all global variables.
+    Returns:
+        dict from names in the checkpoint to variables
+    """
+    checkpoint_shapes = dict(tf.contrib.framework.list_variables(model_path))
+
+    restore_vars = {}
+    for name, var in checkpoint_var_list(var_list).items():
+        if name not in checkpoint_shapes:
+            old_name = legacy_name(name, var.get_shape().as_list(),
+                                   checkpoint_shapes)
+            if old_name is not None:
+                name = old_name
+        restore_vars[name] = var
+    return restore_vars
+
+
+def restore_checkpoint(session, model_path, var_list=None):
+    """Restore variables from a checkpoint.
+    Args:
+        session: session of the model
+        model_path: path to the checkpoint
+        var_list: list of variables. By default, all global variables.
+    """
+    saver = tf.train.Saver(var_list=restore_var_list(model_path, var_list))
+    saver.restore(session, model_path)
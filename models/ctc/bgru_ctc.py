@@ -9,6 +9,7 @@ from __future__ import print_function
 
 import tensorflow as tf
 from models.ctc.ctc_base import ctcBase
+from models.recurrent.cell import gru_cell
 
 
 class BGRU_CTC(ctcBase):
@@ -31,6 +32,11 @@ class BGRU_CTC(ctcBase):
         num_proj: not used
         weight_decay: A float value. Regularization parameter for weight decay
         bottleneck_dim: int, the dimensions of the bottleneck layer
+        time_reduction_type: string, concat or conv or max_pool
+        downsample_list: list of int of size `[num_layer]`. The time
+            resolution is reduced by each factor before each layer.
+        cell_impl: string, standard or block or fused. fused is the same as
+            block in GRU.
     """
 
     def __init__(self,
@@ -47,13 +53,19 @@ class BGRU_CTC(ctcBase):
                  num_proj=None,  # not used
                  weight_decay=0.0,
                  bottleneck_dim=None,
+                 time_reduction_type='concat',
+                 downsample_list=None,
+                 cell_impl='standard',
                  name='bgru_ctc'):
 
         ctcBase.__init__(self, batch_size, input_size, num_unit, num_layer,
                          num_classes, parameter_init,
                          clip_grad, clip_activation,
                          dropout_ratio_input, dropout_ratio_hidden,
-                         weight_decay, name)
+                         weight_decay, name,
+                         time_reduction_type=time_reduction_type,
+                         downsample_list=downsample_list,
+                         cell_impl=cell_impl)
 
         self.bottleneck_dim = bottleneck_dim
 
@@ -82,8 +94,8 @@ class BGRU_CTC(ctcBase):
                     maxval=self.parameter_init)
 
                 with tf.variable_scope('gru', initializer=initializer):
-                    gru_fw = tf.contrib.rnn.GRUCell(self.num_unit)
-                    gru_bw = tf.contrib.rnn.GRUCell(self.num_unit)
+                    gru_fw = gru_cell(self.num_unit, self.cell_impl)
+                    gru_bw = gru_cell(self.num_unit, self.cell_impl)
 
                 # Dropout for outputs of each layer
                 gru_fw = tf.contrib.rnn.DropoutWrapper(
@@ -100,6 +112,10 @@ class BGRU_CTC(ctcBase):
                 # initial_state_fw = _init_state_fw,
                 # initial_state_bw = _init_state_bw,
 
+                # Reduce time resolution
+                outputs, inputs_seq_len = self._reduce_time(
+                    outputs, inputs_seq_len, i_layer)
+
                 # Ignore 2nd return (the last state)
                 (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
                     cell_fw=gru_fw,
@@ -119,23 +135,25 @@ class BGRU_CTC(ctcBase):
         batch_size = tf.shape(inputs)[0]
 
         if self.bottleneck_dim is not None and self.bottleneck_dim != 0:
-            with tf.name_scope('bottleneck'):
+            with tf.variable_scope('bottleneck'):
                 # Affine
-                W_bottleneck = tf.Variable(tf.truncated_normal(
-                    shape=[output_node, self.bottleneck_dim],
-                    stddev=0.1, name='W_bottleneck'))
-                b_bottleneck = tf.Variable(tf.zeros(
-                    shape=[self.bottleneck_dim], name='b_bottleneck'))
+                W_bottleneck = tf.get_variable(
+                    'W_bottleneck', shape=[output_node, self.bottleneck_dim],
+                    initializer=tf.truncated_normal_initializer(stddev=0.1))
+                b_bottleneck = tf.get_variable(
+                    'b_bottleneck', shape=[self.bottleneck_dim],
+                    initializer=tf.zeros_initializer())
                 outputs = tf.matmul(outputs, W_bottleneck) + b_bottleneck
                 output_node = self.bottleneck_dim
 
-        with tf.name_scope('output'):
+        with tf.variable_scope('output'):
             # Affine
-            W_output = tf.Variable(tf.truncated_normal(
-                shape=[output_node, self.num_classes],
-                stddev=0.1, name='W_output'))
-            b_output = tf.Variable(tf.zeros(
-                shape=[self.num_classes], name='b_output'))
+            W_output = tf.get_variable(
+                'W_output', shape=[output_node, self.num_classes],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
+            b_output = tf.get_variable(
+                'b_output', shape=[self.num_classes],
+                initializer=tf.zeros_initializer())
             logits_2d = tf.matmul(outputs, W_output) + b_output
 
             # Reshape back to the original shape
@@ -9,6 +9,10 @@ from __future__ import print_function
 
 import tensorflow as tf
 from models.ctc.ctc_base import ctcBase
+from models.recurrent.cell import check_cell_impl, lstm_cell
+from models.recurrent.fused_rnn import fused_bidirectional_lstm
+from models.recurrent.latency_controlled import latency_controlled_bidirectional_rnn
+from models.recurrent.latency_controlled import right_context_inputs
 
 
 class BLSTM_CTC(ctcBase):
@@ -31,6 +35,15 @@ class BLSTM_CTC(ctcBase):
         num_proj: int, the number of nodes in recurrent projection layer
         weight_decay: A float value. Regularization parameter for weight decay
         bottleneck_dim: int, the dimensions of the bottleneck layer
+        time_reduction_type: string, concat or conv or max_pool
+        downsample_list: list of int of size `[num_layer]`. The time
+            resolution is reduced by each factor before each layer.
+        cell_impl: string, standard or block or fused
+        lc_chunk_size: int, the number of frames in each chunk of the
+            latency-controlled BLSTM. If None or 0, the whole utterance is
+            used in the backward direction.
+        lc_right_context: int, the number of right context frames used in
+            the backward direction of each chunk
     """
 
     def __init__(self,
@@ -47,25 +60,53 @@ class BLSTM_CTC(ctcBase):
                  num_proj=None,
                  weight_decay=0.0,
                  bottleneck_dim=None,
+                 time_reduction_type='concat',
+                 downsample_list=None,
+                 cell_impl='standard',
+                 lc_chunk_size=None,
+                 lc_right_context=0,
                  name='blstm_ctc'):
 
         ctcBase.__init__(self, batch_size, input_size, num_unit, num_layer,
                          num_classes, parameter_init,
                          clip_grad, clip_activation,
                          dropout_ratio_input, dropout_ratio_hidden,
-                         weight_decay, name)
+                         weight_decay, name,
+                         time_reduction_type=time_reduction_type,
+                         downsample_list=downsample_list,
+                         cell_impl=cell_impl)
 
         self.num_proj = None if num_proj == 0 else num_proj
+        check_cell_impl(cell_impl, self.num_proj)
         self.bottleneck_dim = bottleneck_dim
 
+        # Latency-controlled BLSTM
+        if lc_chunk_size is None or lc_chunk_size == 0:
+            self.lc_chunk_size = None
+            self.lc_right_context = 0
+        else:
+            if self.downsample_list is not None:
+                raise ValueError(
+                    'Latency-controlled BLSTM does not support time reduction between layers.')
+            if cell_impl == 'fused':
+                raise ValueError(
+                    'Latency-controlled BLSTM does not support fused cells.')
+            self.lc_chunk_size = int(lc_chunk_size)
+            self.lc_right_context = int(lc_right_context or 0)
+
     def _build(self, inputs, inputs_seq_len, keep_prob_input,
-               keep_prob_hidden):
+               keep_prob_hidden, initial_state=None):
         """Construct model graph.
         Args:
             inputs: A tensor of `[batch_size, max_time, input_dim]`
             inputs_seq_len: A tensor of `[batch_size]`
             keep_prob_input:
             keep_prob_hidden:
+            initial_state: A tuple of LSTMStateTuple of the forward direction
+                in each layer. This is used only in streaming inference of
+                the latency-controlled BLSTM, where inputs are a chunk
+                followed by its right context frames, and logits of the
+                chunk are returned.
         Returns:
             logits:
         """
@@ -74,6 +115,22 @@ class BLSTM_CTC(ctcBase):
                                 keep_prob_input,
                                 name='dropout_input')
 
+        if self.lc_chunk_size is not None:
+            context_inputs, context_seq_len = None, None
+            if self.lc_right_context > 0:
+                context_inputs, context_seq_len = right_context_inputs(
+                    outputs, inputs_seq_len,
+                    self.lc_chunk_size, self.lc_right_context)
+            if initial_state is not None:
+                # Only the first chunk
+                outputs = outputs[:, :self.lc_chunk_size]
+                inputs_seq_len = tf.minimum(
+                    tf.to_int32(inputs_seq_len), self.lc_chunk_size)
+                if self.lc_right_context > 0:
+                    context_inputs = context_inputs[:, :1]
+                    context_seq_len = context_seq_len[:, :1]
+            final_state_fw = []
+
         # Hidden layers
         for i_layer in range(self.num_layer):
             with tf.name_scope('blstm_hidden' + str(i_layer + 1)):
@@ -82,49 +139,74 @@ class BLSTM_CTC(ctcBase):
                     minval=-self.parameter_init,
                     maxval=self.parameter_init)
 
-                lstm_fw = tf.contrib.rnn.LSTMCell(
-                    self.num_unit,
-                    use_peepholes=True,
-                    cell_clip=self.clip_activation,
-                    initializer=initializer,
-                    num_proj=self.num_proj,
-                    forget_bias=1.0,
-                    state_is_tuple=True)
-                lstm_bw = tf.contrib.rnn.LSTMCell(
-                    self.num_unit,
-                    use_peepholes=True,
-                    cell_clip=self.clip_activation,
-                    initializer=initializer,
-                    num_proj=self.num_proj,
-                    forget_bias=1.0,
-                    state_is_tuple=True)
-
-                # Dropout for outputs of each layer
-                lstm_fw = tf.contrib.rnn.DropoutWrapper(
-                    lstm_fw,
-                    output_keep_prob=keep_prob_hidden)
-                lstm_bw = tf.contrib.rnn.DropoutWrapper(
-                    lstm_bw,
-                    output_keep_prob=keep_prob_hidden)
-
-                # _init_state_fw = lstm_fw.zero_state(self.batch_size,
-                #                                     tf.float32)
-                # _init_state_bw = lstm_bw.zero_state(self.batch_size,
-                #                                     tf.float32)
-                # initial_state_fw=_init_state_fw,
-                # initial_state_bw=_init_state_bw,
-
-                # Ignore 2nd return (the last state)
-                (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
-                    cell_fw=lstm_fw,
-                    cell_bw=lstm_bw,
-                    inputs=outputs,
-                    sequence_length=inputs_seq_len,
-                    dtype=tf.float32,
-                    scope='blstm_dynamic' + str(i_layer + 1))
+                # Reduce time resolution
+                outputs, inputs_seq_len = self._reduce_time(
+                    outputs, inputs_seq_len, i_layer)
+
+                if self.cell_impl == 'fused':
+                    (outputs_fw, outputs_bw), final_state = fused_bidirectional_lstm(
+                        outputs, inputs_seq_len, self.num_unit, initializer,
+                        clip_activation=self.clip_activation,
+                        scope='blstm_dynamic' + str(i_layer + 1))
+
+                    # Dropout for outputs of each layer
+                    outputs_fw = tf.nn.dropout(outputs_fw, keep_prob_hidden)
+                    outputs_bw = tf.nn.dropout(outputs_bw, keep_prob_hidden)
+                else:
+                    lstm_fw = lstm_cell(self.num_unit, self.cell_impl,
+                                        initializer=initializer,
+                                        clip_activation=self.clip_activation,
+                                        num_proj=self.num_proj)
+                    lstm_bw = lstm_cell(self.num_unit, self.cell_impl,
+                                        initializer=initializer,
+                                        clip_activation=self.clip_activation,
+                                        num_proj=self.num_proj)
+
+                    # Dropout for outputs of each layer
+                    lstm_fw = tf.contrib.rnn.DropoutWrapper(
+                        lstm_fw,
+                        output_keep_prob=keep_prob_hidden)
+                    lstm_bw = tf.contrib.rnn.DropoutWrapper(
+                        lstm_bw,
+                        output_keep_prob=keep_prob_hidden)
+
+                    # _init_state_fw = lstm_fw.zero_state(self.batch_size,
+                    #                                     tf.float32)
+                    # _init_state_bw = lstm_bw.zero_state(self.batch_size,
+                    #                                     tf.float32)
+                    # initial_state_fw=_init_state_fw,
+                    # initial_state_bw=_init_state_bw,
+
+                    if self.lc_chunk_size is not None:
+                        (outputs_fw, outputs_bw), context_outputs, final_state = latency_controlled_bidirectional_rnn(
+                            cell_fw=lstm_fw,
+                            cell_bw=lstm_bw,
+                            inputs=outputs,
+                            inputs_seq_len=inputs_seq_len,
+                            chunk_size=self.lc_chunk_size,
+                            context_inputs=context_inputs,
+                            context_seq_len=context_seq_len,
+                            initial_state_fw=None if initial_state is None else initial_state[i_layer],
+                            scope='blstm_dynamic' + str(i_layer + 1))
+                        if context_outputs is not None:
+                            context_inputs = tf.concat(
+                                axis=3, values=list(context_outputs))
+                        final_state_fw.append(final_state[0])
+                    else:
+                        # Ignore 2nd return (the last state)
+                        (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
+                            cell_fw=lstm_fw,
+                            cell_bw=lstm_bw,
+                            inputs=outputs,
+                            sequence_length=inputs_seq_len,
+                            dtype=tf.float32,
+                            scope='blstm_dynamic' + str(i_layer + 1))
 
                 outputs = tf.concat(axis=2, values=[outputs_fw, outputs_bw])
 
+        if self.lc_chunk_size is not None:
+            self.final_state = tuple(final_state_fw)
+
         # Reshape to apply the same weights over the timesteps
         if self.num_proj is None:
             output_node = self.num_unit * 2
@@ -136,23 +218,25 @@ class BLSTM_CTC(ctcBase):
         batch_size = tf.shape(inputs)[0]
 
         if self.bottleneck_dim is not None and self.bottleneck_dim != 0:
-            with tf.name_scope('bottleneck'):
+            with tf.variable_scope('bottleneck'):
                 # Affine
-                W_bottleneck = tf.Variable(tf.truncated_normal(
-                    shape=[output_node, self.bottleneck_dim],
-                    stddev=0.1, name='W_bottleneck'))
-                b_bottleneck = tf.Variable(tf.zeros(
-                    shape=[self.bottleneck_dim], name='b_bottleneck'))
+                W_bottleneck = tf.get_variable(
+                    'W_bottleneck', shape=[output_node, self.bottleneck_dim],
+                    initializer=tf.truncated_normal_initializer(stddev=0.1))
+                b_bottleneck = tf.get_variable(
+                    'b_bottleneck', shape=[self.bottleneck_dim],
+                    initializer=tf.zeros_initializer())
                 outputs = tf.matmul(outputs, W_bottleneck) + b_bottleneck
                 output_node = self.bottleneck_dim
 
-        with tf.name_scope('output'):
+        with tf.variable_scope('output'):
             # Affine
-            W_output = tf.Variable(tf.truncated_normal(
-                shape=[output_node, self.num_classes],
-                stddev=0.1, name='W_output'))
-            b_output = tf.Variable(tf.zeros(
-                shape=[self.num_classes], name='b_output'))
+            W_output = tf.get_variable(
+                'W_output', shape=[output_node, self.num_classes],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
+            b_output = tf.get_variable(
+                'b_output', shape=[self.num_classes],
+                initializer=tf.zeros_initializer())
             logits_2d = tf.matmul(outputs, W_output) + b_output
 
             # Reshape back to the original shape
@@ -163,3 +247,23 @@ class BLSTM_CTC(ctcBase):
             logits = tf.transpose(logits, (1, 0, 2))
 
             return logits
+
+    def state_placeholders(self):
+        """Placeholders of the state of the forward direction, which are fed
+           the final state of the previous chunk in streaming inference of
+           the latency-controlled BLSTM.
+        Returns:
+            A tuple of LSTMStateTuple in each layer
+        """
+        if self.lc_chunk_size is None:
+            raise ValueError(
+                'Streaming inference of BLSTM_CTC requires lc_chunk_size.')
+
+        state_size = self.num_unit if self.num_proj is None else self.num_proj
+        return tuple(
+            tf.contrib.rnn.LSTMStateTuple(
+                tf.placeholder(tf.float32, shape=[None, self.num_unit],
+                               name='state_c' + str(i_layer + 1)),
+                tf.placeholder(tf.float32, shape=[None, state_size],
+                               name='state_h' + str(i_layer + 1)))
+            for i_layer in range(self.num_layer))
@@ -8,6 +8,10 @@ from __future__ import division
 from __future__ import print_function
 
 import tensorflow as tf
+from models.recurrent.cell import check_cell_impl
+from models.tower import build_towers, compute_gradients
+from models.gradient_accumulation import add_micro_batch_weight
+from models.gradient_accumulation import micro_batch_weight, apply_gradients
 
 
 OPTIMIZER_CLS_NAMES = {
@@ -20,6 +24,30 @@ OPTIMIZER_CLS_NAMES = {
 }
 
 
+def dense2sparse(labels, labels_seq_len=None, padded_value=-1):
+    """Convert padded dense labels into a SparseTensor in the graph.
+    Args:
+        labels: An int32 tensor of size `[batch_size, max_label_len]`
+        labels_seq_len: An int32 tensor of size `[batch_size]`. If None,
+            labels equal to padded_value are regarded as padding.
+        padded_value: int, the value used for padding
+    Returns:
+        labels_st: A SparseTensor of labels
+    """
+    with tf.name_scope('dense2sparse'):
+        labels = tf.convert_to_tensor(labels, dtype=tf.int32)
+        if labels_seq_len is None:
+            mask = tf.not_equal(labels, padded_value)
+        else:
+            mask = tf.sequence_mask(labels_seq_len,
+                                    maxlen=tf.shape(labels)[1])
+        indices = tf.where(mask)
+        values = tf.gather_nd(labels, indices)
+        dense_shape = tf.cast(tf.shape(labels), tf.int64)
+        labels_st = tf.SparseTensor(indices, values, dense_shape)
+    return labels_st
+
+
 class ctcBase(object):
     """Connectionist Temporal Classification (CTC) network.
     Args:
@@ -38,6 +66,13 @@ class ctcBase(object):
         dropout_ratio_hidden: A float value. Dropout ratio in hidden-hidden
             layers
         weight_decay: A float value. Regularization parameter for weight decay
+        time_reduction_type: string, concat or conv or max_pool. The method
+            to reduce time resolution between layers.
+        downsample_list: list of int of size `[num_layer]`. The time
+            resolution is reduced by each factor before each layer. If None
+            or 0, the time resolution is not reduced.
+        cell_impl: string, standard or block or fused. The implementation of
+            recurrent cells (see models.recurrent.cell).
     """
 
     def __init__(self,
@@ -52,7 +87,10 @@ class ctcBase(object):
                  dropout_ratio_input,
                  dropout_ratio_hidden,
                  weight_decay,
-                 name=None):
+                 name=None,
+                 time_reduction_type='concat',
+                 downsample_list=None,
+                 cell_impl='standard'):
 
         # Network size
         self.batch_size = batch_size
@@ -70,6 +108,26 @@ class ctcBase(object):
         self.dropout_ratio_hidden = dropout_ratio_hidden
         self.weight_decay = float(weight_decay)
 
+        # Time reduction between layers
+        if time_reduction_type not in ['concat', 'conv', 'max_pool']:
+            raise ValueError(
+                'time_reduction_type should be one of ["concat", "conv", '
+                '"max_pool"], you provided %s.' % (time_reduction_type))
+        self.time_reduction_type = time_reduction_type
+        if downsample_list is None or downsample_list == 0 or all(
+                int(factor) == 1 for factor in downsample_list):
+            self.downsample_list = None
+        else:
+            if len(downsample_list) != num_layer:
+                raise ValueError(
+                    'downsample_list should have num_layer (%d) elements, '
+                    'you provided %d.' % (num_layer, len(downsample_list)))
+            self.downsample_list = [int(factor) for factor in downsample_list]
+
+        # Implementation of recurrent cells
+        check_cell_impl(cell_impl)
+        self.cell_impl = cell_impl
+
         # Summaries for TensorBoard
         self.summaries_train = []
         self.summaries_dev = []
@@ -91,31 +149,114 @@ class ctcBase(object):
                     tf.shape(inputs), 0.0, stddev) + inputs
         return inputs
 
+    def _reduce_time(self, outputs, inputs_seq_len, i_layer):
+        """Reduce time resolution of the inputs of the i_layer-th layer.
+        Args:
+            outputs: A tensor of size `[batch_size, max_time, feature_dim]`
+            inputs_seq_len: A tensor of size `[batch_size]`
+            i_layer: int, the index of the layer (0-origin)
+        Returns:
+            outputs: A tensor of size
+                `[batch_size, ceil(max_time / factor), feature_dim']`.
+                feature_dim' is `feature_dim * factor` in concat, and
+                `feature_dim` otherwise.
+            inputs_seq_len: A tensor of size `[batch_size]`
+        """
+        if self.downsample_list is None or self.downsample_list[i_layer] == 1:
+            return outputs, inputs_seq_len
+        factor = self.downsample_list[i_layer]
+
+        with tf.name_scope('time_reduction' + str(i_layer + 1)):
+            batch_size = tf.shape(outputs)[0]
+            max_time = tf.shape(outputs)[1]
+            feature_dim = outputs.get_shape().as_list()[2]
+
+            if self.time_reduction_type == 'concat':
+                # Pad to a multiple of factor and concatenate adjacent frames
+                pad_num = tf.mod(factor - tf.mod(max_time, factor), factor)
+                outputs = tf.pad(outputs, [[0, 0], [0, pad_num], [0, 0]])
+                outputs = tf.reshape(
+                    outputs, shape=[batch_size, -1, feature_dim * factor])
+
+            elif self.time_reduction_type == 'conv':
+                outputs = tf.layers.conv1d(
+                    outputs,
+                    filters=feature_dim,
+                    kernel_size=factor,
+                    strides=factor,
+                    padding='same',
+                    kernel_initializer=tf.random_uniform_initializer(
+                        minval=-self.parameter_init,
+                        maxval=self.parameter_init),
+                    name='time_reduction_conv' + str(i_layer + 1))
+
+            elif self.time_reduction_type == 'max_pool':
+                outputs = tf.layers.max_pooling1d(
+                    outputs,
+                    pool_size=factor,
+                    strides=factor,
+                    padding='same')
+
+        return outputs, self._reduce_seq_len(inputs_seq_len, i_layer)
+
+    def _reduce_seq_len(self, inputs_seq_len, i_layer=None):
+        """Compute sequence lengths after time reduction.
+        Args:
+            inputs_seq_len: A tensor of size `[batch_size]`
+            i_layer: int, the index of the layer. If None, compute lengths
+                of the outputs of the last layer.
+        Returns:
+            inputs_seq_len: A tensor of size `[batch_size]`
+        """
+        if self.downsample_list is None:
+            return inputs_seq_len
+        if i_layer is None:
+            factor_list = self.downsample_list
+        else:
+            factor_list = [self.downsample_list[i_layer]]
+        for factor in factor_list:
+            # ceil(inputs_seq_len / factor)
+            inputs_seq_len = (inputs_seq_len + factor - 1) // factor
+        return inputs_seq_len
+
     def _add_noise_to_gradients(grads_and_vars, gradient_noise_scale,
                                 stddev=0.075):
         """Adds scaled noise from a 0-mean normal distribution to gradients."""
         raise NotImplementedError
 
     def compute_loss(self, inputs, labels, inputs_seq_len, keep_prob_input,
-                     keep_prob_hidden, num_gpu=1, scope=None):
+                     keep_prob_hidden, num_gpu=1, scope=None,
+                     labels_seq_len=None):
         """Operation for computing ctc loss.
         Args:
             inputs: A tensor of size `[batch_size, max_time, input_size]`
-            labels: A SparseTensor of target labels
+            labels: A SparseTensor of target labels, or an int32 tensor of
+                padded target labels of size `[batch_size, max_label_len]`
             inputs_seq_len: A tensor of size `[batch_size]`
             keep_prob_input: A float value. A probability to keep nodes in
                 input-hidden layers
             keep_prob_hidden: A float value. A probability to keep nodes in
                 hidden-hidden layers
             num_gpu: int, the number of GPUs
+            scope: string, the name scope of the tower. If set, only losses
+                in this scope are summed up.
+            labels_seq_len: An int32 tensor of size `[batch_size]`. This is
+                used only when labels are padded. If None, labels of -1 are
+                regarded as padding.
         Returns:
             loss: operation for computing ctc loss
             logits: A tensor of size `[max_time, batch_size, input_size]`
         """
+        if not isinstance(labels, tf.SparseTensor):
+            labels = dense2sparse(labels, labels_seq_len)
+
         # Build model graph
         logits = self._build(
             inputs, inputs_seq_len, keep_prob_input, keep_prob_hidden)
 
+        # Lengths of logits after time reduction
+        inputs_seq_len = self._reduce_seq_len(inputs_seq_len)
+
         # Weight decay
         if self.weight_decay > 0:
             with tf.name_scope("weight_decay_loss"):
@@ -137,7 +278,10 @@ class ctcBase(object):
             tf.add_to_collection('losses', ctc_loss)
 
         # Compute total loss
-        loss = tf.add_n(tf.get_collection('losses'), name='total_loss')
+        loss = tf.add_n(tf.get_collection('losses', scope), name='total_loss')
+
+        # Weight of this mini-batch in gradient accumulation
+        add_micro_batch_weight(loss, tf.shape(inputs_seq_len)[0])
 
         if num_gpu == 1:
             # Add a scalar summary for the snapshot of loss
@@ -149,16 +293,80 @@ class ctcBase(object):
 
         return loss, logits
 
+    def compute_tower_loss(self, inputs_list, labels_list,
+                           inputs_seq_len_list, keep_prob_input,
+                           keep_prob_hidden, devices,
+                           variable_device='/cpu:0',
+                           labels_seq_len_list=None):
+        """Build a tower on each device with shared variables, and compute
+           ctc loss of each tower.
+        Args:
+            inputs_list: list of inputs of each tower
+            labels_list: list of target labels of each tower
+            inputs_seq_len_list: list of inputs_seq_len of each tower
+            keep_prob_input: A float value. A probability to keep nodes in
+                input-hidden layers
+            keep_prob_hidden: A float value. A probability to keep nodes in
+                hidden-hidden layers
+            devices: list of device names (see models.tower.get_devices)
+            variable_device: string, the device of the shared variables
+            labels_seq_len_list: list of labels_seq_len of each tower
+        Returns:
+            losses: list of ctc loss of each tower. Pass this to `train` to
+                average the gradients of towers.
+            logits_list: list of logits of each tower
+        """
+        if labels_seq_len_list is None:
+            labels_seq_len_list = [None] * len(devices)
+
+        def build_fn(i_tower, scope):
+            return self.compute_loss(inputs_list[i_tower],
+                                     labels_list[i_tower],
+                                     inputs_seq_len_list[i_tower],
+                                     keep_prob_input,
+                                     keep_prob_hidden,
+                                     num_gpu=len(devices),
+                                     scope=scope,
+                                     labels_seq_len=labels_seq_len_list[i_tower])
+
+        outputs = build_towers(build_fn, devices, variable_device)
+        losses = [loss for loss, _ in outputs]
+        logits_list = [logits for _, logits in outputs]
+
+        # Add a scalar summary for the snapshot of the mean loss
+        with tf.name_scope("total_loss"):
+            loss_mean = tf.add_n(losses) / len(losses)
+            self.summaries_train.append(
+                tf.summary.scalar('loss_train', loss_mean))
+            self.summaries_dev.append(
+                tf.summary.scalar('loss_dev', loss_mean))
+
+        return losses, logits_list
+
     def train(self, loss, optimizer, learning_rate_init=None,
-              clip_grad_by_norm=None, is_scheduled=False):
+              clip_grad_by_norm=None, is_scheduled=False,
+              num_replicas=None, accumulate_steps=None):
         """Operation for training.
         Args:
-            loss: An operation for computing loss
+            loss: An operation for computing loss, or list of losses of each
+                tower. In the latter, the gradients of towers are averaged
+                before clipping.
             optimizer: string, name of the optimizer in OPTIMIZER_CLS_NAMES
             learning_rate_init: initial learning rate
             clip_grad_by_norm: if True, clip gradients by norm of the
                 value of self.clip_grad
             is_scheduled: if True, schedule learning rate at each epoch
+            num_replicas: int, the number of workers in synchronous
+                distributed training. If set, the gradients of all workers
+                are aggregated before being applied once. The wrapped
+                optimizer is kept as `self.sync_optimizer` to make the
+                session hook. If None, workers update variables
+                asynchronously (or training is not distributed).
+            accumulate_steps: int, the number of micro-batches to accumulate
+                (clipped) gradients over. If set, train_op only accumulates
+                gradients, and `self.apply_op` must be run after every
+                accumulate_steps runs of train_op to update variables and
+                global_step. If None or 1, `self.apply_op` is None.
         Returns:
             train_op: operation for training
         """
@@ -184,6 +392,15 @@ class ctcBase(object):
             optimizer = OPTIMIZER_CLS_NAMES[optimizer](
                 learning_rate=learning_rate_init)
 
+        # Aggregate gradients of all workers
+        self.sync_optimizer = None
+        if num_replicas is not None:
+            optimizer = tf.train.SyncReplicasOptimizer(
+                optimizer,
+                replicas_to_aggregate=num_replicas,
+                total_num_replicas=num_replicas)
+            self.sync_optimizer = optimizer
+
         # Create a variable to track the global step
         global_step = tf.Variable(0, name='global_step', trainable=False)
 
@@ -192,21 +409,34 @@ class ctcBase(object):
             train_op = self._gradient_clipping(loss,
                                                optimizer,
                                                clip_grad_by_norm,
-                                               global_step)
+                                               global_step,
+                                               accumulate_steps)
+
+        elif isinstance(loss, (list, tuple)) or accumulate_steps:
+            # Apply (or accumulate) the average gradients of towers
+            trainable_vars = tf.trainable_variables()
+            grads = compute_gradients(loss, trainable_vars)
+            train_op, self.apply_op = apply_gradients(
+                optimizer,
+                zip(grads, trainable_vars),
+                global_step,
+                accumulate_steps,
+                weight=micro_batch_weight(loss))
 
         else:
             # Use the optimizer to apply the gradients that minimize the loss
             # and also increment the global step counter as a single training
             # step
             train_op = optimizer.minimize(loss, global_step=global_step)
+            self.apply_op = None
 
         return train_op
 
     def _gradient_clipping(self, loss, optimizer, clip_grad_by_norm,
-                           global_step):
-        # Compute gradients
+                           global_step, accumulate_steps=None):
+        # Compute gradients (averaged over towers)
         trainable_vars = tf.trainable_variables()
-        grads = tf.gradients(loss, trainable_vars)
+        grads = compute_gradients(loss, trainable_vars)
 
         # TODO: Optionally add gradient noise
 
@@ -214,22 +444,26 @@ class ctcBase(object):
             # Clip by norm
             clipped_grads = [tf.clip_by_norm(
                 g,
-                clip_norm=self.clip_grad) for g in grads]
+                clip_norm=self.clip_grad) if g is not None else None
+                for g in grads]
         else:
             # Clip by absolute values
             clipped_grads = [tf.clip_by_value(
                 g,
                 clip_value_min=-self.clip_grad,
-                clip_value_max=self.clip_grad) for g in grads]
+                clip_value_max=self.clip_grad) if g is not None else None
+                for g in grads]
 
         # TODO: Add histograms for variables, gradients (norms)
         # self._tensorboard_statistics(trainable_vars)
 
         # Create gradient updates
-        train_op = optimizer.apply_gradients(
+        train_op, self.apply_op = apply_gradients(
+            optimizer,
             zip(clipped_grads, trainable_vars),
-            global_step=global_step,
-            name='train')
+            global_step,
+            accumulate_steps,
+            weight=micro_batch_weight(loss))
 
         return train_op
 
@@ -237,7 +471,8 @@ class ctcBase(object):
         """Operation for decoding.
         Args:
             logits: A tensor of size `[max_time, batch_size, input_size]`
-            inputs_seq_len: A tensor of size `[batch_size]`
+            inputs_seq_len: A tensor of size `[batch_size]`, lengths of the
+                inputs before time reduction
             decode_type: greedy or beam_search
             beam_width: beam width for beam search
         Return:
@@ -246,6 +481,9 @@ class ctcBase(object):
         if decode_type not in ['greedy', 'beam_search']:
             raise ValueError('decode_type is "greedy" or "beam_search".')
 
+        # Lengths of logits after time reduction
+        inputs_seq_len = self._reduce_seq_len(inputs_seq_len)
+
         if decode_type == 'greedy':
             decoded, _ = tf.nn.ctc_greedy_decoder(
                 logits, tf.cast(inputs_seq_len, tf.int32))
@@ -277,14 +515,45 @@ class ctcBase(object):
 
         return posteriors_op
 
-    def compute_ler(self, decode_op, labels):
-        """Operation for computing LER (Label Error Rate).
+    def log_posteriors(self, logits, inputs_seq_len):
+        """Operation for computing log posteriors of each time steps. These
+           are dumped to the posterior cache (see
+           experiments/utils/data/posterior_cache.py).
+        Args:
+            logits: A tensor of size `[max_time, batch_size, input_size]`
+            inputs_seq_len: A tensor of size `[batch_size]`, lengths of the
+                inputs before time reduction
+        Returns:
+            log_posteriors_op: operation for computing log posteriors of size
+                `[batch_size, max_time, num_classes]`
+            outputs_seq_len_op: operation for computing lengths of the log
+                posteriors after time reduction of size `[batch_size]`
+        """
+        # Convert to batch-major: `[batch_size, max_time, num_classes]'
+        logits = tf.transpose(logits, (1, 0, 2))
+
+        logits_2d = tf.reshape(logits, [-1, self.num_classes])
+        log_posteriors_op = tf.reshape(tf.nn.log_softmax(logits_2d),
+                                       tf.shape(logits))
+
+        return log_posteriors_op, self._reduce_seq_len(inputs_seq_len)
+
+    def compute_ler(self, decode_op, labels, labels_seq_len=None):
+        """Operation for computing LER (Label Error Rate). The edit distance
+           of each utterance is normalized by the length of the ground truth
+           as in do_eval_per.
         Args:
             decode_op: operation for decoding
-            labels: A SparseTensor of target labels
+            labels: A SparseTensor of target labels, or an int32 tensor of
+                padded target labels of size `[batch_size, max_label_len]`
+            labels_seq_len: An int32 tensor of size `[batch_size]`. This is
+                used only when labels are padded.
         Return:
             ler_op: operation for computing LER
         """
+        if not isinstance(labels, tf.SparseTensor):
+            labels = dense2sparse(labels, labels_seq_len)
+
         # Compute LER (normalize by label length)
         ler_op = tf.reduce_mean(tf.edit_distance(
             decode_op, labels, normalize=True))
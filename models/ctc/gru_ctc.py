@@ -5,6 +5,7 @@
 
 import tensorflow as tf
 from models.ctc.ctc_base import ctcBase
+from models.recurrent.cell import gru_cell
 
 
 class GRU_CTC(ctcBase):
@@ -27,6 +28,11 @@ class GRU_CTC(ctcBase):
         num_proj: not used
         weight_decay: A float value. Regularization parameter for weight decay
         bottleneck_dim: int, the dimensions of the bottleneck layer
+        time_reduction_type: string, concat or conv or max_pool
+        downsample_list: list of int of size `[num_layer]`. The time
+            resolution is reduced by each factor before each layer.
+        cell_impl: string, standard or block or fused. fused is the same as
+            block in GRU.
     """
 
     def __init__(self,
@@ -43,24 +49,33 @@ class GRU_CTC(ctcBase):
                  num_proj=None,  # not used
                  weight_decay=0.0,
                  bottleneck_dim=None,
+                 time_reduction_type='concat',
+                 downsample_list=None,
+                 cell_impl='standard',
                  name='gru_ctc'):
 
         ctcBase.__init__(self, batch_size, input_size, num_unit, num_layer,
                          num_classes, parameter_init,
                          clip_grad, clip_activation,
                          dropout_ratio_input, dropout_ratio_hidden,
-                         weight_decay, name)
+                         weight_decay, name,
+                         time_reduction_type=time_reduction_type,
+                         downsample_list=downsample_list,
+                         cell_impl=cell_impl)
 
         self.bottleneck_dim = bottleneck_dim
 
     def _build(self, inputs, inputs_seq_len, keep_prob_input,
-               keep_prob_hidden):
+               keep_prob_hidden, initial_state=None):
         """Construct model graph.
         Args:
             inputs: A tensor of `[batch_size, max_time, input_dim]`
             inputs_seq_len:  A tensor of `[batch_size]`
             keep_prob_input:
             keep_prob_hidden:
+            initial_state: A tuple of tensors of size `[batch_size, num_unit]`
+                in each layer. If None, start from zero states. This is used
+                in streaming inference.
         Returns:
             logits:
         """
@@ -79,7 +94,7 @@ class GRU_CTC(ctcBase):
                     maxval=self.parameter_init)
 
                 with tf.variable_scope('gru', initializer=initializer):
-                    gru = tf.contrib.rnn.GRUCell(self.num_unit)
+                    gru = gru_cell(self.num_unit, self.cell_impl)
 
                 # Dropout for outputs of each layer
                 gru = tf.contrib.rnn.DropoutWrapper(
@@ -87,15 +102,36 @@ class GRU_CTC(ctcBase):
 
                 gru_list.append(gru)
 
-        # Stack multiple cells
-        stacked_gru = tf.contrib.rnn.MultiRNNCell(
-            gru_list, state_is_tuple=True)
-
-        # Ignore 2nd return (the last state)
-        outputs, final_state = tf.nn.dynamic_rnn(cell=stacked_gru,
-                                                 inputs=inputs,
-                                                 sequence_length=inputs_seq_len,
-                                                 dtype=tf.float32)
+        if self.downsample_list is None:
+            # Stack multiple cells
+            stacked_gru = tf.contrib.rnn.MultiRNNCell(
+                gru_list, state_is_tuple=True)
+
+            # Ignore 2nd return (the last state)
+            outputs, final_state = tf.nn.dynamic_rnn(
+                cell=stacked_gru,
+                inputs=inputs,
+                sequence_length=inputs_seq_len,
+                initial_state=initial_state,
+                dtype=tf.float32)
+        else:
+            # Run each layer separately to reduce time resolution between
+            # layers
+            outputs = inputs
+            final_state = []
+            for i_layer, gru in enumerate(gru_list):
+                outputs, inputs_seq_len = self._reduce_time(
+                    outputs, inputs_seq_len, i_layer)
+                outputs, state = tf.nn.dynamic_rnn(
+                    cell=gru,
+                    inputs=outputs,
+                    sequence_length=inputs_seq_len,
+                    initial_state=None if initial_state is None else initial_state[i_layer],
+                    dtype=tf.float32,
+                    scope='gru_dynamic' + str(i_layer + 1))
+                final_state.append(state)
+            final_state = tuple(final_state)
+        self.final_state = final_state
 
         # inputs: `[batch_size, max_time, input_size_splice]`
         batch_size = tf.shape(inputs)[0]
@@ -105,23 +141,25 @@ class GRU_CTC(ctcBase):
         outputs = tf.reshape(outputs, shape=[-1, output_node])
 
         if self.bottleneck_dim is not None and self.bottleneck_dim != 0:
-            with tf.name_scope('bottleneck'):
+            with tf.variable_scope('bottleneck'):
                 # Affine
-                W_bottleneck = tf.Variable(tf.truncated_normal(
-                    shape=[output_node, self.bottleneck_dim],
-                    stddev=0.1, name='W_bottleneck'))
-                b_bottleneck = tf.Variable(tf.zeros(
-                    shape=[self.bottleneck_dim], name='b_bottleneck'))
+                W_bottleneck = tf.get_variable(
+                    'W_bottleneck', shape=[output_node, self.bottleneck_dim],
+                    initializer=tf.truncated_normal_initializer(stddev=0.1))
+                b_bottleneck = tf.get_variable(
+                    'b_bottleneck', shape=[self.bottleneck_dim],
+                    initializer=tf.zeros_initializer())
                 outputs = tf.matmul(outputs, W_bottleneck) + b_bottleneck
                 output_node = self.bottleneck_dim
 
-        with tf.name_scope('output'):
+        with tf.variable_scope('output'):
             # Affine
-            W_output = tf.Variable(tf.truncated_normal(
-                shape=[output_node, self.num_classes],
-                stddev=0.1, name='W_output'))
-            b_output = tf.Variable(tf.zeros(
-                shape=[self.num_classes], name='b_output'))
+            W_output = tf.get_variable(
+                'W_output', shape=[output_node, self.num_classes],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
+            b_output = tf.get_variable(
+                'b_output', shape=[self.num_classes],
+                initializer=tf.zeros_initializer())
             logits_2d = tf.matmul(outputs, W_output) + b_output
 
             # Reshape back to the original shape
@@ -132,3 +170,14 @@ class GRU_CTC(ctcBase):
             logits = tf.transpose(logits, (1, 0, 2))
 
             return logits
+
+    def state_placeholders(self):
+        """Placeholders of the recurrent state, which are fed the final state
+           of the previous chunk in streaming inference.
+        Returns:
+            A tuple of tensors of size `[batch_size, num_unit]` in each layer
+        """
+        return tuple(
+            tf.placeholder(tf.float32, shape=[None, self.num_unit],
+                           name='state' + str(i_layer + 1))
+            for i_layer in range(self.num_layer))
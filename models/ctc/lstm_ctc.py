@@ -9,6 +9,8 @@ from __future__ import print_function
 
 import tensorflow as tf
 from models.ctc.ctc_base import ctcBase
+from models.recurrent.cell import check_cell_impl, lstm_cell
+from models.recurrent.fused_rnn import fused_lstm
 
 
 class LSTM_CTC(ctcBase):
@@ -31,6 +33,10 @@ class LSTM_CTC(ctcBase):
         num_proj: int, the number of nodes in recurrent projection layer
         weight_decay: A float value. Regularization parameter for weight decay
         bottleneck_dim: int, the dimensions of the bottleneck layer
+        time_reduction_type: string, concat or conv or max_pool
+        downsample_list: list of int of size `[num_layer]`. The time
+            resolution is reduced by each factor before each layer.
+        cell_impl: string, standard or block or fused
     """
 
     def __init__(self,
@@ -47,25 +53,34 @@ class LSTM_CTC(ctcBase):
                  num_proj=None,
                  weight_decay=0.0,
                  bottleneck_dim=None,
+                 time_reduction_type='concat',
+                 downsample_list=None,
+                 cell_impl='standard',
                  name='lstm_ctc'):
 
         ctcBase.__init__(self, batch_size, input_size, num_unit, num_layer,
                          num_classes, parameter_init,
                          clip_grad, clip_activation,
                          dropout_ratio_input, dropout_ratio_hidden,
-                         weight_decay, name)
+                         weight_decay, name,
+                         time_reduction_type=time_reduction_type,
+                         downsample_list=downsample_list,
+                         cell_impl=cell_impl)
 
         self.num_proj = None if num_proj == 0 else num_proj
+        check_cell_impl(cell_impl, self.num_proj)
         self.bottleneck_dim = bottleneck_dim
 
     def _build(self, inputs, inputs_seq_len, keep_prob_input,
-               keep_prob_hidden):
+               keep_prob_hidden, initial_state=None):
         """Construct model graph.
         Args:
             inputs: A tensor of `[batch_size, max_time, input_dim]`
             inputs_seq_len:  A tensor of `[batch_size]`
             keep_prob_input:
             keep_prob_hidden:
+            initial_state: A tuple of LSTMStateTuple in each layer. If None,
+                start from zero states. This is used in streaming inference.
         Returns:
             logits:
         """
@@ -74,38 +89,13 @@ class LSTM_CTC(ctcBase):
                                keep_prob_input,
                                name='dropout_input')
 
-        # Hidden layers
-        lstm_list = []
-        for i_layer in range(self.num_layer):
-            with tf.name_scope('lstm_hidden' + str(i_layer + 1)):
-
-                initializer = tf.random_uniform_initializer(
-                    minval=-self.parameter_init,
-                    maxval=self.parameter_init)
-
-                lstm = tf.contrib.rnn.LSTMCell(self.num_unit,
-                                               use_peepholes=True,
-                                               cell_clip=self.clip_activation,
-                                               initializer=initializer,
-                                               num_proj=self.num_proj,
-                                               forget_bias=1.0,
-                                               state_is_tuple=True)
-
-                # Dropout for outputs of each layer
-                lstm = tf.contrib.rnn.DropoutWrapper(
-                    lstm, output_keep_prob=keep_prob_hidden)
-
-                lstm_list.append(lstm)
-
-        # Stack multiple cells
-        stacked_lstm = tf.contrib.rnn.MultiRNNCell(
-            lstm_list, state_is_tuple=True)
-
-        # Ignore 2nd return (the last state)
-        outputs, final_state = tf.nn.dynamic_rnn(cell=stacked_lstm,
-                                                 inputs=inputs,
-                                                 sequence_length=inputs_seq_len,
-                                                 dtype=tf.float32)
+        if self.cell_impl == 'fused':
+            outputs, inputs_seq_len, final_state = self._build_fused(
+                inputs, inputs_seq_len, keep_prob_hidden, initial_state)
+        else:
+            outputs, inputs_seq_len, final_state = self._build_cells(
+                inputs, inputs_seq_len, keep_prob_hidden, initial_state)
+        self.final_state = final_state
 
         # Reshape to apply the same weights over the timesteps
         if self.num_proj is None:
@@ -118,23 +108,25 @@ class LSTM_CTC(ctcBase):
         batch_size = tf.shape(inputs)[0]
 
         if self.bottleneck_dim is not None and self.bottleneck_dim != 0:
-            with tf.name_scope('bottleneck'):
+            with tf.variable_scope('bottleneck'):
                 # Affine
-                W_bottleneck = tf.Variable(tf.truncated_normal(
-                    shape=[output_node, self.bottleneck_dim],
-                    stddev=0.1, name='W_bottleneck'))
-                b_bottleneck = tf.Variable(tf.zeros(
-                    shape=[self.bottleneck_dim], name='b_bottleneck'))
+                W_bottleneck = tf.get_variable(
+                    'W_bottleneck', shape=[output_node, self.bottleneck_dim],
+                    initializer=tf.truncated_normal_initializer(stddev=0.1))
+                b_bottleneck = tf.get_variable(
+                    'b_bottleneck', shape=[self.bottleneck_dim],
+                    initializer=tf.zeros_initializer())
                 outputs = tf.matmul(outputs, W_bottleneck) + b_bottleneck
                 output_node = self.bottleneck_dim
 
-        with tf.name_scope('output'):
+        with tf.variable_scope('output'):
             # Affine
-            W_output = tf.Variable(tf.truncated_normal(
-                shape=[output_node, self.num_classes],
-                stddev=0.1, name='W_output'))
-            b_output = tf.Variable(tf.zeros(
-                shape=[self.num_classes], name='b_output'))
+            W_output = tf.get_variable(
+                'W_output', shape=[output_node, self.num_classes],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
+            b_output = tf.get_variable(
+                'b_output', shape=[self.num_classes],
+                initializer=tf.zeros_initializer())
             logits_2d = tf.matmul(outputs, W_output) + b_output
 
             # Reshape back to the original shape
@@ -145,3 +137,137 @@ class LSTM_CTC(ctcBase):
             logits = tf.transpose(logits, (1, 0, 2))
 
             return logits
+
+    def _build_cells(self, inputs, inputs_seq_len, keep_prob_hidden,
+                     initial_state=None):
+        """Construct hidden layers computed step by step.
+        Args:
+            inputs: A tensor of `[batch_size, max_time, input_dim]`
+            inputs_seq_len:  A tensor of `[batch_size]`
+            keep_prob_hidden:
+            initial_state: A tuple of LSTMStateTuple in each layer, or None
+        Returns:
+            outputs: A tensor of `[batch_size, max_time, output_node]`
+            inputs_seq_len: A tensor of `[batch_size]`
+            final_state: A tuple of LSTMStateTuple in each layer
+        """
+        # Hidden layers
+        lstm_list = []
+        for i_layer in range(self.num_layer):
+            with tf.name_scope('lstm_hidden' + str(i_layer + 1)):
+
+                initializer = tf.random_uniform_initializer(
+                    minval=-self.parameter_init,
+                    maxval=self.parameter_init)
+
+                lstm = lstm_cell(self.num_unit, self.cell_impl,
+                                 initializer=initializer,
+                                 clip_activation=self.clip_activation,
+                                 num_proj=self.num_proj)
+
+                # Dropout for outputs of each layer
+                lstm = tf.contrib.rnn.DropoutWrapper(
+                    lstm, output_keep_prob=keep_prob_hidden)
+
+                lstm_list.append(lstm)
+
+        if self.downsample_list is None:
+            # Stack multiple cells
+            stacked_lstm = tf.contrib.rnn.MultiRNNCell(
+                lstm_list, state_is_tuple=True)
+
+            # Ignore 2nd return (the last state)
+            outputs, final_state = tf.nn.dynamic_rnn(
+                cell=stacked_lstm,
+                inputs=inputs,
+                sequence_length=inputs_seq_len,
+                initial_state=initial_state,
+                dtype=tf.float32)
+        else:
+            # Run each layer separately to reduce time resolution between
+            # layers
+            outputs = inputs
+            final_state = []
+            for i_layer, lstm in enumerate(lstm_list):
+                outputs, inputs_seq_len = self._reduce_time(
+                    outputs, inputs_seq_len, i_layer)
+                outputs, state = tf.nn.dynamic_rnn(
+                    cell=lstm,
+                    inputs=outputs,
+                    sequence_length=inputs_seq_len,
+                    initial_state=None if initial_state is None else initial_state[i_layer],
+                    dtype=tf.float32,
+                    scope='lstm_dynamic' + str(i_layer + 1))
+                final_state.append(state)
+            final_state = tuple(final_state)
+
+        return outputs, inputs_seq_len, final_state
+
+    def _build_fused(self, inputs, inputs_seq_len, keep_prob_hidden,
+                     initial_state=None):
+        """Construct hidden layers computed by fused kernels. Variables have
+           the same names as those constructed by `_build_cells`.
+        Args:
+            inputs: A tensor of `[batch_size, max_time, input_dim]`
+            inputs_seq_len:  A tensor of `[batch_size]`
+            keep_prob_hidden:
+            initial_state: A tuple of LSTMStateTuple in each layer, or None
+        Returns:
+            outputs: A tensor of `[batch_size, max_time, num_unit]`
+            inputs_seq_len: A tensor of `[batch_size]`
+            final_state: A tuple of LSTMStateTuple in each layer
+        """
+        outputs = inputs
+        if self.downsample_list is None:
+            # Convert to time-major only once for all layers
+            outputs = tf.transpose(outputs, [1, 0, 2])
+
+        final_state = []
+        for i_layer in range(self.num_layer):
+            with tf.name_scope('lstm_hidden' + str(i_layer + 1)):
+
+                initializer = tf.random_uniform_initializer(
+                    minval=-self.parameter_init,
+                    maxval=self.parameter_init)
+                layer_initial_state = None if initial_state is None else initial_state[i_layer]
+
+                if self.downsample_list is None:
+                    # Same scope as MultiRNNCell
+                    outputs, state = fused_lstm(
+                        outputs, inputs_seq_len, self.num_unit, initializer,
+                        clip_activation=self.clip_activation,
+                        scope='rnn/multi_rnn_cell/cell_' + str(i_layer),
+                        time_major=True,
+                        initial_state=layer_initial_state)
+                else:
+                    outputs, inputs_seq_len = self._reduce_time(
+                        outputs, inputs_seq_len, i_layer)
+                    outputs, state = fused_lstm(
+                        outputs, inputs_seq_len, self.num_unit, initializer,
+                        clip_activation=self.clip_activation,
+                        scope='lstm_dynamic' + str(i_layer + 1),
+                        initial_state=layer_initial_state)
+                final_state.append(state)
+
+                # Dropout for outputs of each layer
+                outputs = tf.nn.dropout(outputs, keep_prob_hidden)
+
+        if self.downsample_list is None:
+            outputs = tf.transpose(outputs, [1, 0, 2])
+
+        return outputs, inputs_seq_len, tuple(final_state)
+
+    def state_placeholders(self):
+        """Placeholders of the recurrent state, which are fed the final state
+           of the previous chunk in streaming inference.
+        Returns:
+            A tuple of LSTMStateTuple in each layer
+        """
+        state_size = self.num_unit if self.num_proj is None else self.num_proj
+        return tuple(
+            tf.contrib.rnn.LSTMStateTuple(
+                tf.placeholder(tf.float32, shape=[None, self.num_unit],
+                               name='state_c' + str(i_layer + 1)),
+                tf.placeholder(tf.float32, shape=[None, state_size],
+                               name='state_h' + str(i_layer + 1)))
+            for i_layer in range(self.num_layer))
@@ -8,7 +8,10 @@ from __future__ import division
 from __future__ import print_function
 
 import tensorflow as tf
-from models.ctc.ctc_base import ctcBase
+from models.ctc.ctc_base import ctcBase, dense2sparse
+from models.gradient_accumulation import add_micro_batch_weight
+from models.recurrent.cell import check_cell_impl, lstm_cell
+from models.recurrent.fused_rnn import fused_bidirectional_lstm
 
 
 class Multitask_BLSTM_CTC(ctcBase):
@@ -37,6 +40,7 @@ class Multitask_BLSTM_CTC(ctcBase):
         num_proj: int, the number of nodes in recurrent projection layer
         weight_decay: A float value. Regularization parameter for weight decay
         bottleneck_dim: int, the dimensions of the bottleneck layer
+        cell_impl: string, standard or block or fused
     """
 
     def __init__(self,
@@ -56,15 +60,17 @@ class Multitask_BLSTM_CTC(ctcBase):
                  num_proj=None,
                  weight_decay=0.0,
                  bottleneck_dim=None,
+                 cell_impl='standard',
                  name='multitask_blstm_ctc'):
 
         ctcBase.__init__(self, batch_size, input_size, num_unit,
                          num_layer_main, num_classes_main, parameter_init,
                          clip_grad, clip_activation,
                          dropout_ratio_input, dropout_ratio_hidden,
-                         weight_decay, name)
+                         weight_decay, name, cell_impl=cell_impl)
 
         self.num_proj = None if num_proj == 0 else num_proj
+        check_cell_impl(cell_impl, self.num_proj)
         self.bottleneck_dim = bottleneck_dim
 
         if num_layer_sub < 1 or num_layer_sub > num_layer_main:
@@ -105,46 +111,41 @@ class Multitask_BLSTM_CTC(ctcBase):
                     minval=-self.parameter_init,
                     maxval=self.parameter_init)
 
-                lstm_fw = tf.contrib.rnn.LSTMCell(
-                    self.num_unit,
-                    use_peepholes=True,
-                    cell_clip=self.clip_activation,
-                    initializer=initializer,
-                    num_proj=self.num_proj,
-                    forget_bias=1.0,
-                    state_is_tuple=True)
-                lstm_bw = tf.contrib.rnn.LSTMCell(
-                    self.num_unit,
-                    use_peepholes=True,
-                    cell_clip=self.clip_activation,
-                    initializer=initializer,
-                    num_proj=self.num_proj,
-                    forget_bias=1.0,
-                    state_is_tuple=True)
-
-                # Dropout for outputs of each layer
-                lstm_fw = tf.contrib.rnn.DropoutWrapper(
-                    lstm_fw,
-                    output_keep_prob=keep_prob_hidden)
-                lstm_bw = tf.contrib.rnn.DropoutWrapper(
-                    lstm_bw,
-                    output_keep_prob=keep_prob_hidden)
-
-                # _init_state_fw = lstm_fw.zero_state(self.batch_size,
-                #                                     tf.float32)
-                # _init_state_bw = lstm_bw.zero_state(self.batch_size,
-                #                                     tf.float32)
-                # initial_state_fw=_init_state_fw,
-                # initial_state_bw=_init_state_bw,
-
-                # Ignore 2nd return (the last state)
-                (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
-                    cell_fw=lstm_fw,
-                    cell_bw=lstm_bw,
-                    inputs=outputs,
-                    sequence_length=inputs_seq_len,
-                    dtype=tf.float32,
-                    scope='blstm_dynamic' + str(i_layer + 1))
+                if self.cell_impl == 'fused':
+                    (outputs_fw, outputs_bw), final_state = fused_bidirectional_lstm(
+                        outputs, inputs_seq_len, self.num_unit, initializer,
+                        clip_activation=self.clip_activation,
+                        scope='blstm_dynamic' + str(i_layer + 1))
+
+                    # Dropout for outputs of each layer
+                    outputs_fw = tf.nn.dropout(outputs_fw, keep_prob_hidden)
+                    outputs_bw = tf.nn.dropout(outputs_bw, keep_prob_hidden)
+                else:
+                    lstm_fw = lstm_cell(self.num_unit, self.cell_impl,
+                                        initializer=initializer,
+                                        clip_activation=self.clip_activation,
+                                        num_proj=self.num_proj)
+                    lstm_bw = lstm_cell(self.num_unit, self.cell_impl,
+                                        initializer=initializer,
+                                        clip_activation=self.clip_activation,
+                                        num_proj=self.num_proj)
+
+                    # Dropout for outputs of each layer
+                    lstm_fw = tf.contrib.rnn.DropoutWrapper(
+                        lstm_fw,
+                        output_keep_prob=keep_prob_hidden)
+                    lstm_bw = tf.contrib.rnn.DropoutWrapper(
+                        lstm_bw,
+                        output_keep_prob=keep_prob_hidden)
+
+                    # Ignore 2nd return (the last state)
+                    (outputs_fw, outputs_bw), final_state = tf.nn.bidirectional_dynamic_rnn(
+                        cell_fw=lstm_fw,
+                        cell_bw=lstm_bw,
+                        inputs=outputs,
+                        sequence_length=inputs_seq_len,
+                        dtype=tf.float32,
+                        scope='blstm_dynamic' + str(i_layer + 1))
 
                 outputs = tf.concat(axis=2, values=[outputs_fw, outputs_bw])
 
@@ -157,14 +158,14 @@ class Multitask_BLSTM_CTC(ctcBase):
                     outputs_hidden = tf.reshape(
                         outputs, shape=[-1, output_node])
 
-                    with tf.name_scope('output_sub'):
+                    with tf.variable_scope('output_sub'):
                         # Affine
-                        W_output_sub = tf.Variable(tf.truncated_normal(
-                            shape=[output_node, self.num_classes_sub],
-                            stddev=0.1, name='W_output_sub'))
-                        b_output_sub = tf.Variable(tf.zeros(
-                            shape=[self.num_classes_sub],
-                            name='b_output_sub'))
+                        W_output_sub = tf.get_variable(
+                            'W_output_sub', shape=[output_node, self.num_classes_sub],
+                            initializer=tf.truncated_normal_initializer(stddev=0.1))
+                        b_output_sub = tf.get_variable(
+                            'b_output_sub', shape=[self.num_classes_sub],
+                            initializer=tf.zeros_initializer())
                         logits_sub_2d = tf.matmul(
                             outputs_hidden, W_output_sub) + b_output_sub
 
@@ -185,23 +186,25 @@ class Multitask_BLSTM_CTC(ctcBase):
         outputs = tf.reshape(outputs, shape=[-1, output_node])
 
         if self.bottleneck_dim is not None and self.bottleneck_dim != 0:
-            with tf.name_scope('bottleneck'):
+            with tf.variable_scope('bottleneck'):
                 # Affine
-                W_bottleneck = tf.Variable(tf.truncated_normal(
-                    shape=[output_node, self.bottleneck_dim],
-                    stddev=0.1, name='W_bottleneck'))
-                b_bottleneck = tf.Variable(tf.zeros(
-                    shape=[self.bottleneck_dim], name='b_bottleneck'))
+                W_bottleneck = tf.get_variable(
+                    'W_bottleneck', shape=[output_node, self.bottleneck_dim],
+                    initializer=tf.truncated_normal_initializer(stddev=0.1))
+                b_bottleneck = tf.get_variable(
+                    'b_bottleneck', shape=[self.bottleneck_dim],
+                    initializer=tf.zeros_initializer())
                 outputs = tf.matmul(outputs, W_bottleneck) + b_bottleneck
                 output_node = self.bottleneck_dim
 
-        with tf.name_scope('output_main'):
+        with tf.variable_scope('output_main'):
             # Affine
-            W_output_main = tf.Variable(tf.truncated_normal(
-                shape=[output_node, self.num_classes],
-                stddev=0.1, name='W_output_main'))
-            b_output_main = tf.Variable(tf.zeros(
-                shape=[self.num_classes], name='b_output_main'))
+            W_output_main = tf.get_variable(
+                'W_output_main', shape=[output_node, self.num_classes],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
+            b_output_main = tf.get_variable(
+                'b_output_main', shape=[self.num_classes],
+                initializer=tf.zeros_initializer())
             logits_main_2d = tf.matmul(outputs, W_output_main) + b_output_main
 
             # Reshape back to the original shape
@@ -214,23 +217,37 @@ class Multitask_BLSTM_CTC(ctcBase):
             return logits_main, logits_sub
 
     def compute_loss(self, inputs, labels_main, labels_sub, inputs_seq_len,
-                     keep_prob_input, keep_prob_hidden, num_gpu=1, scope=None):
+                     keep_prob_input, keep_prob_hidden, num_gpu=1, scope=None,
+                     labels_main_seq_len=None, labels_sub_seq_len=None):
         """Operation for computing ctc loss.
         Args:
             inputs: A tensor of size `[batch_size, max_time, input_size]`
-            labels_main: A SparseTensor of target labels in the main task
-            labels_sub: A SparseTensor of target labels in the sub task
+            labels_main: A SparseTensor of target labels in the main task, or
+                an int32 tensor of padded target labels of size
+                `[batch_size, max_label_len]`
+            labels_sub: A SparseTensor of target labels in the sub task, or
+                an int32 tensor of padded target labels
             inputs_seq_len: A tensor of size `[batch_size]`
             keep_prob_input: A float value. A probability to keep nodes in
                 input-hidden layers
             keep_prob_hidden: A float value. A probability to keep nodes in
                 hidden-hidden layers
             num_gpu: the number of GPUs
+            labels_main_seq_len: An int32 tensor of size `[batch_size]`. This
+                is used only when labels_main are padded. If None, labels of
+                -1 are regarded as padding.
+            labels_sub_seq_len: An int32 tensor of size `[batch_size]`. This
+                is used only when labels_sub are padded.
         Returns:
             loss: operation for computing ctc loss
             logits_main: A tensor of size `[max_time, batch_size, input_size]`
             logits_sub: A tensor of size `[max_time, batch_size, input_size]`
         """
+        if not isinstance(labels_main, tf.SparseTensor):
+            labels_main = dense2sparse(labels_main, labels_main_seq_len)
+        if not isinstance(labels_sub, tf.SparseTensor):
+            labels_sub = dense2sparse(labels_sub, labels_sub_seq_len)
+
         # Build model graph
         logits_main, logits_sub = self._build(
             inputs, inputs_seq_len, keep_prob_input, keep_prob_hidden)
@@ -284,7 +301,10 @@ class Multitask_BLSTM_CTC(ctcBase):
                                   ctc_loss * self.sub_task_weight))
 
         # Compute total loss
-        loss = tf.add_n(tf.get_collection('losses'), name='total_loss')
+        loss = tf.add_n(tf.get_collection('losses', scope), name='total_loss')
+
+        # Weight of this mini-batch in gradient accumulation
+        add_micro_batch_weight(loss, tf.shape(inputs_seq_len)[0])
 
         # Add a scalar summary for the snapshot of loss
         with tf.name_scope("total_loss"):
@@ -358,18 +378,63 @@ class Multitask_BLSTM_CTC(ctcBase):
 
         return posteriors_op_main, posteriors_op_sub
 
+    def log_posteriors(self, logits_main, logits_sub, inputs_seq_len):
+        """Operation for computing log posteriors of each time steps.
+        Args:
+            logits_main: A tensor of size `[max_time, batch_size, input_size]`
+            logits_sub: A tensor of size `[max_time, batch_size, input_size]`
+            inputs_seq_len: A tensor of size `[batch_size]`
+        Return:
+            log_posteriors_op_main: operation for computing log posteriors of
+                size `[batch_size, max_time, num_classes]` in the main task
+            log_posteriors_op_sub: operation for computing log posteriors of
+                size `[batch_size, max_time, num_classes_sub]` in the sub task
+            outputs_seq_len_op: operation for computing lengths of the log
+                posteriors of size `[batch_size]`
+        """
+        # Convert to batch-major: `[batch_size, max_time, num_classes]'
+        logits_main = tf.transpose(logits_main, (1, 0, 2))
+        logits_sub = tf.transpose(logits_sub, (1, 0, 2))
+
+        logits_2d_main = tf.reshape(logits_main,
+                                    shape=[-1, self.num_classes])
+        log_posteriors_op_main = tf.reshape(
+            tf.nn.log_softmax(logits_2d_main), tf.shape(logits_main))
+
+        logits_2d_sub = tf.reshape(logits_sub,
+                                   shape=[-1, self.num_classes_sub])
+        log_posteriors_op_sub = tf.reshape(
+            tf.nn.log_softmax(logits_2d_sub), tf.shape(logits_sub))
+
+        return (log_posteriors_op_main, log_posteriors_op_sub,
+                self._reduce_seq_len(inputs_seq_len))
+
     def compute_ler(self, decode_op_main, decode_op_sub,
-                    labels_main, labels_sub):
-        """Operation for computing LER (Label Error Rate).
+                    labels_main, labels_sub,
+                    labels_main_seq_len=None, labels_sub_seq_len=None):
+        """Operation for computing LER (Label Error Rate) of each task. The
+           edit distance of each utterance is normalized by the length of the
+           ground truth.
         Args:
             decode_op_main: operation for decoding of the main task
             decode_op_sub: operation for decoding of the sub task
-            labels_main: A SparseTensor of target labels in the main task
-            labels_sub: A SparseTensor of target labels in the sub task
+            labels_main: A SparseTensor of target labels in the main task, or
+                an int32 tensor of padded target labels
+            labels_sub: A SparseTensor of target labels in the sub task, or
+                an int32 tensor of padded target labels
+            labels_main_seq_len: An int32 tensor of size `[batch_size]`. This
+                is used only when labels_main are padded.
+            labels_sub_seq_len: An int32 tensor of size `[batch_size]`. This
+                is used only when labels_sub are padded.
         Return:
             ler_op_main: operation for computing LER of the main task
             ler_op_sub: operation for computing LER of the sub task
         """
+        if not isinstance(labels_main, tf.SparseTensor):
+            labels_main = dense2sparse(labels_main, labels_main_seq_len)
+        if not isinstance(labels_sub, tf.SparseTensor):
+            labels_sub = dense2sparse(labels_sub, labels_sub_seq_len)
+
         # Compute LER (normalize by label length)
         ler_op_main = tf.reduce_mean(tf.edit_distance(
             decode_op_main, labels_main, normalize=True))
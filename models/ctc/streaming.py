@@ -0,0 +1,198 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Streaming inference of unidirectional and latency-controlled
+   bidirectional CTC models. Audio features are given chunk by chunk, and
+   the recurrent states, frames to be stacked and CTC hypotheses are carried
+   over to the next chunk.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.util import nest
+
+from models.ctc.streaming_decoder import GreedyStreamingDecoder
+from models.ctc.streaming_decoder import BeamSearchStreamingDecoder
+from experiments.utils.data.frame_stack import FrameStacker
+
+
+class StreamingRecognizer(object):
+    """Streaming recognizer of a single utterance.
+    Args:
+        network: An instance of `LSTM_CTC`, `GRU_CTC` or `BLSTM_CTC` with
+            lc_chunk_size. Time resolution must not be reduced between
+            layers.
+        num_stack: int, the number of frames to stack. If None, frames are
+            not stacked.
+        num_skip: int, the number of frames to skip
+        decode_type: string, greedy or beam_search
+        beam_width: int, the number of beams in beam search
+    """
+
+    def __init__(self, network, num_stack=None, num_skip=None,
+                 decode_type='greedy', beam_width=20):
+
+        if not hasattr(network, 'state_placeholders'):
+            raise ValueError(
+                'Streaming inference is supported only in unidirectional models.')
+        if network.downsample_list is not None:
+            raise ValueError(
+                'Streaming inference does not support time reduction between layers.')
+
+        self.network = network
+
+        # Latency-controlled BLSTM runs on a fixed-size chunk followed by
+        # its right context frames
+        self.lc_chunk_size = getattr(network, 'lc_chunk_size', None)
+        if self.lc_chunk_size is not None:
+            self.window_size = self.lc_chunk_size + network.lc_right_context
+
+        # Frame stacking
+        if num_stack is None or num_skip is None:
+            self.frame_stacker = None
+        else:
+            if network.input_size % num_stack != 0:
+                raise ValueError(
+                    'input_size of the network should be a multiple of num_stack.')
+            self.frame_stacker = FrameStacker(
+                network.input_size // num_stack, num_stack, num_skip)
+
+        # CTC decoder (blank is the last class)
+        blank_index = network.num_classes - 1
+        if decode_type == 'greedy':
+            self.decoder = GreedyStreamingDecoder(blank_index)
+        elif decode_type == 'beam_search':
+            self.decoder = BeamSearchStreamingDecoder(blank_index, beam_width)
+        else:
+            raise ValueError('decode_type is "greedy" or "beam_search".')
+
+        # Define placeholders
+        self.inputs_pl = tf.placeholder(tf.float32,
+                                        shape=[None, None, network.input_size],
+                                        name='inputs')
+        self.inputs_seq_len_pl = tf.placeholder(tf.int32,
+                                                shape=[None],
+                                                name='inputs_seq_len')
+        self.state_pl = network.state_placeholders()
+
+        # Add to the graph each operation
+        logits = network._build(self.inputs_pl,
+                                self.inputs_seq_len_pl,
+                                keep_prob_input=1.0,
+                                keep_prob_hidden=1.0,
+                                initial_state=self.state_pl)
+        # `[max_time, batch_size, num_classes]`
+        self.log_probs_op = tf.nn.log_softmax(logits)
+        self.final_state_op = network.final_state
+
+        self.reset()
+
+    def reset(self):
+        """Start a new utterance."""
+        self.state = [np.zeros((1, pl.get_shape()[1].value), dtype=np.float32)
+                      for pl in nest.flatten(self.state_pl)]
+        if self.frame_stacker is not None:
+            self.frame_stacker.reset()
+        self.decoder.reset()
+        self.buffer = np.zeros((0, self.network.input_size), dtype=np.float32)
+
+    def accept(self, session, inputs):
+        """Recognize a chunk of features.
+        Args:
+            session: session of tensorflow. Variables must be restored.
+            inputs: A numpy array of size `[frame_num, input_size]`, where
+                frame_num is arbitrary
+        Returns:
+            hypothesis: list of labels decoded so far (partial result)
+        """
+        if self.frame_stacker is not None:
+            inputs = self.frame_stacker.push(inputs)
+        return self._feed(session, inputs)
+
+    def finish(self, session):
+        """Recognize the rest of frames and start a new utterance.
+        Args:
+            session: session of tensorflow
+        Returns:
+            hypothesis: list of labels of the whole utterance
+        """
+        if self.frame_stacker is not None:
+            self._feed(session, self.frame_stacker.flush())
+        if self.lc_chunk_size is not None:
+            # The rest of chunks have less right context frames
+            while len(self.buffer) > 0:
+                self._run_window(session)
+        hypothesis = self.decoder.hypothesis
+        self.reset()
+        return hypothesis
+
+    def _feed(self, session, inputs):
+        """
+        Args:
+            session: session of tensorflow
+            inputs: A numpy array of size `[frame_num, input_size]`. Frames
+                are already stacked.
+        Returns:
+            hypothesis: list of labels decoded so far
+        """
+        if self.lc_chunk_size is None:
+            return self._run(session, inputs)
+
+        self.buffer = np.concatenate(
+            [self.buffer, np.asarray(inputs, dtype=np.float32)], axis=0)
+        while len(self.buffer) >= self.window_size:
+            self._run_window(session)
+        return list(self.decoder.hypothesis)
+
+    def _run_window(self, session):
+        """Recognize the first chunk in the buffer with its right context
+           frames, and remove the chunk from the buffer.
+        """
+        window_len = min(len(self.buffer), self.window_size)
+        chunk_len = min(len(self.buffer), self.lc_chunk_size)
+
+        # Pad with zeros up to the window size
+        window = np.zeros((self.window_size, self.network.input_size),
+                          dtype=np.float32)
+        window[:window_len] = self.buffer[:window_len]
+        self.buffer = self.buffer[chunk_len:]
+
+        return self._run(session, window, window_len, chunk_len)
+
+    def _run(self, session, inputs, inputs_seq_len=None, output_len=None):
+        """
+        Args:
+            session: session of tensorflow
+            inputs: A numpy array of size `[frame_num, input_size]`
+            inputs_seq_len: int, the number of frames. If None, the length
+                of inputs.
+            output_len: int, the number of frames to decode. If None, all
+                frames of inputs are decoded.
+        Returns:
+            hypothesis: list of labels decoded so far
+        """
+        inputs = np.asarray(inputs, dtype=np.float32)
+        if len(inputs) == 0:
+            return list(self.decoder.hypothesis)
+        if inputs_seq_len is None:
+            inputs_seq_len = len(inputs)
+        if output_len is None:
+            output_len = inputs_seq_len
+
+        feed_dict = {
+            self.inputs_pl: inputs[np.newaxis],
+            self.inputs_seq_len_pl: [inputs_seq_len]
+        }
+        for pl, state in zip(nest.flatten(self.state_pl), self.state):
+            feed_dict[pl] = state
+
+        log_probs, final_state = session.run(
+            [self.log_probs_op, nest.flatten(self.final_state_op)],
+            feed_dict=feed_dict)
+        self.state = final_state
+
+        return self.decoder.step(log_probs[:output_len, 0, :])
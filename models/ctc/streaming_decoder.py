@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""CTC decoders which consume log probabilities chunk by chunk and keep
+   the hypotheses between chunks (numpy implementation).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import defaultdict
+import numpy as np
+
+LOG_ZERO = -np.inf
+
+
+class GreedyStreamingDecoder(object):
+    """Best path decoding. The label of the last frame is carried over to
+       the next chunk to merge repeated labels across chunks.
+    Args:
+        blank_index: int, index of the blank label
+    """
+
+    def __init__(self, blank_index):
+        self.blank_index = blank_index
+        self.reset()
+
+    def reset(self):
+        """Start a new utterance."""
+        self.hypothesis = []
+        self.prev_label = self.blank_index
+
+    def step(self, log_probs):
+        """
+        Args:
+            log_probs: A numpy array of size `[T, num_classes]`
+        Returns:
+            hypothesis: list of labels decoded so far
+        """
+        for label in np.argmax(log_probs, axis=1):
+            if label != self.prev_label and label != self.blank_index:
+                self.hypothesis.append(int(label))
+            self.prev_label = label
+        return list(self.hypothesis)
+
+
+class BeamSearchStreamingDecoder(object):
+    """Prefix beam search. The probabilities of prefixes ending in blank and
+       non-blank labels are kept between chunks.
+    Args:
+        blank_index: int, index of the blank label
+        beam_width: int, the number of prefixes to keep. Only the top
+            beam_width labels in each frame are used to extend prefixes.
+    """
+
+    def __init__(self, blank_index, beam_width):
+        if beam_width < 1:
+            raise ValueError('beam_width should be positive.')
+        self.blank_index = blank_index
+        self.beam_width = beam_width
+        self.reset()
+
+    def reset(self):
+        """Start a new utterance."""
+        # prefix => [log probability ending in blank,
+        #            log probability ending in non-blank]
+        self.beams = {(): [0., LOG_ZERO]}
+
+    @property
+    def hypothesis(self):
+        best_prefix = max(self.beams,
+                          key=lambda prefix: np.logaddexp(*self.beams[prefix]))
+        return list(best_prefix)
+
+    def nbest(self):
+        """
+        Returns:
+            list of `(labels, log probability)`, sorted by probabilities in
+            descending order
+        """
+        return [(list(prefix), np.logaddexp(*probs)) for prefix, probs in
+                sorted(self.beams.items(),
+                       key=lambda item: -np.logaddexp(*item[1]))]
+
+    def step(self, log_probs):
+        """
+        Args:
+            log_probs: A numpy array of size `[T, num_classes]`
+        Returns:
+            hypothesis: list of labels of the best prefix so far
+        """
+        for log_probs_t in log_probs:
+            candidates = np.argsort(log_probs_t)[::-1][:self.beam_width]
+            log_prob_blank = log_probs_t[self.blank_index]
+
+            next_beams = defaultdict(lambda: [LOG_ZERO, LOG_ZERO])
+            for prefix, (prob_blank, prob_nonblank) in self.beams.items():
+                prob_total = np.logaddexp(prob_blank, prob_nonblank)
+
+                # Stay in the same prefix by blank
+                next_probs = next_beams[prefix]
+                next_probs[0] = np.logaddexp(
+                    next_probs[0], prob_total + log_prob_blank)
+
+                last_label = prefix[-1] if len(prefix) > 0 else None
+                for label in candidates:
+                    if label == self.blank_index:
+                        continue
+                    label = int(label)
+                    log_prob = log_probs_t[label]
+                    next_prefix = prefix + (label,)
+                    next_probs = next_beams[next_prefix]
+                    if label == last_label:
+                        # Repeated labels must be separated by blank
+                        next_probs[1] = np.logaddexp(
+                            next_probs[1], prob_blank + log_prob)
+                        # Merge repeated labels
+                        same_probs = next_beams[prefix]
+                        same_probs[1] = np.logaddexp(
+                            same_probs[1], prob_nonblank + log_prob)
+                    else:
+                        next_probs[1] = np.logaddexp(
+                            next_probs[1], prob_total + log_prob)
+
+            # Prune (prefixes which cannot be emitted are removed)
+            self.beams = dict(
+                item for item in sorted(
+                    next_beams.items(),
+                    key=lambda item: -np.logaddexp(*item[1]))[:self.beam_width]
+                if np.logaddexp(*item[1]) > LOG_ZERO)
+
+        return self.hypothesis
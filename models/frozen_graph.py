@@ -0,0 +1,212 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Export trained models as inference-only frozen graphs, and load them
+   without the model classes. Dropout is removed by building the graph with
+   keep_prob of 1.0, variables are converted into constants, and nodes
+   unused in inference (loss, weight decay and training decoders) are
+   stripped.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import tensorflow as tf
+from tensorflow.tools.graph_transforms import TransformGraph
+
+from models.checkpoint import restore_checkpoint
+
+# Names of input and output nodes in frozen graphs
+INPUTS_NAME = 'inputs'
+INPUTS_SEQ_LEN_NAME = 'inputs_seq_len'
+LOGITS_NAME = 'logits'
+POSTERIORS_NAME = 'posteriors'
+DECODED_NAME = 'decoded'
+MODEL_TYPE_NAME = 'model_type'
+EOS_INDEX_NAME = 'eos_index'
+
+TRANSFORMS = [
+    'remove_nodes(op=CheckNumerics)',
+    'fold_constants(ignore_errors=true)',
+    'strip_unused_nodes',
+    'sort_by_execution_order'
+]
+
+
+def _input_placeholders(input_size):
+    inputs_pl = tf.placeholder(tf.float32,
+                               shape=[None, None, input_size],
+                               name=INPUTS_NAME)
+    inputs_seq_len_pl = tf.placeholder(tf.int32,
+                                       shape=[None],
+                                       name=INPUTS_SEQ_LEN_NAME)
+    return inputs_pl, inputs_seq_len_pl
+
+
+def _build_ctc(network, decode_type, beam_width):
+    """
+    Args:
+        network: An instance of the CTC model class
+        decode_type: string, greedy or beam_search
+        beam_width: int, beam width for beam search
+    Returns:
+        output_names: list of names of output nodes
+    """
+    inputs_pl, inputs_seq_len_pl = _input_placeholders(network.input_size)
+    logits = network._build(inputs_pl, inputs_seq_len_pl,
+                            keep_prob_input=1.0,
+                            keep_prob_hidden=1.0)
+
+    # `[batch_size, max_time, num_classes]`
+    logits_batch_major = tf.transpose(logits, [1, 0, 2])
+    tf.identity(logits_batch_major, name=LOGITS_NAME)
+    tf.nn.softmax(logits_batch_major, name=POSTERIORS_NAME)
+
+    decode_op = network.decoder(logits,
+                                inputs_seq_len_pl,
+                                decode_type=decode_type,
+                                beam_width=beam_width)
+    tf.identity(decode_op.indices, name=DECODED_NAME + '_indices')
+    tf.identity(decode_op.values, name=DECODED_NAME + '_values')
+    tf.identity(decode_op.dense_shape, name=DECODED_NAME + '_shape')
+    tf.constant('ctc', name=MODEL_TYPE_NAME)
+
+    return [LOGITS_NAME, POSTERIORS_NAME,
+            DECODED_NAME + '_indices', DECODED_NAME + '_values',
+            DECODED_NAME + '_shape', MODEL_TYPE_NAME]
+
+
+def _build_attention(network, decode_type, beam_width):
+    """
+    Args:
+        network: An instance of the attention model class
+        decode_type: string, greedy or beam_search
+        beam_width: int, beam width for beam search
+    Returns:
+        output_names: list of names of output nodes
+    """
+    inputs_pl, inputs_seq_len_pl = _input_placeholders(network.input_size)
+
+    # Labels are used only in the training decoder, which is stripped
+    labels_pl = tf.placeholder(tf.int32, shape=[None, None], name='labels')
+    labels_seq_len_pl = tf.placeholder(tf.int32, shape=[None],
+                                       name='labels_seq_len')
+    _, decoder_outputs_train, decoder_outputs_infer = network._build(
+        inputs_pl, labels_pl, inputs_seq_len_pl, labels_seq_len_pl,
+        keep_prob_input=1.0,
+        keep_prob_hidden=1.0)
+    _, decode_op = network.decoder(decoder_outputs_train,
+                                   decoder_outputs_infer,
+                                   decode_type=decode_type,
+                                   beam_width=beam_width)
+
+    # `[batch_size, max_decode_length, num_classes]`
+    logits = decoder_outputs_infer.logits / network.logits_tempareture
+    tf.identity(logits, name=LOGITS_NAME)
+    tf.nn.softmax(logits, name=POSTERIORS_NAME)
+    tf.identity(decode_op, name=DECODED_NAME)
+    tf.constant('attention', name=MODEL_TYPE_NAME)
+    tf.constant(network.eos_index, name=EOS_INDEX_NAME)
+
+    return [LOGITS_NAME, POSTERIORS_NAME, DECODED_NAME, MODEL_TYPE_NAME,
+            EOS_INDEX_NAME]
+
+
+def export_frozen_graph(network, model_path, save_path, decode_type,
+                        beam_width=None):
+    """Build the inference graph, restore variables and write it as a
+       frozen graph.
+    Args:
+        network: An instance of the CTC or attention model class. Models
+            with sos_index are regarded as attention models.
+        model_path: path to the checkpoint to restore
+        save_path: path to save the frozen graph (.pb)
+        decode_type: string, greedy or beam_search
+        beam_width: int, beam width for beam search
+    Returns:
+        graph_def: A frozen `GraphDef`
+    """
+    with tf.Graph().as_default() as graph:
+        if hasattr(network, 'sos_index'):
+            output_names = _build_attention(network, decode_type, beam_width)
+        else:
+            output_names = _build_ctc(network, decode_type, beam_width)
+
+        with tf.Session() as sess:
+            restore_checkpoint(sess, model_path)
+            graph_def = tf.graph_util.convert_variables_to_constants(
+                sess, graph.as_graph_def(), output_names)
+
+    graph_def = TransformGraph(graph_def,
+                               [INPUTS_NAME, INPUTS_SEQ_LEN_NAME],
+                               output_names,
+                               TRANSFORMS)
+
+    with tf.gfile.GFile(save_path, 'wb') as f:
+        f.write(graph_def.SerializeToString())
+
+    return graph_def
+
+
+class FrozenGraph(object):
+    """Inference-only model loaded from a frozen graph. This has the same
+       attributes as the model classes used by the evaluation and decoding
+       functions (inputs, inputs_seq_len, keep_prob_input, keep_prob_hidden
+       and model_dir).
+    Args:
+        graph_path: path to the frozen graph (.pb)
+        model_dir: path to the directory to save results. If None, the
+            directory of graph_path.
+    """
+
+    def __init__(self, graph_path, model_dir=None):
+        graph_def = tf.GraphDef()
+        with tf.gfile.GFile(graph_path, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.import_graph_def(graph_def, name='')
+
+            self.inputs = self._tensor(INPUTS_NAME)
+            self.inputs_seq_len = self._tensor(INPUTS_SEQ_LEN_NAME)
+            self.logits = self._tensor(LOGITS_NAME)
+            self.posteriors = self._tensor(POSTERIORS_NAME)
+            self.input_size = self.inputs.get_shape()[2].value
+
+            # Dropout has been removed, but evaluation functions feed these
+            self.keep_prob_input = tf.placeholder_with_default(
+                1.0, shape=[], name='keep_prob_input')
+            self.keep_prob_hidden = tf.placeholder_with_default(
+                1.0, shape=[], name='keep_prob_hidden')
+
+            self.session = tf.Session(graph=self.graph)
+            self.model_type = self.session.run(
+                self._tensor(MODEL_TYPE_NAME)).decode('utf-8')
+
+            if self.model_type == 'ctc':
+                # A SparseTensor as returned by ctcBase.decoder
+                self.decode_op = tf.SparseTensor(
+                    self._tensor(DECODED_NAME + '_indices'),
+                    self._tensor(DECODED_NAME + '_values'),
+                    self._tensor(DECODED_NAME + '_shape'))
+                self.eos_index = None
+            else:
+                # `[batch_size, max_decode_length]`
+                self.decode_op = self._tensor(DECODED_NAME)
+                self.eos_index = int(self.session.run(
+                    self._tensor(EOS_INDEX_NAME)))
+
+        self.graph.finalize()
+
+        if model_dir is None:
+            model_dir = os.path.dirname(graph_path)
+        self.model_dir = model_dir
+
+    def _tensor(self, name):
+        return self.graph.get_tensor_by_name(name + ':0')
+
+    def close(self):
+        self.session.close()
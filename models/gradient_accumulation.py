@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Gradient accumulation. The gradients of micro-batches are added up in
+   non-trainable variables and applied once every `accumulate_steps`
+   micro-batches, so that the effective mini-batch is larger than what fits
+   in memory. global_step is incremented only when the gradients are
+   applied.
+
+   Micro-batches of different sizes are weighted by the number of
+   utterances. Losses averaged over utterances (e.g. CTC loss) add the size
+   of the mini-batch to the MICRO_BATCH_WEIGHTS collection in compute_loss
+   by `add_micro_batch_weight`. The weight is put in the name scope of the
+   loss, so that only the weights of the losses being trained are counted
+   even if other loss graphs (e.g. of other towers) are built. Losses
+   summed over utterances already scale with the size, and add nothing
+   (each micro-batch has a weight of 1).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+MICRO_BATCH_WEIGHTS = 'micro_batch_weights'
+
+
+def add_micro_batch_weight(loss, weight):
+    """Add the weight of the micro-batch of a loss to the
+       MICRO_BATCH_WEIGHTS collection.
+    Args:
+        loss: A scalar tensor of the loss
+        weight: A scalar tensor, the weight of the micro-batch
+    Returns:
+        weight: A float scalar tensor in the name scope of the loss
+    """
+    with tf.name_scope(loss.op.name + '/'):
+        weight = tf.identity(tf.to_float(weight),
+                             name='micro_batch_weight')
+    tf.add_to_collection(MICRO_BATCH_WEIGHTS, weight)
+    return weight
+
+
+def micro_batch_weight(loss):
+    """
+    Args:
+        loss: A scalar tensor, or list of scalar tensors of each tower
+    Returns:
+        weight: A float scalar tensor, the sum of the weights added to the
+            losses by `add_micro_batch_weight`, or 1.0 if there are not any
+    """
+    if not isinstance(loss, (list, tuple)):
+        loss = [loss]
+    weights = []
+    for loss_tower in loss:
+        weights += tf.get_collection(MICRO_BATCH_WEIGHTS,
+                                     scope=loss_tower.op.name + '/')
+    if len(weights) == 0:
+        return tf.constant(1.0)
+    return tf.add_n(weights)
+
+
+class GradientAccumulator(object):
+    """Accumulators of gradients of variables.
+    Args:
+        var_list: list of variables
+    """
+
+    def __init__(self, var_list):
+        with tf.name_scope('gradient_accumulation'):
+            self.var_list = var_list
+            self.accum_grads = [
+                tf.Variable(tf.zeros(var.get_shape(),
+                                     dtype=var.dtype.base_dtype),
+                            trainable=False,
+                            name=var.op.name.replace('/', '_') + '_accum')
+                for var in var_list]
+            self.accum_weight = tf.Variable(0.0, trainable=False,
+                                            name='accum_weight')
+
+    def accumulate(self, grads, weight):
+        """
+        Args:
+            grads: list of gradients (or None) of each variable
+            weight: A float scalar tensor, the weight of this micro-batch
+        Returns:
+            An operation to add the weighted gradients to the accumulators
+        """
+        with tf.name_scope('accumulate'):
+            accum_ops = [accum_grad.assign_add(tf.convert_to_tensor(grad) *
+                                               weight)
+                         for accum_grad, grad in zip(self.accum_grads, grads)
+                         if grad is not None]
+            accum_ops.append(self.accum_weight.assign_add(weight))
+            return tf.group(*accum_ops, name='accumulate_gradients')
+
+    def apply(self, optimizer, global_step):
+        """
+        Args:
+            optimizer: An instance of `tf.train.Optimizer`
+            global_step: A variable of the global step
+        Returns:
+            An operation to apply the weighted average of the accumulated
+            gradients and reset the accumulators
+        """
+        with tf.name_scope('apply'):
+            # The denominator is never 0 even if nothing is accumulated
+            weight = tf.maximum(self.accum_weight, 1e-8)
+            apply_op = optimizer.apply_gradients(
+                [(accum_grad / weight, var) for accum_grad, var
+                 in zip(self.accum_grads, self.var_list)],
+                global_step=global_step)
+
+            with tf.control_dependencies([apply_op]):
+                reset_ops = [accum_grad.assign(tf.zeros_like(accum_grad))
+                             for accum_grad in self.accum_grads]
+                reset_ops.append(self.accum_weight.assign(0.0))
+                return tf.group(*reset_ops, name='train')
+
+
+def apply_gradients(optimizer, grads_and_vars, global_step,
+                    accumulate_steps=None, weight=None):
+    """Apply gradients at once, or accumulate them.
+    Args:
+        optimizer: An instance of `tf.train.Optimizer`
+        grads_and_vars: list of `(gradient, variable)`
+        global_step: A variable of the global step
+        accumulate_steps: int, the number of micro-batches to accumulate
+            gradients over. If None or 1, gradients are applied at once.
+        weight: A float scalar tensor, the weight of the micro-batch (see
+            `micro_batch_weight`). If None, micro-batches are weighted
+            equally.
+    Returns:
+        train_op: operation for training. With accumulation, this only
+            accumulates gradients of a micro-batch.
+        apply_op: operation to apply the accumulated gradients, which must
+            be run after every `accumulate_steps` runs of train_op. None
+            without accumulation.
+    """
+    grads_and_vars = [(grad, var) for grad, var in grads_and_vars
+                      if grad is not None]
+    if accumulate_steps is None or accumulate_steps <= 1:
+        train_op = optimizer.apply_gradients(grads_and_vars,
+                                             global_step=global_step,
+                                             name='train')
+        return train_op, None
+
+    grads = [grad for grad, _ in grads_and_vars]
+    var_list = [var for _, var in grads_and_vars]
+    if weight is None:
+        weight = tf.constant(1.0)
+    accumulator = GradientAccumulator(var_list)
+    train_op = accumulator.accumulate(grads, weight)
+    apply_op = accumulator.apply(optimizer, global_step)
+    return train_op, apply_op
@@ -0,0 +1,151 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Select implementations of recurrent cells.
+   standard: tf.contrib.rnn.LSTMCell & GRUCell
+   block: tf.contrib.rnn.LSTMBlockCell & GRUBlockCell, which compute each
+       time step by a single op
+   fused: tf.contrib.rnn.LSTMBlockFusedCell, which computes all time steps
+       by a single op (see models.recurrent.fused_rnn). GRU falls back to
+       GRUBlockCell.
+   Variables of LSTM cells have the same names in all implementations, so
+   that checkpoints are compatible. Variables of GRUBlockCell are renamed
+   by `checkpoint_var_list` when saving or restoring.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import re
+import tensorflow as tf
+
+CELL_IMPLS = ['standard', 'block', 'fused']
+
+# Variable names of GRUBlockCell to those of GRUCell
+GRU_BLOCK_VAR_MAP = {
+    'w_ru': 'gru_cell/gates/weights',
+    'b_ru': 'gru_cell/gates/biases',
+    'w_c': 'gru_cell/candidate/weights',
+    'b_c': 'gru_cell/candidate/biases',
+}
+
+
+def check_cell_impl(cell_impl, num_proj=None):
+    """Check the name of the implementation.
+    Args:
+        cell_impl: string, standard or block or fused
+        num_proj: int, the number of nodes in recurrent projection layer
+    """
+    if cell_impl not in CELL_IMPLS:
+        raise ValueError(
+            'cell_impl should be one of [%s], you provided %s.' %
+            (', '.join(CELL_IMPLS), cell_impl))
+    if cell_impl != 'standard' and num_proj is not None and num_proj != 0:
+        raise ValueError(
+            'The recurrent projection layer is not supported in %s cells.' %
+            cell_impl)
+
+
+class InitializerWrapper(tf.contrib.rnn.RNNCell):
+    """Create variables of the wrapped cell with the initializer. Variable
+       names are not changed.
+    Args:
+        cell: An instance of `tf.contrib.rnn.RNNCell`
+        initializer: An initializer of weight parameters
+    """
+
+    def __init__(self, cell, initializer):
+        self._cell = cell
+        self._initializer = initializer
+
+    @property
+    def state_size(self):
+        return self._cell.state_size
+
+    @property
+    def output_size(self):
+        return self._cell.output_size
+
+    def __call__(self, inputs, state, scope=None):
+        with tf.variable_scope(tf.get_variable_scope(),
+                               initializer=self._initializer):
+            return self._cell(inputs, state, scope=scope)
+
+
+def lstm_cell(num_unit, cell_impl, initializer, clip_activation=None,
+              num_proj=None):
+    """Create an LSTM cell computed step by step.
+    Args:
+        num_unit: int, the number of units
+        cell_impl: string, standard or block
+        initializer: An initializer of weight parameters
+        clip_activation: A float value. Range of activation clipping (> 0).
+            This is not used in block cells.
+        num_proj: int, the number of nodes in recurrent projection layer
+    Returns:
+        cell: An instance of `tf.contrib.rnn.RNNCell`
+    """
+    check_cell_impl(cell_impl, num_proj)
+
+    if cell_impl == 'standard':
+        return tf.contrib.rnn.LSTMCell(
+            num_unit,
+            use_peepholes=True,
+            cell_clip=clip_activation,
+            initializer=initializer,
+            num_proj=num_proj,
+            forget_bias=1.0,
+            state_is_tuple=True)
+
+    elif cell_impl == 'block':
+        cell = tf.contrib.rnn.LSTMBlockCell(
+            num_unit,
+            forget_bias=1.0,
+            use_peephole=True)
+        return InitializerWrapper(cell, initializer)
+
+    raise ValueError('Use models.recurrent.fused_rnn for fused cells.')
+
+
+def gru_cell(num_unit, cell_impl):
+    """Create a GRU cell computed step by step.
+    Args:
+        num_unit: int, the number of units
+        cell_impl: string, standard or block or fused. fused is the same
+            as block.
+    Returns:
+        cell: An instance of `tf.contrib.rnn.RNNCell`
+    """
+    check_cell_impl(cell_impl)
+
+    if cell_impl == 'standard':
+        return tf.contrib.rnn.GRUCell(num_unit)
+    return tf.contrib.rnn.GRUBlockCell(num_unit)
+
+
+def checkpoint_name(var_name):
+    """Convert a variable name into the one in checkpoints of standard cells.
+    Args:
+        var_name: string, the name of a variable (without `:0`)
+    Returns:
+        string
+    """
+    match = re.match(r'^(.+/)?GRUBlockCell/(w_ru|b_ru|w_c|b_c)$', var_name)
+    if match is None:
+        return var_name
+    return (match.group(1) or '') + GRU_BLOCK_VAR_MAP[match.group(2)]
+
+
+def checkpoint_var_list(var_list=None):
+    """Make a dictionary of variables for `tf.train.Saver`, which saves and
+       restores variables of block and fused cells with the names of
+       standard cells.
+    Args:
+        var_list: list of variables. By default, all global variables.
+    Returns:
+        dict from names in checkpoints to variables
+    """
+    if var_list is None:
+        var_list = tf.global_variables()
+    return {checkpoint_name(var.op.name): var for var in var_list}
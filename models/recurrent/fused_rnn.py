@@ -0,0 +1,120 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unidirectional and bidirectional LSTM layers computed by
+   tf.contrib.rnn.LSTMBlockFusedCell. All time steps are computed by a
+   single op in time-major. Variables have the same names as those of
+   tf.contrib.rnn.LSTMCell run by tf.nn.dynamic_rnn and
+   tf.nn.bidirectional_dynamic_rnn.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+
+def _fused_lstm_cell(inputs, inputs_seq_len, num_unit, clip_activation,
+                     initial_state=None):
+    """
+    Args:
+        inputs: A tensor of size `[T, B, input_size]`
+        inputs_seq_len: A tensor of size `[B]`
+        num_unit: int, the number of units
+        clip_activation: A float value. Range of activation clipping (> 0)
+        initial_state: An instance of `tf.contrib.rnn.LSTMStateTuple`, or
+            None to start from zero states
+    Returns:
+        outputs: A tensor of size `[T, B, num_unit]`
+        final_state: An instance of `tf.contrib.rnn.LSTMStateTuple`
+    """
+    cell = tf.contrib.rnn.LSTMBlockFusedCell(
+        num_unit,
+        forget_bias=1.0,
+        cell_clip=clip_activation,
+        use_peephole=True)
+    if initial_state is not None:
+        initial_state = (initial_state.c, initial_state.h)
+    outputs, (final_c, final_h) = cell(inputs,
+                                       initial_state=initial_state,
+                                       dtype=tf.float32,
+                                       sequence_length=inputs_seq_len,
+                                       scope='lstm_cell')
+    return outputs, tf.contrib.rnn.LSTMStateTuple(final_c, final_h)
+
+
+def fused_lstm(inputs, inputs_seq_len, num_unit, initializer,
+               clip_activation=None, scope='rnn', time_major=False,
+               initial_state=None):
+    """Unidirectional LSTM layer.
+    Args:
+        inputs: A tensor of size `[B, T, input_size]`
+            (`[T, B, input_size]` if time_major is True)
+        inputs_seq_len: A tensor of size `[B]`
+        num_unit: int, the number of units
+        initializer: An initializer of weight parameters
+        clip_activation: A float value. Range of activation clipping (> 0)
+        scope: string, the name of the variable scope. The variables are
+            created in `scope/lstm_cell`.
+        time_major: bool, if True, inputs and outputs are time-major
+        initial_state: An instance of `tf.contrib.rnn.LSTMStateTuple`, or
+            None to start from zero states
+    Returns:
+        outputs: A tensor of size `[B, T, num_unit]`
+            (`[T, B, num_unit]` if time_major is True)
+        final_state: An instance of `tf.contrib.rnn.LSTMStateTuple`
+    """
+    with tf.variable_scope(scope, initializer=initializer):
+        if not time_major:
+            inputs = tf.transpose(inputs, [1, 0, 2])
+        outputs, final_state = _fused_lstm_cell(
+            inputs, inputs_seq_len, num_unit, clip_activation,
+            initial_state)
+        if not time_major:
+            outputs = tf.transpose(outputs, [1, 0, 2])
+    return outputs, final_state
+
+
+def fused_bidirectional_lstm(inputs, inputs_seq_len, num_unit, initializer,
+                             clip_activation=None,
+                             scope='bidirectional_rnn', time_major=False):
+    """Bidirectional LSTM layer. Inputs are transposed to time-major only
+       once for both directions.
+    Args:
+        inputs: A tensor of size `[B, T, input_size]`
+            (`[T, B, input_size]` if time_major is True)
+        inputs_seq_len: A tensor of size `[B]`
+        num_unit: int, the number of units in each direction
+        initializer: An initializer of weight parameters
+        clip_activation: A float value. Range of activation clipping (> 0)
+        scope: string, the name of the variable scope. The variables are
+            created in `scope/fw/lstm_cell` and `scope/bw/lstm_cell`.
+        time_major: bool, if True, inputs and outputs are time-major
+    Returns:
+        outputs: A tuple of `(outputs_fw, outputs_bw)`. Each is a tensor of
+            size `[B, T, num_unit]` (`[T, B, num_unit]` if time_major is
+            True)
+        final_state: A tuple of `(final_state_fw, final_state_bw)`
+    """
+    with tf.variable_scope(scope, initializer=initializer):
+        if not time_major:
+            inputs = tf.transpose(inputs, [1, 0, 2])
+
+        with tf.variable_scope('fw'):
+            outputs_fw, final_state_fw = _fused_lstm_cell(
+                inputs, inputs_seq_len, num_unit, clip_activation)
+
+        with tf.variable_scope('bw'):
+            inputs_reverse = tf.reverse_sequence(
+                inputs, inputs_seq_len, seq_dim=0, batch_dim=1)
+            outputs_bw, final_state_bw = _fused_lstm_cell(
+                inputs_reverse, inputs_seq_len, num_unit, clip_activation)
+            outputs_bw = tf.reverse_sequence(
+                outputs_bw, inputs_seq_len, seq_dim=0, batch_dim=1)
+
+        if not time_major:
+            outputs_fw = tf.transpose(outputs_fw, [1, 0, 2])
+            outputs_bw = tf.transpose(outputs_bw, [1, 0, 2])
+
+    return (outputs_fw, outputs_bw), (final_state_fw, final_state_bw)
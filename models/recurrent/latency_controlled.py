@@ -0,0 +1,250 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Latency-controlled bidirectional RNN layer. This implementation is based
+   on https://arxiv.org/abs/1510.08983.
+       Zhang, Yu, et al.
+       "Highway long short-term memory rnns for distant speech recognition."
+       ICASSP 2016.
+   An utterance is split into chunks of a fixed size. The forward direction
+   carries its state over chunks, and the backward direction of each chunk
+   starts from zero states at the end of the right context frames. Outputs
+   of the right context frames are used only as inputs of the upper layer
+   in the same chunk, so that the latency is `chunk_size + right_context`
+   frames regardless of the number of layers.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+from tensorflow.python.util import nest
+
+
+class _StateOutputWrapper(tf.contrib.rnn.RNNCell):
+    """Output the state of every time step in addition to the output.
+       Variables of the wrapped cell are not renamed.
+    Args:
+        cell: An instance of `tf.contrib.rnn.RNNCell`
+    """
+
+    def __init__(self, cell):
+        self._cell = cell
+
+    @property
+    def state_size(self):
+        return self._cell.state_size
+
+    @property
+    def output_size(self):
+        return (self._cell.output_size, self._cell.state_size)
+
+    def __call__(self, inputs, state, scope=None):
+        output, next_state = self._cell(inputs, state, scope=scope)
+        return (output, next_state), next_state
+
+
+def right_context_inputs(inputs, inputs_seq_len, chunk_size, right_context):
+    """Gather right context frames of each chunk.
+    Args:
+        inputs: A tensor of size `[B, T, input_size]`
+        inputs_seq_len: A tensor of size `[B]`
+        chunk_size: int, the number of frames in each chunk
+        right_context: int, the number of right context frames (> 0)
+    Returns:
+        context_inputs: A tensor of size
+            `[B, num_chunk, right_context, input_size]`, where num_chunk is
+            `ceil(T / chunk_size)`
+        context_seq_len: A tensor of size `[B, num_chunk]`. The number of
+            context frames of each chunk. 0 in chunks which are not full.
+    """
+    with tf.name_scope('right_context'):
+        batch_size = tf.shape(inputs)[0]
+        max_time = tf.shape(inputs)[1]
+        input_size = inputs.get_shape()[2].value
+        num_chunk = (max_time + chunk_size - 1) // chunk_size
+        inputs_seq_len = tf.to_int32(inputs_seq_len)
+
+        # Pad with zeros so that the context of the last chunk fits
+        pad_num = num_chunk * chunk_size + right_context - max_time
+        padded_inputs = tf.pad(inputs, [[0, 0], [0, pad_num], [0, 0]])
+
+        # `[num_chunk, right_context]`
+        context_index = tf.expand_dims(
+            (tf.range(num_chunk) + 1) * chunk_size, axis=1) + tf.expand_dims(
+            tf.range(right_context), axis=0)
+        context_inputs = tf.gather(tf.transpose(padded_inputs, [1, 0, 2]),
+                                   tf.reshape(context_index, [-1]))
+        context_inputs = tf.reshape(
+            context_inputs, [num_chunk, right_context, batch_size, input_size])
+        context_inputs = tf.transpose(context_inputs, [2, 0, 1, 3])
+
+        chunk_end = (tf.range(num_chunk) + 1) * chunk_size
+        context_seq_len = tf.clip_by_value(
+            tf.expand_dims(inputs_seq_len, axis=1) -
+            tf.expand_dims(chunk_end, axis=0), 0, right_context)
+
+    return context_inputs, context_seq_len
+
+
+def _split_batch(tensor, batch_size, num_chunk):
+    """`[B * num_chunk, ...]` -> `[B, num_chunk, ...]`"""
+    tensor_split = tf.reshape(tensor, tf.concat(
+        [[batch_size, num_chunk], tf.shape(tensor)[1:]], axis=0))
+    # Keep static shapes except for the batch dimension
+    tensor_split.set_shape(
+        tf.TensorShape([None, None]).concatenate(tensor.get_shape()[1:]))
+    return tensor_split
+
+
+def _merge_batch(tensor):
+    """`[B, num_chunk, ...]` -> `[B * num_chunk, ...]`"""
+    tensor_merged = tf.reshape(
+        tensor, tf.concat([[-1], tf.shape(tensor)[2:]], axis=0))
+    # Keep static shapes except for the batch dimension
+    tensor_merged.set_shape(
+        tf.TensorShape([None]).concatenate(tensor.get_shape()[2:]))
+    return tensor_merged
+
+
+def latency_controlled_bidirectional_rnn(cell_fw, cell_bw, inputs,
+                                         inputs_seq_len, chunk_size,
+                                         context_inputs=None,
+                                         context_seq_len=None,
+                                         initial_state_fw=None,
+                                         dtype=tf.float32,
+                                         scope=None):
+    """Latency-controlled bidirectional RNN layer. Variables have the same
+       names as those of `tf.nn.bidirectional_dynamic_rnn`.
+    Args:
+        cell_fw: An instance of `tf.contrib.rnn.RNNCell`
+        cell_bw: An instance of `tf.contrib.rnn.RNNCell`
+        inputs: A tensor of size `[B, T, input_size]`
+        inputs_seq_len: A tensor of size `[B]`
+        chunk_size: int, the number of frames in each chunk
+        context_inputs: A tensor of size
+            `[B, num_chunk, right_context, input_size]`, the inputs of right
+            context frames of each chunk (see `right_context_inputs`). If
+            None, the right context is not used.
+        context_seq_len: A tensor of size `[B, num_chunk]`
+        initial_state_fw: The initial state of the forward direction. This
+            is used to carry the state over calls in streaming inference.
+        dtype: the data type of the initial states
+        scope: string, the name of the variable scope
+    Returns:
+        outputs: A tuple of `(outputs_fw, outputs_bw)` of size
+            `[B, T, output_size]`
+        context_outputs: A tuple of `(context_outputs_fw, context_outputs_bw)`
+            of size `[B, num_chunk, right_context, output_size]`, or None
+        final_state: A tuple of `(final_state_fw, final_state_bw)`.
+            final_state_fw is the state after the last frame (excluding
+            the right context), and final_state_bw is the state of the
+            backward direction at the first frame.
+    """
+    with tf.variable_scope(scope or 'bidirectional_rnn'):
+        batch_size = tf.shape(inputs)[0]
+        max_time = tf.shape(inputs)[1]
+        input_size = inputs.get_shape()[2].value
+        num_chunk = (max_time + chunk_size - 1) // chunk_size
+        inputs_seq_len = tf.to_int32(inputs_seq_len)
+        use_context = context_inputs is not None
+
+        # Split into chunks: `[B * num_chunk, chunk_size, input_size]`
+        pad_num = num_chunk * chunk_size - max_time
+        chunk_inputs = tf.reshape(
+            tf.pad(inputs, [[0, 0], [0, pad_num], [0, 0]]),
+            [-1, chunk_size, input_size])
+        chunk_seq_len = tf.reshape(tf.clip_by_value(
+            tf.expand_dims(inputs_seq_len, axis=1) -
+            tf.expand_dims(tf.range(num_chunk) * chunk_size, axis=0),
+            0, chunk_size), [-1])
+
+        if use_context:
+            context_inputs = _merge_batch(context_inputs)
+            context_seq_len = tf.reshape(tf.to_int32(context_seq_len), [-1])
+
+        # Forward direction over the whole sequence
+        with tf.variable_scope('fw') as fw_scope:
+            if use_context:
+                (outputs_fw, states_fw), final_state_fw = tf.nn.dynamic_rnn(
+                    cell=_StateOutputWrapper(cell_fw),
+                    inputs=inputs,
+                    sequence_length=inputs_seq_len,
+                    initial_state=initial_state_fw,
+                    dtype=dtype,
+                    scope=fw_scope)
+            else:
+                outputs_fw, final_state_fw = tf.nn.dynamic_rnn(
+                    cell=cell_fw,
+                    inputs=inputs,
+                    sequence_length=inputs_seq_len,
+                    initial_state=initial_state_fw,
+                    dtype=dtype,
+                    scope=fw_scope)
+
+        # Forward direction over the right context, starting from the state
+        # at the end of each chunk
+        if use_context:
+            chunk_last = tf.minimum(
+                (tf.range(num_chunk) + 1) * chunk_size, max_time) - 1
+
+            def _state_at_chunk_end(states):
+                # `[B, T, state_size]` -> `[B * num_chunk, state_size]`
+                states = tf.gather(tf.transpose(states, [1, 0, 2]),
+                                   chunk_last)
+                return tf.reshape(tf.transpose(states, [1, 0, 2]),
+                                  [-1, states.get_shape()[2].value])
+
+            with tf.variable_scope(fw_scope, reuse=True) as fw_scope_reuse:
+                context_outputs_fw, _ = tf.nn.dynamic_rnn(
+                    cell=cell_fw,
+                    inputs=context_inputs,
+                    sequence_length=context_seq_len,
+                    initial_state=nest.map_structure(
+                        _state_at_chunk_end, states_fw),
+                    dtype=dtype,
+                    scope=fw_scope_reuse)
+
+        # Backward direction in each chunk (and its right context)
+        with tf.variable_scope('bw') as bw_scope:
+            if use_context:
+                window_inputs = tf.concat(
+                    [chunk_inputs, context_inputs], axis=1)
+                window_seq_len = chunk_seq_len + context_seq_len
+            else:
+                window_inputs = chunk_inputs
+                window_seq_len = chunk_seq_len
+
+            window_inputs_reverse = tf.reverse_sequence(
+                window_inputs, window_seq_len, seq_dim=1, batch_dim=0)
+            window_outputs_bw, window_state_bw = tf.nn.dynamic_rnn(
+                cell=cell_bw,
+                inputs=window_inputs_reverse,
+                sequence_length=window_seq_len,
+                dtype=dtype,
+                scope=bw_scope)
+            window_outputs_bw = tf.reverse_sequence(
+                window_outputs_bw, window_seq_len, seq_dim=1, batch_dim=0)
+
+        output_size_bw = cell_bw.output_size
+        outputs_bw = tf.reshape(
+            window_outputs_bw[:, :chunk_size],
+            [batch_size, num_chunk * chunk_size, output_size_bw])
+        outputs_bw = outputs_bw[:, :max_time]
+
+        # The state of the backward direction at the first frame
+        final_state_bw = nest.map_structure(
+            lambda state: _split_batch(state, batch_size, num_chunk)[:, 0],
+            window_state_bw)
+
+        if use_context:
+            context_outputs = (
+                _split_batch(context_outputs_fw, batch_size, num_chunk),
+                _split_batch(window_outputs_bw[:, chunk_size:],
+                             batch_size, num_chunk))
+        else:
+            context_outputs = None
+
+    return ((outputs_fw, outputs_bw), context_outputs,
+            (final_state_fw, final_state_bw))
@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark decoding steps of the attention layer with and without the
+   projection of the encoder outputs computed once before decoding.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../../')
+from models.attention.decoders.attention_layer import AttentionLayer
+
+
+def build_decoding_loop(attention_layer, encoder_states, values_length,
+                        decoder_num_unit, step_num, use_keys):
+    """Run the attention layer for step_num decoding steps.
+    Args:
+        attention_layer: An instance of `AttentionLayer`
+        encoder_states: A tensor of size
+            `[batch_size, input_time, encoder_num_unit]`
+        values_length: A tensor of size `[batch_size]`
+        decoder_num_unit: int, the number of units of the decoder state
+        step_num: int, the number of decoding steps
+        use_keys: if True, compute the projection of encoder_states once
+            before the loop
+    Returns:
+        attention_weights: A tensor of size `[batch_size, input_time]` at
+            the last step
+    """
+    batch_size = tf.shape(encoder_states)[0]
+    keys = None
+    if use_keys:
+        keys = attention_layer.prepare_memory(encoder_states)
+
+    def body(step, decoder_state, attention_weights):
+        attention_weights, attention_context = attention_layer(
+            encoder_states=encoder_states,
+            current_decoder_state=decoder_state,
+            values=encoder_states,
+            values_length=values_length,
+            attention_weights=attention_weights,
+            keys=keys)
+        # Next decoder state (a dummy of the RNN)
+        decoder_state = tf.tanh(
+            decoder_state + tf.reduce_mean(attention_context, axis=1,
+                                           keep_dims=True))
+        return step + 1, decoder_state, attention_weights
+
+    _, _, attention_weights = tf.while_loop(
+        cond=lambda step, *_: step < step_num,
+        body=body,
+        loop_vars=[tf.constant(0),
+                   tf.zeros([batch_size, decoder_num_unit]),
+                   tf.zeros([batch_size, tf.shape(encoder_states)[1]])])
+    return attention_weights
+
+
+def benchmark(attention_type, batch_size=32, input_time=500,
+              encoder_num_unit=512, decoder_num_unit=256, num_unit=256,
+              step_num=100, iteration=10):
+
+    print('----- attention_type: %s -----' % attention_type)
+
+    tf.reset_default_graph()
+    with tf.Graph().as_default():
+        encoder_states = tf.placeholder(
+            tf.float32, shape=[None, None, encoder_num_unit])
+        values_length = tf.placeholder(tf.int32, shape=[None])
+
+        attention_layer = AttentionLayer(
+            num_unit=num_unit,
+            attention_smoothing=False,
+            attention_weights_tempareture=1.0,
+            attention_type=attention_type)
+
+        weights_ops = {}
+        for use_keys in [False, True]:
+            with tf.variable_scope('attention', reuse=use_keys):
+                weights_ops[use_keys] = build_decoding_loop(
+                    attention_layer, encoder_states, values_length,
+                    decoder_num_unit, step_num, use_keys)
+
+        feed_dict = {
+            encoder_states: np.random.randn(
+                batch_size, input_time, encoder_num_unit),
+            values_length: np.random.randint(
+                input_time // 2, input_time + 1, size=batch_size)
+        }
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+
+            # Results must be the same
+            weights_per_step = sess.run(weights_ops[False], feed_dict)
+            weights_cached = sess.run(weights_ops[True], feed_dict)
+            assert np.allclose(weights_per_step, weights_cached, atol=1e-6)
+
+            for use_keys in [False, True]:
+                start_time = time.time()
+                for _ in range(iteration):
+                    sess.run(weights_ops[use_keys], feed_dict)
+                duration = time.time() - start_time
+                print('  %s: %.1f steps/sec' % (
+                    'precomputed' if use_keys else 'per step',
+                    step_num * iteration / duration))
+
+
+if __name__ == '__main__':
+    for attention_type in ['content', 'hybrid', 'layer_dot']:
+        benchmark(attention_type)
@@ -7,6 +7,7 @@ from __future__ import print_function
 
 import sys
 import unittest
+import numpy as np
 import tensorflow as tf
 
 sys.path.append('../../')
@@ -20,7 +21,7 @@ class TestAttentionEncoder(unittest.TestCase):
     @measure_time
     def test_attention_encoder(self):
         print("Attention Encoder Working check.")
-        # self.check_encode(model_type='pblstm_encoder', label_type='character')
+        self.check_encode(model_type='pblstm_encoder', label_type='character')
         self.check_encode(model_type='blstm_encoder', label_type='character')
         self.check_encode(model_type='lstm_encoder', label_type='character')
         self.check_encode(model_type='bgru_encoder', label_type='character')
@@ -97,6 +98,24 @@ class TestAttentionEncoder(unittest.TestCase):
                         attention_values.shape)
                     self.assertEqual(frame_num, attention_values_length[0])
 
+                elif model_type == 'pblstm_encoder':
+                    # Pick up the final layer
+                    outputs = encoder_outputs.outputs
+                    attention_values_length = encoder_outputs.attention_values_length
+
+                    # Halved before every layer but the first one
+                    frame_num_reduced = frame_num
+                    seq_len_reduced = np.array(inputs_seq_len)
+                    for _ in range(encoder.num_layer - 1):
+                        frame_num_reduced = (frame_num_reduced + 1) // 2
+                        seq_len_reduced = (seq_len_reduced + 1) // 2
+
+                    self.assertEqual(
+                        (batch_size, frame_num_reduced, encoder.num_unit * 2),
+                        outputs.shape)
+                    self.assertEqual(list(seq_len_reduced),
+                                     list(attention_values_length))
+
                 elif model_type == 'lstm_encoder':
                     # Pick up the final layer
                     outputs = encoder_outputs.outputs
@@ -0,0 +1,308 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../../')
+from models.attention.blstm_attention_seq2seq import BLSTMAttetion
+from models.attention.joint_ctc_attention import JointCTCAttention
+from models.attention.decoders.beam_search.util import tile_batch, gather_tree
+from models.attention.decoders.beam_search.util import choose_top_k
+from models.attention.decoders.beam_search.namedtuple import BeamSearchConfig
+from models.attention.decoders.beam_search.beam_search_decoder import BeamSearchDecoder
+from models.test.util import measure_time
+from models.test.data import generate_data
+
+
+class BeamWidth1Attention(BLSTMAttetion):
+    """Decodes by beam search of beam width 1 in addition to greedy decoding,
+       which the model uses instead when beam_width is 1."""
+
+    def _decode_infer(self, decoder, bridge, encoder_outputs):
+        decoder_outputs = super(BeamWidth1Attention, self)._decode_infer(
+            decoder, bridge, encoder_outputs)
+
+        batch_size = tf.shape(encoder_outputs.outputs)[0]
+        config = BeamSearchConfig(
+            beam_width=1,
+            vocab_size=self.num_classes,
+            eos_token=self.eos_index,
+            length_penalty_weight=0.0,
+            choose_successors_fn=choose_top_k)
+        beam_search_decoder = BeamSearchDecoder(
+            decoder=self._create_decoder(encoder_outputs, None),
+            config=config)
+        helper_infer = tf.contrib.seq2seq.GreedyEmbeddingHelper(
+            embedding=self._generate_target_embedding(reuse=True),
+            start_tokens=tf.fill([batch_size], self.sos_index),
+            end_token=self.eos_index)
+        self.beam_search_outputs, _ = beam_search_decoder(
+            initial_state=bridge(reuse=True),
+            helper=helper_infer)
+
+        return decoder_outputs
+
+
+class TestBeamSearch(tf.test.TestCase):
+
+    @measure_time
+    def test_beam_search(self):
+        print("Beam Search Working check.")
+        self.check_util()
+
+        self.check_decoding(model_type='attention', beam_width=4)
+        self.check_decoding(model_type='attention', beam_width=4,
+                            length_penalty_weight=0.6)
+        self.check_decoding(model_type='joint_ctc_attention', beam_width=4)
+
+        self.check_beam_width_1(attention_type='location')
+        self.check_beam_width_1(attention_type='hybrid')
+
+    def check_util(self):
+
+        print('----- util -----')
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            with tf.Session() as sess:
+                # `[batch_size, 2]` -> `[batch_size * beam_width, 2]`
+                tiled = sess.run(tile_batch(
+                    tf.constant([[1, 2], [3, 4]]), beam_width=3))
+                self.assertAllEqual(tiled, [[1, 2], [1, 2], [1, 2],
+                                            [3, 4], [3, 4], [3, 4]])
+
+                # `[time, batch_size, beam_width]`
+                step_ids = [[[2, 5, 3]], [[6, 1, 4]], [[7, 8, 9]]]
+                parent_ids = [[[0, 0, 0]], [[2, 1, 0]], [[2, 1, 1]]]
+                predicted_ids = sess.run(gather_tree(
+                    tf.constant(step_ids), tf.constant(parent_ids)))
+                self.assertAllEqual(predicted_ids[:, 0, :],
+                                    [[2, 5, 5], [4, 1, 1], [7, 8, 9]])
+
+    def check_decoding(self, model_type, beam_width,
+                       length_penalty_weight=0.0):
+
+        print('----- model_type: %s, beam_width: %d, length_penalty_weight: %.1f -----' %
+              (model_type, beam_width, length_penalty_weight))
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            # Load batch data
+            batch_size = 2
+            inputs, labels, inputs_seq_len, labels_seq_len = generate_data(
+                label_type='character',
+                model='attention',
+                batch_size=batch_size)
+
+            # Define placeholders
+            inputs_pl = tf.placeholder(tf.float32,
+                                       shape=[None, None, inputs.shape[-1]],
+                                       name='inputs')
+            labels_pl = tf.placeholder(tf.int32,
+                                       shape=[None, None],
+                                       name='labels')
+            inputs_seq_len_pl = tf.placeholder(tf.int32,
+                                               shape=[None],
+                                               name='inputs_seq_len')
+            labels_seq_len_pl = tf.placeholder(tf.int32,
+                                               shape=[None],
+                                               name='labels_seq_len')
+            keep_prob_input_pl = tf.placeholder(tf.float32,
+                                                name='keep_prob_input')
+            keep_prob_hidden_pl = tf.placeholder(tf.float32,
+                                                 name='keep_prob_hidden')
+
+            # Define model graph
+            num_classes = 26 + 2
+            eos_index = num_classes - 1
+            if model_type == 'attention':
+                network = BLSTMAttetion(
+                    batch_size=batch_size,
+                    input_size=inputs[0].shape[1],
+                    encoder_num_unit=64,
+                    encoder_num_layer=1,
+                    attention_dim=32,
+                    attention_type='content',
+                    decoder_num_unit=64,
+                    decoder_num_layer=1,
+                    embedding_dim=20,
+                    num_classes=num_classes,
+                    sos_index=num_classes - 2,
+                    eos_index=eos_index,
+                    max_decode_length=20,
+                    beam_width=beam_width,
+                    length_penalty_weight=length_penalty_weight)
+                _, _, decoder_outputs_train, decoder_outputs_infer = network.compute_loss(
+                    inputs_pl,
+                    labels_pl,
+                    inputs_seq_len_pl,
+                    labels_seq_len_pl,
+                    keep_prob_input_pl,
+                    keep_prob_hidden_pl)
+            else:
+                indices_pl = tf.placeholder(tf.int64, name='indices')
+                values_pl = tf.placeholder(tf.int32, name='values')
+                shape_pl = tf.placeholder(tf.int64, name='shape')
+                ctc_labels_pl = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+                network = JointCTCAttention(
+                    batch_size=batch_size,
+                    input_size=inputs[0].shape[1],
+                    encoder_num_unit=64,
+                    encoder_num_layer=1,
+                    attention_dim=32,
+                    attention_type='content',
+                    decoder_num_unit=64,
+                    decoder_num_layer=1,
+                    embedding_dim=20,
+                    att_num_classes=num_classes,
+                    ctc_num_classes=26,
+                    att_task_weight=0.5,
+                    sos_index=num_classes - 2,
+                    eos_index=eos_index,
+                    max_decode_length=20,
+                    beam_width=beam_width,
+                    length_penalty_weight=length_penalty_weight)
+                _, _, _, decoder_outputs_train, decoder_outputs_infer = network.compute_loss(
+                    inputs_pl,
+                    labels_pl,
+                    inputs_seq_len_pl,
+                    labels_seq_len_pl,
+                    ctc_labels_pl,
+                    keep_prob_input_pl,
+                    keep_prob_hidden_pl)
+
+            _, decode_op_infer = network.decoder(
+                decoder_outputs_train,
+                decoder_outputs_infer,
+                decode_type='beam_search',
+                beam_width=beam_width)
+            nbest_op = network.nbest_decoder()
+
+            # Make feed dict
+            feed_dict = {
+                inputs_pl: inputs,
+                inputs_seq_len_pl: inputs_seq_len,
+                keep_prob_input_pl: 1.0,
+                keep_prob_hidden_pl: 1.0
+            }
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+
+                predicted_ids_best, nbest = sess.run(
+                    [decode_op_infer, nbest_op], feed_dict=feed_dict)
+
+                self.assertEqual(nbest.predicted_ids.shape[:2],
+                                 (batch_size, beam_width))
+                self.assertEqual(nbest.scores.shape, (batch_size, beam_width))
+                self.assertAllEqual(predicted_ids_best,
+                                    nbest.predicted_ids[:, 0, :])
+
+                # Hypotheses are sorted by scores
+                self.assertTrue(np.all(np.diff(nbest.scores, axis=1) <= 0))
+
+                # Labels after <EOS> are padded with <EOS>
+                for b in range(batch_size):
+                    for i in range(beam_width):
+                        length = nbest.lengths[b, i]
+                        self.assertTrue(np.all(
+                            nbest.predicted_ids[b, i, length:] == eos_index))
+
+    def check_beam_width_1(self, attention_type):
+
+        print('----- beam_width: 1, attention_type: %s -----' %
+              attention_type)
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            # Load batch data
+            batch_size = 2
+            inputs, labels, inputs_seq_len, labels_seq_len = generate_data(
+                label_type='character',
+                model='attention',
+                batch_size=batch_size)
+
+            # Define placeholders
+            inputs_pl = tf.placeholder(tf.float32,
+                                       shape=[None, None, inputs.shape[-1]],
+                                       name='inputs')
+            labels_pl = tf.placeholder(tf.int32,
+                                       shape=[None, None],
+                                       name='labels')
+            inputs_seq_len_pl = tf.placeholder(tf.int32,
+                                               shape=[None],
+                                               name='inputs_seq_len')
+            labels_seq_len_pl = tf.placeholder(tf.int32,
+                                               shape=[None],
+                                               name='labels_seq_len')
+            keep_prob_input_pl = tf.placeholder(tf.float32,
+                                                name='keep_prob_input')
+            keep_prob_hidden_pl = tf.placeholder(tf.float32,
+                                                 name='keep_prob_hidden')
+
+            # Define model graph
+            num_classes = 26 + 2
+            eos_index = num_classes - 1
+            network = BeamWidth1Attention(
+                batch_size=batch_size,
+                input_size=inputs[0].shape[1],
+                encoder_num_unit=64,
+                encoder_num_layer=1,
+                attention_dim=32,
+                attention_type=attention_type,
+                decoder_num_unit=64,
+                decoder_num_layer=1,
+                embedding_dim=20,
+                num_classes=num_classes,
+                sos_index=num_classes - 2,
+                eos_index=eos_index,
+                max_decode_length=20)
+            _, _, decoder_outputs_train, decoder_outputs_infer = network.compute_loss(
+                inputs_pl,
+                labels_pl,
+                inputs_seq_len_pl,
+                labels_seq_len_pl,
+                keep_prob_input_pl,
+                keep_prob_hidden_pl)
+            _, decode_op_infer = network.decoder(
+                decoder_outputs_train,
+                decoder_outputs_infer,
+                decode_type='greedy')
+
+            # Make feed dict
+            feed_dict = {
+                inputs_pl: inputs,
+                inputs_seq_len_pl: inputs_seq_len,
+                keep_prob_input_pl: 1.0,
+                keep_prob_hidden_pl: 1.0
+            }
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+
+                predicted_ids_greedy, beam_search_outputs = sess.run(
+                    [decode_op_infer, network.beam_search_outputs],
+                    feed_dict=feed_dict)
+
+                # The attention weights of the previous step are fed back
+                # in both decoders, so the only beam follows the greedy
+                # path
+                for b in range(batch_size):
+                    length = beam_search_outputs.lengths[b, 0]
+                    labels_beam = list(
+                        beam_search_outputs.predicted_ids[b, 0, :length])
+                    labels_greedy = list(predicted_ids_greedy[b])
+                    if eos_index in labels_greedy:
+                        labels_greedy = labels_greedy[
+                            :labels_greedy.index(eos_index) + 1]
+                    self.assertEqual(labels_beam, labels_greedy)
+
+
+if __name__ == "__main__":
+    tf.test.main()
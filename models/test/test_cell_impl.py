@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import tensorflow as tf
+
+sys.path.append('../../')
+from models.ctc.load_model import load
+from models.recurrent.cell import checkpoint_name, checkpoint_var_list
+from models.test.util import measure_time
+from models.test.data import generate_data
+
+
+class TestCellImpl(tf.test.TestCase):
+
+    @measure_time
+    def test_cell_impl(self):
+        print("Block & fused cells Working check.")
+
+        self.assertEqual(
+            checkpoint_name('bgru_ctc/blstm_dynamic1/fw/GRUBlockCell/w_ru'),
+            'bgru_ctc/blstm_dynamic1/fw/gru_cell/gates/weights')
+        self.assertEqual(checkpoint_name('rnn/GRUBlockCell/b_c'),
+                         'rnn/gru_cell/candidate/biases')
+        self.assertEqual(checkpoint_name('rnn/lstm_cell/weights'),
+                         'rnn/lstm_cell/weights')
+
+        self.check_restore(model_type='blstm_ctc', cell_impl='fused')
+        self.check_restore(model_type='blstm_ctc', cell_impl='block')
+        self.check_restore(model_type='lstm_ctc', cell_impl='fused')
+        self.check_restore(model_type='lstm_ctc', cell_impl='block')
+        self.check_restore(model_type='bgru_ctc', cell_impl='block')
+        self.check_restore(model_type='gru_ctc', cell_impl='block')
+
+    def _build(self, model_type, cell_impl, inputs):
+        inputs_pl = tf.placeholder(tf.float32,
+                                   shape=[None, None, inputs.shape[-1]],
+                                   name='inputs')
+        inputs_seq_len_pl = tf.placeholder(tf.int64,
+                                           shape=[None],
+                                           name='inputs_seq_len')
+        model = load(model_type=model_type)
+        network = model(batch_size=inputs.shape[0],
+                        input_size=inputs.shape[-1],
+                        num_unit=64,
+                        num_layer=2,
+                        num_classes=26,
+                        parameter_init=0.1,
+                        clip_activation=50,
+                        cell_impl=cell_impl)
+        logits = network._build(inputs_pl, inputs_seq_len_pl, 1.0, 1.0)
+        return inputs_pl, inputs_seq_len_pl, logits
+
+    def check_restore(self, model_type, cell_impl):
+        """Restore variables trained by standard cells into block or fused
+           cells, and compare outputs."""
+
+        print('----- ' + model_type + ', ' + cell_impl + ' -----')
+
+        inputs, _, inputs_seq_len = generate_data(
+            label_type='character',
+            model='ctc',
+            batch_size=2)
+        save_dir = tempfile.mkdtemp()
+        save_path = os.path.join(save_dir, 'model.ckpt')
+
+        try:
+            tf.reset_default_graph()
+            with tf.Graph().as_default():
+                inputs_pl, inputs_seq_len_pl, logits = self._build(
+                    model_type, 'standard', inputs)
+                saver = tf.train.Saver()
+                var_names = set(var.op.name for var in tf.global_variables())
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    logits_standard = sess.run(
+                        logits, feed_dict={inputs_pl: inputs,
+                                           inputs_seq_len_pl: inputs_seq_len})
+                    saver.save(sess, save_path)
+
+            tf.reset_default_graph()
+            with tf.Graph().as_default():
+                inputs_pl, inputs_seq_len_pl, logits = self._build(
+                    model_type, cell_impl, inputs)
+                var_list = checkpoint_var_list()
+                self.assertEqual(set(var_list.keys()), var_names)
+                saver = tf.train.Saver(var_list=var_list)
+                with tf.Session() as sess:
+                    saver.restore(sess, save_path)
+                    logits_restored = sess.run(
+                        logits, feed_dict={inputs_pl: inputs,
+                                           inputs_seq_len_pl: inputs_seq_len})
+
+            self.assertAllClose(logits_standard, logits_restored,
+                                rtol=1e-4, atol=1e-4)
+        finally:
+            shutil.rmtree(save_dir)
+
+
+if __name__ == "__main__":
+    tf.test.main()
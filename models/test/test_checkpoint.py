@@ -0,0 +1,94 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../../')
+from models.checkpoint import legacy_name, restore_checkpoint
+from models.test.util import measure_time
+
+
+class TestCheckpoint(tf.test.TestCase):
+
+    @measure_time
+    def test_checkpoint(self):
+        print("Checkpoint restoring working check.")
+
+        checkpoint_shapes = {
+            'blstm_ctc/output/Variable': [10, 5],
+            'blstm_ctc/output/Variable_1': [5],
+            'blstm_ctc/bottleneck/Variable': [20, 10],
+            'blstm_ctc/bottleneck/Variable_1': [10],
+            'decoder/while/attention/filter': [100, 1, 10]}
+        self.assertEqual(
+            legacy_name('blstm_ctc/output/W_output', [10, 5],
+                        checkpoint_shapes),
+            'blstm_ctc/output/Variable')
+        self.assertEqual(
+            legacy_name('blstm_ctc/bottleneck/b_bottleneck', [10],
+                        checkpoint_shapes),
+            'blstm_ctc/bottleneck/Variable_1')
+        self.assertEqual(
+            legacy_name('decoder/attention/filter', [100, 1, 10],
+                        checkpoint_shapes),
+            'decoder/while/attention/filter')
+        self.assertIsNone(legacy_name('blstm_ctc/fw/lstm_cell/weights',
+                                      [10, 40], checkpoint_shapes))
+        with self.assertRaises(ValueError):
+            legacy_name('blstm_ctc/output/W_output', [10, 6],
+                        checkpoint_shapes)
+
+        self.check_restore()
+
+    def check_restore(self):
+        """Restore variables created by tf.Variable in name scopes into
+           variables created by tf.get_variable in variable scopes."""
+        save_dir = tempfile.mkdtemp()
+        save_path = os.path.join(save_dir, 'model.ckpt')
+
+        try:
+            tf.reset_default_graph()
+            with tf.Graph().as_default():
+                with tf.name_scope('model'):
+                    with tf.name_scope('output'):
+                        W_output = tf.Variable(tf.truncated_normal(
+                            shape=[4, 3], stddev=0.1, name='W_output'))
+                        b_output = tf.Variable(tf.truncated_normal(
+                            shape=[3], stddev=0.1, name='b_output'))
+                saver = tf.train.Saver()
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    W_value, b_value = sess.run([W_output, b_output])
+                    saver.save(sess, save_path)
+
+            tf.reset_default_graph()
+            with tf.Graph().as_default():
+                with tf.variable_scope('model'):
+                    with tf.variable_scope('output'):
+                        W_output = tf.get_variable(
+                            'W_output', shape=[4, 3],
+                            initializer=tf.zeros_initializer())
+                        b_output = tf.get_variable(
+                            'b_output', shape=[3],
+                            initializer=tf.zeros_initializer())
+                with tf.Session() as sess:
+                    restore_checkpoint(sess, save_path)
+                    W_restored, b_restored = sess.run([W_output, b_output])
+
+            np.testing.assert_array_equal(W_value, W_restored)
+            np.testing.assert_array_equal(b_value, b_restored)
+        finally:
+            shutil.rmtree(save_dir)
+
+
+if __name__ == "__main__":
+    tf.test.main()
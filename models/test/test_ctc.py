@@ -31,11 +31,45 @@ class TestCTC(tf.test.TestCase):
         self.check_training(model_type='bgru_ctc', label_type='phone')
         self.check_training(model_type='gru_ctc', label_type='character')
         self.check_training(model_type='gru_ctc', label_type='phone')
+
+        # Time reduction between layers
+        self.check_training(model_type='blstm_ctc', label_type='character',
+                            time_reduction_type='concat',
+                            downsample_list=[1, 2])
+        self.check_training(model_type='lstm_ctc', label_type='character',
+                            time_reduction_type='conv',
+                            downsample_list=[1, 2])
+        self.check_training(model_type='bgru_ctc', label_type='character',
+                            time_reduction_type='max_pool',
+                            downsample_list=[1, 2])
+        self.check_training(model_type='gru_ctc', label_type='character',
+                            time_reduction_type='concat',
+                            downsample_list=[1, 2])
+
+        # Block and fused kernels
+        self.check_training(model_type='blstm_ctc', label_type='character',
+                            cell_impl='fused')
+        self.check_training(model_type='lstm_ctc', label_type='character',
+                            cell_impl='block')
+        self.check_training(model_type='lstm_ctc', label_type='character',
+                            cell_impl='fused', downsample_list=[1, 2])
+        self.check_training(model_type='bgru_ctc', label_type='character',
+                            cell_impl='block')
+
+        # Latency-controlled BLSTM
+        self.check_training(model_type='blstm_ctc', label_type='character',
+                            lc_chunk_size=10, lc_right_context=5)
+        self.check_training(model_type='blstm_ctc', label_type='character',
+                            cell_impl='block', lc_chunk_size=20)
         # self.check_training(model_type='cnn_ctc', label_type='phone')
         # self.check_training(model_type='cnn_ctc', label_type='phone')
 
-    def check_training(self, model_type, label_type):
-        print('----- ' + model_type + ', ' + label_type + ' -----')
+    def check_training(self, model_type, label_type,
+                       time_reduction_type='concat', downsample_list=None,
+                       cell_impl='standard', lc_chunk_size=None,
+                       lc_right_context=0):
+        print('----- ' + model_type + ', ' + label_type + ', ' +
+              cell_impl + ' -----')
         tf.reset_default_graph()
         with tf.Graph().as_default():
             # Load batch data
@@ -64,6 +98,10 @@ class TestCTC(tf.test.TestCase):
             # Define model graph
             num_classes = 26 if label_type == 'character' else 61
             model = load(model_type=model_type)
+            lc_param = {}
+            if lc_chunk_size is not None:
+                lc_param['lc_chunk_size'] = lc_chunk_size
+                lc_param['lc_right_context'] = lc_right_context
             network = model(batch_size=batch_size,
                             input_size=inputs[0].shape[1],
                             num_unit=256,
@@ -76,7 +114,11 @@ class TestCTC(tf.test.TestCase):
                             dropout_ratio_input=1.0,
                             dropout_ratio_hidden=1.0,
                             num_proj=None,
-                            weight_decay=1e-6)
+                            weight_decay=1e-6,
+                            time_reduction_type=time_reduction_type,
+                            downsample_list=downsample_list,
+                            cell_impl=cell_impl,
+                            **lc_param)
 
             # Add to the graph each operation
             loss_op, logits = network.compute_loss(inputs_pl,
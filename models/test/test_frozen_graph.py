@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import tensorflow as tf
+
+sys.path.append('../../')
+from models.ctc.load_model import load
+from models.frozen_graph import export_frozen_graph, FrozenGraph
+from models.test.util import measure_time
+from models.test.data import generate_data
+
+
+class TestFrozenGraph(tf.test.TestCase):
+
+    @measure_time
+    def test_frozen_graph(self):
+        print("Frozen graph Working check.")
+        self.check_export(model_type='blstm_ctc', decode_type='beam_search')
+        self.check_export(model_type='lstm_ctc', decode_type='greedy')
+        self.check_export(model_type='bgru_ctc', decode_type='greedy')
+
+    def check_export(self, model_type, decode_type):
+        print('----- ' + model_type + ', ' + decode_type + ' -----')
+
+        inputs, _, inputs_seq_len = generate_data(
+            label_type='character',
+            model='ctc',
+            batch_size=2)
+        save_dir = tempfile.mkdtemp()
+        model_path = os.path.join(save_dir, 'model.ckpt')
+        graph_path = os.path.join(save_dir, 'frozen_graph.pb')
+
+        try:
+            model = load(model_type=model_type)
+            network = model(batch_size=2,
+                            input_size=inputs.shape[-1],
+                            num_unit=64,
+                            num_layer=2,
+                            num_classes=26,
+                            parameter_init=0.1,
+                            clip_activation=50,
+                            dropout_ratio_input=0.8,
+                            dropout_ratio_hidden=0.5)
+
+            # Training graph
+            tf.reset_default_graph()
+            with tf.Graph().as_default():
+                inputs_pl = tf.placeholder(
+                    tf.float32, shape=[None, None, inputs.shape[-1]])
+                inputs_seq_len_pl = tf.placeholder(tf.int32, shape=[None])
+                keep_prob_input_pl = tf.placeholder(tf.float32)
+                keep_prob_hidden_pl = tf.placeholder(tf.float32)
+                logits = network._build(inputs_pl, inputs_seq_len_pl,
+                                        keep_prob_input_pl,
+                                        keep_prob_hidden_pl)
+                decode_op = network.decoder(logits, inputs_seq_len_pl,
+                                            decode_type=decode_type,
+                                            beam_width=20)
+                saver = tf.train.Saver()
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    feed_dict = {inputs_pl: inputs,
+                                 inputs_seq_len_pl: inputs_seq_len,
+                                 keep_prob_input_pl: 1.0,
+                                 keep_prob_hidden_pl: 1.0}
+                    logits_train, decoded_train = sess.run(
+                        [logits, decode_op], feed_dict=feed_dict)
+                    saver.save(sess, model_path)
+
+            # Export and load
+            graph_def = export_frozen_graph(network, model_path, graph_path,
+                                            decode_type=decode_type,
+                                            beam_width=20)
+            op_types = set(node.op for node in graph_def.node)
+            self.assertNotIn('VariableV2', op_types)
+            self.assertNotIn('RandomUniform', op_types)
+
+            frozen = FrozenGraph(graph_path)
+            self.assertEqual(frozen.model_dir, save_dir)
+            self.assertEqual(frozen.model_type, 'ctc')
+            feed_dict = {frozen.inputs: inputs,
+                         frozen.inputs_seq_len: inputs_seq_len,
+                         frozen.keep_prob_input: 1.0,
+                         frozen.keep_prob_hidden: 1.0}
+            logits_frozen, posteriors, decoded_frozen = frozen.session.run(
+                [frozen.logits, frozen.posteriors, frozen.decode_op],
+                feed_dict=feed_dict)
+            frozen.close()
+
+            self.assertAllClose(logits_train.transpose(1, 0, 2),
+                                logits_frozen, rtol=1e-5, atol=1e-5)
+            self.assertAllClose(posteriors.sum(axis=-1),
+                                [[1.0] * inputs.shape[1]] * 2)
+            self.assertAllEqual(decoded_train.indices, decoded_frozen.indices)
+            self.assertAllEqual(decoded_train.values, decoded_frozen.values)
+        finally:
+            shutil.rmtree(save_dir)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,283 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../../')
+from models.attention.joint_ctc_attention import JointCTCAttention
+from models.gradient_accumulation import add_micro_batch_weight
+from models.gradient_accumulation import micro_batch_weight, apply_gradients
+from models.test.util import measure_time
+from models.test.data import generate_data
+
+
+class TestGradientAccumulation(tf.test.TestCase):
+
+    @measure_time
+    def test_gradient_accumulation(self):
+        print("Gradient accumulation check.")
+        # Micro-batches of different sizes
+        self.check_accumulation(micro_batch_sizes=[3, 5], is_mean=True)
+        self.check_accumulation(micro_batch_sizes=[4, 1, 2], is_mean=True)
+        self.check_accumulation(micro_batch_sizes=[3, 5], is_mean=False)
+
+        # A sum over utterances and an average over utterances in one loss
+        self.check_mixed_loss(micro_batch_sizes=[3, 5])
+        self.check_mixed_loss(micro_batch_sizes=[6, 1, 2])
+
+        # The sequence and CTC losses of the joint CTC-attention model
+        self.check_joint_ctc_attention(micro_batch_sizes=[1, 3])
+
+    def check_accumulation(self, micro_batch_sizes, is_mean):
+        print('----- micro_batch_sizes: %s, is_mean: %s -----' %
+              (str(micro_batch_sizes), str(is_mean)))
+
+        inputs = np.random.randn(sum(micro_batch_sizes), 4).astype(np.float32)
+        targets = np.random.randn(sum(micro_batch_sizes), 2).astype(
+            np.float32)
+        w_init = np.random.randn(4, 2).astype(np.float32)
+
+        def build(accumulate_steps):
+            tf.reset_default_graph()
+            inputs_pl = tf.placeholder(tf.float32, shape=[None, 4])
+            targets_pl = tf.placeholder(tf.float32, shape=[None, 2])
+            w = tf.Variable(w_init, name='w')
+            losses = tf.reduce_sum(
+                tf.square(tf.matmul(inputs_pl, w) - targets_pl), axis=1)
+            if is_mean:
+                loss = tf.reduce_mean(losses, name='total_loss')
+                add_micro_batch_weight(loss, tf.shape(inputs_pl)[0])
+            else:
+                loss = tf.reduce_sum(losses, name='total_loss')
+
+            # The weight of another loss graph is not counted
+            loss_dev = tf.reduce_mean(losses, name='total_loss')
+            add_micro_batch_weight(loss_dev, 100)
+
+            global_step = tf.Variable(0, name='global_step', trainable=False)
+            optimizer = tf.train.GradientDescentOptimizer(0.01)
+            grads_and_vars = optimizer.compute_gradients(loss, [w])
+            train_op, apply_op = apply_gradients(
+                optimizer, grads_and_vars, global_step, accumulate_steps,
+                weight=micro_batch_weight(loss))
+            return inputs_pl, targets_pl, w, global_step, train_op, apply_op
+
+        # Apply the gradients of all micro-batches once
+        inputs_pl, targets_pl, w, global_step, train_op, apply_op = build(
+            accumulate_steps=len(micro_batch_sizes))
+        self.assertIsNotNone(apply_op)
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            offset = 0
+            for size in micro_batch_sizes:
+                sess.run(train_op, feed_dict={
+                    inputs_pl: inputs[offset:offset + size],
+                    targets_pl: targets[offset:offset + size]})
+                offset += size
+                # global_step counts only updates
+                self.assertEqual(sess.run(global_step), 0)
+                self.assertAllClose(sess.run(w), w_init)
+            sess.run(apply_op)
+            self.assertEqual(sess.run(global_step), 1)
+            w_accum = sess.run(w)
+
+        # A single mini-batch of all utterances
+        inputs_pl, targets_pl, w, global_step, train_op, apply_op = build(
+            accumulate_steps=None)
+        self.assertIsNone(apply_op)
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            sess.run(train_op, feed_dict={inputs_pl: inputs,
+                                          targets_pl: targets})
+            self.assertEqual(sess.run(global_step), 1)
+            w_single = sess.run(w)
+
+        if is_mean:
+            # Each utterance has the same weight
+            self.assertAllClose(w_accum, w_single, rtol=1e-4, atol=1e-5)
+        else:
+            # Summed losses are averaged over micro-batches
+            self.assertAllClose(w_init - w_accum,
+                                (w_init - w_single) / len(micro_batch_sizes),
+                                rtol=1e-4, atol=1e-5)
+
+    def check_mixed_loss(self, micro_batch_sizes):
+        print('----- mixed loss, micro_batch_sizes: %s -----' %
+              str(micro_batch_sizes))
+
+        inputs = np.random.randn(sum(micro_batch_sizes), 4).astype(np.float32)
+        targets = np.random.randn(sum(micro_batch_sizes), 2).astype(
+            np.float32)
+        w_sum_init = np.random.randn(4, 2).astype(np.float32)
+        w_mean_init = np.random.randn(4, 2).astype(np.float32)
+
+        def build(accumulate_steps):
+            tf.reset_default_graph()
+            inputs_pl = tf.placeholder(tf.float32, shape=[None, 4])
+            targets_pl = tf.placeholder(tf.float32, shape=[None, 2])
+            w_sum = tf.Variable(w_sum_init, name='w_sum')
+            w_mean = tf.Variable(w_mean_init, name='w_mean')
+            loss_sum = tf.reduce_sum(
+                tf.square(tf.matmul(inputs_pl, w_sum) - targets_pl))
+            loss_mean = tf.reduce_mean(tf.reduce_sum(
+                tf.square(tf.matmul(inputs_pl, w_mean) - targets_pl),
+                axis=1))
+            loss = tf.add(loss_sum, loss_mean, name='total_loss')
+            add_micro_batch_weight(loss, tf.shape(inputs_pl)[0])
+            global_step = tf.Variable(0, name='global_step', trainable=False)
+            optimizer = tf.train.GradientDescentOptimizer(0.01)
+            grads_and_vars = optimizer.compute_gradients(
+                loss, [w_sum, w_mean])
+            train_op, apply_op = apply_gradients(
+                optimizer, grads_and_vars, global_step, accumulate_steps,
+                weight=micro_batch_weight(loss))
+            return inputs_pl, targets_pl, w_sum, w_mean, train_op, apply_op
+
+        # Accumulate the gradients of all micro-batches
+        inputs_pl, targets_pl, w_sum, w_mean, train_op, apply_op = build(
+            accumulate_steps=len(micro_batch_sizes))
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            offset = 0
+            for size in micro_batch_sizes:
+                sess.run(train_op, feed_dict={
+                    inputs_pl: inputs[offset:offset + size],
+                    targets_pl: targets[offset:offset + size]})
+                offset += size
+            sess.run(apply_op)
+            w_sum_accum, w_mean_accum = sess.run([w_sum, w_mean])
+
+        # Apply the gradients of each mini-batch separately
+        inputs_pl, targets_pl, w_sum, w_mean, train_op, _ = build(
+            accumulate_steps=None)
+        w_sum_updates, offsets = [], [0]
+        for size in micro_batch_sizes:
+            offsets.append(offsets[-1] + size)
+        for size, offset in zip(micro_batch_sizes, offsets):
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                sess.run(train_op, feed_dict={
+                    inputs_pl: inputs[offset:offset + size],
+                    targets_pl: targets[offset:offset + size]})
+                w_sum_updates.append(w_sum_init - sess.run(w_sum))
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            sess.run(train_op, feed_dict={inputs_pl: inputs,
+                                          targets_pl: targets})
+            w_mean_single = sess.run(w_mean)
+
+        # The averaged loss is averaged over all utterances
+        self.assertAllClose(w_mean_accum, w_mean_single,
+                            rtol=1e-4, atol=1e-5)
+
+        # The summed loss is averaged over micro-batches weighted by their
+        # sizes
+        w_sum_update = sum(size * update for size, update
+                           in zip(micro_batch_sizes, w_sum_updates))
+        w_sum_update /= sum(micro_batch_sizes)
+        self.assertAllClose(w_sum_init - w_sum_accum, w_sum_update,
+                            rtol=1e-4, atol=1e-5)
+
+    def check_joint_ctc_attention(self, micro_batch_sizes):
+        print('----- joint CTC-attention, micro_batch_sizes: %s -----' %
+              str(micro_batch_sizes))
+
+        batch_size = sum(micro_batch_sizes)
+        inputs, att_labels, inputs_seq_len, att_labels_seq_len, _ = \
+            generate_data(label_type='character',
+                          model='joint_ctc_attention',
+                          batch_size=batch_size)
+        # Make utterances different from each other
+        inputs = inputs + np.random.randn(*inputs.shape) * 0.1
+        att_labels = np.array(att_labels)
+        inputs_seq_len = np.array(inputs_seq_len)
+        att_labels_seq_len = np.array(att_labels_seq_len)
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            inputs_pl = tf.placeholder(tf.float32,
+                                       shape=[None, None, inputs.shape[-1]],
+                                       name='inputs')
+            att_labels_pl = tf.placeholder(tf.int32, shape=[None, None],
+                                           name='att_labels')
+            indices_pl = tf.placeholder(tf.int64, name='indices')
+            values_pl = tf.placeholder(tf.int32, name='values')
+            shape_pl = tf.placeholder(tf.int64, name='shape')
+            ctc_labels_pl = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+            inputs_seq_len_pl = tf.placeholder(tf.int32, shape=[None],
+                                               name='inputs_seq_len')
+            att_labels_seq_len_pl = tf.placeholder(tf.int32, shape=[None],
+                                                   name='att_labels_seq_len')
+
+            network = JointCTCAttention(
+                batch_size=batch_size,
+                input_size=inputs.shape[-1],
+                encoder_num_unit=32,
+                encoder_num_layer=1,
+                attention_dim=16,
+                attention_type='content',
+                decoder_num_unit=32,
+                decoder_num_layer=1,
+                embedding_dim=8,
+                att_num_classes=26 + 2,
+                ctc_num_classes=26,
+                att_task_weight=0.5,
+                sos_index=26,
+                eos_index=27,
+                max_decode_length=50,
+                # Gradients are not clipped
+                clip_grad=1e6)
+            loss_op = network.compute_loss(
+                inputs_pl, att_labels_pl, inputs_seq_len_pl,
+                att_labels_seq_len_pl, ctc_labels_pl, 1.0, 1.0)[0]
+            train_op = network.train(loss_op,
+                                     optimizer='sgd',
+                                     learning_rate_init=0.1,
+                                     accumulate_steps=len(micro_batch_sizes))
+            trainable_vars = tf.trainable_variables()
+
+            def make_feed_dict(start, end):
+                _, _, _, _, ctc_labels_st = generate_data(
+                    label_type='character',
+                    model='joint_ctc_attention',
+                    batch_size=end - start)
+                return {inputs_pl: inputs[start:end],
+                        att_labels_pl: att_labels[start:end],
+                        inputs_seq_len_pl: inputs_seq_len[start:end],
+                        att_labels_seq_len_pl: att_labels_seq_len[start:end],
+                        ctc_labels_pl: ctc_labels_st}
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                vars_init = sess.run(trainable_vars)
+
+                # Accumulate the gradients of the micro-batches
+                offset = 0
+                for size in micro_batch_sizes:
+                    sess.run(train_op,
+                             feed_dict=make_feed_dict(offset, offset + size))
+                    offset += size
+                sess.run(network.apply_op)
+                vars_accum = sess.run(trainable_vars)
+
+                # A single mini-batch of all utterances from the same values
+                for var, value in zip(trainable_vars, vars_init):
+                    var.load(value, sess)
+                sess.run(train_op, feed_dict=make_feed_dict(0, batch_size))
+                sess.run(network.apply_op)
+                vars_single = sess.run(trainable_vars)
+
+        # Each utterance has the same weight in both losses
+        for value_accum, value_single in zip(vars_accum, vars_single):
+            self.assertAllClose(value_accum, value_single,
+                                rtol=1e-3, atol=1e-5)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import tensorflow as tf
+
+sys.path.append('../../')
+from models.ctc.load_model import load
+from models.ctc.streaming import StreamingRecognizer
+from models.test.util import measure_time
+from models.test.data import generate_data
+
+
+class TestStreaming(tf.test.TestCase):
+
+    @measure_time
+    def test_streaming(self):
+        print("Streaming inference Working check.")
+        self.check_streaming(model_type='lstm_ctc', decode_type='greedy')
+        self.check_streaming(model_type='lstm_ctc', decode_type='beam_search')
+        self.check_streaming(model_type='lstm_ctc', decode_type='greedy',
+                             cell_impl='fused')
+        self.check_streaming(model_type='gru_ctc', decode_type='greedy')
+        self.check_streaming(model_type='lstm_ctc', decode_type='greedy',
+                             num_stack=3, num_skip=2)
+
+        # Latency-controlled BLSTM
+        self.check_streaming(model_type='blstm_ctc', decode_type='greedy',
+                             lc_chunk_size=10, lc_right_context=5)
+        self.check_streaming(model_type='blstm_ctc', decode_type='beam_search',
+                             lc_chunk_size=8, lc_right_context=0)
+        self.check_streaming(model_type='blstm_ctc', decode_type='greedy',
+                             num_stack=3, num_skip=2,
+                             lc_chunk_size=10, lc_right_context=5)
+
+    def check_streaming(self, model_type, decode_type, cell_impl='standard',
+                        num_stack=None, num_skip=None, lc_chunk_size=None,
+                        lc_right_context=0):
+        print('----- %s, %s, %s, num_stack: %s, num_skip: %s -----' %
+              (model_type, decode_type, cell_impl, str(num_stack),
+               str(num_skip)))
+
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            inputs, _, _ = generate_data(label_type='character',
+                                         model='ctc',
+                                         batch_size=1)
+            inputs = inputs[0]
+
+            model = load(model_type=model_type)
+            lc_param = {}
+            if lc_chunk_size is not None:
+                lc_param['lc_chunk_size'] = lc_chunk_size
+                lc_param['lc_right_context'] = lc_right_context
+            network = model(batch_size=1,
+                            input_size=inputs.shape[1] * (num_stack or 1),
+                            num_unit=64,
+                            num_layer=2,
+                            num_classes=26,
+                            parameter_init=0.1,
+                            clip_activation=50,
+                            cell_impl=cell_impl,
+                            **lc_param)
+            recognizer = StreamingRecognizer(network,
+                                             num_stack=num_stack,
+                                             num_skip=num_skip,
+                                             decode_type=decode_type,
+                                             beam_width=4)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+
+                # Whole utterance at once
+                recognizer.accept(sess, inputs)
+                hypothesis_whole = recognizer.finish(sess)
+
+                # Chunk by chunk
+                for chunk_size in [1, 7, 50]:
+                    for t in range(0, len(inputs), chunk_size):
+                        partial = recognizer.accept(
+                            sess, inputs[t:t + chunk_size])
+                    hypothesis = recognizer.finish(sess)
+                    self.assertEqual(hypothesis, hypothesis_whole)
+
+                    if decode_type == 'greedy':
+                        # Partial results are prefixes of the final one
+                        self.assertEqual(hypothesis[:len(partial)], partial)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,71 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import itertools
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from models.ctc.streaming_decoder import GreedyStreamingDecoder
+from models.ctc.streaming_decoder import BeamSearchStreamingDecoder
+
+
+def _log_softmax(logits):
+    logits = logits - np.max(logits, axis=1, keepdims=True)
+    return logits - np.log(np.sum(np.exp(logits), axis=1, keepdims=True))
+
+
+def _collapse(path, blank_index):
+    return [label for i, label in enumerate(path)
+            if label != blank_index and (i == 0 or label != path[i - 1])]
+
+
+class TestStreamingDecoder(unittest.TestCase):
+
+    def test_streaming_decoder(self):
+        np.random.seed(0)
+        num_classes = 5
+        blank_index = num_classes - 1
+        log_probs = _log_softmax(np.random.randn(30, num_classes) * 3)
+
+        for chunk_size in [1, 3, 7]:
+            # Greedy decoding
+            decoder = GreedyStreamingDecoder(blank_index)
+            for t in range(0, len(log_probs), chunk_size):
+                hypothesis = decoder.step(log_probs[t:t + chunk_size])
+            self.assertEqual(
+                hypothesis,
+                _collapse(list(np.argmax(log_probs, axis=1)), blank_index))
+
+            # Beam search decoding is independent of the chunk size
+            decoder_whole = BeamSearchStreamingDecoder(blank_index, 4)
+            decoder_whole.step(log_probs)
+            decoder = BeamSearchStreamingDecoder(blank_index, 4)
+            for t in range(0, len(log_probs), chunk_size):
+                decoder.step(log_probs[t:t + chunk_size])
+            self.assertEqual(decoder.hypothesis, decoder_whole.hypothesis)
+
+        # Exhaustive search over all paths
+        log_probs = _log_softmax(np.random.randn(6, 3) * 2)
+        label_probs = {}
+        for path in itertools.product(range(3), repeat=len(log_probs)):
+            labels = tuple(_collapse(list(path), 2))
+            log_prob = np.sum(log_probs[np.arange(len(path)), path])
+            label_probs[labels] = np.logaddexp(
+                label_probs.get(labels, -np.inf), log_prob)
+        decoder = BeamSearchStreamingDecoder(2, beam_width=100)
+        decoder.step(log_probs)
+        for labels, log_prob in decoder.nbest():
+            self.assertAlmostEqual(log_prob, label_probs[tuple(labels)])
+        self.assertEqual(
+            tuple(decoder.hypothesis),
+            max(label_probs, key=lambda labels: label_probs[labels]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../../')
+from models.ctc.load_model import load
+from models.tower import get_devices, compute_gradients
+from models.test.util import measure_time
+from models.test.data import generate_data
+
+
+class TestTower(tf.test.TestCase):
+
+    @measure_time
+    def test_tower(self):
+        print("Multi-tower training check.")
+        self.check_training(model_type='blstm_ctc', num_tower=2)
+        self.check_training(model_type='lstm_ctc', num_tower=3)
+        self.check_training(model_type='bgru_ctc', num_tower=2,
+                            clip_grad=None)
+
+    def check_training(self, model_type, num_tower, clip_grad=5.0):
+        print('----- ' + model_type + ', num_tower: ' + str(num_tower) +
+              ' -----')
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            # Load batch data
+            batch_size = 2
+            inputs, labels_true_st, inputs_seq_len = generate_data(
+                label_type='character',
+                model='ctc',
+                batch_size=batch_size)
+
+            # Define placeholders of each tower
+            inputs_pl_list, labels_pl_list, inputs_seq_len_pl_list = [], [], []
+            for i_tower in range(num_tower):
+                inputs_pl_list.append(tf.placeholder(
+                    tf.float32,
+                    shape=[None, None, inputs.shape[-1]],
+                    name='inputs' + str(i_tower)))
+                labels_pl_list.append(tf.SparseTensor(
+                    tf.placeholder(tf.int64, name='indices' + str(i_tower)),
+                    tf.placeholder(tf.int32, name='values' + str(i_tower)),
+                    tf.placeholder(tf.int64, name='shape' + str(i_tower))))
+                inputs_seq_len_pl_list.append(tf.placeholder(
+                    tf.int64, shape=[None],
+                    name='inputs_seq_len' + str(i_tower)))
+            keep_prob_input_pl = tf.placeholder(tf.float32,
+                                                name='keep_prob_input')
+            keep_prob_hidden_pl = tf.placeholder(tf.float32,
+                                                 name='keep_prob_hidden')
+
+            # Define model graph
+            model = load(model_type=model_type)
+            network = model(batch_size=batch_size,
+                            input_size=inputs[0].shape[1],
+                            num_unit=64,
+                            num_layer=2,
+                            bottleneck_dim=0,
+                            num_classes=26,
+                            parameter_init=0.1,
+                            clip_grad=clip_grad,
+                            clip_activation=50,
+                            dropout_ratio_input=1.0,
+                            dropout_ratio_hidden=1.0,
+                            num_proj=None,
+                            weight_decay=1e-6)
+
+            # Build towers on virtual CPU devices
+            losses, logits_list = network.compute_tower_loss(
+                inputs_pl_list,
+                labels_pl_list,
+                inputs_seq_len_pl_list,
+                keep_prob_input_pl,
+                keep_prob_hidden_pl,
+                devices=get_devices(num_tower, device_type='cpu'))
+            self.assertEqual(len(losses), num_tower)
+            self.assertEqual(len(logits_list), num_tower)
+            loss_op = tf.add_n(losses) / num_tower
+
+            # Variables are shared between towers
+            var_names = [var.name for var in tf.trainable_variables()]
+            self.assertEqual(len(var_names), len(set(var_names)))
+            for var_name in var_names:
+                self.assertFalse(var_name.startswith('tower'))
+
+            # Gradients of each tower and the averaged gradients
+            trainable_vars = tf.trainable_variables()
+            tower_grads = [tf.gradients(loss, trainable_vars)
+                           for loss in losses]
+            grads = compute_gradients(losses, trainable_vars)
+
+            learning_rate = 1e-3
+            train_op = network.train(losses,
+                                     optimizer='adam',
+                                     learning_rate_init=learning_rate,
+                                     is_scheduled=False)
+
+            # Feed a different part of data to each tower
+            feed_dict = {
+                keep_prob_input_pl: 1.0,
+                keep_prob_hidden_pl: 1.0,
+                network.lr: learning_rate
+            }
+            for i_tower in range(num_tower):
+                # Cut frames at the end to make towers different
+                max_time = inputs.shape[1] - i_tower * 10
+                feed_dict[inputs_pl_list[i_tower]] = inputs[:, :max_time]
+                feed_dict[labels_pl_list[i_tower]] = labels_true_st
+                feed_dict[inputs_seq_len_pl_list[i_tower]] = np.minimum(
+                    inputs_seq_len, max_time)
+
+            config = tf.ConfigProto(device_count={'CPU': num_tower},
+                                    allow_soft_placement=True)
+            with tf.Session(config=config) as sess:
+                sess.run(tf.global_variables_initializer())
+
+                # The averaged gradient equals the mean of gradients of towers
+                tower_grads_value, grads_value = sess.run(
+                    [tower_grads, grads], feed_dict=feed_dict)
+                for i_var, grad_value in enumerate(grads_value):
+                    grad_mean = np.mean(
+                        [tower_grads_value[i_tower][i_var]
+                         for i_tower in range(num_tower)], axis=0)
+                    self.assertAllClose(grad_value, grad_mean,
+                                        rtol=1e-4, atol=1e-5)
+
+                # Train model
+                loss_init = sess.run(loss_op, feed_dict=feed_dict)
+                for step in range(50):
+                    _, loss_train = sess.run([train_op, loss_op],
+                                             feed_dict=feed_dict)
+                print('Loss: %.3f -> %.3f' % (loss_init, loss_train))
+                self.assertLess(loss_train, loss_init)
+
+
+if __name__ == "__main__":
+    tf.test.main()
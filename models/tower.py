@@ -0,0 +1,111 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Synchronous data-parallel training with towers. A replica of the model
+   (tower) is built on each device with shared variables, and the gradients
+   of all towers are averaged before being applied once.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+VARIABLE_OPS = ['Variable', 'VariableV2', 'VarHandleOp']
+
+
+def get_devices(num_tower, device_type='gpu'):
+    """
+    Args:
+        num_tower: int, the number of towers
+        device_type: string, gpu or cpu. In cpu, create a session with
+            `tf.ConfigProto(device_count={'CPU': num_tower})` to get as many
+            virtual devices.
+    Returns:
+        devices: list of device names
+    """
+    if device_type not in ['gpu', 'cpu']:
+        raise ValueError('device_type is "gpu" or "cpu".')
+    return ['/%s:%d' % (device_type, i) for i in range(num_tower)]
+
+
+def tower_device(device, variable_device='/cpu:0'):
+    """Place variables on variable_device and the other ops on device.
+    Args:
+        device: string, the device of the tower
+        variable_device: string, the device of the shared variables. If
+            None, variables are placed on the device of the first tower.
+    Returns:
+        A device function for `tf.device`
+    """
+    def _assign(op):
+        if variable_device is not None and op.type in VARIABLE_OPS:
+            return variable_device
+        return device
+    return _assign
+
+
+def build_towers(build_fn, devices, variable_device='/cpu:0'):
+    """Build a tower on each device. Variables are created in the first
+       tower and reused in the others.
+    Args:
+        build_fn: A function of `(i_tower, scope)`, where scope is the name
+            scope of the tower, which builds the tower and returns its
+            outputs
+        devices: list of device names
+        variable_device: string, the device of the shared variables
+    Returns:
+        outputs: list of the outputs of build_fn of each tower
+    """
+    outputs = []
+    for i_tower, device in enumerate(devices):
+        with tf.device(tower_device(device, variable_device)):
+            with tf.name_scope('tower' + str(i_tower)) as scope:
+                with tf.variable_scope(tf.get_variable_scope(),
+                                       reuse=True if i_tower > 0 else None):
+                    outputs.append(build_fn(i_tower, scope))
+    return outputs
+
+
+def average_gradients(tower_grads):
+    """
+    Args:
+        tower_grads: list of lists of gradients of each tower. The gradients
+            of the i-th variable are at the i-th position of every list.
+            None means the variable is not used by the loss.
+    Returns:
+        grads: list of averaged gradients (or None)
+    """
+    grads = []
+    for grads_var in zip(*tower_grads):
+        grads_var = [g for g in grads_var if g is not None]
+        if len(grads_var) == 0:
+            grads.append(None)
+        elif len(grads_var) == 1:
+            grads.append(grads_var[0])
+        else:
+            # NOTE: sparse gradients (e.g. of embeddings) are densified
+            grads.append(tf.add_n(
+                [tf.convert_to_tensor(g) for g in grads_var]) /
+                len(grads_var))
+    return grads
+
+
+def compute_gradients(loss, var_list):
+    """Compute gradients of a loss or the average gradients of tower losses.
+    Args:
+        loss: A scalar tensor, or list of scalar tensors of each tower
+        var_list: list of variables
+    Returns:
+        grads: list of gradients (or None) of each variable
+    """
+    if not isinstance(loss, (list, tuple)):
+        return tf.gradients(loss, var_list)
+
+    tower_grads = []
+    for loss_tower in loss:
+        # Compute gradients on the device of each tower
+        tower_grads.append(tf.gradients(
+            loss_tower, var_list, colocate_gradients_with_ops=True))
+    return average_gradients(tower_grads)